@@ -0,0 +1,82 @@
+"""
+Общие утилиты для бенчмарков MCP серверов
+"""
+
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if PROJECT_DIR not in sys.path:
+    sys.path.append(PROJECT_DIR)
+
+
+def spawn_server(script: str = "standard_mcp_server.py", env: Optional[Dict[str, str]] = None,
+                 text: bool = False) -> subprocess.Popen:
+    """Запустить MCP сервер из корня проекта со stdio-пайпами"""
+    full_env = os.environ.copy()
+    full_env["PYTHONIOENCODING"] = "utf-8"
+    if env:
+        full_env.update(env)
+
+    return subprocess.Popen(
+        [sys.executable, script],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=PROJECT_DIR,
+        env=full_env,
+        text=text,
+        encoding="utf-8" if text else None,
+    )
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Перцентиль по отсортированной выборке (ближайший ранг)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """Сводка латентностей в миллисекундах"""
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3) if latencies else 0.0,
+    }
+
+
+def rss_kb(pid: int) -> int:
+    """Резидентная память процесса (КБ); 0, если недоступно"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if pid == os.getpid():
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        except ImportError:
+            pass
+    return 0
+
+
+def git_commit() -> str:
+    """Текущий коммит проекта (для сравнения результатов между коммитами)"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Время ответа calc_stats на больших историях вычислений
+
+Колонки HistoryColumns заполняются --rows вызовами, равномерно
+распределенными по --days дням, и для каждого окна (вся история,
+последние сутки, последний час, случайные окна) замеряется aggregate().
+Для сравнения то же считается в чистом Python по списку словарей
+истории (--baseline-rows строк, как раньше хранился calculator_history).
+
+    python benchmarks/bench_calc_analytics.py --rows 5000000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Dict, List
+
+from _common import latency_summary
+
+import numpy as np
+
+from calc_analytics import HistoryColumns
+
+
+def python_aggregate(entries: List[Dict], start: float, end: float) -> Dict:
+    """Тот же запрос по словарям: фильтр, сортировка для перцентилей"""
+    values = sorted(e["result"] for e in entries if start <= e["ts"] <= end)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "sum": sum(values),
+        "min": values[0],
+        "max": values[-1],
+        "mean": statistics.fmean(values),
+        "p99": values[min(len(values) - 1, int(len(values) * 0.99))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--queries", type=int, default=50, help="случайных окон")
+    parser.add_argument("--baseline-rows", type=int, default=500_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    now = time.time()
+    span = args.days * 86400
+    timestamps = np.sort(rng.uniform(now - span, now, args.rows))
+    values = rng.lognormal(3, 1.5, args.rows)
+
+    columns = HistoryColumns(max_rows=args.rows)
+    started = time.perf_counter()
+    columns.extend(timestamps, values)
+    load_ms = (time.perf_counter() - started) * 1000
+
+    windows = {"all": (None, None), "day": (now - 86400, now), "hour": (now - 3600, now)}
+    results: Dict[str, Dict] = {"rows": args.rows, "load_ms": round(load_ms, 2)}
+    for name, (start, end) in windows.items():
+        latencies = []
+        for _ in range(10):
+            started = time.perf_counter()
+            columns.aggregate(start, end)
+            latencies.append(time.perf_counter() - started)
+        results[name] = latency_summary(latencies)
+
+    picker = random.Random(args.seed)
+    latencies = []
+    for _ in range(args.queries):
+        a, b = sorted(picker.uniform(now - span, now) for _ in range(2))
+        started = time.perf_counter()
+        columns.aggregate(a, b)
+        latencies.append(time.perf_counter() - started)
+    results["random"] = latency_summary(latencies)
+
+    if args.baseline_rows:
+        entries = [{"ts": float(t), "result": float(v)}
+                   for t, v in zip(timestamps[-args.baseline_rows:], values[-args.baseline_rows:])]
+        latencies = []
+        for _ in range(3):
+            started = time.perf_counter()
+            python_aggregate(entries, now - span, now)
+            latencies.append(time.perf_counter() - started)
+        results["python_baseline"] = {"rows": len(entries), **latency_summary(latencies)}
+
+    for name in ("all", "day", "hour", "random"):
+        print(f"{name:>7}: p50 {results[name]['p50_ms']:8.2f} мс, p99 {results[name]['p99_ms']:8.2f} мс "
+              f"({args.rows} строк)")
+    if args.baseline_rows:
+        baseline = results["python_baseline"]
+        print(f" python: p50 {baseline['p50_ms']:8.2f} мс ({baseline['rows']} словарей, вся история)")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Холодный старт MCP серверов: время от запуска процесса до ответа на initialize
+
+Каждый замер запускает новый процесс. Сравниваются варианты:
+  standard          — python standard_mcp_server.py (команда MCPConnection по умолчанию)
+  standard_fast     — python -S standard_mcp_server.py (MCP_SERVER_NO_SITE=1)
+  standard_registry — то же + заранее сериализованный реестр (MCP_TOOLS_REGISTRY)
+  fastmcp           — python personal_assistant.py
+
+    python benchmarks/bench_cold_start.py --runs 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from _common import latency_summary
+
+from mcp_connection import NO_SITE_COMMAND, SERVER_COMMAND, MCPConnection, make_request
+
+VARIANTS = ("standard", "standard_fast", "standard_registry", "fastmcp")
+
+
+def variant_command(variant: str) -> List[str]:
+    if variant == "standard_fast":
+        return list(NO_SITE_COMMAND)
+    if variant == "fastmcp":
+        return [sys.executable, "personal_assistant.py"]
+    return list(SERVER_COMMAND)
+
+
+async def cold_start(variant: str, env: Optional[Dict[str, str]] = None) -> Dict[str, float]:
+    """Один запуск: время до initialize, до готового списка инструментов и оценка самого сервера"""
+    connection = MCPConnection(command=variant_command(variant), env=env)
+    started = time.perf_counter()
+    await connection.start()
+    try:
+        await connection.initialize(batch=variant != "fastmcp")
+        result = {
+            "initialize": connection.startup_seconds,
+            "tools_ready": time.perf_counter() - started,
+        }
+        if variant != "fastmcp":
+            response = await connection.request(make_request("resources/read", {"uri": "metrics://server"}))
+            metrics = json.loads(response["result"]["contents"][0]["text"])
+            startup = metrics.get("startup", {}).get("first_initialize")
+            if startup:
+                result["server_reported"] = startup["max_ms"] / 1000
+        return result
+    finally:
+        await connection.close()
+
+
+async def measure(variant: str, runs: int, env: Optional[Dict[str, str]] = None) -> Dict:
+    samples = [await cold_start(variant, env) for _ in range(runs)]
+    result = {"variant": variant, "runs": runs}
+    for key in ("initialize", "tools_ready", "server_reported"):
+        values = [sample[key] for sample in samples if key in sample]
+        if values:
+            result[key] = latency_summary(values)
+    return result
+
+
+async def measure_all(runs: int, variants=VARIANTS) -> List[Dict]:
+    """Замерить все варианты; реестр инструментов готовится во временном файле"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        registry = os.path.join(tmp_dir, "tools.json")
+        process = await asyncio.create_subprocess_exec(
+            *SERVER_COMMAND, "--dump-tools", registry,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        await process.wait()
+
+        results = []
+        for variant in variants:
+            env = {"MCP_TOOLS_REGISTRY": registry} if variant == "standard_registry" else None
+            results.append(await measure(variant, runs, env))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20, help="запусков на вариант")
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="через запятую")
+    args = parser.parse_args()
+
+    variants = [v.strip() for v in args.variants.split(",")]
+    results = asyncio.run(measure_all(args.runs, variants))
+    for result in results:
+        line = f"{result['variant']:>18}: initialize p50 {result['initialize']['p50_ms']:7.1f} мс, " \
+               f"p95 {result['initialize']['p95_ms']:7.1f} мс"
+        if "server_reported" in result:
+            line += f" (по данным сервера p50 {result['server_reported']['p50_ms']:.0f} мс)"
+        print(line)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
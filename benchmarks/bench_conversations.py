@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Пропускная способность параллельных диалогов (ConversationManager)
+
+Один клиент с общим HTTP пулом и MCP сервером прогоняет пакет ходов
+(несколько диалогов по несколько ходов) при разной параллельности.
+Заглушка LLM отвечает с задержкой и готовит не больше --upstream-limit
+ответов одновременно, так что рост пропускной способности должен
+упереться в этот лимит.
+
+    python benchmarks/bench_conversations.py --levels 1,2,4,8,16,32 --upstream-limit 16
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+from _common import latency_summary
+
+from conversation_manager import ConversationManager, batch_summary
+from openrouter_client import OpenRouterMCPClient
+from stub_llm import StubLLMServer
+
+
+def make_batch(conversations: int, turns: int) -> List[Dict]:
+    return [
+        {"id": f"{c}-{t}", "conversation": f"c{c}", "prompt": f"Добавь задачу и посчитай выражение #{c}.{t}"}
+        for t in range(turns)
+        for c in range(conversations)
+    ]
+
+
+async def run_level(concurrency: int, args) -> Dict:
+    stub = StubLLMServer(latency=args.llm_latency, concurrency_limit=args.upstream_limit)
+    await stub.start()
+    client = OpenRouterMCPClient(api_key="benchmark", pool_size=args.pool_size)
+    client.base_url = stub.base_url
+    try:
+        await client.start_mcp_server()
+        manager = ConversationManager(client, concurrency=concurrency)
+        started = time.perf_counter()
+        results = await manager.run_batch(make_batch(args.conversations, args.turns))
+        summary = batch_summary(results, time.perf_counter() - started)
+        return {
+            "concurrency": concurrency,
+            **summary,
+            "upstream_requests": stub.requests,
+            "turn": latency_summary([r["seconds"] for r in results]),
+            "upstream": latency_summary([r["upstream_seconds"] for r in results]),
+            "mcp": latency_summary([r["mcp_seconds"] for r in results]),
+        }
+    finally:
+        await client.cleanup()
+        await stub.stop()
+
+
+async def run(args) -> List[Dict]:
+    return [await run_level(int(level), args) for level in args.levels.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="уровни параллельности через запятую")
+    parser.add_argument("--conversations", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=2, help="ходов в каждом диалоге")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="задержка ответа заглушки (сек)")
+    parser.add_argument("--upstream-limit", type=int, default=16,
+                        help="сколько ответов заглушка готовит одновременно (0 — без лимита)")
+    parser.add_argument("--pool-size", type=int, default=0)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    for result in results:
+        print(f"параллельно {result['concurrency']:>3}: {result['turns_per_second']:7.2f} ходов/сек, "
+              f"p50 {result['turn']['p50_ms']:7.1f} мс, p95 {result['turn']['p95_ms']:7.1f} мс, "
+              f"ошибок {result['errors']}")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Латентность get_tasks FastMCP сервера, пока text_stats нагружает процессор
+
+personal_assistant.py запускается с каждым режимом MCP_OFFLOAD (off, thread,
+process). Несколько клиентов непрерывно отправляют большие text_stats, а
+отдельный клиент по одному вызывает get_tasks. В режиме off get_tasks ждет
+в цикле событий за каждым text_stats; при выносе тяжелого инструмента из
+цикла латентность get_tasks должна остаться близкой к холостой.
+
+    python benchmarks/bench_offload.py --modes off,thread,process --text-size 2000000
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Dict, List
+
+from _common import latency_summary
+
+from mcp_connection import MCPConnection, make_request
+
+WORDS = ["анализ", "текста", "протокол", "задача", "сервер", "клиент"]
+
+
+async def call(connection: MCPConnection, name: str, arguments: Dict) -> bool:
+    response = await connection.request(make_request("tools/call", {"name": name, "arguments": arguments}))
+    return "result" in response and not response["result"].get("isError")
+
+
+async def probe(connection: MCPConnection, count: int) -> List[float]:
+    """Последовательные вызовы get_tasks"""
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        await call(connection, "get_tasks", {})
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def run_mode(mode: str, args) -> Dict:
+    env = {"MCP_OFFLOAD": mode}
+    if args.workers:
+        env["MCP_OFFLOAD_WORKERS"] = str(args.workers)
+    connection = MCPConnection(command=[sys.executable, "personal_assistant.py"], env=env)
+    await connection.start()
+    try:
+        await connection.initialize(batch=False)
+        for i in range(args.store_size):
+            await call(connection, "add_task", {"title": f"Задача {i}"})
+        text = " ".join(WORDS[i % len(WORDS)] for i in range(args.text_size // 7))
+
+        idle = await probe(connection, args.probes)
+
+        heavy_latencies: List[float] = []
+        stop = asyncio.Event()
+
+        async def saturate():
+            while not stop.is_set():
+                started = time.perf_counter()
+                await call(connection, "text_stats", {"text": text})
+                heavy_latencies.append(time.perf_counter() - started)
+
+        heavy = [asyncio.create_task(saturate()) for _ in range(args.heavy_clients)]
+        # Даем нагрузке установиться: первые ответы text_stats (и запуск пула процессов)
+        while len(heavy_latencies) < args.heavy_clients:
+            await asyncio.sleep(0.05)
+        loaded = await probe(connection, args.probes)
+        stop.set()
+        await asyncio.gather(*heavy)
+
+        return {
+            "mode": mode,
+            "get_tasks_idle": latency_summary(idle),
+            "get_tasks_loaded": latency_summary(loaded),
+            "text_stats": latency_summary(heavy_latencies),
+        }
+    finally:
+        await connection.close()
+
+
+async def run(args) -> List[Dict]:
+    return [await run_mode(mode.strip(), args) for mode in args.modes.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="off,thread,process", help="режимы MCP_OFFLOAD через запятую")
+    parser.add_argument("--text-size", type=int, default=2_000_000, help="размер текста text_stats (символов)")
+    parser.add_argument("--heavy-clients", type=int, default=4, help="сколько text_stats одновременно")
+    parser.add_argument("--probes", type=int, default=30, help="сколько вызовов get_tasks замерять")
+    parser.add_argument("--store-size", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=0, help="MCP_OFFLOAD_WORKERS (0 — по умолчанию)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    for result in results:
+        idle, loaded = result["get_tasks_idle"], result["get_tasks_loaded"]
+        print(f"{result['mode']:>8}: get_tasks p50 {idle['p50_ms']:7.1f} -> {loaded['p50_ms']:7.1f} мс, "
+              f"p99 {idle['p99_ms']:7.1f} -> {loaded['p99_ms']:7.1f} мс под нагрузкой text_stats")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Большие значения через stdio и через файлы в общей памяти ($payload)
+
+Стандартный сервер запускается в двух режимах:
+  inline    — все в строке JSON-RPC (MCP_PAYLOAD_THRESHOLD=0, как раньше)
+  payloads  — строки от --threshold символов уходят файлами в /dev/shm
+Измеряется латентность text_stats с текстом каждого размера из --sizes
+(большой запрос) и get_tasks по хранилищу из --store-size задач (большой ответ).
+
+    python benchmarks/bench_payloads.py --sizes 100000,1000000,8000000 --store-size 20000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+from _common import latency_summary
+
+from mcp_connection import MCPConnection, make_request
+from mcp_payload import PayloadChannel
+
+WORDS = ["анализ", "текста", "протокол", "задача", "сервер", "клиент"]
+
+
+async def timed(connection: MCPConnection, name: str, arguments: Dict, repeat: int) -> List[float]:
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = await connection.request(make_request("tools/call", {"name": name, "arguments": arguments}))
+        latencies.append(time.perf_counter() - started)
+        assert "result" in response, response
+    return latencies
+
+
+async def run_mode(mode: str, args) -> Dict:
+    threshold = 0 if mode == "inline" else args.threshold
+    env = {
+        "MCP_PAYLOAD_THRESHOLD": str(threshold),
+        # Самый большой текст должен пройти проверку размера в обоих режимах
+        "MCP_MAX_REQUEST_BYTES": str(4 * max(args.sizes) + 1024 * 1024),
+    }
+    connection = MCPConnection(env=env)
+    connection.payloads = PayloadChannel(threshold=threshold)
+    await connection.start()
+    try:
+        await connection.initialize()
+        result = {"mode": mode, "active": connection.payloads_active, "text_stats": {}}
+        for size in args.sizes:
+            text = " ".join(WORDS[i % len(WORDS)] for i in range(size // 7))
+            result["text_stats"][size] = latency_summary(await timed(connection, "text_stats", {"text": text}, args.repeat))
+
+        for i in range(args.store_size):
+            await connection.send_batch([make_request("tools/call", {
+                "name": "add_task", "arguments": {"title": f"Задача {i}", "description": "описание задачи " * 4}
+            })])
+        result["get_tasks"] = latency_summary(await timed(connection, "get_tasks", {}, args.repeat))
+        result["files_sent"] = connection.payloads.sent
+        result["files_received"] = connection.payloads.received
+        return result
+    finally:
+        await connection.close()
+
+
+async def run(args):
+    return [await run_mode(mode, args) for mode in ("inline", "payloads")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100000,1000000,8000000", help="размеры текста text_stats (символов)")
+    parser.add_argument("--store-size", type=int, default=20000, help="задач в хранилище для get_tasks")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--threshold", type=int, default=64 * 1024, help="порог $payload (символов)")
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",")]
+
+    results = asyncio.run(run(args))
+    for r in results:
+        sizes = ", ".join(f"{size}: {s['p50_ms']:.1f} мс" for size, s in r["text_stats"].items())
+        print(f"{r['mode']:>8}: text_stats p50 {sizes}; get_tasks p50 {r['get_tasks']['p50_ms']:.1f} мс")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Кэширование промптов у провайдера: prefill и латентность по ходам диалога
+
+Заглушка LLM кэширует префиксы до меток cache_control (как Anthropic) и
+тратит --prefill-us микросекунд на каждый не закэшированный токен промпта.
+Один длинный диалог (--turns ходов, инструменты MCP сервера в каждом
+запросе) прогоняется в режимах:
+  off   — запрос как раньше: без системного промпта и меток
+  auto  — стабильный префикс и метки cache_control (OPENROUTER_PROMPT_CACHE=auto)
+
+    python benchmarks/bench_prompt_cache.py --turns 20 --prefill-us 50
+"""
+
+import argparse
+import asyncio
+import json
+from typing import Dict
+
+from _common import latency_summary
+
+from openrouter_client import OpenRouterMCPClient
+from prompt_cache import PromptCachePlanner
+from stub_llm import StubLLMServer
+
+MODEL = "anthropic/claude-3.5-sonnet"
+
+
+async def run_mode(mode: str, args) -> Dict:
+    stub = StubLLMServer(latency=args.llm_latency, prompt_cache=True, prefill_per_token=args.prefill_us / 1e6)
+    await stub.start()
+    client = OpenRouterMCPClient(api_key="benchmark", model=MODEL)
+    client.base_url = stub.base_url
+    client.prompt_cache = PromptCachePlanner(mode=mode)
+    try:
+        await client.start_mcp_server()
+        for i in range(args.turns):
+            await client.chat_turn(f"Добавь задачу и посчитай выражение #{i}. " + "Контекст. " * args.message_words)
+        turns = list(client.turn_metrics)
+        prompt_tokens = sum(t["prompt_tokens"] for t in turns)
+        cached_tokens = sum(t["prompt_cached_tokens"] for t in turns)
+        return {
+            "mode": mode,
+            "turns": args.turns,
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "savings": round(cached_tokens / prompt_tokens, 3) if prompt_tokens else 0.0,
+            "hits": sum(t["prompt_cache_hits"] for t in turns),
+            "misses": sum(t["prompt_cache_misses"] for t in turns),
+            "turn": latency_summary([t["total_seconds"] for t in turns]),
+            "upstream": latency_summary([t["upstream_seconds"] for t in turns]),
+            "last_turn_ms": round(turns[-1]["upstream_seconds"] * 1000, 2),
+        }
+    finally:
+        await client.cleanup()
+        await stub.stop()
+
+
+async def run(args):
+    return [await run_mode(mode, args) for mode in ("off", "auto")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--prefill-us", type=float, default=50.0, help="prefill на токен (микросекунды)")
+    parser.add_argument("--llm-latency", type=float, default=0.01, help="задержка ответа заглушки (сек)")
+    parser.add_argument("--message-words", type=int, default=100, help="слов в каждом сообщении пользователя")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    for r in results:
+        print(f"{r['mode']:>5}: из кэша {r['savings'] * 100:5.1f}% токенов промпта "
+              f"({r['hits']} попаданий, {r['misses']} промахов), upstream p50 {r['upstream']['p50_ms']:7.1f} мс, "
+              f"последний ход {r['last_turn_ms']:7.1f} мс")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Колоночный снимок задач против JSON: запись, открытие, аналитика и размер
+
+Для хранилища из --tasks задач замеряется:
+  write      — запись всего списка (json.dump / write_snapshot)
+  open       — время до первого доступа к данным (json.load / mmap снимка)
+  summary    — счетчики по приоритетам, завершенным и просроченным
+               (JSON: загрузка и проход по словарям; снимок: проход по колонкам)
+  materialize — полный список словарей задач
+
+    python benchmarks/bench_snapshot.py --tasks 200000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from _common import PROJECT_DIR  # noqa: F401  (добавляет корень проекта в sys.path)
+
+from task_snapshot import TaskSnapshot, write_snapshot
+from task_tenants import TaskNamespace, parse_due_date
+
+
+def make_tasks(count: int) -> List[Dict]:
+    namespace = TaskNamespace("bench", max_tasks=count)
+    for i in range(count):
+        task = {
+            "title": f"Задача {i}",
+            "description": "Подготовить квартальный отчет" if i % 3 else "",
+            "priority": ("low", "medium", "high")[i % 3],
+            "completed": False,
+            "created_at": datetime.now().isoformat(),
+        }
+        if i % 5 == 0:
+            task["due_date"] = f"2025-0{i % 9 + 1}-15"
+        namespace.add_task(task)
+        if i % 4 == 0:
+            namespace.mark_completed(namespace.tasks[-1])
+    return namespace.tasks
+
+
+def json_summary(tasks: List[Dict]) -> Dict:
+    now = datetime.now()
+    by_priority = {"high": 0, "medium": 0, "low": 0}
+    completed = overdue = 0
+    for task in tasks:
+        by_priority[task["priority"]] += 1
+        if task["completed"]:
+            completed += 1
+        elif task.get("due_date") and parse_due_date(task["due_date"]) <= now:
+            overdue += 1
+    return {"total": len(tasks), "completed": completed, "by_priority": by_priority, "overdue": overdue}
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, round((time.perf_counter() - started) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=200_000)
+    args = parser.parse_args()
+
+    tasks = make_tasks(args.tasks)
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "tasks.json")
+        snapshot_path = os.path.join(tmp, "tasks.snapshot")
+
+        def dump_json():
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(tasks, f, ensure_ascii=False)
+
+        def load_json():
+            with open(json_path, encoding="utf-8") as f:
+                return json.load(f)
+
+        _, json_write = timed(dump_json)
+        loaded, json_open = timed(load_json)
+        json_stats, json_scan = timed(lambda: json_summary(loaded))
+
+        _, snapshot_write = timed(lambda: write_snapshot(snapshot_path, tasks))
+        snapshot, snapshot_open = timed(lambda: TaskSnapshot(snapshot_path))
+        snapshot_stats, snapshot_scan = timed(snapshot.summary)
+        _, snapshot_materialize = timed(snapshot.tasks)
+        snapshot.close()
+        assert snapshot_stats["overdue"] == json_stats["overdue"]
+
+        results = {
+            "tasks": args.tasks,
+            "json": {"write_ms": json_write, "open_ms": json_open, "summary_ms": json_open + json_scan,
+                     "materialize_ms": json_open, "bytes": os.path.getsize(json_path)},
+            "snapshot": {"write_ms": snapshot_write, "open_ms": snapshot_open,
+                         "summary_ms": snapshot_open + snapshot_scan, "materialize_ms": snapshot_materialize,
+                         "bytes": os.path.getsize(snapshot_path)},
+        }
+
+    for name in ("json", "snapshot"):
+        r = results[name]
+        print(f"{name:>8}: запись {r['write_ms']:8.1f} мс, открытие {r['open_ms']:8.1f} мс, "
+              f"сводка {r['summary_ms']:8.1f} мс, словари {r['materialize_ms']:8.1f} мс, {r['bytes'] / 1e6:6.1f} МБ")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный генератор: конвейерная отправка запросов в standard_mcp_server.py
+
+Все запросы пишутся в stdin одним потоком, не дожидаясь ответов, после чего
+считается пропускная способность. Сравниваются два режима вывода сервера:
+сброс после каждого ответа (MCP_WRITE_BUFFER=0) и буферизованный FramedWriter.
+"""
+
+import argparse
+import json
+import threading
+import time
+
+from _common import spawn_server
+
+
+def run_pipeline(requests_count: int, env: dict) -> dict:
+    process = spawn_server(env=env)
+
+    payload = b"".join(
+        (json.dumps({
+            "jsonrpc": "2.0",
+            "id": i,
+            "method": "tools/call",
+            "params": {"name": "calculate", "arguments": {"expression": f"{i} * 2 + 1"}}
+        }) + "\n").encode("utf-8")
+        for i in range(requests_count)
+    )
+
+    def feed():
+        process.stdin.write(payload)
+        process.stdin.close()
+
+    started = time.perf_counter()
+    feeder = threading.Thread(target=feed)
+    feeder.start()
+
+    received = 0
+    reads = 0
+    while received < requests_count:
+        chunk = process.stdout.read1(1 << 20)
+        if not chunk:
+            break
+        reads += 1
+        received += chunk.count(b"\n")
+
+    elapsed = time.perf_counter() - started
+    feeder.join()
+    process.wait()
+
+    return {
+        "requests": requests_count,
+        "received": received,
+        "seconds": round(elapsed, 4),
+        "requests_per_second": round(received / elapsed, 1) if elapsed else 0.0,
+        "client_reads": reads,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    results = {
+        "flush_per_message": run_pipeline(args.requests, {"MCP_WRITE_BUFFER": "0"}),
+        "framed_writer": run_pipeline(args.requests, {}),
+    }
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Латентность записи задач, пока другие потоки выгружают список
+
+Стандартный сервер в одном процессе: --readers потоков непрерывно читают
+get_tasks и tasks://list, один писатель добавляет и завершает задачи.
+Режимы:
+  locked    — читатели держат lock пространства на время выгрузки (как без снимков)
+  snapshot  — читатели берут снимок версии (TaskNamespace.snapshot) без lock
+
+    python benchmarks/bench_task_isolation.py --tasks 10000 --readers 4 --seconds 5
+"""
+
+import argparse
+import json
+import tempfile
+import threading
+import time
+from typing import Dict
+
+from _common import latency_summary
+
+from standard_mcp_server import StandardMCPServer
+from task_tenants import TenantRegistry
+
+
+def run_mode(mode: str, args) -> Dict:
+    with tempfile.TemporaryDirectory() as store_dir:
+        server = StandardMCPServer(tenants=TenantRegistry(store_dir=store_dir, max_tasks=10_000_000))
+        for i in range(args.tasks):
+            server.add_task(f"Задача {i}", "описание задачи " * 4)
+        namespace = server.namespace
+        session = {"tenant": namespace.tenant_id}
+        stop = threading.Event()
+        read_latencies = []
+
+        def read_list():
+            server.get_tasks()
+            server.read_resource("tasks://list")
+
+        def reader():
+            while not stop.is_set():
+                started = time.perf_counter()
+                if mode == "locked":
+                    with namespace.lock:
+                        read_list()
+                else:
+                    read_list()
+                read_latencies.append(time.perf_counter() - started)
+
+        threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+        for thread in threads:
+            thread.start()
+        write_latencies = []
+        deadline = time.perf_counter() + args.seconds
+        request_id = 0
+        while time.perf_counter() < deadline:
+            request_id += 1
+            if request_id % 3:
+                params = {"name": "add_task", "arguments": {"title": f"Новая {request_id}"}}
+            else:
+                params = {"name": "complete_task", "arguments": {"task_id": namespace.completed_count + 1}}
+            started = time.perf_counter()
+            server.handle_request({"jsonrpc": "2.0", "id": request_id, "method": "tools/call", "params": params},
+                                  session)
+            write_latencies.append(time.perf_counter() - started)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        return {
+            "mode": mode,
+            "writes_per_second": round(len(write_latencies) / args.seconds, 1),
+            "write": latency_summary(write_latencies),
+            "read": latency_summary(read_latencies),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=10000, help="задач в хранилище до начала замера")
+    parser.add_argument("--readers", type=int, default=4, help="потоков, выгружающих список")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    results = [run_mode(mode, args) for mode in ("locked", "snapshot")]
+    for r in results:
+        print(f"{r['mode']:>8}: записей/с {r['writes_per_second']:8.1f}, запись p50 {r['write']['p50_ms']:.3f} мс, "
+              f"p99 {r['write']['p99_ms']:.3f} мс, max {r['write']['max_ms']:.1f} мс; "
+              f"выгрузок {r['read']['count']}, p50 {r['read']['p50_ms']:.1f} мс")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест сетевых транспортов: сотни одновременных локальных клиентов
+
+Запускает mcp_transport.py в отдельном процессе, подключает N клиентов
+(TCP или HTTP), каждый выполняет initialize и серию tools/call.
+Печатает p50/p99 латентности запросов и пропускную способность в JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+
+from _common import PROJECT_DIR, latency_summary
+
+TOOL_MIX = [
+    ("add_task", {"title": "Нагрузка", "priority": "low"}),
+    ("get_tasks", {"status": "pending"}),
+    ("calculate", {"expression": "(2 + 3) * 7"}),
+    ("generate_password", {"length": 16}),
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def request(request_id: int, method: str, params=None) -> dict:
+    message = {"jsonrpc": "2.0", "id": request_id, "method": method}
+    if params is not None:
+        message["params"] = params
+    return message
+
+
+async def tcp_client(port: int, calls: int, latencies: list):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for i in range(calls + 1):
+            if i == 0:
+                message = request(0, "initialize", {})
+            else:
+                name, arguments = TOOL_MIX[i % len(TOOL_MIX)]
+                message = request(i, "tools/call", {"name": name, "arguments": arguments})
+            started = time.perf_counter()
+            writer.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+            await writer.drain()
+            json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+
+async def http_client(port: int, calls: int, latencies: list):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    session_id = None
+    try:
+        for i in range(calls + 1):
+            if i == 0:
+                message = request(0, "initialize", {})
+            else:
+                name, arguments = TOOL_MIX[i % len(TOOL_MIX)]
+                message = request(i, "tools/call", {"name": name, "arguments": arguments})
+            body = json.dumps(message, ensure_ascii=False).encode("utf-8")
+            head = f"POST /mcp HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            if session_id:
+                head += f"Mcp-Session-Id: {session_id}\r\n"
+            started = time.perf_counter()
+            writer.write((head + "\r\n").encode("latin-1") + body)
+            await writer.drain()
+
+            await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            json.loads(await reader.readexactly(int(headers["content-length"])))
+            session_id = headers.get("mcp-session-id", session_id)
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+
+async def wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("Сервер не запустился")
+
+
+async def run(transport: str, clients: int, calls: int, state: str) -> dict:
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "mcp_transport.py", f"--{transport}", f"127.0.0.1:{port}",
+         "--state", state, "--max-connections", str(clients * 2), "--max-sessions", str(clients * 2)],
+        cwd=PROJECT_DIR,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        await wait_for_port(port)
+        latencies: list = []
+        client = tcp_client if transport == "tcp" else http_client
+        started = time.perf_counter()
+        await asyncio.gather(*(client(port, calls, latencies) for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+
+    result = {
+        "transport": transport,
+        "state": state,
+        "clients": clients,
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+    }
+    result.update(latency_summary(latencies))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--calls", type=int, default=20, help="tools/call на клиента")
+    parser.add_argument("--state", choices=["shared", "session"], default="session")
+    args = parser.parse_args()
+
+    results = [
+        asyncio.run(run(transport, args.clients, args.calls, args.state))
+        for transport in ("tcp", "http")
+    ]
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
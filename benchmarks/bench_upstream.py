@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Хвостовая латентность запросов к upstream при сбоях: повторы, hedging и запасная модель
+
+Заглушка LLM отвечает 503 (с Retry-After) на долю запросов и медленно на другую
+долю. Один и тот же поток запросов прогоняется в вариантах:
+  baseline  — одна попытка (поведение до устойчивого слоя)
+  retry     — повторы с джиттером и Retry-After
+  hedged    — повторы + дубликат медленного запроса после p95
+  fallback  — основная модель всегда падает, запросы уходят на запасную
+
+    python benchmarks/bench_upstream.py --requests 300 --error-rate 0.1 --slow-rate 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+import aiohttp
+from _common import latency_summary
+
+from openrouter_client import OpenRouterMCPClient
+from stub_llm import StubLLMServer
+from upstream_resilience import ModelSelector, RetryPolicy
+
+VARIANTS = ("baseline", "retry", "hedged", "fallback")
+
+
+async def run_variant(variant: str, args) -> Dict:
+    stub = StubLLMServer(latency=args.latency, seed=args.seed, error_rate=args.error_rate,
+                         slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+                         retry_after=args.retry_after,
+                         failing_models={"primary"} if variant == "fallback" else None)
+    await stub.start()
+    client = OpenRouterMCPClient(api_key="benchmark", model="primary")
+    client.base_url = stub.base_url
+    client.retry_policy = RetryPolicy(max_attempts=1 if variant == "baseline" else 3,
+                                      base_delay=0.02, max_delay=1.0, seed=args.seed)
+    client.model_selector = ModelSelector(["primary", "backup"] if variant == "fallback" else ["primary"])
+    client.hedge_requests = variant == "hedged"
+
+    latencies: List[float] = []
+    errors = 0
+    turn = client._new_turn()
+    queue = iter(range(args.requests))
+
+    async def worker(session: aiohttp.ClientSession):
+        nonlocal errors
+        for i in queue:
+            # Уникальное сообщение — иначе сработает single-flight
+            payload = {"model": "primary", "messages": [{"role": "user", "content": f"Запрос {i}"}]}
+            started = time.perf_counter()
+            try:
+                status, _ = await client._post_completion(session, {}, payload, turn)
+            except aiohttp.ClientError:
+                status = 0
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors += 1
+
+    try:
+        started = time.perf_counter()
+        async with aiohttp.ClientSession() as session:
+            await asyncio.gather(*(worker(session) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await stub.stop()
+
+    result = {
+        "variant": variant,
+        "requests": args.requests,
+        "errors": errors,
+        "success_rate": round(1 - errors / args.requests, 4),
+        "seconds": round(elapsed, 3),
+        "upstream_requests": stub.requests,
+        "retries": turn["upstream_retries"],
+        "hedged": turn["upstream_hedged"],
+        "fallbacks": turn["upstream_fallbacks"],
+    }
+    result.update(latency_summary(latencies))
+    return result
+
+
+async def run(args) -> List[Dict]:
+    return [await run_variant(v.strip(), args) for v in args.variants.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="через запятую")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.02, help="обычная задержка заглушки (сек)")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="доля ответов 503")
+    parser.add_argument("--slow-rate", type=float, default=0.03, help="доля медленных ответов")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="задержка медленного ответа (сек)")
+    parser.add_argument("--retry-after", type=float, default=0.05, help="Retry-After в ответах 503 (сек)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    for result in results:
+        print(f"{result['variant']:>9}: успешно {result['success_rate'] * 100:5.1f}%, "
+              f"p50 {result['p50_ms']:7.1f} мс, p95 {result['p95_ms']:7.1f} мс, p99 {result['p99_ms']:7.1f} мс")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Воспроизводимый набор бенчмарков MCP серверов и клиентского конвейера
+
+Сценарии:
+  standard — standard_mcp_server.py по stdio
+  fastmcp  — personal_assistant.py (FastMCP) по stdio
+  client   — OpenRouterMCPClient целиком против локальной заглушки LLM
+  coldstart — время запуска серверов до ответа на initialize (bench_cold_start.py)
+
+Результат — JSON (пропускная способность, p50/p95/p99, RSS), который
+удобно сравнивать между коммитами:
+
+    python benchmarks/run_suite.py --output before.json
+    python benchmarks/run_suite.py --mix get_tasks=3,text_stats=1 --rate 500 --store-size 5000
+
+Сценарий client можно записать и затем воспроизводить без upstream:
+
+    python benchmarks/run_suite.py --scenarios client --llm-cache-mode record --llm-cache-dir traffic/
+    python benchmarks/run_suite.py --scenarios client --llm-cache-mode replay --llm-cache-dir traffic/
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from _common import git_commit, latency_summary, rss_kb
+
+from mcp_connection import MCPConnection, make_request
+
+SERVERS = {
+    "standard": "standard_mcp_server.py",
+    "fastmcp": "personal_assistant.py",
+}
+
+
+def parse_mix(spec: str) -> List[Tuple[str, int]]:
+    """Разобрать смесь инструментов вида 'get_tasks=3,calculate=1'"""
+    mix = []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix.append((name.strip(), int(weight or 1)))
+    return mix
+
+
+def tool_arguments(name: str, rng: random.Random, text_size: int) -> Dict:
+    if name == "add_task":
+        return {"title": f"Задача {rng.randint(1, 10**6)}", "priority": rng.choice(["low", "medium", "high"])}
+    if name == "get_tasks":
+        return {"status": rng.choice(["all", "pending", "completed"])}
+    if name == "complete_task":
+        return {"task_id": rng.randint(1, 1000)}
+    if name == "calculate":
+        return {"expression": f"({rng.randint(1, 999)} + {rng.randint(1, 999)}) * {rng.randint(2, 9)}"}
+    if name == "generate_password":
+        return {"length": rng.randint(8, 32)}
+    if name == "text_stats":
+        words = ["анализ", "текста", "протокол", "задача", "сервер", "клиент"]
+        text = " ".join(rng.choice(words) for _ in range(max(1, text_size // 7)))
+        return {"text": text}
+    return {}
+
+
+async def connect(server: str) -> MCPConnection:
+    connection = MCPConnection(command=[sys.executable, SERVERS[server]])
+    await connection.start()
+    # FastMCP не поддерживает batch: рукопожатие по шагам
+    await connection.initialize(batch=server == "standard")
+    return connection
+
+
+async def call(connection: MCPConnection, name: str, arguments: Dict) -> bool:
+    response = await connection.request(make_request("tools/call", {"name": name, "arguments": arguments}))
+    return "result" in response and not response["result"].get("isError")
+
+
+async def populate(connection: MCPConnection, store_size: int, rng: random.Random, chunk: int = 500):
+    for start in range(0, store_size, chunk):
+        await asyncio.gather(*(
+            call(connection, "add_task", tool_arguments("add_task", rng, 0))
+            for _ in range(min(chunk, store_size - start))
+        ))
+
+
+async def drive(connection: MCPConnection, args, rng: random.Random) -> Dict:
+    """Подать нагрузку: замкнутый цикл (rate=0) или открытый с заданной частотой"""
+    names = [name for name, weight in parse_mix(args.mix) for _ in range(weight)]
+    plan = [(name, tool_arguments(name, rng, args.text_size))
+            for name in (rng.choice(names) for _ in range(args.requests))]
+    latencies: List[float] = []
+    per_tool: Dict[str, List[float]] = {}
+    errors = 0
+    loop = asyncio.get_running_loop()
+
+    async def one(name: str, arguments: Dict, scheduled: float):
+        nonlocal errors
+        try:
+            ok = await call(connection, name, arguments)
+        except ConnectionError:
+            ok = False
+        # В открытом цикле латентность считается от запланированного момента
+        latency = loop.time() - scheduled
+        latencies.append(latency)
+        per_tool.setdefault(name, []).append(latency)
+        if not ok:
+            errors += 1
+
+    started = loop.time()
+    if args.rate > 0:
+        tasks = []
+        for i, (name, arguments) in enumerate(plan):
+            scheduled = started + i / args.rate
+            await asyncio.sleep(max(0.0, scheduled - loop.time()))
+            tasks.append(asyncio.create_task(one(name, arguments, scheduled)))
+        await asyncio.gather(*tasks)
+    else:
+        queue = iter(plan)
+
+        async def worker():
+            for name, arguments in queue:
+                await one(name, arguments, loop.time())
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = loop.time() - started
+
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+    }
+    result.update(latency_summary(latencies))
+    result["per_tool"] = {name: latency_summary(values) for name, values in sorted(per_tool.items())}
+    return result
+
+
+async def bench_server(server: str, args) -> Dict:
+    rng = random.Random(args.seed)
+    connection = await connect(server)
+    try:
+        populate_started = time.perf_counter()
+        await populate(connection, args.store_size, rng)
+        populate_seconds = time.perf_counter() - populate_started
+        result = {"scenario": server, "store_size": args.store_size,
+                  "populate_seconds": round(populate_seconds, 4)}
+        result.update(await drive(connection, args, rng))
+        result["server_rss_kb"] = rss_kb(connection.pid)
+        return result
+    finally:
+        await connection.close()
+
+
+async def bench_client(args) -> Dict:
+    from openrouter_client import OpenRouterMCPClient
+    from stub_llm import StubLLMServer
+
+    stub = StubLLMServer(latency=args.llm_latency)
+    await stub.start()
+    client = OpenRouterMCPClient(api_key="benchmark", pool_size=args.pool_size)
+    client.base_url = stub.base_url
+    if args.llm_cache_mode != "off":
+        # record — записать ответы заглушки, replay — прогнать бенчмарк по записи без upstream
+        from completion_cache import CompletionCache
+        client.completion_cache = CompletionCache(args.llm_cache_dir, mode=args.llm_cache_mode)
+    try:
+        await client.start_mcp_server()
+        started = time.perf_counter()
+        for i in range(args.turns):
+            client.conversation_history = []
+            await client.chat_with_openrouter(f"Добавь задачу и посчитай выражение #{i}")
+        elapsed = time.perf_counter() - started
+
+        turns = list(client.turn_metrics)
+        result = {
+            "scenario": "client",
+            "turns": args.turns,
+            "llm_latency_ms": args.llm_latency * 1000,
+            "seconds": round(elapsed, 4),
+            "throughput_turns_per_s": round(args.turns / elapsed, 1) if elapsed else 0.0,
+            "turn": latency_summary([t["total_seconds"] for t in turns]),
+            "upstream": latency_summary([t["upstream_seconds"] for t in turns]),
+            "mcp": latency_summary([t["mcp_seconds"] for t in turns]),
+            "upstream_served": stub.requests,
+            "upstream_cached": sum(t["upstream_cached"] for t in turns),
+            "client_rss_kb": rss_kb(__import__("os").getpid()),
+        }
+        if client.mcp_connection:
+            result["server_rss_kb"] = rss_kb(client.mcp_connection.pid)
+        return result
+    finally:
+        await client.cleanup()
+        await stub.stop()
+
+
+async def run(args) -> Dict:
+    results = []
+    for scenario in args.scenarios.split(","):
+        scenario = scenario.strip()
+        if scenario == "client":
+            results.append(await bench_client(args))
+        elif scenario == "coldstart":
+            from bench_cold_start import measure_all
+            results.append({"scenario": "coldstart", "variants": await measure_all(args.cold_runs)})
+        else:
+            results.append(await bench_server(scenario, args))
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="standard,fastmcp,client",
+                        help="через запятую: standard, fastmcp, client, coldstart")
+    parser.add_argument("--mix", default="get_tasks=3,add_task=2,calculate=2,generate_password=1,text_stats=1",
+                        help="веса инструментов")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=0.0, help="запросов/с (0 — замкнутый цикл)")
+    parser.add_argument("--concurrency", type=int, default=8, help="параллельных запросов в замкнутом цикле")
+    parser.add_argument("--store-size", type=int, default=1000, help="задач в хранилище перед замером")
+    parser.add_argument("--text-size", type=int, default=2000, help="символов в тексте для text_stats")
+    parser.add_argument("--turns", type=int, default=50, help="ходов диалога в сценарии client")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="задержка заглушки LLM (сек)")
+    parser.add_argument("--pool-size", type=int, default=0, help="размер пула MCP в сценарии client")
+    parser.add_argument("--llm-cache-mode", choices=["off", "cache", "record", "replay"], default="off",
+                        help="кэш ответов LLM в сценарии client (record/replay — запись и воспроизведение)")
+    parser.add_argument("--llm-cache-dir", help="каталог кэша ответов LLM")
+    parser.add_argument("--cold-runs", type=int, default=10, help="запусков на вариант в сценарии coldstart")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="файл для JSON результата (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"📊 Результаты сохранены в {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
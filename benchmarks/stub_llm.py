@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Локальная заглушка OpenRouter /chat/completions для бенчмарков клиента
+
+На первое сообщение пользователя отвечает вызовом инструментов, на
+сообщение с результатами инструментов — текстом. Задержка ответа
+настраивается, так что можно моделировать время работы модели, а
+внедряемые сбои (503, медленные ответы) — нестабильный upstream.
+
+С prompt_cache=True заглушка кэширует префиксы промпта, как Anthropic:
+префикс до сообщения с меткой cache_control запоминается, и следующий
+запрос с тем же префиксом платит prefill (prefill_per_token) только за
+остаток; без меток ничего не кэшируется. Токены считаются грубо — 4 символа на токен.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+from typing import Dict, List, Optional, Set
+
+from aiohttp import web
+
+from _common import PROJECT_DIR  # noqa: F401  (добавляет корень проекта в sys.path)
+
+from prompt_cache import canonical_json, strip_cache_markers
+
+# Сколько границ сообщений перед меткой cache_control проверяется при чтении кэша
+LOOKBACK_BLOCKS = 20
+
+DEFAULT_TOOL_CALLS = [
+    ("add_task", {"title": "Задача из бенчмарка", "priority": "medium"}),
+    ("calculate", {"expression": "(17 + 25) * 3"}),
+]
+
+
+class StubLLMServer:
+    """HTTP заглушка, совместимая по формату с OpenRouter chat/completions"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 tool_calls: Optional[List] = None, seed: int = 0, error_rate: float = 0.0,
+                 slow_rate: float = 0.0, slow_latency: float = 1.0, retry_after: Optional[float] = None,
+                 failing_models: Optional[Set[str]] = None, concurrency_limit: int = 0,
+                 prompt_cache: bool = False, prefill_per_token: float = 0.0, chain_tool_calls: bool = False):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        # Внедрение сбоев: доля ответов 503 (с Retry-After, если задан), доля медленных
+        # ответов и модели, которые всегда отвечают 503
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.retry_after = retry_after
+        self.failing_models = failing_models or set()
+        self.failures = 0
+        # Лимит upstream: сколько ответов модель готовит одновременно (0 — без лимита),
+        # остальные запросы ждут своей очереди
+        self.concurrency_limit = concurrency_limit
+        self._slots = asyncio.Semaphore(concurrency_limit) if concurrency_limit else None
+        self.tool_calls = DEFAULT_TOOL_CALLS if tool_calls is None else tool_calls
+        # Модель снова вызывает инструменты и после их результатов, если tool_choice не "none"
+        self.chain_tool_calls = chain_tool_calls
+        # Кэш префиксов промпта (хэши префиксов до меток) и время prefill на токен
+        self.prompt_cache = prompt_cache
+        self.prefill_per_token = prefill_per_token
+        self._prompt_prefixes: Set[str] = set()
+        self.requests = 0
+        self.random = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/chat/completions", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        payload = await request.json()
+        if payload.get("model") in self.failing_models or self.random.random() < self.error_rate:
+            self.failures += 1
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else None
+            return web.json_response({"error": {"message": "Service unavailable"}}, status=503, headers=headers)
+        latency = self.slow_latency if self.random.random() < self.slow_rate else self.latency
+        usage = self.prompt_usage(payload)
+        latency += (usage["prompt_tokens"] - usage["prompt_tokens_details"]["cached_tokens"]) * self.prefill_per_token
+        if self._slots is None:
+            if latency:
+                await asyncio.sleep(latency)
+        else:
+            async with self._slots:
+                await asyncio.sleep(latency)
+        return web.json_response({**self.completion(payload), "usage": usage})
+
+    def prompt_usage(self, payload: Dict) -> Dict:
+        """usage ответа: токены промпта, прочитанные из кэша и записанные в кэш.
+
+        Как у Anthropic: префикс записывается в кэш на метках, а читается
+        с любой границы сообщений не дальше LOOKBACK_BLOCKS перед меткой.
+        """
+        prefix = hashlib.sha256()
+        boundaries: List[tuple] = []
+        marked: List[str] = []
+        size = cached = written = 0
+        for part in [payload.get("tools") or []] + payload["messages"]:
+            message = strip_cache_markers(part) if isinstance(part, dict) else part
+            text = canonical_json(message).encode("utf-8")
+            prefix.update(text)
+            size += len(text)
+            boundaries.append((prefix.hexdigest(), size))
+            if self.prompt_cache and message is not part:
+                for digest, prefix_size in reversed(boundaries[-LOOKBACK_BLOCKS:]):
+                    if digest in self._prompt_prefixes:
+                        cached = max(cached, prefix_size)
+                        break
+                marked.append(boundaries[-1][0])
+                written = size
+        # Записи этого запроса видны только следующим
+        self._prompt_prefixes.update(marked)
+        return {
+            "prompt_tokens": size // 4,
+            "completion_tokens": 0,
+            "total_tokens": size // 4,
+            "prompt_tokens_details": {
+                "cached_tokens": cached // 4,
+                "cache_write_tokens": max(0, written - cached) // 4,
+            },
+        }
+
+    def completion(self, payload: Dict) -> Dict:
+        last = payload["messages"][-1]
+        calls_allowed = self.tool_calls and payload.get("tools") and payload.get("tool_choice") != "none"
+        if calls_allowed and (last.get("role") == "user" or self.chain_tool_calls):
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": f"call_{self.requests}_{i}",
+                        "type": "function",
+                        "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)}
+                    }
+                    for i, (name, arguments) in enumerate(self.tool_calls)
+                ]
+            }
+        else:
+            message = {"role": "assistant", "content": "Готово."}
+        return {
+            "id": f"stub-{self.requests}",
+            "model": payload.get("model"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }
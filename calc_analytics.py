@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Колонки истории калькулятора и векторная аналитика по ним (NumPy)
+
+История вычислений для ресурса calculator://history — список словарей,
+ограниченный по размеру. Для аналитики те же вызовы дополнительно
+хранятся в двух колонках float64 (array из стандартной библиотеки): время
+(секунды эпохи) и числовой результат. Запрос за любое окно времени — два
+бинарных поиска и несколько векторных операций NumPy над срезом колонок
+без копирования и без Python объекта на строку.
+
+NumPy импортируется при первом запросе статистики. Если он не установлен
+(или сервер запущен с python -S, без site-packages), та же сводка
+считается на чистом Python — медленнее, но с тем же результатом.
+"""
+
+import base64
+import bisect
+import math
+import sys
+from array import array
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+DEFAULT_PERCENTILES = (50, 90, 99)
+
+# Выше этого числа строк перцентили считаются по равномерной выборке такого размера:
+# точный выбор порядковой статистики на миллионах строк занимает сотни миллисекунд
+PERCENTILE_SAMPLE_ROWS = 500_000
+
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+_numpy_module: Any = None
+_numpy_checked = False
+
+
+def _numpy():
+    """NumPy или None, если он недоступен (импорт пробуется один раз)"""
+    global _numpy_module, _numpy_checked
+    if not _numpy_checked:
+        _numpy_module = _import_numpy()
+        _numpy_checked = True
+    return _numpy_module
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _column(values: Iterable[float]) -> array:
+    """array("d") из списка, array или массива NumPy (последние — одним копированием байт)"""
+    if isinstance(values, array) and values.typecode == "d":
+        return values
+    try:
+        view = memoryview(values)
+    except TypeError:
+        return array("d", values)
+    if view.format == "d" and view.ndim == 1 and view.c_contiguous:
+        column = array("d")
+        column.frombytes(view.cast("B"))
+        return column
+    return array("d", values)
+
+
+class HistoryColumns:
+    """Время и результат вычислений в двух колонках array("d").
+
+    Хранится не больше max_rows строк: когда место кончается, отбрасывается
+    старшая половина (как вытеснение старых записей в списке истории).
+    """
+
+    # Байт на строку: время и результат по 8 байт
+    ROW_BYTES = 16
+
+    def __init__(self, max_rows: int = 1_000_000):
+        self.max_rows = max(2, max_rows)
+        self.dropped = 0
+        # Сколько строк без числового результата (NaN); пока 0, фильтр не нужен
+        self.non_numeric = 0
+        self._timestamps = array("d")
+        self._values = array("d")
+        # Время добавляется по возрастанию; если часы ушли назад, окна считаются маской
+        self._sorted = True
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._timestamps) * self.ROW_BYTES
+
+    @property
+    def timestamps(self) -> array:
+        return self._timestamps
+
+    @property
+    def values(self) -> array:
+        return self._values
+
+    def append(self, timestamp: float, value: Any):
+        """Добавить вызов; нечисловой или слишком большой результат хранится как NaN"""
+        try:
+            value = float(value)
+        except (TypeError, ValueError, OverflowError):
+            value = float("nan")
+        if not math.isfinite(value):
+            self.non_numeric += 1
+        self._make_room(1)
+        if self._timestamps and timestamp < self._timestamps[-1]:
+            self._sorted = False
+        self._timestamps.append(timestamp)
+        self._values.append(value)
+
+    def extend(self, timestamps: Iterable[float], values: Iterable[float]):
+        """Добавить много вызовов разом (загрузка, бенчмарки)"""
+        timestamps, values = _column(timestamps), _column(values)
+        if len(timestamps) != len(values):
+            raise ValueError("timestamps и values должны быть одной длины")
+        if len(timestamps) > self.max_rows:
+            self.dropped += len(timestamps) - self.max_rows
+            timestamps, values = timestamps[-self.max_rows:], values[-self.max_rows:]
+        if not timestamps:
+            return
+        self._make_room(len(timestamps))
+        np = _numpy()
+        if np is not None:
+            times = np.frombuffer(timestamps, dtype=np.float64)
+            ordered = not np.any(np.diff(times) < 0)
+            non_numeric = len(values) - int(np.count_nonzero(np.isfinite(np.frombuffer(values, dtype=np.float64))))
+            del times
+        else:
+            ordered = all(a <= b for a, b in zip(timestamps, timestamps[1:]))
+            non_numeric = sum(1 for value in values if not math.isfinite(value))
+        if not ordered or (self._timestamps and timestamps[0] < self._timestamps[-1]):
+            self._sorted = False
+        self.non_numeric += non_numeric
+        self._timestamps.extend(timestamps)
+        self._values.extend(values)
+
+    def snapshot(self) -> "HistoryColumns":
+        """Копия колонок для aggregate без lock пространства.
+
+        Копируются байты двух array (без Python объекта на строку): на миллион
+        строк это единицы миллисекунд против десятков на саму сводку. Ссылки без копии не подходят — вытеснение
+        сдвигает строки, а append при живом представлении NumPy невозможен.
+        """
+        copy = HistoryColumns(self.max_rows)
+        copy.dropped, copy.non_numeric, copy._sorted = self.dropped, self.non_numeric, self._sorted
+        copy._timestamps, copy._values = self._timestamps[:], self._values[:]
+        return copy
+
+    def aggregate(self, start: Optional[float] = None, end: Optional[float] = None,
+                  percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, Any]:
+        """Сводка за окно [start, end] (секунды эпохи; None — без границы)"""
+        np = _numpy()
+        if np is None:
+            return self._aggregate_python(start, end, percentiles)
+        # Представления колонок без копирования; живут только внутри вызова,
+        # пока они есть, array нельзя расширить
+        timestamps = np.frombuffer(self._timestamps, dtype=np.float64)
+        values = np.frombuffer(self._values, dtype=np.float64)
+        if self._sorted:
+            lo = 0 if start is None else int(np.searchsorted(timestamps, start, side="left"))
+            hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side="right"))
+            window_times, window_values = timestamps[lo:hi], values[lo:hi]
+        else:
+            mask = np.ones(len(timestamps), dtype=bool)
+            if start is not None:
+                mask &= timestamps >= start
+            if end is not None:
+                mask &= timestamps <= end
+            window_times, window_values = timestamps[mask], values[mask]
+
+        count = len(window_times)
+        result: Dict[str, Any] = {"count": count}
+        numeric = window_values[np.isfinite(window_values)] if self.non_numeric else window_values
+        result["numeric"] = len(numeric)
+        if len(numeric):
+            total = float(numeric.sum())
+            sample = numeric
+            if len(numeric) > PERCENTILE_SAMPLE_ROWS:
+                sample = numeric[::-(-len(numeric) // PERCENTILE_SAMPLE_ROWS)]
+                result["percentile_sample"] = len(sample)
+            result.update({
+                "sum": total,
+                "min": float(numeric.min()),
+                "max": float(numeric.max()),
+                "mean": total / len(numeric),
+                "percentiles": {
+                    f"p{p:g}": float(v) for p, v in zip(percentiles, np.percentile(sample, percentiles))
+                },
+            })
+
+        if count:
+            first, last = (float(window_times[0]), float(window_times[-1])) if self._sorted else \
+                (float(window_times.min()), float(window_times.max()))
+            result.update(_rate(count, start, end, first, last))
+            if self._sorted:
+                # Границы минут бинарным поиском: O(минут * log n) вместо прохода по строкам
+                edges = np.searchsorted(window_times, np.arange(first, last + 60, 60), side="left")
+                result["peak_per_minute"] = int(np.diff(np.append(edges, count)).max())
+            else:
+                buckets = ((window_times - first) // 60).astype(np.int64)
+                result["peak_per_minute"] = int(np.bincount(buckets).max())
+        return result
+
+    def _aggregate_python(self, start: Optional[float], end: Optional[float],
+                          percentiles: Sequence[float]) -> Dict[str, Any]:
+        """Та же сводка без NumPy"""
+        if self._sorted:
+            lo = 0 if start is None else bisect.bisect_left(self._timestamps, start)
+            hi = len(self._timestamps) if end is None else bisect.bisect_right(self._timestamps, end)
+            window = list(zip(self._timestamps[lo:hi], self._values[lo:hi]))
+        else:
+            window = [(t, v) for t, v in zip(self._timestamps, self._values)
+                      if (start is None or t >= start) and (end is None or t <= end)]
+
+        result: Dict[str, Any] = {"count": len(window)}
+        numeric = sorted(v for _, v in window if math.isfinite(v))
+        result["numeric"] = len(numeric)
+        if numeric:
+            total = math.fsum(numeric)
+            result.update({
+                "sum": total,
+                "min": numeric[0],
+                "max": numeric[-1],
+                "mean": total / len(numeric),
+                "percentiles": {f"p{p:g}": _percentile(numeric, p) for p in percentiles},
+            })
+        if window:
+            first = min(t for t, _ in window)
+            last = max(t for t, _ in window)
+            result.update(_rate(len(window), start, end, first, last))
+            result["peak_per_minute"] = max(Counter(int((t - first) // 60) for t, _ in window).values())
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Колонки в base64, little-endian (для вытеснения арендатора на диск)"""
+        return {"timestamps": _encode(self._timestamps), "values": _encode(self._values)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], max_rows: int = 1_000_000) -> "HistoryColumns":
+        columns = cls(max_rows)
+        columns.extend(_decode(data["timestamps"]), _decode(data["values"]))
+        return columns
+
+    def drop_oldest(self, count: int):
+        """Отбросить count самых старых строк"""
+        count = min(max(0, count), len(self._timestamps))
+        if count:
+            del self._timestamps[:count]
+            del self._values[:count]
+            self.dropped += count
+
+    def _make_room(self, extra: int):
+        """Отбросить старшую половину (или сколько нужно), если extra строк не помещаются"""
+        size = len(self._timestamps)
+        if size + extra <= self.max_rows:
+            return
+        keep = max(0, min(size, self.max_rows // 2, self.max_rows - extra))
+        drop = size - keep
+        del self._timestamps[:drop]
+        del self._values[:drop]
+        self.dropped += drop
+
+
+def _rate(count: int, start: Optional[float], end: Optional[float], first: float, last: float) -> Dict[str, float]:
+    """Вызовы в минуту: по длине окна, а без границ — от первого вызова до последнего"""
+    window_start = start if start is not None else first
+    window_end = end if end is not None else last
+    return {"calls_per_minute": count / (max(window_end - window_start, 60.0) / 60)}
+
+
+def _percentile(ordered: Sequence[float], p: float) -> float:
+    """Перцентиль с линейной интерполяцией (как numpy.percentile по умолчанию)"""
+    k = (len(ordered) - 1) * p / 100
+    low = math.floor(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+def _encode(column: array) -> str:
+    if not _LITTLE_ENDIAN:
+        column = array("d", column)
+        column.byteswap()
+    return base64.b64encode(column.tobytes()).decode("ascii")
+
+
+def _decode(data: str) -> array:
+    column = array("d")
+    column.frombytes(base64.b64decode(data))
+    if not _LITTLE_ENDIAN:
+        column.byteswap()
+    return column
+
+
+def parse_window(last_minutes: float = 0, since: str = "", until: str = "",
+                 now: Optional[datetime] = None) -> Dict[str, Optional[float]]:
+    """Границы окна в секундах эпохи: last_minutes от now или since/until в ISO формате"""
+    now = now or datetime.now()
+    end = datetime.fromisoformat(until).timestamp() if until else None
+    if since:
+        start = datetime.fromisoformat(since).timestamp()
+    elif last_minutes:
+        if last_minutes < 0:
+            raise ValueError("last_minutes должно быть положительным")
+        start = now.timestamp() - last_minutes * 60
+        end = end if end is not None else now.timestamp()
+    else:
+        start = None
+    return {"start": start, "end": end}
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    """Сводка calc_stats для ответа инструмента"""
+    if not stats["count"]:
+        return "📭 В этом окне вычислений нет"
+    lines = ["📈 Статистика вычислений:", "", f"🔢 Вызовов: {stats['count']}"]
+    if stats["numeric"]:
+        percentiles = ", ".join(f"{name} = {value:g}" for name, value in stats["percentiles"].items())
+        lines += [
+            f"➕ Сумма: {stats['sum']:g}",
+            f"⬇️ Минимум: {stats['min']:g}",
+            f"⬆️ Максимум: {stats['max']:g}",
+            f"➗ Среднее: {stats['mean']:g}",
+            f"📊 Перцентили: {percentiles}"
+            + (f" (по выборке {stats['percentile_sample']})" if "percentile_sample" in stats else ""),
+        ]
+    if stats["numeric"] < stats["count"]:
+        lines.append(f"⚠️ Без числового результата: {stats['count'] - stats['numeric']}")
+    if "calls_per_minute" in stats:
+        lines.append(f"⏱️ Вызовов в минуту: {stats['calls_per_minute']:.2f} (пик {stats['peak_per_minute']})")
+    return "\n".join(lines)
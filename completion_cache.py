@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Дисковый кэш ответов OpenRouter /chat/completions
+
+Ключ — SHA-256 канонического JSON тела запроса (модель, сообщения, инструменты
+и остальные параметры), поэтому одинаковые запросы находят один ответ
+независимо от порядка ключей. Режимы:
+  off    — кэш выключен
+  cache  — ответы берутся из кэша, пока не истек TTL; старые вытесняются по размеру
+  record — каждый запрос идет в upstream, ответ записывается (для последующего replay)
+  replay — ответы только из записи, без сети и без учета TTL; промах — ошибка
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+CACHE_MODES = ("off", "cache", "record", "replay")
+
+
+def completion_key(payload: Dict[str, Any]) -> str:
+    """Канонический хэш тела запроса"""
+    canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """Ответы upstream в файлах <ключ>.json с TTL и LRU-вытеснением по суммарному размеру"""
+
+    def __init__(self, cache_dir: Optional[str] = None, mode: str = "cache",
+                 ttl: float = 24 * 3600, max_bytes: int = 64 * 1024 * 1024):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"mode должен быть одним из: {', '.join(CACHE_MODES)}")
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "openrouter_cache")
+        self.mode = mode
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Ключ -> размер файла, от давно использованных к недавним; читается с диска при первом обращении
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "CompletionCache":
+        """Настройки из переменных окружения OPENROUTER_CACHE*"""
+        return cls(
+            cache_dir=os.getenv("OPENROUTER_CACHE_DIR"),
+            mode=os.getenv("OPENROUTER_CACHE", "off"),
+            ttl=float(os.getenv("OPENROUTER_CACHE_TTL", str(24 * 3600))),
+            max_bytes=int(os.getenv("OPENROUTER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def get(self, key: str) -> Optional[Tuple[int, str]]:
+        """Ответ (status, body) из кэша или None"""
+        if self.mode not in ("cache", "replay"):
+            return None
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+
+        if self.mode == "cache" and time.time() - entry["created"] > self.ttl:
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        with self._lock:
+            index = self._load_index()
+            if key in index:
+                index.move_to_end(key)
+        self.hits += 1
+        return entry["status"], entry["body"]
+
+    def put(self, key: str, payload: Dict[str, Any], status: int, body: str):
+        """Сохранить успешный ответ"""
+        if self.mode not in ("cache", "record") or status != 200:
+            return
+        entry = {"created": time.time(), "model": payload.get("model"), "status": status, "body": body}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            index = self._load_index()
+            self._size += size - index.pop(key, 0)
+            index[key] = size
+            # Запись для replay не вытесняется: иначе воспроизведение не будет полным
+            while self.mode == "cache" and self.max_bytes and self._size > self.max_bytes and len(index) > 1:
+                evicted, evicted_size = index.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+                try:
+                    os.remove(self._path(evicted))
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            index = self._load_index()
+            return {
+                "mode": self.mode,
+                "entries": len(index),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _remove(self, key: str):
+        with self._lock:
+            self._size -= self._load_index().pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        """Индекс файлов кэша в порядке последнего изменения (вызывается под lock)"""
+        if self._index is None:
+            entries = []
+            if os.path.isdir(self.cache_dir):
+                for name in os.listdir(self.cache_dir):
+                    if name.endswith(".json"):
+                        stat = os.stat(os.path.join(self.cache_dir, name))
+                        entries.append((stat.st_mtime, name[:-5], stat.st_size))
+            entries.sort()
+            self._index = OrderedDict((key, size) for _, key, size in entries)
+            self._size = sum(self._index.values())
+        return self._index
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Несколько независимых диалогов с OpenRouter в одном процессе
+
+ConversationManager ведет много диалогов одновременно на одном event loop:
+у каждого диалога своя история, а HTTP пул клиента и соединение (или пул)
+с MCP сервером общие. Ходы одного диалога идут строго по очереди, ходы
+разных диалогов — параллельно, но не больше concurrency одновременно.
+
+Пакетный режим читает JSONL с промптами:
+    {"id": "1", "conversation": "alice", "prompt": "Добавь задачу"}
+и пишет JSONL с ответами и временем каждого хода.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from openrouter_client import OpenRouterMCPClient
+
+
+class Conversation:
+    """История одного диалога и число его ходов"""
+
+    __slots__ = ("id", "history", "turns", "lock")
+
+    def __init__(self, conversation_id: str):
+        self.id = conversation_id
+        self.history: List[Dict] = []
+        self.turns = 0
+        # Ходы одного диалога не перемешиваются: каждый опирается на предыдущий ответ
+        self.lock = asyncio.Lock()
+
+
+class ConversationManager:
+    """Параллельные диалоги поверх одного OpenRouterMCPClient"""
+
+    def __init__(self, client: OpenRouterMCPClient, concurrency: int = 8):
+        self.client = client
+        self.concurrency = max(1, concurrency)
+        self.conversations: Dict[str, Conversation] = {}
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+    def open(self, conversation_id: Optional[str] = None) -> Conversation:
+        """Диалог по id (новый, если такого еще нет)"""
+        if conversation_id is None:
+            conversation_id = f"conversation-{len(self.conversations) + 1}"
+        conversation = self.conversations.get(conversation_id)
+        if conversation is None:
+            conversation = self.conversations[conversation_id] = Conversation(conversation_id)
+        return conversation
+
+    def close(self, conversation_id: str):
+        self.conversations.pop(conversation_id, None)
+
+    async def send(self, conversation_id: str, message: str) -> Dict[str, Any]:
+        """Ход диалога: ответ и время (общее, upstream, MCP, до первого байта)"""
+        conversation = self.open(conversation_id)
+        async with conversation.lock:
+            async with self._slots:
+                started = time.perf_counter()
+                error = None
+                try:
+                    response, turn = await self.client.chat_turn(message, conversation.history)
+                except Exception as e:
+                    response, turn, error = None, self.client._new_turn(), str(e)
+                conversation.turns += 1
+        return {
+            "conversation": conversation.id,
+            "turn": conversation.turns,
+            "response": response,
+            "error": error,
+            "seconds": round(time.perf_counter() - started, 6),
+            "upstream_seconds": round(turn["upstream_seconds"], 6),
+            "mcp_seconds": round(turn["mcp_seconds"], 6),
+            "ttfb_seconds": None if turn["ttfb_seconds"] is None else round(turn["ttfb_seconds"], 6),
+            "upstream_requests": turn["upstream_requests"],
+            "mcp_calls": turn["mcp_calls"],
+            "prompt_tokens": turn["prompt_tokens"],
+            "prompt_cached_tokens": turn["prompt_cached_tokens"],
+        }
+
+    async def run_batch(self, items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Выполнить промпты пакета; результаты в порядке входа.
+
+        Промпты одного диалога выполняются по порядку, без conversation каждый
+        промпт — отдельный диалог.
+        """
+        items = list(items)
+
+        async def one(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+            item_id = item.get("id", index)
+            conversation_id = str(item.get("conversation") or f"item-{item_id}")
+            result = await self.send(conversation_id, str(item.get("prompt", "")))
+            return {"id": item_id, **result}
+
+        # Порядок захвата lock диалога совпадает с порядком задач, поэтому ходы
+        # одного диалога выполняются в порядке файла
+        return list(await asyncio.gather(*(one(i, item) for i, item in enumerate(items))))
+
+
+def read_batch(path: str) -> List[Dict[str, Any]]:
+    """Промпты из JSONL (пустые строки пропускаются; строка-не-объект — промпт целиком)"""
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            items.append(item if isinstance(item, dict) else {"prompt": str(item)})
+    return items
+
+
+def write_batch(path: str, results: List[Dict[str, Any]]):
+    with open(path, "w", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+def batch_summary(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """Сводка пакета: число ходов, ошибки и пропускная способность"""
+    errors = sum(1 for r in results if r["error"] or (r["response"] or "").startswith("❌"))
+    return {
+        "items": len(results),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "turns_per_second": round(len(results) / elapsed, 2) if elapsed else 0.0,
+    }
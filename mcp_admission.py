@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Контроль допуска запросов MCP сервера
+
+Защищает сервер от перегрузки до того, как запрос начнет расходовать память
+и процессорное время:
+  - лимит размера сообщения (проверяется до разбора JSON);
+  - ограничение числа одновременных вызовов тяжелых инструментов;
+  - token bucket на сессию (запросов в секунду с запасом на всплеск);
+  - сброс нагрузки по глубине очереди: сначала отклоняются тяжелые
+    инструменты, затем все, кроме служебных методов.
+
+Отклоненный запрос сразу получает JSON-RPC ошибку, поэтому дешевые вызовы
+не стоят в очереди за тяжелыми и их латентность под перегрузкой предсказуема.
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+# Коды ошибок JSON-RPC для отклоненных запросов
+INVALID_REQUEST = -32600
+SERVER_OVERLOADED = -32002
+RATE_LIMITED = -32003
+
+# Служебные методы не ограничиваются: без них клиент не сможет ни подключиться,
+# ни отменить запрос, ни проверить, жив ли сервер
+EXEMPT_METHODS = {"initialize", "ping", "tools/list"}
+
+# Тяжелые инструменты и число их одновременных вызовов по умолчанию
+DEFAULT_TOOL_CONCURRENCY = {"text_stats": 2, "get_tasks": 4}
+
+
+class AdmissionError(Exception):
+    """Запрос отклонен контролем допуска"""
+
+    def __init__(self, code: int, message: str, reason: str, data: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.code = code
+        self.reason = reason
+        self.data = data or {}
+
+    def to_error(self) -> Dict[str, Any]:
+        return {"code": self.code, "message": str(self), "data": {"reason": self.reason, **self.data}}
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше burst в запасе"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1.0) -> float:
+        """Списать токены; возвращает 0 или сколько секунд ждать до следующей попытки"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    """Разобрать лимиты вида 'text_stats=2,get_tasks=4'"""
+    limits = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip():
+            limits[name.strip()] = int(value)
+    return limits
+
+
+class AdmissionController:
+    """Решает, принять ли запрос, и учитывает глубину очереди перед сервером.
+
+    Транспорт сообщает о запросах, ожидающих выполнения (enqueued/dequeued);
+    один контроллер может быть общим для нескольких экземпляров сервера.
+    """
+
+    def __init__(self, max_request_bytes: int = 4 * 1024 * 1024,
+                 tool_concurrency: Optional[Dict[str, int]] = None,
+                 concurrency_wait: float = 1.0, rate: float = 0.0, burst: Optional[float] = None,
+                 shed_depth: int = 512, max_depth: int = 2048):
+        # 0 в любом лимите — без ограничения
+        self.max_request_bytes = max_request_bytes
+        self.tool_concurrency = dict(DEFAULT_TOOL_CONCURRENCY if tool_concurrency is None else tool_concurrency)
+        self.concurrency_wait = concurrency_wait
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate * 2)
+        self.shed_depth = shed_depth
+        self.max_depth = max_depth
+        self.queued = 0
+        self.rejected: Counter = Counter()
+        self._slots = {tool: threading.BoundedSemaphore(limit)
+                       for tool, limit in self.tool_concurrency.items() if limit > 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """Настройки из переменных окружения MCP_MAX_REQUEST_BYTES, MCP_TOOL_CONCURRENCY и др."""
+        concurrency = os.getenv("MCP_TOOL_CONCURRENCY")
+        burst = os.getenv("MCP_RATE_BURST")
+        return cls(
+            max_request_bytes=int(os.getenv("MCP_MAX_REQUEST_BYTES", str(4 * 1024 * 1024))),
+            tool_concurrency=parse_limits(concurrency) if concurrency is not None else None,
+            concurrency_wait=float(os.getenv("MCP_TOOL_WAIT_MS", "1000")) / 1000,
+            rate=float(os.getenv("MCP_RATE_LIMIT", "0")),
+            burst=float(burst) if burst else None,
+            shed_depth=int(os.getenv("MCP_SHED_DEPTH", "512")),
+            max_depth=int(os.getenv("MCP_MAX_QUEUE_DEPTH", "2048"))
+        )
+
+    def enqueued(self, count: int = 1):
+        with self._lock:
+            self.queued += count
+
+    def dequeued(self, count: int = 1):
+        with self._lock:
+            self.queued -= count
+
+    def check_size(self, size: int):
+        """Проверить размер сырого сообщения до разбора JSON"""
+        if self.max_request_bytes and size > self.max_request_bytes:
+            self._reject(INVALID_REQUEST, "Request too large", "too_large", {"maxBytes": self.max_request_bytes})
+
+    def admit(self, method: str, tool: Optional[str], session: Dict[str, Any],
+              wait: Optional[float] = None) -> Optional[threading.BoundedSemaphore]:
+        """Принять запрос или бросить AdmissionError.
+
+        Возвращает занятый слот тяжелого инструмента (его нужно вернуть через
+        release) или None. wait — сколько секунд можно ждать свободного слота.
+        """
+        if method in EXEMPT_METHODS or method.startswith("notifications/"):
+            return None
+
+        slots = self._slots.get(tool) if method == "tools/call" else None
+        # Тяжелые инструменты отклоняются раньше, чтобы очередь успели разобрать дешевые
+        depth = self.queued
+        if self.max_depth and depth >= self.max_depth:
+            self._reject(SERVER_OVERLOADED, "Server overloaded", "queue_depth", {"queueDepth": depth})
+        if slots is not None and self.shed_depth and depth >= self.shed_depth:
+            self._reject(SERVER_OVERLOADED, "Server overloaded", "queue_depth", {"queueDepth": depth})
+
+        if self.rate > 0:
+            bucket = session.get("rate_bucket")
+            if bucket is None:
+                bucket = session.setdefault("rate_bucket", TokenBucket(self.rate, self.burst))
+            with self._lock:
+                retry_after = bucket.take()
+            if retry_after:
+                self._reject(RATE_LIMITED, "Rate limit exceeded", "rate_limit",
+                             {"retryAfterMs": int(retry_after * 1000) + 1})
+
+        if slots is None:
+            return None
+        if not slots.acquire(timeout=self.concurrency_wait if wait is None else wait):
+            self._reject(SERVER_OVERLOADED, "Server overloaded", "concurrency",
+                         {"tool": tool, "limit": self.tool_concurrency[tool]})
+        return slots
+
+    def release(self, ticket: Optional[threading.BoundedSemaphore]):
+        if ticket is not None:
+            ticket.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queued,
+            "rejected": dict(self.rejected),
+            "tool_concurrency": self.tool_concurrency,
+            "rate": self.rate,
+            "burst": self.burst,
+            "shed_depth": self.shed_depth,
+            "max_depth": self.max_depth,
+        }
+
+    def _reject(self, code: int, message: str, reason: str, data: Dict[str, Any]):
+        with self._lock:
+            self.rejected[reason] += 1
+        raise AdmissionError(code, message, reason, data)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Отмена и дедлайны запросов MCP сервера
+
+Каждый запрос получает CancelToken: его отменяет notifications/cancelled от
+клиента или истечение дедлайна (params._meta.timeoutMs). Инструменты проверяют
+токен в своих циклах, а вычисления, которые нельзя прервать изнутри (eval
+с возведением в степень), выполняются в отдельном процессе, который можно убить.
+"""
+
+import ast
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+# Код ошибки JSON-RPC для запроса, не уложившегося в дедлайн
+DEADLINE_EXCEEDED = -32001
+
+
+class RequestCancelled(BaseException):
+    """Запрос отменен клиентом (reason="cancelled") или истек дедлайн (reason="deadline").
+
+    Наследуется от BaseException (как asyncio.CancelledError), чтобы обработчики
+    ошибок инструментов (except Exception) не превращали отмену в обычную ошибку.
+    """
+
+    def __init__(self, reason: str = "cancelled"):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+    """Флаг отмены запроса с необязательным дедлайном"""
+
+    __slots__ = ("deadline", "reason", "_event")
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+
+    def cancel(self, reason: str = "cancelled"):
+        if self.reason is None:
+            self.reason = reason
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline")
+            return True
+        return False
+
+    def check(self):
+        """Бросить RequestCancelled, если запрос отменен или дедлайн истек"""
+        if self.cancelled:
+            raise RequestCancelled(self.reason)
+
+    def remaining(self, default: float) -> float:
+        """Сколько секунд осталось до дедлайна (не больше default)"""
+        if self.deadline is None:
+            return default
+        return max(0.0, min(default, self.deadline - time.monotonic()))
+
+
+def _evaluator_loop(stdin, stdout):
+    """Цикл дочернего процесса: строка с выражением -> строка JSON [успех, repr значения]"""
+    for line in stdin:
+        try:
+            reply = [True, repr(eval(json.loads(line), {"__builtins__": {}}))]
+        except Exception as e:
+            reply = [False, str(e)]
+        stdout.write(json.dumps(reply) + "\n")
+        stdout.flush()
+
+
+class IsolatedEvaluator:
+    """eval в отдельном процессе: зависшее вычисление убивается вместе с процессом.
+
+    Процесс (python -S mcp_cancellation.py) запускается при первом вызове
+    и переиспользуется; после отмены или таймаута он завершается и при
+    следующем вызове создается заново. Обычный subprocess, а не fork:
+    форк процесса, где другой поток держит блокировку stdin, зависает.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        # Потолок времени вычисления, даже если у запроса нет дедлайна
+        self.timeout = timeout if timeout is not None else float(os.getenv("MCP_CALC_TIMEOUT", "5"))
+        self.kills = 0
+        self._process = None
+        self._replies: Optional["queue.Queue[Optional[str]]"] = None
+        self._lock = threading.Lock()
+
+    def evaluate(self, expression: str, token: Optional[CancelToken] = None) -> Any:
+        token = token or CancelToken()
+        timeout = token.remaining(self.timeout)
+        with self._lock:
+            self._ensure_started()
+            self._process.stdin.write(json.dumps(expression) + "\n")
+            self._process.stdin.flush()
+            ends = time.monotonic() + timeout
+            # Ответ забирается сразу по готовности; отмена проверяется между ожиданиями
+            while True:
+                try:
+                    reply = self._replies.get(timeout=0.02)
+                    break
+                except queue.Empty:
+                    if token.cancelled or time.monotonic() >= ends:
+                        self._kill()
+                        raise RequestCancelled(token.reason or "deadline")
+            if reply is None:
+                self._kill()
+                raise ArithmeticError("процесс вычислений завершился")
+        ok, value = json.loads(reply)
+        if not ok:
+            raise ArithmeticError(value)
+        return ast.literal_eval(value)
+
+    def close(self):
+        with self._lock:
+            if self._process is not None:
+                self._process.stdin.close()
+                try:
+                    self._process.wait(timeout=1)
+                except subprocess.TimeoutExpired:
+                    self._process.kill()
+                self._process = None
+
+    def _ensure_started(self):
+        if self._process is not None and self._process.poll() is None:
+            return
+        self._process = subprocess.Popen(
+            [sys.executable, "-S", os.path.abspath(__file__)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding="utf-8"
+        )
+        self._replies = queue.Queue()
+        threading.Thread(target=_read_replies, args=(self._process.stdout, self._replies),
+                         name="mcp-evaluator", daemon=True).start()
+
+    def _kill(self):
+        self._process.kill()
+        self._process.wait()
+        self._process = None
+        self.kills += 1
+
+
+def _read_replies(stdout, replies: "queue.Queue[Optional[str]]"):
+    for line in stdout:
+        replies.put(line)
+    replies.put(None)
+
+
+def cancel_key(session: Any, request_id: Any) -> Tuple[int, Any]:
+    """Ключ запроса: id в JSON-RPC уникальны только в пределах сессии"""
+    return (id(session), request_id)
+
+
+if __name__ == "__main__":
+    _evaluator_loop(sys.stdin, sys.stdout)
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Асинхронное stdio-соединение с MCP сервером
+Один дочерний процесс, мультиплексирование запросов по JSON-RPC id
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from mcp_payload import CAPABILITY, PAYLOAD_MARKER, PAYLOAD_UNAVAILABLE, PayloadChannel, PayloadUnavailable
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Максимальная длина одной строки ответа (результаты инструментов бывают большими)
+STREAM_LIMIT = 64 * 1024 * 1024
+
+CLIENT_INFO = {
+    "name": "OpenRouter MCP Client",
+    "version": "1.0.0"
+}
+
+# Сколько секунд ждать, пока сервер завершится сам после закрытия stdin
+CLOSE_GRACE = 2.0
+
+# Команда запуска standard_mcp_server.py. С MCP_SERVER_NO_SITE=1 сервер запускается с -S
+# (без site и .pth файлов окружения): холодный старт быстрее, но пакеты окружения
+# недоступны и calc_stats считает сводку без NumPy
+SERVER_COMMAND = [sys.executable, "standard_mcp_server.py"]
+NO_SITE_COMMAND = [sys.executable, "-S", "standard_mcp_server.py"]
+
+# Общий счетчик id: запросы одного клиента уникальны во всех его соединениях
+_request_ids = itertools.count(1)
+
+# Получатели notifications/progress по progressToken. Токены уникальны для
+# клиента, поэтому реестр общий: фрагмент найдет получателя, даже если запрос
+# ушел через супервизор или пул
+_progress_handlers: Dict[Any, Callable[[Dict], None]] = {}
+
+
+def register_progress(handler: Callable[[Dict], None]) -> str:
+    """Зарегистрировать получателя notifications/progress; возвращает progressToken"""
+    token = f"progress-{next(_request_ids)}"
+    _progress_handlers[token] = handler
+    return token
+
+
+def unregister_progress(token: str):
+    _progress_handlers.pop(token, None)
+
+
+def with_deadline(request: Dict, timeout: Optional[float]) -> Dict:
+    """Копия запроса с дедлайном в params._meta.timeoutMs (сервер отменит его сам)"""
+    if timeout is None or "id" not in request:
+        return request
+    params = dict(request.get("params") or {})
+    params["_meta"] = {**params.get("_meta", {}), "timeoutMs": int(timeout * 1000)}
+    return {**request, "params": params}
+
+
+def payload_unavailable(response: Optional[Dict]) -> bool:
+    """Сервер не прочитал ссылку $payload запроса и не выполнял его — можно повторить"""
+    error = response.get("error") if isinstance(response, dict) else None
+    return (isinstance(error, dict) and error.get("code") == PAYLOAD_UNAVAILABLE
+            and (error.get("data") or {}).get("direction") == "request")
+
+
+def server_command() -> List[str]:
+    """Команда запуска сервера с учетом MCP_SERVER_NO_SITE"""
+    return list(NO_SITE_COMMAND if os.getenv("MCP_SERVER_NO_SITE") == "1" else SERVER_COMMAND)
+
+
+def make_request(method: str, params: Optional[Dict] = None) -> Dict:
+    """Сформировать JSON-RPC запрос с уникальным id"""
+    request = {
+        "jsonrpc": "2.0",
+        "id": next(_request_ids),
+        "method": method
+    }
+    if params is not None:
+        request["params"] = params
+    return request
+
+
+class MCPConnection:
+    """Соединение с MCP сервером, запущенным в subprocess.
+
+    Запросы можно отправлять конкурентно: ответы сопоставляются с
+    ожидающими future по id, уведомления сервера передаются в on_notification.
+    """
+
+    def __init__(self, command: Optional[List[str]] = None, cwd: str = PROJECT_DIR,
+                 env: Optional[Dict[str, str]] = None):
+        self.command = command or server_command()
+        self.cwd = cwd
+        self.env = env
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.server_info: Dict[str, Any] = {}
+        self.tools: List[Dict] = []
+        self.on_notification: Optional[Callable[[Dict], None]] = None
+        self._pending: Dict[Any, asyncio.Future] = {}
+        # Время от запуска процесса до ответа на initialize (холодный старт)
+        self.startup_seconds: Optional[float] = None
+        self._started_at = 0.0
+        self._stderr_tail: deque = deque(maxlen=50)
+        self._reader_task: Optional[asyncio.Task] = None
+        self._stderr_task: Optional[asyncio.Task] = None
+        # Большие строки — файлами в общей памяти, если сервер объявил поддержку (MCP_PAYLOAD_THRESHOLD)
+        self.payloads = PayloadChannel.from_env()
+        self.payloads_active = False
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    @property
+    def is_alive(self) -> bool:
+        return (
+            self.process is not None
+            and self.process.returncode is None
+            and self._reader_task is not None
+            and not self._reader_task.done()
+        )
+
+    @property
+    def in_flight(self) -> int:
+        """Число запросов, ожидающих ответа"""
+        return len(self._pending)
+
+    @property
+    def stderr_output(self) -> str:
+        return "".join(self._stderr_tail)
+
+    async def start(self):
+        """Запустить процесс сервера"""
+        env = os.environ.copy()
+        env["PYTHONIOENCODING"] = "utf-8"
+        if self.env:
+            env.update(self.env)
+
+        self._started_at = time.perf_counter()
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=self.cwd,
+            env=env,
+            limit=STREAM_LIMIT
+        )
+        self._reader_task = asyncio.create_task(self._read_loop())
+        self._stderr_task = asyncio.create_task(self._read_stderr())
+
+    async def initialize(self, batch: bool = True):
+        """Рукопожатие MCP: initialize + tools/list одним batch-запросом.
+
+        batch=False — по шагам, для серверов без поддержки batch (FastMCP).
+        """
+        capabilities: Dict[str, Any] = {"tools": {}}
+        if self.payloads.enabled:
+            capabilities["experimental"] = self.payloads.capability()
+        init_request = make_request("initialize", {
+            "protocolVersion": "2024-11-05",
+            "capabilities": capabilities,
+            "clientInfo": CLIENT_INFO
+        })
+        if batch:
+            init_response, tools_response = await self.send_batch([init_request, make_request("tools/list")])
+            self.startup_seconds = time.perf_counter() - self._started_at
+        else:
+            init_response = await self.request(init_request)
+            self.startup_seconds = time.perf_counter() - self._started_at
+            await self.notify("notifications/initialized")
+            tools_response = await self.request(make_request("tools/list"))
+        if init_response and "result" in init_response:
+            self.server_info = init_response["result"].get("serverInfo", {})
+            experimental = init_response["result"].get("capabilities", {}).get("experimental") or {}
+            self.payloads_active = self.payloads.enabled and CAPABILITY in experimental
+        if tools_response and "result" in tools_response:
+            self.tools = tools_response["result"].get("tools", [])
+
+    async def request(self, message: Any, timeout: Optional[float] = None) -> Any:
+        """Отправить запрос или batch и дождаться ответа.
+
+        timeout — дедлайн в секундах: он передается серверу в params._meta.timeoutMs,
+        а если ответ не пришел вовремя, серверу уходит notifications/cancelled
+        и поднимается TimeoutError.
+        """
+        if isinstance(message, list):
+            return await self.send_batch(message, timeout)
+
+        message = with_deadline(message, timeout)
+        future = self._register(message.get("id"))
+        externalized = await self._write(message)
+        response = (await self._wait([message], [future], timeout))[0]
+        if externalized and payload_unavailable(response):
+            # Сервер не видит наши файлы (другая машина или каталог) — дальше только в строке
+            self.payloads_active = False
+            return await self.request(message, timeout)
+        return response
+
+    async def send_batch(self, requests: List[Dict], timeout: Optional[float] = None) -> List[Optional[Dict]]:
+        """Отправить batch-массив; ответы возвращаются в порядке запросов"""
+        requests = [with_deadline(r, timeout) for r in requests]
+        futures = [self._register(r["id"]) if "id" in r else None for r in requests]
+        externalized = await self._write(requests)
+        responses = await self._wait(requests, futures, timeout)
+        retry = [i for i, response in enumerate(responses) if payload_unavailable(response)]
+        if externalized and retry:
+            self.payloads_active = False
+            for i, response in zip(retry, await self.send_batch([requests[i] for i in retry], timeout)):
+                responses[i] = response
+        return responses
+
+    async def _wait(self, requests: List[Dict], futures: List[Optional[asyncio.Future]],
+                    timeout: Optional[float]) -> List[Optional[Dict]]:
+        waiting = [f for f in futures if f is not None]
+        try:
+            if waiting:
+                await asyncio.wait_for(asyncio.gather(*waiting), timeout)
+        except asyncio.TimeoutError:
+            await self._cancel(requests, "timeout")
+            raise TimeoutError(f"MCP сервер не ответил за {timeout:.1f} с") from None
+        except asyncio.CancelledError:
+            # Вызывающий больше не ждет ответа — серверу незачем продолжать работу
+            await self._cancel(requests, "cancelled")
+            raise
+        return [f.result() if f is not None else None for f in futures]
+
+    async def _cancel(self, requests: List[Dict], reason: str):
+        """Снять ожидание и сообщить серверу об отмене неотвеченных запросов"""
+        for request in requests:
+            future = self._pending.pop(request.get("id"), None)
+            if future is None:
+                continue
+            future.cancel()
+            if self.is_alive:
+                try:
+                    await self.notify("notifications/cancelled", {"requestId": request["id"], "reason": reason})
+                except (ConnectionError, RuntimeError):
+                    pass
+
+    async def notify(self, method: str, params: Optional[Dict] = None):
+        """Отправить уведомление (без ожидания ответа)"""
+        message = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            message["params"] = params
+        await self._write(message)
+
+    async def close(self):
+        """Остановить процесс сервера.
+
+        Сначала закрывается stdin: сервер доделывает принятые запросы, отправляет
+        ответы и сохраняет состояние (MCP_TASKS_SNAPSHOT). Не успел за
+        CLOSE_GRACE секунд — SIGTERM, затем SIGKILL.
+        """
+        if self.process and self.process.returncode is None:
+            try:
+                self.process.stdin.close()
+                await asyncio.wait_for(self.process.wait(), timeout=CLOSE_GRACE)
+            except (asyncio.TimeoutError, OSError):
+                self.process.terminate()
+                try:
+                    await asyncio.wait_for(self.process.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    self.process.kill()
+                    await self.process.wait()
+        for task in (self._reader_task, self._stderr_task):
+            if task:
+                task.cancel()
+        self._fail_pending(ConnectionError("MCP соединение закрыто"))
+        self.payloads.close()
+
+    def _register(self, request_id: Any) -> asyncio.Future:
+        if not self.is_alive:
+            raise ConnectionError(f"MCP сервер не активен: {self.stderr_output.strip()}")
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        return future
+
+    async def _write(self, message: Any) -> bool:
+        """Записать сообщение; True — длинные строки ушли ссылками $payload"""
+        outgoing = self.payloads.externalize(message) if self.payloads_active else message
+        data = (json.dumps(outgoing, ensure_ascii=False) + "\n").encode("utf-8")
+        self.process.stdin.write(data)
+        await self.process.stdin.drain()
+        return outgoing is not message
+
+    async def _read_loop(self):
+        try:
+            while True:
+                line = await self.process.stdout.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"❌ Ошибка парсинга ответа MCP: {e}", file=sys.stderr)
+                    continue
+                if PAYLOAD_MARKER in line:
+                    message = await self._load_payloads(message)
+                self._dispatch(message)
+        finally:
+            self._fail_pending(ConnectionError(
+                f"MCP сервер завершился: {self.stderr_output.strip()}"
+            ))
+
+    async def _load_payloads(self, message: Any) -> Any:
+        """Подставить значения по ссылкам $payload из ответа сервера.
+
+        Если файл прочитать не удалось, запрос получает ошибку PAYLOAD_UNAVAILABLE
+        (инструмент уже выполнен, поэтому он не повторяется), а сервер — просьбу
+        передавать ответы в строке.
+        """
+        items = message if isinstance(message, list) else [message]
+        failed = False
+        for index, item in enumerate(items):
+            try:
+                items[index] = self.payloads.internalize(item)
+            except PayloadUnavailable as e:
+                failed = True
+                # Уведомление без значения просто теряется
+                items[index] = {"jsonrpc": "2.0", "id": item["id"],
+                                "error": {"code": PAYLOAD_UNAVAILABLE, "message": f"Payload unavailable: {e}",
+                                          "data": {"direction": "response"}}} if "id" in item else None
+        if failed:
+            await self.notify("notifications/payloads", {"enabled": False})
+        return items if isinstance(message, list) else items[0]
+
+    def _dispatch(self, message: Any):
+        for item in message if isinstance(message, list) else [message]:
+            if not isinstance(item, dict):
+                continue
+            if "id" not in item or ("method" in item and "result" not in item and "error" not in item):
+                if item.get("method") == "notifications/progress":
+                    params = item.get("params") or {}
+                    handler = _progress_handlers.get(params.get("progressToken"))
+                    if handler is not None:
+                        handler(params)
+                        continue
+                if self.on_notification:
+                    self.on_notification(item)
+                continue
+            future = self._pending.pop(item["id"], None)
+            if future is None and item["id"] is None and len(self._pending) == 1:
+                # Ошибка разбора без id относится к единственному ожидающему запросу
+                future = self._pending.pop(next(iter(self._pending)))
+            if future is not None and not future.done():
+                future.set_result(item)
+
+    async def _read_stderr(self):
+        while True:
+            line = await self.process.stderr.readline()
+            if not line:
+                return
+            self._stderr_tail.append(line.decode("utf-8", errors="replace"))
+
+    def _fail_pending(self, error: Exception):
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
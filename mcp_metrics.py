@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Метрики MCP сервера и клиента
+Счетчики вызовов и ошибок, гистограммы латентности, размеры сообщений
+"""
+
+import json
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# Границы le для Prometheus-гистограмм (секунды)
+PROMETHEUS_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+class LatencyHistogram:
+    """Гистограмма в стиле HDR: логарифмические октавы с линейными под-корзинами.
+
+    Запись — O(1) без аллокаций; относительная ошибка перцентилей не больше
+    1 / sub_buckets. Значения хранятся в микросекундах от 1 мкс до ~2^36 мкс.
+    """
+
+    MAX_EXPONENT = 36
+
+    def __init__(self, sub_buckets: int = 16):
+        self.sub_buckets = sub_buckets
+        self.counts: List[int] = [0] * ((self.MAX_EXPONENT + 1) * sub_buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _index(self, micros: float) -> int:
+        if micros < 1:
+            return 0
+        mantissa, exponent = math.frexp(micros)  # micros = mantissa * 2**exponent, mantissa в [0.5, 1)
+        exponent = min(exponent, self.MAX_EXPONENT)
+        sub = min(int((mantissa - 0.5) * 2 * self.sub_buckets), self.sub_buckets - 1)
+        return exponent * self.sub_buckets + sub
+
+    def _upper_bound(self, index: int) -> float:
+        """Верхняя граница корзины в секундах"""
+        exponent, sub = divmod(index, self.sub_buckets)
+        return (0.5 + (sub + 1) / (2 * self.sub_buckets)) * (2 ** exponent) / 1_000_000
+
+    def record(self, seconds: float):
+        self.counts[self._index(seconds * 1_000_000)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, pct: float) -> float:
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(self.count * pct / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._upper_bound(index), self.max)
+        return self.max
+
+    def cumulative(self, bounds=PROMETHEUS_BUCKETS) -> List[Tuple[float, int]]:
+        """Накопленные счетчики для заданных границ le"""
+        result = []
+        seen = 0
+        index = 0
+        for bound in bounds:
+            while index < len(self.counts) and self._upper_bound(index) <= bound:
+                seen += self.counts[index]
+                index += 1
+            result.append((bound, seen))
+        return result
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 3),
+            "p90_ms": round(self.percentile(90) * 1000, 3),
+            "p99_ms": round(self.percentile(99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class _Series:
+    __slots__ = ("calls", "errors", "latency", "bytes_in", "bytes_out")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+
+class MetricsRegistry:
+    """Потокобезопасный набор метрик, сгруппированных по (вид, имя).
+
+    Вид — например "method" (JSON-RPC метод), "tool" (инструмент) или
+    "upstream" (HTTP запросы клиента к OpenRouter).
+    """
+
+    def __init__(self, namespace: str = "mcp"):
+        self.namespace = namespace
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind: str, name: str) -> _Series:
+        key = (kind, name)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series.setdefault(key, _Series())
+        return series
+
+    def record(self, kind: str, name: str, seconds: float, error: bool = False):
+        with self._lock:
+            series = self._get(kind, name)
+            series.calls += 1
+            if error:
+                series.errors += 1
+            series.latency.record(seconds)
+
+    def record_bytes(self, kind: str, name: str, bytes_in: int = 0, bytes_out: int = 0):
+        with self._lock:
+            series = self._get(kind, name)
+            series.bytes_in += bytes_in
+            series.bytes_out += bytes_out
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Текущие метрики в виде {вид: {имя: {...}}}"""
+        with self._lock:
+            result: Dict[str, Dict[str, Any]] = {}
+            for (kind, name), series in sorted(self._series.items()):
+                entry = {
+                    "calls": series.calls,
+                    "errors": series.errors,
+                    "bytes_in": series.bytes_in,
+                    "bytes_out": series.bytes_out,
+                }
+                latency = series.latency.summary()
+                latency.pop("count")
+                entry.update(latency)
+                result.setdefault(kind, {})[name] = entry
+            return result
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def render_prometheus(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        prefix = self.namespace
+        lines = [
+            f"# TYPE {prefix}_calls_total counter",
+            f"# TYPE {prefix}_errors_total counter",
+            f"# TYPE {prefix}_bytes_in_total counter",
+            f"# TYPE {prefix}_bytes_out_total counter",
+            f"# TYPE {prefix}_latency_seconds histogram",
+        ]
+        with self._lock:
+            for (kind, name), series in sorted(self._series.items()):
+                labels = f'kind="{kind}",name="{_escape(name)}"'
+                lines.append(f"{prefix}_calls_total{{{labels}}} {series.calls}")
+                lines.append(f"{prefix}_errors_total{{{labels}}} {series.errors}")
+                lines.append(f"{prefix}_bytes_in_total{{{labels}}} {series.bytes_in}")
+                lines.append(f"{prefix}_bytes_out_total{{{labels}}} {series.bytes_out}")
+                for bound, count in series.latency.cumulative():
+                    lines.append(f'{prefix}_latency_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{prefix}_latency_seconds_bucket{{{labels},le="+Inf"}} {series.latency.count}')
+                lines.append(f"{prefix}_latency_seconds_sum{{{labels}}} {series.latency.total:.6f}")
+                lines.append(f"{prefix}_latency_seconds_count{{{labels}}} {series.latency.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: Optional[str]) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
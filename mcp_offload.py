@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Вынос тяжелых инструментов FastMCP из цикла событий
+
+FastMCP выполняет синхронные инструменты прямо в цикле событий, поэтому
+большой text_stats задерживает все остальные запросы и уведомления процесса.
+Инструмент, объявленный через ToolOffloader.tool, регистрируется асинхронной
+оберткой, которая выполняет его в пуле потоков или процессов:
+  thread  — пул потоков (по умолчанию): цикл событий остается свободным
+  process — пул процессов для чистых функций (isolate=True): нет общего GIL
+  off     — как раньше, в цикле событий
+Очередь ограничена: если заняты все исполнители и max_queue ожидающих,
+вызов сразу получает отказ вместо бесконечного ожидания. Модульное имя
+инструмента остается обычной синхронной функцией (demo_test.py вызывает ее напрямую).
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+OFFLOAD_MODES = ("off", "thread", "process")
+
+OVERLOADED_MESSAGE = "❌ Сервер перегружен: слишком много тяжелых вызовов в очереди, повторите позже"
+
+
+class ToolOffloader:
+    """Пулы исполнителей для тяжелых инструментов с ограниченной очередью"""
+
+    def __init__(self, mode: str = "thread", workers: Optional[int] = None, max_queue: int = 32):
+        if mode not in OFFLOAD_MODES:
+            raise ValueError(f"mode должен быть одним из: {', '.join(OFFLOAD_MODES)}")
+        self.mode = mode
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.max_queue = max_queue
+        self.pending = 0
+        self.rejected = 0
+        self.completed = 0
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+
+    @classmethod
+    def from_env(cls) -> "ToolOffloader":
+        """Настройки из MCP_OFFLOAD (off/thread/process), MCP_OFFLOAD_WORKERS и MCP_OFFLOAD_QUEUE"""
+        return cls(
+            mode=os.getenv("MCP_OFFLOAD", "thread"),
+            workers=int(os.getenv("MCP_OFFLOAD_WORKERS", "0")) or None,
+            max_queue=int(os.getenv("MCP_OFFLOAD_QUEUE", "32"))
+        )
+
+    def tool(self, server, isolate: bool = False, **tool_kwargs) -> Callable:
+        """Декоратор: зарегистрировать fn инструментом server с выполнением вне цикла событий.
+
+        isolate=True — функция зависит только от аргументов (без Context и общего
+        состояния) и в режиме process может выполняться в другом процессе.
+        Возвращает саму fn, а не обертку.
+        """
+        def decorator(fn: Callable) -> Callable:
+            if self.mode == "off":
+                server.add_tool(fn, **tool_kwargs)
+                return fn
+
+            @functools.wraps(fn)
+            async def offloaded(*args, **kwargs):
+                return await self.run(fn, isolate, *args, **kwargs)
+
+            server.add_tool(offloaded, **tool_kwargs)
+            return fn
+        return decorator
+
+    async def run(self, fn: Callable, isolate: bool, *args, **kwargs) -> Any:
+        """Выполнить fn в пуле; при переполненной очереди — отказ"""
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            return OVERLOADED_MESSAGE
+
+        loop = asyncio.get_running_loop()
+        if isolate and self.mode == "process":
+            call = functools.partial(fn, *args, **kwargs)
+        else:
+            # Поток получает контекст запроса (contextvars), как asyncio.to_thread
+            call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        self.pending += 1
+        try:
+            return await loop.run_in_executor(self._executor(isolate), call)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def _executor(self, isolate: bool) -> Executor:
+        if isolate and self.mode == "process":
+            if self._processes is None:
+                # spawn: fork процесса с потоками stdio сервера может зависнуть
+                import multiprocessing
+                self._processes = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._processes
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(self.workers, thread_name_prefix="mcp-offload")
+        return self._threads
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        for executor in (self._threads, self._processes):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._threads = self._processes = None
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Передача больших строк JSON-RPC в обход stdio-канала
+
+Строка длиннее порога не экранируется в JSON и не проходит через пайп:
+она записывается (UTF-8, одним вызовом write) в файл в общей памяти
+(/dev/shm, если есть, иначе временный каталог), а в сообщении вместо нее
+остается ссылка
+
+    {"$payload": {"path": "...", "size": 12345, "sha256": "..."}}
+
+Получатель отображает файл в память (mmap), сверяет хэш, декодирует
+строку и удаляет файл. Писатель удаляет оставшиеся файлы при закрытии.
+
+Поддержку объявляют обе стороны в initialize (capabilities.experimental.payloads).
+Если одна из сторон ее не объявила или ссылку не удалось прочитать (файл на
+другой машине, удален, хэш не совпал), значения передаются в строке, как раньше.
+Модуль использует только стандартную библиотеку (сервер можно запускать с python -S).
+"""
+
+import hashlib
+import mmap
+import os
+import tempfile
+from typing import Any, Dict, Optional, Set
+
+PAYLOAD_KEY = "$payload"
+FILE_PREFIX = "mcp-payload-"
+# Быстрая проверка сырой строки сообщения: без этой подстроки ссылок в нем нет
+PAYLOAD_MARKER = b'"$payload"'
+# Имя возможности в capabilities.experimental
+CAPABILITY = "payloads"
+# Ошибка JSON-RPC: ссылку не удалось прочитать, запрос нужно повторить со значением в строке
+PAYLOAD_UNAVAILABLE = -32004
+
+DEFAULT_THRESHOLD = 256 * 1024
+
+
+class PayloadUnavailable(Exception):
+    """Ссылку нельзя прочитать: нет файла, не тот размер или хэш"""
+
+
+class PayloadTooLarge(PayloadUnavailable):
+    """Значение по ссылке больше допустимого размера запроса"""
+
+    def __init__(self, size: int, max_bytes: int):
+        super().__init__(f"значение {size} байт больше лимита {max_bytes}")
+        self.size = size
+
+
+def _default_directory() -> str:
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        return shm
+    return tempfile.gettempdir()
+
+
+class PayloadChannel:
+    """Запись и чтение значений по ссылкам $payload.
+
+    threshold — минимальная длина строки (символов), которая уходит в файл;
+    0 выключает канал.
+    """
+
+    def __init__(self, threshold: int = DEFAULT_THRESHOLD, directory: Optional[str] = None):
+        self.threshold = threshold
+        self.directory = directory or _default_directory()
+        self.sent = 0
+        self.received = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._created: Set[str] = set()
+
+    @classmethod
+    def from_env(cls) -> "PayloadChannel":
+        return cls(
+            threshold=int(os.getenv("MCP_PAYLOAD_THRESHOLD", str(DEFAULT_THRESHOLD))),
+            directory=os.getenv("MCP_PAYLOAD_DIR") or None
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def capability(self) -> Dict[str, Any]:
+        """Описание для capabilities.experimental в initialize"""
+        return {CAPABILITY: {"threshold": self.threshold}}
+
+    def externalize(self, value: Any) -> Any:
+        """Заменить длинные строки ссылками.
+
+        Исходный объект не меняется: копируются только контейнеры на пути
+        к замененным строкам; если заменять нечего, возвращается сам value.
+        """
+        if isinstance(value, str):
+            return self.store(value) if len(value) >= self.threshold else value
+        if isinstance(value, dict):
+            changed = None
+            for key, item in value.items():
+                if isinstance(item, (str, dict, list)):
+                    new_item = self.externalize(item)
+                    if new_item is not item:
+                        if changed is None:
+                            changed = dict(value)
+                        changed[key] = new_item
+            return value if changed is None else changed
+        if isinstance(value, list):
+            changed = None
+            for index, item in enumerate(value):
+                if isinstance(item, (str, dict, list)):
+                    new_item = self.externalize(item)
+                    if new_item is not item:
+                        if changed is None:
+                            changed = list(value)
+                        changed[index] = new_item
+            return value if changed is None else changed
+        return value
+
+    def internalize(self, value: Any, max_bytes: int = 0) -> Any:
+        """Подставить значения вместо ссылок (файлы после чтения удаляются)"""
+        if isinstance(value, dict):
+            if len(value) == 1 and PAYLOAD_KEY in value:
+                return self.load(value[PAYLOAD_KEY], max_bytes)
+            for key, item in value.items():
+                if isinstance(item, (dict, list)):
+                    value[key] = self.internalize(item, max_bytes)
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                if isinstance(item, (dict, list)):
+                    value[index] = self.internalize(item, max_bytes)
+        return value
+
+    def store(self, text: str) -> Dict[str, Any]:
+        """Записать строку в файл и вернуть ссылку на него"""
+        data = text.encode("utf-8")
+        fd, path = tempfile.mkstemp(prefix=f"{FILE_PREFIX}{os.getpid()}-", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+        except OSError:
+            _unlink(path)
+            raise
+        self._track(path)
+        self.sent += 1
+        self.bytes_sent += len(data)
+        return {PAYLOAD_KEY: {"path": path, "size": len(data), "sha256": hashlib.sha256(data).hexdigest()}}
+
+    def load(self, ref: Any, max_bytes: int = 0) -> str:
+        """Прочитать значение по ссылке, проверить размер и хэш, удалить файл"""
+        if not isinstance(ref, dict) or not isinstance(ref.get("path"), str):
+            raise PayloadUnavailable("неверная ссылка")
+        path, size = ref["path"], ref.get("size")
+        if not isinstance(size, int) or size < 0:
+            raise PayloadUnavailable("неверный размер")
+        # Читаются (и удаляются) только файлы канала, а не произвольные пути
+        if (os.path.dirname(os.path.realpath(path)) != os.path.realpath(self.directory)
+                or not os.path.basename(path).startswith(FILE_PREFIX)):
+            raise PayloadUnavailable(f"{path}: вне каталога {self.directory}")
+        if max_bytes and size > max_bytes:
+            _unlink(path)
+            raise PayloadTooLarge(size, max_bytes)
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size != size:
+                    raise PayloadUnavailable(f"{path}: размер не совпадает")
+                if size == 0:
+                    text, digest = "", hashlib.sha256(b"").hexdigest()
+                else:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        digest = hashlib.sha256(mapped).hexdigest()
+                        with memoryview(mapped) as data:
+                            text = str(data, "utf-8") if digest == ref.get("sha256") else ""
+        except OSError as e:
+            raise PayloadUnavailable(f"{path}: {e.strerror or e}") from None
+        except UnicodeDecodeError:
+            raise PayloadUnavailable(f"{path}: не UTF-8") from None
+        if digest != ref.get("sha256"):
+            raise PayloadUnavailable(f"{path}: хэш не совпадает")
+        _unlink(path)
+        self.received += 1
+        self.bytes_received += size
+        return text
+
+    def close(self):
+        """Удалить файлы, которые получатель так и не прочитал"""
+        for path in self._created:
+            _unlink(path)
+        self._created.clear()
+
+    def _track(self, path: str):
+        self._created.add(path)
+        if len(self._created) > 1024:
+            # Прочитанные файлы получатель уже удалил — забываем их
+            self._created = {p for p in self._created if os.path.exists(p)}
+
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Пул предварительно инициализированных процессов MCP сервера
+Позволяет CPU-емким инструментам использовать несколько ядер
+"""
+
+import asyncio
+import functools
+import time
+from typing import Any, Dict, List, Optional
+
+from mcp_connection import MCPConnection, make_request
+from mcp_supervisor import MCPSupervisor
+
+# Инструменты со списком задач живут только у процесса-владельца (sticky routing)
+TASK_TOOLS = frozenset({"add_task", "get_tasks", "complete_task", "next_tasks", "overdue_tasks"})
+
+# Все инструменты с состоянием: задачи и история калькулятора (calc_stats считает по ней)
+STATEFUL_TOOLS = TASK_TOOLS | {"calculate", "calc_stats"}
+
+# Ресурсы с тем же состоянием (tasks://list, tasks://changes, calculator://history)
+# читаются и отслеживаются подпиской тоже у владельца
+STATEFUL_RESOURCE_PREFIXES = ("tasks://", "calculator://")
+RESOURCE_METHODS = frozenset({"resources/read", "resources/subscribe", "resources/unsubscribe"})
+
+# Переменные окружения состояния, которое хранит только владелец: у остальных воркеров
+# они пустые, иначе воркер без задач перезаписал бы снимок владельца при завершении
+OWNER_ONLY_ENV = ("MCP_TASKS_SNAPSHOT",)
+
+
+class PoolWorker:
+    """Процесс сервера в пуле и его статистика"""
+
+    def __init__(self, index: int, owner: bool = False):
+        self.index = index
+        self.owner = owner
+        self.connection: Optional[MCPSupervisor] = None
+        self.requests = 0
+        self.active = 0
+        self.last_ping_ms: Optional[float] = None
+
+    @property
+    def load(self) -> int:
+        """Запросы, назначенные воркеру и еще не завершенные"""
+        return self.active
+
+    @property
+    def is_alive(self) -> bool:
+        return self.connection is not None and self.connection.is_alive
+
+    @property
+    def restarts(self) -> int:
+        return self.connection.restarts if self.connection else 0
+
+    async def start(self):
+        # Супервизор перезапускает упавший процесс и восстанавливает его задачи
+        if self.owner:
+            factory = MCPConnection
+        else:
+            factory = functools.partial(MCPConnection, env=dict.fromkeys(OWNER_ONLY_ENV, ""))
+        self.connection = MCPSupervisor(factory)
+        await self.connection.start()
+
+    async def ensure_alive(self):
+        """Перезапустить процесс, если он упал"""
+        if not self.is_alive:
+            await self.connection.recover()
+
+
+class MCPServerPool:
+    """Пул из N процессов standard_mcp_server.py.
+
+    Инструменты без состояния уходят на наименее загруженный процесс,
+    инструменты и ресурсы задач и калькулятора — всегда на процесс-владелец (воркер #0).
+    Упавшие воркеры перезапускаются супервизором автоматически.
+    """
+
+    def __init__(self, size: int, sticky_tools=STATEFUL_TOOLS, owner_index: int = 0):
+        if size < 1:
+            raise ValueError("Размер пула должен быть не меньше 1")
+        self.size = size
+        self.sticky_tools = sticky_tools
+        self.owner_index = owner_index
+        self.workers = [PoolWorker(i, owner=i == owner_index) for i in range(size)]
+
+    @property
+    def tools(self) -> List[Dict]:
+        owner = self.workers[self.owner_index].connection
+        return owner.tools if owner else []
+
+    async def start(self):
+        """Запустить и инициализировать все процессы параллельно"""
+        await asyncio.gather(*(worker.start() for worker in self.workers))
+
+    async def close(self):
+        await asyncio.gather(*(w.connection.close() for w in self.workers if w.connection))
+
+    def pick(self, tool_name: Optional[str] = None) -> PoolWorker:
+        """Выбрать воркер: владелец для инструментов задач, иначе наименее загруженный"""
+        if tool_name in self.sticky_tools:
+            return self.workers[self.owner_index]
+        alive = [w for w in self.workers if w.is_alive] or self.workers
+        return min(alive, key=lambda w: (w.load, w.requests))
+
+    def route(self, request: Dict) -> PoolWorker:
+        """Воркер для запроса: инструменты по имени, ресурсы с состоянием — владельцу"""
+        params = request.get("params") or {}
+        if request.get("method") == "tools/call":
+            return self.pick(params.get("name"))
+        if request.get("method") in RESOURCE_METHODS and str(params.get("uri", "")).startswith(STATEFUL_RESOURCE_PREFIXES):
+            return self.workers[self.owner_index]
+        return self.pick()
+
+    async def request(self, message: Any, timeout: Optional[float] = None) -> Any:
+        """Отправить запрос или batch; элементы batch распределяются по воркерам"""
+        if isinstance(message, list):
+            return await self._request_batch(message, timeout)
+
+        worker = self.route(message)
+        worker.active += 1
+        worker.requests += 1
+        try:
+            await worker.ensure_alive()
+            return await worker.connection.request(message, timeout)
+        finally:
+            worker.active -= 1
+
+    async def _request_batch(self, requests: List[Dict], timeout: Optional[float] = None) -> List[Optional[Dict]]:
+        groups: Dict[int, List[Dict]] = {}
+        for request in requests:
+            worker = self.route(request)
+            worker.active += 1
+            worker.requests += 1
+            groups.setdefault(worker.index, []).append(request)
+
+        async def send_group(index: int, group: List[Dict]) -> List[Optional[Dict]]:
+            worker = self.workers[index]
+            try:
+                await worker.ensure_alive()
+                return await worker.connection.send_batch(group, timeout)
+            finally:
+                worker.active -= len(group)
+
+        indexes = list(groups)
+        results = await asyncio.gather(*(send_group(i, groups[i]) for i in indexes))
+        by_id = {
+            response["id"]: response
+            for group_result in results
+            for response in group_result if response is not None
+        }
+        return [by_id.get(request.get("id")) for request in requests]
+
+    async def health_check(self, timeout: float = 2.0) -> List[Dict[str, Any]]:
+        """Проверить все воркеры запросом ping"""
+        async def check(worker: PoolWorker) -> Dict[str, Any]:
+            status = {
+                "worker": worker.index,
+                "pid": worker.connection.pid if worker.connection else None,
+                "owner": worker.index == self.owner_index,
+                "alive": worker.is_alive,
+                "in_flight": worker.load,
+                "requests": worker.requests,
+                "restarts": worker.restarts,
+                "ping_ms": None
+            }
+            if worker.is_alive:
+                started = time.perf_counter()
+                try:
+                    await asyncio.wait_for(worker.connection.request(make_request("ping")), timeout)
+                    worker.last_ping_ms = round((time.perf_counter() - started) * 1000, 3)
+                    status["ping_ms"] = worker.last_ping_ms
+                except (asyncio.TimeoutError, ConnectionError):
+                    status["alive"] = False
+            return status
+
+        return list(await asyncio.gather(*(check(w) for w in self.workers)))
+
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Профилирование медленных запросов MCP серверов (включается по запросу)
+
+Для каждого запроса дольше порога сохраняется профиль (cProfile или
+семплирующий профиль стеков) и пишется структурированная запись в журнал
+медленных запросов. Включить и настроить можно без перезапуска сервера,
+если это разрешено при запуске (MCP_PROFILE_CONTROL=1): профили пишутся
+на диск сервера, поэтому по умолчанию клиенты не управляют профилированием,
+а каталог профилей можно выбрать только внутри MCP_PROFILE_DIR.
+"""
+
+import functools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+PROFILE_MODES = ("cprofile", "sampling")
+
+# cProfile — один на процесс: с Python 3.12 второй enable() в другом потоке
+# падает с "another profiler is active", поэтому параллельный запрос
+# выполняется без профиля
+_CPROFILE_LOCK = threading.Lock()
+
+
+class StackSampler:
+    """Семплирующий профайлер: раз в interval снимает стек одного потока"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="mcp-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def dump(self, path: str):
+        """Сохранить в формате folded stacks (для flamegraph.pl / speedscope)"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class SlowRequestProfiler:
+    """Профилирование запросов, которые выполняются дольше threshold_ms"""
+
+    def __init__(self, enabled: bool = False, threshold_ms: float = 500.0, mode: str = "cprofile",
+                 profile_dir: Optional[str] = None, log_path: Optional[str] = None,
+                 remote_control: bool = False):
+        self.enabled = enabled
+        self.threshold_ms = threshold_ms
+        self.mode = mode
+        self.profile_dir = profile_dir or os.path.join(tempfile.gettempdir(), "mcp_profiles")
+        # Каталог, внутри которого клиент может выбрать profileDir
+        self.root_dir = os.path.realpath(self.profile_dir)
+        # Можно ли клиентам менять настройки (debug/profiling, set_profiling)
+        self.remote_control = remote_control
+        # Журнал медленных запросов (JSON Lines); без пути — stderr
+        self.log_path = log_path
+        self.slow_requests = 0
+        # Запросы, выполненные без cProfile: его уже занял другой запрос
+        self.skipped_profiles = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SlowRequestProfiler":
+        """Настройки из переменных окружения MCP_PROFILE*"""
+        return cls(
+            enabled=os.getenv("MCP_PROFILE", "0") not in ("", "0", "false"),
+            threshold_ms=float(os.getenv("MCP_PROFILE_THRESHOLD_MS", "500")),
+            mode=os.getenv("MCP_PROFILE_MODE", "cprofile"),
+            profile_dir=os.getenv("MCP_PROFILE_DIR"),
+            log_path=os.getenv("MCP_SLOW_LOG"),
+            remote_control=os.getenv("MCP_PROFILE_CONTROL", "0") not in ("", "0", "false")
+        )
+
+    def configure(self, enabled: Optional[bool] = None, threshold_ms: Optional[float] = None,
+                  mode: Optional[str] = None, profile_dir: Optional[str] = None) -> Dict[str, Any]:
+        """Изменить настройки во время работы; возвращает текущее состояние.
+
+        Неверный параметр отклоняет весь вызов — настройки не меняются частично.
+        """
+        if mode is not None and mode not in PROFILE_MODES:
+            raise ValueError(f"mode должен быть одним из: {', '.join(PROFILE_MODES)}")
+        if profile_dir is not None:
+            profile_dir = self.resolve_profile_dir(profile_dir)
+        if mode is not None:
+            self.mode = mode
+        if threshold_ms is not None:
+            self.threshold_ms = float(threshold_ms)
+        if profile_dir is not None:
+            self.profile_dir = profile_dir
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        return self.status()
+
+    def resolve_profile_dir(self, profile_dir: str) -> str:
+        """Каталог профилей внутри root_dir (относительный путь — от него)"""
+        path = os.path.realpath(os.path.join(self.root_dir, profile_dir))
+        if os.path.commonpath([self.root_dir, path]) != self.root_dir:
+            raise ValueError(f"profileDir должен быть внутри {self.root_dir}")
+        return path
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "thresholdMs": self.threshold_ms,
+            "mode": self.mode,
+            "profileDir": self.profile_dir,
+            "slowLog": self.log_path or "stderr",
+            "slowRequests": self.slow_requests,
+            "skippedProfiles": self.skipped_profiles
+        }
+
+    @contextmanager
+    def profile(self, method: str, tool: Optional[str] = None,
+                arguments: Optional[Dict] = None) -> Iterator[None]:
+        """Выполнить блок под профайлером; медленный запрос попадает в журнал"""
+        if not self.enabled:
+            yield
+            return
+
+        mode = self.mode
+        if mode == "sampling":
+            profiler = StackSampler(threading.get_ident())
+            profiler.start()
+        else:
+            profiler = self._start_cprofile()
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            if mode == "sampling":
+                profiler.stop()
+            elif profiler is not None:
+                profiler.disable()
+                _CPROFILE_LOCK.release()
+            if duration_ms >= self.threshold_ms:
+                self._report(profiler, mode, method, tool, arguments, duration_ms)
+
+    def _start_cprofile(self):
+        """Включить cProfile; None — профайлер занят, запрос идет без профиля"""
+        import cProfile
+        if _CPROFILE_LOCK.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                return profiler
+            except ValueError:
+                # Профайлер включен вне сервера (python -m cProfile, отладчик)
+                _CPROFILE_LOCK.release()
+        with self._lock:
+            self.skipped_profiles += 1
+        return None
+
+    def profiled(self, fn):
+        """Декоратор для функций-инструментов (FastMCP)"""
+        import inspect
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return fn(*args, **kwargs)
+            arguments = dict(signature.bind_partial(*args, **kwargs).arguments)
+            with self.profile("tools/call", fn.__name__, arguments):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def _report(self, profiler, mode: str, method: str, tool: Optional[str],
+                arguments: Optional[Dict], duration_ms: float):
+        path = None
+        if profiler is not None:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+            name = (tool or method or "request").replace("/", "_")
+            suffix = "folded" if mode == "sampling" else "prof"
+            path = os.path.join(self.profile_dir, f"{stamp}-{name}.{suffix}")
+            if mode == "sampling":
+                profiler.dump(path)
+            else:
+                profiler.dump_stats(path)
+
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "method": method,
+            "tool": tool,
+            "argument_sizes": {key: len(str(value)) for key, value in (arguments or {}).items()},
+            "duration_ms": round(duration_ms, 3),
+            "profile": path,
+            "mode": mode
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self.slow_requests += 1
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as log:
+                    log.write(line + "\n")
+            else:
+                print(f"🐢 {line}", file=sys.stderr)
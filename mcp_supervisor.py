@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Супервизор MCP сервера: перезапуск упавшего процесса и восстановление состояния
+"""
+
+import asyncio
+import json
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from mcp_connection import MCPConnection, make_request
+
+# Запросы, которые безопасно повторить после перезапуска сервера
+IDEMPOTENT_METHODS = frozenset({"initialize", "ping", "tools/list", "resources/list", "resources/read"})
+IDEMPOTENT_TOOLS = frozenset({"get_tasks", "generate_password", "text_stats"})
+
+# Вызовы, меняющие состояние задач: журналируются и воспроизводятся в новом процессе
+REPLAYED_TOOLS = frozenset({"add_task", "complete_task"})
+
+# Начало ответа инструмента при успешном изменении; ошибки ("Ошибка: ...", "❌ ...") не журналируются
+SUCCESS_MARKS = {"add_task": "✅", "complete_task": "🎉"}
+
+# id задачи в ответе add_task ("✅ Задача #3 '...' добавлена ...")
+TASK_ID = re.compile(r"#(\d+)")
+
+# Журнал воспроизводится частями: каждая укладывается в MCP_MAX_REQUEST_BYTES
+REPLAY_CHUNK = 100
+REPLAY_CHUNK_BYTES = 256 * 1024
+
+# Предел записей журнала; дальше изменения не журналируются
+MAX_JOURNAL = 20000
+
+
+class MCPSupervisor:
+    """Следит за процессом MCP сервера и перезапускает его при падении.
+
+    После перезапуска повторяется рукопожатие initialize/tools/list, в новый
+    процесс воспроизводится журнал успешных изменений задач, а идемпотентные
+    запросы, прерванные падением, отправляются повторно. Изменения, которые
+    новый процесс уже загрузил сам (снимок MCP_TASKS_SNAPSHOT, сохраненный
+    при SIGTERM, или каталог арендаторов), повторно не применяются и
+    удаляются из журнала.
+
+    Журнал отправляется частями с _meta.replay: stdio-сервер пропускает их
+    мимо контроля допуска (лимит частоты, глубина очереди). Сверх max_journal
+    записей изменения не журналируются — после перезапуска восстановится
+    согласованное, но более раннее состояние.
+    """
+
+    def __init__(self, connection_factory: Callable[[], MCPConnection] = MCPConnection,
+                 max_attempts: int = 5, backoff_base: float = 0.05, backoff_max: float = 2.0,
+                 recovery_target: float = 1.0, max_journal: int = MAX_JOURNAL):
+        self.connection_factory = connection_factory
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Целевое время восстановления (сек); превышение выводится в stderr
+        self.recovery_target = recovery_target
+        self.connection: Optional[MCPConnection] = None
+        self.restarts = 0
+        self.recovery_times: List[float] = []
+        self.failed = False
+        # (арендатор, инструмент, id задачи, параметры tools/call)
+        self._journal: List[Tuple[Optional[str], str, int, Dict]] = []
+        self.max_journal = max_journal
+        # Изменения, не попавшие в переполненный журнал
+        self.journal_dropped = 0
+        self._recover_lock = asyncio.Lock()
+        self._watch_task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    # Интерфейс соединения -------------------------------------------------
+
+    @property
+    def tools(self) -> List[Dict]:
+        return self.connection.tools if self.connection else []
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.connection.pid if self.connection else None
+
+    @property
+    def is_alive(self) -> bool:
+        return self.connection is not None and self.connection.is_alive
+
+    @property
+    def available(self) -> bool:
+        """Сервер работает или будет перезапущен (супервизор не сдался)"""
+        return not self.failed and self.connection is not None
+
+    @property
+    def startup_seconds(self) -> Optional[float]:
+        """Холодный старт текущего процесса: от запуска до ответа на initialize"""
+        return self.connection.startup_seconds if self.connection else None
+
+    @property
+    def journal_size(self) -> int:
+        return len(self._journal)
+
+    @property
+    def in_flight(self) -> int:
+        return self.connection.in_flight if self.connection else 0
+
+    @property
+    def stderr_output(self) -> str:
+        return self.connection.stderr_output if self.connection else ""
+
+    async def start(self):
+        """Запустить сервер и выполнить рукопожатие"""
+        self._closing = False
+        self.connection = await self._spawn()
+
+    async def close(self):
+        self._closing = True
+        if self._watch_task:
+            self._watch_task.cancel()
+        if self.connection:
+            await self.connection.close()
+
+    async def request(self, message: Any, timeout: Optional[float] = None) -> Any:
+        """Отправить запрос; при падении сервера — восстановить и повторить идемпотентный"""
+        if isinstance(message, list):
+            return await self.send_batch(message, timeout)
+
+        if not self.is_alive:
+            await self.recover()
+        try:
+            response = await self.connection.request(message, timeout)
+        except ConnectionError:
+            await self.recover()
+            if not _is_idempotent(message):
+                raise
+            response = await self.connection.request(message, timeout)
+
+        self._record(message, response)
+        return response
+
+    async def send_batch(self, requests: List[Dict], timeout: Optional[float] = None) -> List[Optional[Dict]]:
+        """Отправить batch; после падения повторяются только идемпотентные элементы"""
+        if not self.is_alive:
+            await self.recover()
+        try:
+            responses = await self.connection.send_batch(requests, timeout)
+        except ConnectionError:
+            await self.recover()
+            retry = [r for r in requests if _is_idempotent(r)]
+            retried = await self.connection.send_batch(retry, timeout) if retry else []
+            by_id = {r["id"]: resp for r, resp in zip(retry, retried) if "id" in r}
+            responses = [by_id.get(r.get("id")) for r in requests]
+
+        for request, response in zip(requests, responses):
+            self._record(request, response)
+        return responses
+
+    # Восстановление -----------------------------------------------------
+
+    async def recover(self):
+        """Перезапустить процесс с экспоненциальной задержкой между попытками"""
+        async with self._recover_lock:
+            if self.is_alive or self._closing:
+                return
+            if self.failed:
+                raise ConnectionError("MCP сервер не удалось перезапустить")
+
+            started = time.perf_counter()
+            stderr_output = self.stderr_output.strip()
+            if self.connection:
+                await self.connection.close()
+            print(f"⚠️ MCP сервер завершился, перезапуск... {stderr_output}", file=sys.stderr)
+
+            for attempt in range(self.max_attempts):
+                try:
+                    self.connection = await self._spawn()
+                    await self._replay()
+                    break
+                except (ConnectionError, OSError) as e:
+                    delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                    print(f"❌ Попытка перезапуска {attempt + 1} не удалась: {e}", file=sys.stderr)
+                    await asyncio.sleep(delay)
+            else:
+                self.failed = True
+                raise ConnectionError("MCP сервер не удалось перезапустить")
+
+            elapsed = time.perf_counter() - started
+            self.restarts += 1
+            self.recovery_times.append(elapsed)
+            marker = "✅" if elapsed <= self.recovery_target else "⚠️"
+            print(f"{marker} MCP сервер восстановлен за {elapsed * 1000:.0f} мс "
+                  f"(цель {self.recovery_target * 1000:.0f} мс)", file=sys.stderr)
+
+    async def _spawn(self) -> MCPConnection:
+        connection = self.connection_factory()
+        await connection.start()
+        await connection.initialize()
+        self._watch_task = asyncio.create_task(self._watch(connection))
+        return connection
+
+    async def _watch(self, connection: MCPConnection):
+        """Перезапустить сервер сразу после выхода процесса, не дожидаясь запроса"""
+        await connection.process.wait()
+        if self._closing or connection is not self.connection:
+            return
+        try:
+            await self.recover()
+        except ConnectionError as e:
+            print(f"❌ {e}", file=sys.stderr)
+
+    async def _replay(self):
+        """Воспроизвести журнал изменений задач, которых нет в новом процессе"""
+        if not self._journal:
+            return
+        state = await self._task_state({tenant for tenant, _, _, _ in self._journal})
+        pending = []
+        for entry in self._journal:
+            tenant, name, task_id, _ = entry
+            tasks = state[tenant]
+            # Задача с этим id уже загружена или уже завершена — запись применена
+            if name == "add_task" and task_id in tasks or name == "complete_task" and tasks.get(task_id):
+                continue
+            pending.append(entry)
+        # Примененные записи сохранил сам сервер — журналу они больше не нужны
+        self._journal = pending
+
+        failed = 0
+        for chunk in _chunks([_replay_request(params) for _, _, _, params in pending]):
+            responses = await self.connection.send_batch(chunk)
+            failed += sum(not _succeeded(request["params"]["name"], response)
+                          for request, response in zip(chunk, responses))
+        if failed:
+            print(f"⚠️ Не воспроизведено изменений задач: {failed} из {len(pending)}", file=sys.stderr)
+
+    async def _task_state(self, tenants: Set[Optional[str]]) -> Dict[Optional[str], Dict[int, bool]]:
+        """Задачи арендаторов в новом процессе: {арендатор: {id: completed}}"""
+        state = {}
+        for tenant in tenants:
+            params: Dict[str, Any] = {"uri": "tasks://list"}
+            if tenant:
+                params["_meta"] = {"tenant": tenant}
+            response = await self.connection.request(make_request("resources/read", params))
+            contents = (response.get("result") or {}).get("contents") or [{"text": "[]"}]
+            state[tenant] = {task["id"]: task["completed"] for task in json.loads(contents[0]["text"])}
+        return state
+
+    def _record(self, request: Dict, response: Optional[Dict]):
+        if request.get("method") != "tools/call":
+            return
+        params = request.get("params") or {}
+        name = params.get("name")
+        if name not in REPLAYED_TOOLS or not _succeeded(name, response):
+            return
+        if name == "add_task":
+            match = TASK_ID.search(_text(response))
+            if not match:
+                return
+            task_id = int(match.group(1))
+        else:
+            task_id = (params.get("arguments") or {}).get("task_id")
+        if len(self._journal) >= self.max_journal or self.journal_dropped:
+            # Без пропусков: иначе id задач при воспроизведении разойдутся с журналом
+            if not self.journal_dropped:
+                print(f"⚠️ Журнал супервизора переполнен ({self.max_journal} записей): "
+                      f"новые изменения задач не переживут падение сервера", file=sys.stderr)
+            self.journal_dropped += 1
+            return
+        tenant = (params.get("_meta") or {}).get("tenant")
+        self._journal.append((tenant, name, task_id, params))
+
+
+def _text(response: Optional[Dict]) -> str:
+    result = (response or {}).get("result") or {}
+    return ((result.get("content") or [{}])[0]).get("text", "")
+
+
+def _succeeded(name: str, response: Optional[Dict]) -> bool:
+    """Инструмент изменил задачи: ответ без ошибки и с отметкой успеха"""
+    if not response or "result" not in response or response["result"].get("isError"):
+        return False
+    return _text(response).startswith(SUCCESS_MARKS[name])
+
+
+def _replay_request(params: Dict) -> Dict:
+    """Запрос воспроизведения: с id, чтобы увидеть отказ, и с _meta.replay"""
+    meta = {**(params.get("_meta") or {}), "replay": True}
+    return make_request("tools/call", {**params, "_meta": meta})
+
+
+def _chunks(requests: List[Dict]) -> List[List[Dict]]:
+    """Разбить запросы на части не больше REPLAY_CHUNK штук и REPLAY_CHUNK_BYTES байт"""
+    chunks: List[List[Dict]] = []
+    size = 0
+    for request in requests:
+        request_size = len(json.dumps(request, ensure_ascii=False).encode("utf-8"))
+        if not chunks or len(chunks[-1]) >= REPLAY_CHUNK or size + request_size > REPLAY_CHUNK_BYTES:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(request)
+        size += request_size
+    return chunks
+
+
+def _is_idempotent(request: Dict) -> bool:
+    method = request.get("method")
+    if method == "tools/call":
+        return (request.get("params") or {}).get("name") in IDEMPOTENT_TOOLS
+    return method in IDEMPOTENT_METHODS
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+Сетевые транспорты для StandardMCPServer
+TCP / Unix-сокет (JSON-RPC построчно) и streamable HTTP (POST /mcp)
+
+Все транспорты используют то же ядро handle_message, что и stdio режим,
+поэтому один процесс сервера может обслуживать много клиентов.
+"""
+
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from mcp_admission import INVALID_REQUEST, AdmissionController
+from standard_mcp_server import StandardMCPServer
+from task_tenants import DEFAULT_TENANT, TenantRegistry
+
+# Максимальная длина одного сообщения (строки или тела HTTP запроса)
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024
+
+
+class BodyTooLarge(ValueError):
+    """Content-Length HTTP запроса больше MAX_MESSAGE_BYTES"""
+
+
+class ClientSession:
+    """Клиентская сессия: экземпляр сервера и состояние сессии (выбранный арендатор)"""
+
+    __slots__ = ("session_id", "server", "state", "last_used", "pinned")
+
+    def __init__(self, session_id: str, server: StandardMCPServer):
+        self.session_id = session_id
+        self.server = server
+        self.state: Dict[str, Any] = {"tenant": DEFAULT_TENANT}
+        self.last_used = time.monotonic()
+        # Сессия соединения TCP/Unix живет, пока открыто соединение, и по простою не истекает
+        self.pinned = False
+
+
+class SessionRegistry:
+    """Состояние сервера для клиентских сессий.
+
+    state="shared" — все сессии работают с одним StandardMCPServer, а задачи
+    разделены по арендаторам (_meta.tenant в initialize или в запросе);
+    state="session" — у каждой сессии свой экземпляр сервера со своим каталогом
+    вытесненных арендаторов (удаляется вместе с сессией) и без общего снимка
+    задач. При превышении max_sessions вытесняется давно неиспользуемая сессия,
+    а HTTP сессии без DELETE закрываются после idle_timeout секунд простоя.
+    """
+
+    def __init__(self, state: str = "shared", max_sessions: int = 256, batch_workers: int = 0,
+                 idle_timeout: float = 1800.0):
+        if state not in ("shared", "session"):
+            raise ValueError("state должен быть shared или session")
+        self.state = state
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.expired = 0
+        self.batch_workers = batch_workers
+        # Контроль допуска общий для всех сессий: очередь запросов у процесса одна
+        self.admission = AdmissionController.from_env()
+        # Каталоги сессий: MCP_TENANT_DIR/sessions или временный каталог процесса
+        self._sessions_dir: Optional[str] = None
+        self._shared = self._new_server() if state == "shared" else None
+        self._sessions: "OrderedDict[str, ClientSession]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def open(self, session_id: Optional[str] = None, pinned: bool = False) -> ClientSession:
+        """Создать сессию (или вернуть существующую).
+
+        pinned — сессия открытого соединения: она не вытесняется и не истекает,
+        пока соединение не закроет ее само (число таких ограничено max_connections).
+        """
+        session_id = session_id or uuid.uuid4().hex
+        self.expire()
+        session = self.get(session_id)
+        if session is None:
+            server = self._shared or self._new_server(session_id)
+            session = ClientSession(session_id, server)
+            session.pinned = pinned
+            self._sessions[session_id] = session
+            if len(self._sessions) > self.max_sessions:
+                for evicted in [s for s in self._sessions.values() if not s.pinned and s is not session]:
+                    if len(self._sessions) <= self.max_sessions:
+                        break
+                    del self._sessions[evicted.session_id]
+                    self._discard(evicted)
+        return session
+
+    def _new_server(self, session_id: Optional[str] = None) -> StandardMCPServer:
+        tenants = TenantRegistry.from_env()
+        if session_id is not None:
+            # Арендаторы с одним именем в разных сессиях — разные пространства:
+            # вытесненные пишутся в каталог сессии, общий снимок (MCP_TASKS_SNAPSHOT) не читается
+            tenants.store_dir = os.path.join(self.sessions_dir, session_id)
+            tenants.snapshot_path = None
+        return StandardMCPServer(batch_workers=self.batch_workers, tenants=tenants, admission=self.admission)
+
+    @property
+    def sessions_dir(self) -> str:
+        if self._sessions_dir is None:
+            base = os.getenv("MCP_TENANT_DIR")
+            if base:
+                self._sessions_dir = os.path.join(base, "sessions")
+            else:
+                self._sessions_dir = tempfile.mkdtemp(prefix="mcp_sessions_")
+                atexit.register(shutil.rmtree, self._sessions_dir, True)
+        return self._sessions_dir
+
+    def _discard(self, session: ClientSession):
+        session.server.drop_session(session.state)
+        if session.server is not self._shared:
+            # Процесс вычислений и файлы $payload сессии иначе переживут ее
+            session.server.close()
+            shutil.rmtree(session.server.tenants.store_dir, ignore_errors=True)
+
+    def expire(self):
+        """Закрыть сессии, простаивающие дольше idle_timeout"""
+        deadline = time.monotonic() - self.idle_timeout
+        # Сессии упорядочены по последнему использованию: дальше идут только более свежие
+        for session in list(self._sessions.values()):
+            if session.last_used > deadline:
+                break
+            if session.pinned:
+                continue
+            del self._sessions[session.session_id]
+            self._discard(session)
+            self.expired += 1
+
+    def get(self, session_id: str) -> Optional[ClientSession]:
+        session = self._sessions.get(session_id)
+        if session is not None:
+            if session.last_used <= time.monotonic() - self.idle_timeout and not session.pinned:
+                self.expire()
+                return None
+            session.last_used = time.monotonic()
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def close(self, session_id: str) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self._discard(session)
+        return True
+
+
+class MCPNetworkServer:
+    """Общая часть транспортов: лимит соединений и выполнение запросов.
+
+    Запросы выполняются в пуле потоков, чтобы тяжелый инструмент не блокировал
+    event loop; max_in_flight ограничивает число одновременно выполняемых
+    запросов одного соединения — дальше клиент упирается в TCP backpressure.
+    """
+
+    def __init__(self, registry: SessionRegistry, max_connections: int = 1000,
+                 max_in_flight: int = 16, workers: int = 8):
+        self.registry = registry
+        self.max_connections = max_connections
+        self.max_in_flight = max_in_flight
+        self.connections = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mcp-net")
+
+    async def execute(self, session: ClientSession, body: bytes) -> Optional[bytes]:
+        """Выполнить сообщение в пуле потоков; возвращает сериализованный ответ.
+
+        Пока сообщение ждет свободного потока, оно учитывается в глубине очереди
+        контроля допуска — по ней сервер сбрасывает нагрузку.
+        """
+        loop = asyncio.get_running_loop()
+        admission = session.server.admission
+        admission.enqueued()
+        # Сообщение покидает очередь ровно один раз: при старте или при отмене до старта
+        waiting = threading.Lock()
+
+        def leave_queue():
+            if waiting.acquire(blocking=False):
+                admission.dequeued()
+
+        def run() -> Optional[bytes]:
+            leave_queue()
+            return session.server.handle_raw(body, session.state)
+
+        try:
+            return await loop.run_in_executor(self._executor, run)
+        finally:
+            leave_queue()
+
+    def _admit(self) -> bool:
+        if self.connections >= self.max_connections:
+            self.rejected += 1
+            return False
+        self.connections += 1
+        return True
+
+
+class MCPSocketServer(MCPNetworkServer):
+    """JSON-RPC поверх TCP или Unix-сокета: одно сообщение на строку, одно соединение — одна сессия"""
+
+    async def serve_tcp(self, host: str, port: int) -> asyncio.base_events.Server:
+        return await asyncio.start_server(self.handle_connection, host, port, limit=MAX_MESSAGE_BYTES)
+
+    async def serve_unix(self, path: str) -> asyncio.base_events.Server:
+        if os.path.exists(path):
+            os.unlink(path)
+        return await asyncio.start_unix_server(self.handle_connection, path, limit=MAX_MESSAGE_BYTES)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if not self._admit():
+            writer.write(_encode(_error(None, -32000, "Too many connections")))
+            await _close_writer(writer)
+            return
+
+        session = self.registry.open(pinned=True)
+        # Уведомления о подписках пишутся в соединение из потока, выполняющего запрос
+        loop = asyncio.get_running_loop()
+        session.state["notify"] = lambda data: loop.call_soon_threadsafe(writer.write, data)
+        slots = asyncio.Semaphore(self.max_in_flight)
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def run(line: bytes):
+            try:
+                response = await self.execute(session, line)
+                if response is not None:
+                    async with write_lock:
+                        writer.write(response)
+                        await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                slots.release()
+
+        try:
+            while True:
+                # Не читаем следующий запрос, пока у соединения нет свободного слота
+                await slots.acquire()
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    slots.release()
+                    break
+                if not line:
+                    slots.release()
+                    break
+                if not line.strip():
+                    slots.release()
+                    continue
+                task = asyncio.create_task(run(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            self.connections -= 1
+            self.registry.close(session.session_id)
+            await _close_writer(writer)
+
+
+class MCPHttpServer(MCPNetworkServer):
+    """Streamable HTTP: POST /mcp с JSON-RPC телом, сессия в заголовке Mcp-Session-Id"""
+
+    endpoint = "/mcp"
+
+    async def serve(self, host: str, port: int) -> asyncio.base_events.Server:
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if not self._admit():
+            await self._respond(writer, 503, _encode(_error(None, -32000, "Too many connections")),
+                                keep_alive=False)
+            await _close_writer(writer)
+            return
+
+        try:
+            # HTTP/1.1 keep-alive: запросы одного соединения обрабатываются по очереди
+            while True:
+                try:
+                    request = await _read_http_request(reader)
+                except BodyTooLarge:
+                    # Тело не читаем, поэтому соединение дальше не используется
+                    error = _error(None, INVALID_REQUEST, "Request too large")
+                    error["error"]["data"] = {"reason": "too_large", "maxBytes": MAX_MESSAGE_BYTES}
+                    await self._respond(writer, 413, _encode(error), keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._handle_http(writer, method, path, headers, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self.connections -= 1
+            await _close_writer(writer)
+
+    async def _handle_http(self, writer, method: str, path: str, headers: Dict[str, str],
+                           body: bytes, keep_alive: bool):
+        if path.split("?", 1)[0] != self.endpoint:
+            await self._respond(writer, 404, b"", keep_alive)
+            return
+
+        session_id = headers.get("mcp-session-id")
+
+        if method == "DELETE":
+            status = 204 if session_id and self.registry.close(session_id) else 404
+            await self._respond(writer, status, b"", keep_alive)
+            return
+
+        if method != "POST":
+            await self._respond(writer, 405, b"", keep_alive, {"Allow": "POST, DELETE"})
+            return
+
+        if session_id:
+            session = self.registry.get(session_id)
+            if session is None:
+                await self._respond(writer, 404, _encode(_error(None, -32001, "Session not found")),
+                                    keep_alive)
+                return
+        else:
+            session = self.registry.open()
+
+        response = await self.execute(session, body)
+        extra = {"Mcp-Session-Id": session.session_id}
+        if response is None:
+            # Только уведомления — ответа нет
+            await self._respond(writer, 202, b"", keep_alive, extra)
+        else:
+            await self._respond(writer, 200, response, keep_alive, extra)
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, body: bytes,
+                       keep_alive: bool, headers: Optional[Dict[str, str]] = None):
+        reason = {200: "OK", 202: "Accepted", 204: "No Content", 400: "Bad Request",
+                  404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+                  503: "Service Unavailable"}.get(status, "OK")
+        lines = [
+            f"HTTP/1.1 {status} {reason}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+async def _read_http_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    """Прочитать один HTTP/1.1 запрос (без chunked-тела)"""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    parts = request_line.decode("latin-1").split()
+    if len(parts) < 2:
+        raise ValueError("Некорректная строка запроса")
+    method, path = parts[0].upper(), parts[1]
+
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", "0") or 0)
+    if length > MAX_MESSAGE_BYTES:
+        raise BodyTooLarge("Слишком большое тело запроса")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+def _encode(message: Any) -> bytes:
+    return (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _error(request_id: Any, code: int, message: str) -> Dict:
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {
+            "code": code,
+            "message": message
+        }
+    }
+
+
+async def _close_writer(writer: asyncio.StreamWriter):
+    try:
+        writer.close()
+        await writer.wait_closed()
+    except (ConnectionError, OSError):
+        pass
+
+
+async def serve(args):
+    registry = SessionRegistry(state=args.state, max_sessions=args.max_sessions, idle_timeout=args.session_ttl)
+    options = {
+        "max_connections": args.max_connections,
+        "max_in_flight": args.max_in_flight,
+        "workers": args.workers
+    }
+
+    servers = []
+    if args.tcp:
+        host, _, port = args.tcp.rpartition(":")
+        servers.append(await MCPSocketServer(registry, **options).serve_tcp(host or "127.0.0.1", int(port)))
+        print(f"🔌 TCP: {args.tcp}", file=sys.stderr)
+    if args.unix:
+        servers.append(await MCPSocketServer(registry, **options).serve_unix(args.unix))
+        print(f"🔌 Unix-сокет: {args.unix}", file=sys.stderr)
+    if args.http:
+        host, _, port = args.http.rpartition(":")
+        servers.append(await MCPHttpServer(registry, **options).serve(host or "127.0.0.1", int(port)))
+        print(f"🌐 HTTP: http://{args.http}{MCPHttpServer.endpoint}", file=sys.stderr)
+
+    if not servers:
+        raise SystemExit("Укажите хотя бы один транспорт: --tcp, --unix или --http")
+
+    await asyncio.gather(*(server.serve_forever() for server in servers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сетевые транспорты Personal Assistant MCP Server")
+    parser.add_argument("--tcp", help="host:port для JSON-RPC поверх TCP")
+    parser.add_argument("--unix", help="путь к Unix-сокету")
+    parser.add_argument("--http", help="host:port для streamable HTTP")
+    parser.add_argument("--state", choices=["shared", "session"], default="shared",
+                        help="общее состояние или отдельное для каждой сессии")
+    parser.add_argument("--max-connections", type=int, default=1000)
+    parser.add_argument("--max-sessions", type=int, default=256)
+    parser.add_argument("--session-ttl", type=float, default=1800,
+                        help="секунд простоя, после которых HTTP сессия без DELETE закрывается")
+    parser.add_argument("--max-in-flight", type=int, default=16,
+                        help="одновременно выполняемых запросов на соединение")
+    parser.add_argument("--workers", type=int, default=8, help="потоков для выполнения запросов")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -4,38 +4,76 @@ OpenRouter MCP Client
 Клиент для подключения MCP сервера к OpenRouter API
 """
 
+import argparse
 import json
 import asyncio
-import subprocess
 import sys
-from typing import Dict, List, Any, Optional
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple
 import aiohttp
 import os
 from datetime import datetime
 from dotenv import load_dotenv
 
+from completion_cache import CompletionCache, completion_key
+from mcp_cancellation import DEADLINE_EXCEEDED
+from mcp_connection import make_request, register_progress, unregister_progress
+from mcp_metrics import MetricsRegistry
+from mcp_pool import MCPServerPool
+from mcp_supervisor import MCPSupervisor
+from prompt_cache import PromptCachePlanner, usage_cache_stats
+from upstream_resilience import ModelSelector, RetryPolicy, parse_retry_after
+
 class OpenRouterMCPClient:
     """Клиент для интеграции MCP сервера с OpenRouter"""
     
-    def __init__(self, api_key: str, model: str = "anthropic/claude-3.5-sonnet"):
+    def __init__(self, api_key: str, model: str = "anthropic/claude-3.5-sonnet", pool_size: int = 0):
         self.api_key = api_key
         self.model = model
         self.base_url = "https://openrouter.ai/api/v1"
-        self.mcp_process = None
+        # pool_size > 1 — пул из нескольких процессов MCP сервера вместо одного
+        self.pool_size = pool_size
+        # Супервизор перезапускает упавший сервер вместо отказа до конца сессии
+        self.mcp_connection: Optional[MCPSupervisor] = None
+        self.mcp_pool: Optional[MCPServerPool] = None
         self.available_tools = []
         self.conversation_history = []
+        # HTTP сессия создается при первом запросе и общая для всех диалогов;
+        # max_connections — сколько запросов к upstream одновременно
+        self._http: Optional[aiohttp.ClientSession] = None
+        self.max_connections = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "32"))
+        # Время MCP и OpenRouter по отдельности; turn_metrics — последние ходы диалога
+        self.metrics = MetricsRegistry(namespace="mcp_client")
+        self.turn_metrics = deque(maxlen=100)
+        # Дедлайн MCP запроса (сек): сервер получает его в _meta.timeoutMs
+        # и отменяет работу сам; 0 — без ограничения
+        self.request_timeout = float(os.getenv("MCP_REQUEST_TIMEOUT", "30")) or None
+        # Кэш ответов upstream (OPENROUTER_CACHE=cache|record|replay) и одинаковые запросы в полете
+        self.completion_cache = CompletionCache.from_env()
+        self._inflight_completions: Dict[str, asyncio.Future] = {}
+        # Повторы, hedged-запросы (OPENROUTER_HEDGE=1) и запасные модели (OPENROUTER_FALLBACK_MODELS)
+        self.retry_policy = RetryPolicy.from_env()
+        self.model_selector = ModelSelector.from_env(model)
+        self.hedge_requests = os.getenv("OPENROUTER_HEDGE", "0") not in ("", "0", "false")
+        # Стабильный префикс запроса и метки cache_control (OPENROUTER_PROMPT_CACHE=auto|on|off)
+        self.prompt_cache = PromptCachePlanner.from_env()
         
     async def start_mcp_server(self):
-        """Запуск MCP сервера в subprocess"""
+        """Запуск MCP сервера (или пула серверов) в subprocess"""
         try:
-            self.mcp_process = subprocess.Popen(
-                [sys.executable, "standard_mcp_server.py"],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                cwd=os.path.dirname(os.path.abspath(__file__))
-            )
+            if self.pool_size > 1:
+                self.mcp_pool = MCPServerPool(self.pool_size)
+                await self.mcp_pool.start()
+            else:
+                self.mcp_connection = MCPSupervisor()
+                await self.mcp_connection.start()
+            
+            # Холодный старт каждого процесса (до ответа на initialize) — в метрики клиента
+            connections = [w.connection for w in self.mcp_pool.workers] if self.mcp_pool else [self.mcp_connection]
+            for connection in connections:
+                if connection.startup_seconds is not None:
+                    self.metrics.record("startup", "mcp_server", connection.startup_seconds)
             
             # Инициализация MCP соединения
             await self.initialize_mcp()
@@ -44,89 +82,80 @@ class OpenRouterMCPClient:
             print(f"❌ Ошибка запуска MCP сервера: {e}")
             raise
     
+    def _make_request(self, method: str, params: Optional[Dict] = None) -> Dict:
+        """Сформировать JSON-RPC запрос с уникальным id"""
+        return make_request(method, params)
+
+    def _mcp_active(self) -> bool:
+        if self.mcp_pool:
+            return any(worker.is_alive for worker in self.mcp_pool.workers)
+        return self.mcp_connection is not None and self.mcp_connection.available
+
     async def initialize_mcp(self):
         """Инициализация MCP соединения"""
-        # Отправляем initialize запрос
-        init_request = {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "initialize",
-            "params": {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {
-                    "tools": {}
-                },
-                "clientInfo": {
-                    "name": "OpenRouter MCP Client",
-                    "version": "1.0.0"
-                }
-            }
-        }
-        
-        response = await self.send_mcp_request(init_request)
-        
-        # Получаем список доступных инструментов
-        tools_request = {
-            "jsonrpc": "2.0",
-            "id": 2,
-            "method": "tools/list"
-        }
-        
-        tools_response = await self.send_mcp_request(tools_request)
-        if tools_response and "result" in tools_response:
-            self.available_tools = tools_response["result"].get("tools", [])
+        # Пул инициализирует каждый процесс сам при запуске
+        if self.mcp_pool:
+            self.available_tools = self.mcp_pool.tools
+            return
+
+        # Рукопожатие (initialize + tools/list одним batch) выполняет супервизор при запуске
+        self.available_tools = self.mcp_connection.tools
     
-    async def send_mcp_request(self, request: Dict) -> Optional[Dict]:
-        """Отправка запроса к MCP серверу"""
+    async def send_mcp_request(self, request: Any) -> Optional[Any]:
+        """Отправка запроса (или batch-массива) к MCP серверу"""
+        method = "batch" if isinstance(request, list) else request.get("method", "")
+        started = time.perf_counter()
         try:
-            if not self.mcp_process:
-                raise Exception("MCP сервер не запущен")
-            
-            # Проверяем, что процесс еще жив
-            if self.mcp_process.poll() is not None:
-                stderr_output = self.mcp_process.stderr.read()
-                raise Exception(f"MCP сервер завершился с ошибкой: {stderr_output}")
-            
-            # Отправляем запрос
-            request_str = json.dumps(request) + "\n"
-            self.mcp_process.stdin.write(request_str)
-            self.mcp_process.stdin.flush()
+            if self.mcp_pool:
+                response = await self.mcp_pool.request(request, self.request_timeout)
+            else:
+                if not self.mcp_connection:
+                    raise Exception("MCP сервер не запущен")
+                
+                # Упавший процесс перезапускается супервизором внутри request
+                response = await self.mcp_connection.request(request, self.request_timeout)
             
-            # Читаем ответ
-            response_str = self.mcp_process.stdout.readline()
+            self.metrics.record("mcp", method, time.perf_counter() - started)
+            return response
             
-            if response_str and response_str.strip():
-                try:
-                    response = json.loads(response_str.strip())
-                    return response
-                except json.JSONDecodeError as e:
-                    print(f"❌ Ошибка парсинга ответа MCP: {e}", file=sys.stderr)
-                    return None
-            else:
-                print("❌ Пустой ответ от MCP сервера", file=sys.stderr)
-                return None
+        except TimeoutError as e:
+            # Сервер уже получил notifications/cancelled; модели уходит обычная ошибка инструмента
+            self.metrics.record("mcp", method, time.perf_counter() - started, error=True)
+            print(f"⏱️ {e}", file=sys.stderr)
+            error = {"code": DEADLINE_EXCEEDED, "message": str(e)}
+            if isinstance(request, list):
+                return [{"jsonrpc": "2.0", "id": r["id"], "error": error} if "id" in r else None for r in request]
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": error}
             
         except Exception as e:
+            self.metrics.record("mcp", method, time.perf_counter() - started, error=True)
             print(f"❌ Ошибка MCP запроса: {e}", file=sys.stderr)
             return None
     
-    async def call_tool(self, tool_name: str, arguments: Dict) -> str:
-        """Вызов инструмента через MCP"""
-        # Проверяем состояние процесса
-        if not self.mcp_process or self.mcp_process.poll() is not None:
-            return "❌ MCP сервер не активен"
-        
-        tool_request = {
-            "jsonrpc": "2.0",
-            "id": 3,
-            "method": "tools/call",
-            "params": {
-                "name": tool_name,
-                "arguments": arguments
-            }
-        }
-        
-        response = await self.send_mcp_request(tool_request)
+    async def send_batch(self, requests: List[Dict]) -> List[Optional[Dict]]:
+        """Отправка нескольких запросов одним JSON-RPC batch-массивом.
+
+        Возвращает ответы в порядке запросов (None, если ответа нет).
+        """
+        if not requests:
+            return []
+
+        responses = await self.send_mcp_request(requests)
+        return responses if responses is not None else [None] * len(requests)
+
+    async def mcp_health(self) -> List[Dict[str, Any]]:
+        """Состояние процессов MCP сервера (ping каждого процесса)"""
+        if self.mcp_pool:
+            return await self.mcp_pool.health_check()
+        response = await self.send_mcp_request(self._make_request("ping"))
+        return [{
+            "worker": 0,
+            "pid": self.mcp_connection.pid if self.mcp_connection else None,
+            "alive": response is not None and "result" in response
+        }]
+
+    def _tool_result_text(self, response: Optional[Dict]) -> str:
+        """Извлечь текст результата из ответа tools/call"""
         if response and "result" in response:
             content = response["result"].get("content", [])
             if content and len(content) > 0:
@@ -136,6 +165,85 @@ class OpenRouterMCPClient:
             return f"❌ Ошибка сервера: {error.get('message', 'Неизвестная ошибка')}"
         
         return "❌ Ошибка выполнения инструмента"
+
+    async def call_tool(self, tool_name: str, arguments: Dict) -> str:
+        """Вызов инструмента через MCP"""
+        # Проверяем состояние процесса
+        if not self._mcp_active():
+            return "❌ MCP сервер не активен"
+        
+        tool_request = self._make_request("tools/call", {
+            "name": tool_name,
+            "arguments": arguments
+        })
+        
+        response = await self.send_mcp_request(tool_request)
+        return self._tool_result_text(response)
+
+    async def call_tool_stream(self, tool_name: str, arguments: Dict) -> AsyncIterator[str]:
+        """Вызов инструмента с получением результата по частям (см. stream_mcp_request)"""
+        async for chunk in self.stream_mcp_request("tools/call", {"name": tool_name, "arguments": arguments}):
+            yield chunk
+
+    async def read_resource_stream(self, uri: str) -> AsyncIterator[str]:
+        """Чтение ресурса по частям (tasks://list, calculator://history)"""
+        async for chunk in self.stream_mcp_request("resources/read", {"uri": uri}):
+            yield chunk
+
+    async def stream_mcp_request(self, method: str, params: Dict) -> AsyncIterator[str]:
+        """Запрос с progressToken: фрагменты результата отдаются по мере поступления.
+
+        Сервер присылает части в notifications/progress, поэтому ни одна строка
+        протокола не превышает размер части, а потребитель начинает работу до
+        завершения запроса. Если сервер не умеет отдавать результат частями,
+        весь результат отдается одним фрагментом.
+        """
+        if not self._mcp_active():
+            yield "❌ MCP сервер не активен"
+            return
+
+        chunks: asyncio.Queue = asyncio.Queue()
+        token = register_progress(lambda progress: chunks.put_nowait(progress.get("message", "")))
+        request = self._make_request(method, {**params, "_meta": {"progressToken": token}})
+        response_task = asyncio.create_task(self.send_mcp_request(request))
+        try:
+            while True:
+                next_chunk = asyncio.ensure_future(chunks.get())
+                await asyncio.wait({next_chunk, response_task}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_chunk.done():
+                    next_chunk.cancel()
+                    break
+                yield next_chunk.result()
+            # Уведомления приходят раньше ответа — дочитываем то, что уже в очереди
+            while not chunks.empty():
+                yield chunks.get_nowait()
+
+            response = response_task.result()
+            result = response.get("result", {}) if response else {}
+            if "streamed" not in result.get("_meta", {}):
+                if method == "resources/read" and result.get("contents"):
+                    yield result["contents"][0].get("text", "")
+                else:
+                    yield self._tool_result_text(response)
+        finally:
+            unregister_progress(token)
+            if not response_task.done():
+                response_task.cancel()
+
+    async def call_tools_batch(self, calls: List[Tuple[str, Dict]]) -> List[str]:
+        """Вызов нескольких инструментов за один round trip"""
+        if len(calls) == 1:
+            return [await self.call_tool(*calls[0])]
+
+        if not self._mcp_active():
+            return ["❌ MCP сервер не активен"] * len(calls)
+
+        requests = [
+            self._make_request("tools/call", {"name": name, "arguments": arguments})
+            for name, arguments in calls
+        ]
+        responses = await self.send_batch(requests)
+        return [self._tool_result_text(response) for response in responses]
     
     def format_tools_for_openrouter(self) -> List[Dict]:
         """Форматирование инструментов для OpenRouter API"""
@@ -167,11 +275,213 @@ class OpenRouterMCPClient:
         
         return formatted_tools
     
-    async def chat_with_openrouter(self, message: str) -> str:
-        """Отправка запроса к OpenRouter с поддержкой инструментов"""
+    def _request_tools(self) -> List[Dict]:
+        """Инструменты для запроса: собираются заново, только если сменился список сервера"""
+        return self.prompt_cache.tools(self.available_tools, self.format_tools_for_openrouter)
+
+    def _record_usage(self, result: Dict, turn: Dict):
+        """Попадание в кэш промпта провайдера по usage ответа"""
+        prompt_tokens, cached, written = usage_cache_stats(result.get("usage"))
+        if not prompt_tokens:
+            return
+        turn["prompt_tokens"] += prompt_tokens
+        turn["prompt_cached_tokens"] += cached
+        turn["prompt_cache_write_tokens"] += written
+        turn["prompt_cache_hits" if cached else "prompt_cache_misses"] += 1
+        # Доля промпта, которую провайдер не обрабатывал заново (экономия prefill)
+        turn["prompt_cache_savings"] = turn["prompt_cached_tokens"] / turn["prompt_tokens"]
+        self.metrics.record("prompt_cache", "hit" if cached else "miss", 0.0)
+
+    async def _post_completion(self, session: aiohttp.ClientSession, headers: Dict,
+                               payload: Dict, turn: Dict) -> Tuple[int, str]:
+        """POST /chat/completions через кэш ответов и single-flight.
+
+        Одинаковые запросы, отправленные одновременно, ждут один ответ upstream
+        вместо того, чтобы оплачивать каждый.
+        """
+        key = completion_key(payload)
+        if self.completion_cache.enabled:
+            cached = self.completion_cache.get(key)
+            if cached is not None:
+                turn["upstream_cached"] += 1
+                self.metrics.record("upstream_cache", "hit", 0.0)
+                return cached
+            if self.completion_cache.mode == "replay":
+                self.metrics.record("upstream_cache", "miss", 0.0, error=True)
+                return 404, f"Ответ не записан (replay): {key}"
+
+        inflight = self._inflight_completions.get(key)
+        if inflight is not None:
+            turn["upstream_deduplicated"] += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight_completions[key] = future
+        try:
+            status, body = await self._request_completion(session, headers, payload, turn)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение могли не забрать (ожидающих нет) — не предупреждаем об этом в логах
+            future.exception()
+            raise
+        finally:
+            self._inflight_completions.pop(key, None)
+        future.set_result((status, body))
+        self.completion_cache.put(key, payload, status, body)
+        return status, body
+
+    async def _request_completion(self, session: aiohttp.ClientSession, headers: Dict,
+                                  payload: Dict, turn: Dict) -> Tuple[int, str]:
+        """Устойчивый запрос к upstream: модели по очереди, повторы с backoff, hedging.
+
+        Для каждой модели (основная, затем запасные в порядке ModelSelector)
+        делается до max_attempts попыток; повторяются только временные ошибки,
+        пауза учитывает Retry-After. Если Retry-After дольше max_delay, модель
+        пропускается (без запасных — возвращается ее ответ). Ошибка соединения
+        после всех попыток пробрасывается, как и раньше.
+        """
+        status, body, error = 0, "", None
+        for index, model in enumerate(self.model_selector.order(payload.get("model"))):
+            if index:
+                turn["upstream_fallbacks"] += 1
+                self.metrics.record("upstream_fallback", model, 0.0)
+            attempt_payload = payload if model == payload.get("model") else {**payload, "model": model}
+            for attempt in range(self.retry_policy.max_attempts):
+                try:
+                    status, body, retry_after = await self._hedged_completion(session, headers, attempt_payload, turn)
+                    error = None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    status, body, retry_after, error = 0, str(e), None, e
+                if status == 200:
+                    return status, body
+                if not self.retry_policy.should_retry(status):
+                    return status, body
+                if attempt + 1 < self.retry_policy.max_attempts:
+                    delay = self.retry_policy.delay(attempt, retry_after)
+                    if delay is None:
+                        # Retry-After дольше OPENROUTER_RETRY_MAX_MS — сразу к запасной модели
+                        break
+                    turn["upstream_retries"] += 1
+                    await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return status, body
+
+    async def _hedged_completion(self, session: aiohttp.ClientSession, headers: Dict,
+                                 payload: Dict, turn: Dict) -> Tuple[int, str, Optional[float]]:
+        """Одна попытка; если ответа нет дольше p95 модели — дубликат, побеждает первый успешный"""
+        delay = self.model_selector.hedge_delay(payload["model"]) if self.hedge_requests else None
+        first = asyncio.ensure_future(self._send_completion(session, headers, payload, turn))
+        if delay is None:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        turn["upstream_hedged"] += 1
+        pending = {first, asyncio.ensure_future(self._send_completion(session, headers, payload, turn))}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result()[0] == 200:
+                        return task.result()
+                if not pending:
+                    # Обе копии не удались — вернуть результат последней
+                    return done.pop().result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _send_completion(self, session: aiohttp.ClientSession, headers: Dict,
+                               payload: Dict, turn: Dict) -> Tuple[int, str, Optional[float]]:
+        """POST /chat/completions с замером времени до первого байта и полного ответа"""
+        started = time.perf_counter()
+        try:
+            async with session.post(
+                f"{self.base_url}/chat/completions",
+                headers=headers,
+                json=payload
+            ) as response:
+                # Заголовки получены — это время до первого байта ответа
+                ttfb = time.perf_counter() - started
+                body = await response.text()
+                status = response.status
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.model_selector.record(payload["model"], time.perf_counter() - started, False)
+            raise
         
+        elapsed = time.perf_counter() - started
+        self.metrics.record("upstream", "chat/completions", elapsed, status != 200)
+        self.metrics.record("upstream_ttfb", "chat/completions", ttfb)
+        self.metrics.record_bytes("upstream", "chat/completions", bytes_in=len(body))
+        self.model_selector.record(payload["model"], elapsed, status == 200)
+        
+        turn["upstream_requests"] += 1
+        turn["upstream_seconds"] += elapsed
+        if turn["ttfb_seconds"] is None:
+            turn["ttfb_seconds"] = ttfb
+        return status, body, retry_after
+
+    @staticmethod
+    def _new_turn() -> Dict[str, Any]:
+        """Счетчики одного хода диалога (см. turn_metrics)"""
+        return {
+            "started_at": datetime.now().isoformat(),
+            "upstream_requests": 0,
+            "upstream_seconds": 0.0,
+            "ttfb_seconds": None,
+            "upstream_cached": 0,
+            "upstream_deduplicated": 0,
+            "upstream_retries": 0,
+            "upstream_hedged": 0,
+            "upstream_fallbacks": 0,
+            "prompt_tokens": 0,
+            "prompt_cached_tokens": 0,
+            "prompt_cache_write_tokens": 0,
+            "prompt_cache_hits": 0,
+            "prompt_cache_misses": 0,
+            "prompt_cache_savings": 0.0,
+            "mcp_calls": 0,
+            "mcp_seconds": 0.0
+        }
+
+    async def chat_with_openrouter(self, message: str, history: Optional[List[Dict]] = None) -> str:
+        """Отправка запроса к OpenRouter с поддержкой инструментов"""
+        response, _ = await self.chat_turn(message, history)
+        return response
+
+    async def chat_turn(self, message: str, history: Optional[List[Dict]] = None) -> Tuple[str, Dict]:
+        """Один ход диалога: ответ и счетчики хода.
+
+        history — история диалога (по умолчанию conversation_history); отдельные
+        истории позволяют вести несколько диалогов одновременно (ConversationManager).
+        """
+        turn = self._new_turn()
+        started = time.perf_counter()
+        try:
+            response = await self._chat_turn(message, turn, self.conversation_history if history is None else history)
+            return response, turn
+        finally:
+            turn["total_seconds"] = time.perf_counter() - started
+            self.metrics.record("turn", "chat", turn["total_seconds"])
+            self.turn_metrics.append(turn)
+
+    def _http_session(self) -> aiohttp.ClientSession:
+        """Общая HTTP сессия (пул соединений) для всех диалогов клиента"""
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections)
+            )
+        return self._http
+
+    async def _chat_turn(self, message: str, turn: Dict, history: List[Dict]) -> str:
         # Добавляем сообщение пользователя
-        self.conversation_history.append({
+        history.append({
             "role": "user",
             "content": message
         })
@@ -184,99 +494,115 @@ class OpenRouterMCPClient:
             "X-Title": "MCP Demo Client"
         }
         
+        tools = self._request_tools()
         payload = {
             "model": self.model,
-            "messages": self.conversation_history,
-            "tools": self.format_tools_for_openrouter(),
+            "messages": self.prompt_cache.messages(self.model, history),
+            "tools": tools,
             "tool_choice": "auto"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload
-            ) as response:
-                
-                if response.status != 200:
-                    error_text = await response.text()
-                    return f"❌ Ошибка OpenRouter: {response.status} - {error_text}"
+        session = self._http_session()
+        status, body = await self._post_completion(session, headers, payload, turn)
+        
+        if status != 200:
+            return f"❌ Ошибка OpenRouter: {status} - {body}"
+        
+        try:
+            result = json.loads(body)
+        except json.JSONDecodeError as e:
+            return f"❌ Ошибка парсинга ответа OpenRouter: {e}"
+        self._record_usage(result, turn)
+        
+        if "choices" not in result or len(result["choices"]) == 0:
+            return "❌ Пустой ответ от OpenRouter"
+        
+        choice = result["choices"][0]
+        message_result = choice["message"]
+        
+        # Добавляем ответ ассистента в историю
+        history.append(message_result)
+        
+        # Проверяем, нужно ли вызвать инструменты
+        if "tool_calls" in message_result:
+            tool_results = []
+            parsed_calls = []
+            
+            for tool_call in message_result["tool_calls"]:
+                func_name = tool_call["function"]["name"]
+                func_args_str = tool_call["function"]["arguments"]
                 
                 try:
-                    result = await response.json()
+                    # Обрабатываем пустые аргументы
+                    if not func_args_str or func_args_str.strip() == "":
+                        func_args = {}
+                    else:
+                        func_args = json.loads(func_args_str)
                 except json.JSONDecodeError as e:
-                    return f"❌ Ошибка парсинга ответа OpenRouter: {e}"
-                
-                if "choices" not in result or len(result["choices"]) == 0:
-                    return "❌ Пустой ответ от OpenRouter"
-                
-                choice = result["choices"][0]
-                message_result = choice["message"]
+                    parsed_calls.append((tool_call, None, f"❌ Ошибка парсинга аргументов: {e}"))
+                else:
+                    parsed_calls.append((tool_call, func_args, None))
+            
+            # Все инструменты этого хода вызываются одним batch-запросом к MCP
+            batch_calls = [
+                (tool_call["function"]["name"], func_args)
+                for tool_call, func_args, error in parsed_calls if error is None
+            ]
+            mcp_started = time.perf_counter()
+            batch_results = iter(await self.call_tools_batch(batch_calls) if batch_calls else [])
+            turn["mcp_calls"] += len(batch_calls)
+            turn["mcp_seconds"] += time.perf_counter() - mcp_started
+            
+            for tool_call, func_args, error in parsed_calls:
+                func_name = tool_call["function"]["name"]
+                tool_result = error if error is not None else next(batch_results)
                 
-                # Добавляем ответ ассистента в историю
-                self.conversation_history.append(message_result)
+                tool_results.append(f"Результат {func_name}: {tool_result}")
                 
-                # Проверяем, нужно ли вызвать инструменты
-                if "tool_calls" in message_result:
-                    tool_results = []
+                # Добавляем результат инструмента в историю
+                history.append({
+                    "role": "tool",
+                    "tool_call_id": tool_call["id"],
+                    "content": tool_result
+                })
+            
+            # Получаем финальный ответ после выполнения инструментов
+            final_payload = {
+                "model": self.model,
+                "messages": self.prompt_cache.messages(self.model, history)
+            }
+            if self.prompt_cache.enabled:
+                # Те же инструменты, что и в первом запросе: без них префикс (инструменты идут
+                # первыми) не совпадет с закэшированным и промпт обработается заново.
+                # Повторные вызовы в этом ходу не выполняются — модель должна ответить текстом
+                final_payload["tools"] = tools
+                final_payload["tool_choice"] = "none"
+            
+            final_status, final_body = await self._post_completion(session, headers, final_payload, turn)
+            
+            if final_status == 200:
+                try:
+                    final_result = json.loads(final_body)
+                    self._record_usage(final_result, turn)
                     
-                    for tool_call in message_result["tool_calls"]:
-                        func_name = tool_call["function"]["name"]
-                        func_args_str = tool_call["function"]["arguments"]
-                        
-                        try:
-                            # Обрабатываем пустые аргументы
-                            if not func_args_str or func_args_str.strip() == "":
-                                func_args = {}
-                            else:
-                                func_args = json.loads(func_args_str)
-                        except json.JSONDecodeError as e:
-                            tool_result = f"❌ Ошибка парсинга аргументов: {e}"
-                        else:
-                            # Вызываем инструмент через MCP
-                            tool_result = await self.call_tool(func_name, func_args)
-                        
-                        tool_results.append(f"Результат {func_name}: {tool_result}")
-                        
-                        # Добавляем результат инструмента в историю
-                        self.conversation_history.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call["id"],
-                            "content": tool_result
+                    if "choices" in final_result and len(final_result["choices"]) > 0:
+                        # Инструменты в финальном запросе есть только ради префикса;
+                        # повторные вызовы инструментов в этом ходу не выполняются
+                        final_message = final_result["choices"][0]["message"].get("content") or "Нет ответа"
+                        history.append({
+                            "role": "assistant",
+                            "content": final_message
                         })
-                    
-                    # Получаем финальный ответ после выполнения инструментов
-                    final_payload = {
-                        "model": self.model,
-                        "messages": self.conversation_history
-                    }
-                    
-                    async with session.post(
-                        f"{self.base_url}/chat/completions",
-                        headers=headers,
-                        json=final_payload
-                    ) as final_response:
-                        
-                        if final_response.status == 200:
-                            try:
-                                final_result = await final_response.json()
-                                
-                                if "choices" in final_result and len(final_result["choices"]) > 0:
-                                    final_message = final_result["choices"][0]["message"]["content"]
-                                    self.conversation_history.append({
-                                        "role": "assistant",
-                                        "content": final_message
-                                    })
-                                    return final_message
-                                else:
-                                    return "❌ Пустой финальный ответ"
-                            except json.JSONDecodeError as e:
-                                return f"❌ Ошибка парсинга финального ответа: {e}"
-                        else:
-                            return f"❌ Ошибка финального запроса: {final_response.status}"
-                
-                return message_result.get("content", "Нет ответа")
-    
+                        return final_message
+                    else:
+                        return "❌ Пустой финальный ответ"
+                except json.JSONDecodeError as e:
+                    return f"❌ Ошибка парсинга финального ответа: {e}"
+            else:
+                return f"❌ Ошибка финального запроса: {final_status}"
+        
+        return message_result.get("content", "Нет ответа")
+
     async def interactive_chat(self):
         """Интерактивный чат с пользователем"""
         print("\n" + "="*50)
@@ -309,12 +635,39 @@ class OpenRouterMCPClient:
     
     async def cleanup(self):
         """Очистка ресурсов"""
-        if self.mcp_process:
-            self.mcp_process.terminate()
-            self.mcp_process = None
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+        if self.mcp_pool:
+            await self.mcp_pool.close()
+            self.mcp_pool = None
+        if self.mcp_connection:
+            await self.mcp_connection.close()
+            self.mcp_connection = None
+
+async def run_batch_file(client: OpenRouterMCPClient, input_path: str, output_path: str, concurrency: int):
+    """Пакетный режим: промпты из JSONL, ответы с временем каждого хода в JSONL"""
+    # Импорт здесь: conversation_manager сам импортирует этот модуль
+    from conversation_manager import ConversationManager, batch_summary, read_batch, write_batch
+
+    items = read_batch(input_path)
+    manager = ConversationManager(client, concurrency=concurrency)
+    print(f"📦 Пакет: {len(items)} промптов, параллельно до {manager.concurrency} ходов")
+    started = time.perf_counter()
+    results = await manager.run_batch(items)
+    summary = batch_summary(results, time.perf_counter() - started)
+    write_batch(output_path, results)
+    print(f"✅ Готово за {summary['seconds']} сек ({summary['turns_per_second']} ходов/сек), "
+          f"ошибок: {summary['errors']}; результаты: {output_path}")
 
 async def main():
     """Главная функция"""
+    parser = argparse.ArgumentParser(description="OpenRouter MCP клиент")
+    parser.add_argument("--batch", metavar="PROMPTS.jsonl", help="пакетный режим вместо интерактивного чата")
+    parser.add_argument("--output", default="results.jsonl", help="куда писать результаты пакета")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("OPENROUTER_CONCURRENCY", "8")),
+                        help="сколько ходов разных диалогов выполнять одновременно")
+    args = parser.parse_args()
     
     # Загружаем переменные из .env файла
     load_dotenv()
@@ -331,15 +684,19 @@ async def main():
     # Создаем клиент
     client = OpenRouterMCPClient(
         api_key=api_key,
-        model="anthropic/claude-3.5-sonnet"  # можно поменять модель
+        model=os.getenv("OPENROUTER_MODEL", "anthropic/claude-3.5-sonnet"),
+        pool_size=int(os.getenv("MCP_POOL_SIZE", "0"))
     )
     
     try:
         # Запускаем MCP сервер
         await client.start_mcp_server()
         
-        # Запускаем интерактивный чат
-        await client.interactive_chat()
+        if args.batch:
+            await run_batch_file(client, args.batch, args.output, args.concurrency)
+        else:
+            # Запускаем интерактивный чат
+            await client.interactive_chat()
         
     finally:
         # Очищаем ресурсы
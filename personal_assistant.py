@@ -4,100 +4,311 @@ Personal Assistant MCP Server
 Демонстрационный проект, показывающий возможности MCP протокола
 """
 
+import asyncio
+import itertools
 import json
-import random
-import string
-import hashlib
+import os
+import re
+import sys
+import weakref
 from datetime import datetime
-from typing import Dict, List, Any
-from mcp.server.fastmcp import FastMCP
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Sequence
+from mcp.server.fastmcp import Context, FastMCP
+from mcp.server.fastmcp.resources import ResourceTemplate
+from mcp.shared.exceptions import McpError
+from mcp.types import INVALID_PARAMS, ErrorData
+
+from calc_analytics import format_stats, parse_window
+from mcp_cancellation import CancelToken, IsolatedEvaluator, RequestCancelled
+from mcp_offload import ToolOffloader
+from mcp_profiling import SlowRequestProfiler
+from prompt_cache import VersionedCache
+from task_tenants import DEFAULT_TENANT, TaskNamespace, TenantLimitError, TenantRegistry, parse_due_date
 
 # Создаем MCP сервер
 mcp = FastMCP("Personal Assistant")
 
-# Хранилище данных в памяти (в реальном проекте использовалась бы БД)
-tasks_storage: List[Dict[str, Any]] = []
-calculator_history: List[Dict[str, Any]] = []
+# Профилирование медленных вызовов (MCP_PROFILE=1 или инструмент set_profiling)
+profiler = SlowRequestProfiler.from_env()
+
+# Тяжелые инструменты (offloader.tool) выполняются вне цикла событий (MCP_OFFLOAD),
+# дешевые и инструменты задач — в нем, как раньше
+offloader = ToolOffloader.from_env()
+
+# Хранилище данных в памяти (в реальном проекте использовалась бы БД).
+# У каждого арендатора свое пространство; арендатор выбирается через _meta.tenant
+tenants = TenantRegistry.from_env()
+tasks_storage: List[Dict[str, Any]] = tenants.get(DEFAULT_TENANT).tasks
+calculator_history: List[Dict[str, Any]] = tenants.get(DEFAULT_TENANT).calculator_history
+
+# Готовый текст промптов: task_summary пересчитывается, только когда меняется версия задач
+prompt_outputs = VersionedCache()
+
+# Арендатор, однажды указанный в запросе, закрепляется за сессией клиента
+_session_tenants: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def _namespace(ctx: Optional[Context] = None) -> TaskNamespace:
+    """Пространство задач арендатора текущего запроса"""
+    if ctx is None:
+        return tenants.get(DEFAULT_TENANT)
+    
+    try:
+        meta = ctx.request_context.meta
+        session = ctx.request_context.session
+    except (AttributeError, ValueError, LookupError):
+        return tenants.get(DEFAULT_TENANT)
+    
+    tenant = getattr(meta, "tenant", None) if meta is not None else None
+    if isinstance(tenant, str) and tenant:
+        try:
+            _session_tenants[session] = tenant
+        except TypeError:
+            pass
+    else:
+        tenant = _session_tenants.get(session, DEFAULT_TENANT)
+    return tenants.get(tenant)
+
+# Выражения со степенью считаются в отдельном процессе, который убивается по дедлайну
+evaluator = IsolatedEvaluator()
+
+def _cancel_token(ctx: Optional[Context] = None) -> CancelToken:
+    """Токен с дедлайном запроса из _meta.timeoutMs.
+
+    Синхронный инструмент выполняется в цикле событий или в пуле offloader,
+    notifications/cancelled до него не доходит — остается только дедлайн.
+    """
+    try:
+        timeout_ms = getattr(ctx.request_context.meta, "timeoutMs", None)
+    except (AttributeError, ValueError, LookupError):
+        timeout_ms = None
+    return CancelToken(timeout_ms / 1000 if isinstance(timeout_ms, (int, float)) else None)
+
+# Размер части потокового результата (символов), см. export_tasks
+STREAM_CHUNK_SIZE = int(os.getenv("MCP_STREAM_CHUNK", 64 * 1024))
+
+# Подписки на ресурсы задач: сессия клиента -> URI
+_subscriptions: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+SUBSCRIBABLE_RESOURCES = ("tasks://list", "tasks://changes")
+
+def _notify_tasks_updated(namespace: TaskNamespace):
+    """Отправить notifications/resources/updated подписанным сессиям арендатора"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Прямой вызов функции (demo_test.py) — уведомлять некого
+        return
+    
+    for session, uris in list(_subscriptions.items()):
+        if _session_tenants.get(session, DEFAULT_TENANT) != namespace.tenant_id:
+            continue
+        for uri in sorted(uris):
+            loop.create_task(session.send_resource_updated(uri))
+
+@mcp._mcp_server.subscribe_resource()
+async def subscribe_resource(uri) -> None:
+    uri = str(uri)
+    if uri.split("?", 1)[0] not in SUBSCRIBABLE_RESOURCES:
+        raise McpError(ErrorData(code=INVALID_PARAMS, message=f"Ресурс не поддерживает подписку: {uri}"))
+    session = mcp._mcp_server.request_context.session
+    _subscriptions.setdefault(session, set()).add(uri)
+
+@mcp._mcp_server.unsubscribe_resource()
+async def unsubscribe_resource(uri) -> None:
+    session = mcp._mcp_server.request_context.session
+    _subscriptions.get(session, set()).discard(str(uri))
+
+# FastMCP 1.x всегда объявляет resources.subscribe=false — включаем, раз обработчик есть
+_get_capabilities = mcp._mcp_server.get_capabilities
+
+def _capabilities_with_subscribe(*args, **kwargs):
+    capabilities = _get_capabilities(*args, **kwargs)
+    if capabilities.resources is not None:
+        capabilities.resources.subscribe = True
+    return capabilities
+
+mcp._mcp_server.get_capabilities = _capabilities_with_subscribe
 
 # =============================================================================
 # TOOLS (Инструменты)
 # =============================================================================
 
 @mcp.tool()
-def add_task(title: str, description: str = "", priority: str = "medium") -> str:
+@profiler.profiled
+def add_task(title: str, description: str = "", priority: str = "medium", due_date: str = "",
+             ctx: Context = None) -> str:
     """Добавить новую задачу в список дел.
     
     Args:
         title: Название задачи
         description: Описание задачи (необязательно)
         priority: Приоритет задачи (low, medium, high)
+        due_date: Срок выполнения: YYYY-MM-DD или YYYY-MM-DDTHH:MM (необязательно)
     """
     if priority not in ["low", "medium", "high"]:
         return "Ошибка: приоритет должен быть low, medium или high"
+    if due_date:
+        try:
+            parse_due_date(due_date)
+        except ValueError:
+            return "Ошибка: срок должен быть в формате YYYY-MM-DD или YYYY-MM-DDTHH:MM"
     
     task = {
-        "id": len(tasks_storage) + 1,
         "title": title,
         "description": description,
         "priority": priority,
         "completed": False,
         "created_at": datetime.now().isoformat()
     }
+    if due_date:
+        task["due_date"] = due_date
     
-    tasks_storage.append(task)
+    namespace = _namespace(ctx)
+    try:
+        namespace.add_task(task)
+    except TenantLimitError as e:
+        return f"❌ Задача не добавлена: {e}"
+    _notify_tasks_updated(namespace)
     return f"✅ Задача '{title}' добавлена с приоритетом {priority}"
 
 @mcp.tool()
-def get_tasks(status: str = "all") -> str:
+@profiler.profiled
+def get_tasks(status: str = "all", ctx: Context = None) -> str:
     """Получить список задач.
     
     Args:
         status: Фильтр по статусу (all, completed, pending)
     """
+    return "".join(_iter_tasks(_namespace(ctx).snapshot().tasks, status))
+
+def _iter_tasks(tasks_storage: Sequence[Dict[str, Any]], status: str) -> Iterator[str]:
+    """Список задач по частям: заголовок, затем по фрагменту на задачу"""
     if not tasks_storage:
-        return "📝 Список задач пуст"
+        yield "📝 Список задач пуст"
+        return
     
-    filtered_tasks = tasks_storage
+    filtered_tasks = iter(tasks_storage)
     if status == "completed":
-        filtered_tasks = [t for t in tasks_storage if t["completed"]]
+        filtered_tasks = (t for t in tasks_storage if t["completed"])
     elif status == "pending":
-        filtered_tasks = [t for t in tasks_storage if not t["completed"]]
+        filtered_tasks = (t for t in tasks_storage if not t["completed"])
     
-    if not filtered_tasks:
-        return f"📝 Нет задач со статусом '{status}'"
+    first = next(filtered_tasks, None)
+    if first is None:
+        yield f"📝 Нет задач со статусом '{status}'"
+        return
     
-    result = f"📋 Список задач ({status}):\n\n"
-    for task in filtered_tasks:
+    yield f"📋 Список задач ({status}):\n\n"
+    for task in itertools.chain([first], filtered_tasks):
         status_icon = "✅" if task["completed"] else "⏳"
         priority_icon = {"high": "🔴", "medium": "🟡", "low": "🟢"}[task["priority"]]
         
-        result += f"{status_icon} {priority_icon} #{task['id']}: {task['title']}\n"
+        result = f"{status_icon} {priority_icon} #{task['id']}: {task['title']}\n"
         if task["description"]:
             result += f"   📄 {task['description']}\n"
+        if task.get("due_date"):
+            result += f"   ⏰ Срок: {task['due_date']}\n"
         result += f"   📅 Создана: {task['created_at'][:10]}\n\n"
+        yield result
+
+def _format_scheduled(task: Dict[str, Any]) -> str:
+    """Задача в ответе next_tasks/overdue_tasks"""
+    priority_icon = {"high": "🔴", "medium": "🟡", "low": "🟢"}[task["priority"]]
+    result = f"{priority_icon} #{task['id']}: {task['title']}\n"
+    if task.get("due_date"):
+        result += f"   ⏰ Срок: {task['due_date']}\n"
+    return result + "\n"
+
+@mcp.tool()
+@profiler.profiled
+def next_tasks(k: int = 5, ctx: Context = None) -> str:
+    """Что делать дальше: k незавершенных задач по приоритету, затем по сроку.
     
-    return result
+    Args:
+        k: Сколько задач вернуть
+    """
+    if k < 1:
+        return "❌ k должно быть положительным"
+    tasks = _namespace(ctx).next_tasks(k)
+    if not tasks:
+        return "🎉 Незавершенных задач нет"
+    return f"🎯 Следующие задачи ({len(tasks)}):\n\n" + "".join(_format_scheduled(task) for task in tasks)
+
+@mcp.tool()
+@profiler.profiled
+def overdue_tasks(k: int = 5, ctx: Context = None) -> str:
+    """Незавершенные задачи с истекшим сроком, самые просроченные первыми.
+    
+    Args:
+        k: Сколько задач вернуть
+    """
+    if k < 1:
+        return "❌ k должно быть положительным"
+    tasks = _namespace(ctx).overdue_tasks(k)
+    if not tasks:
+        return "✅ Просроченных задач нет"
+    return f"⏰ Просроченные задачи ({len(tasks)}):\n\n" + "".join(_format_scheduled(task) for task in tasks)
+
+def _chunked(pieces: Iterable[str], size: int) -> Iterator[str]:
+    """Склеить мелкие фрагменты в части примерно по size символов"""
+    buffer: List[str] = []
+    length = 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield "".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+@mcp.tool()
+async def export_tasks(status: str = "all", ctx: Context = None) -> str:
+    """Выгрузить список задач частями (для больших списков).
+    
+    Если клиент передал progressToken, части приходят в notifications/progress
+    по мере готовности, а в ответе остается только сводка.
+    
+    Args:
+        status: Фильтр по статусу (all, completed, pending)
+    """
+    try:
+        meta = ctx.request_context.meta if ctx is not None else None
+    except ValueError:
+        meta = None
+    # Части уходят с await между ними: снимок не меняется, пока задачи добавляют
+    pieces = _iter_tasks(_namespace(ctx).snapshot().tasks, status)
+    if getattr(meta, "progressToken", None) is None:
+        return "".join(pieces)
+    
+    chunks = 0
+    for chunk in _chunked(pieces, STREAM_CHUNK_SIZE):
+        chunks += 1
+        await ctx.report_progress(chunks, message=chunk)
+    return f"📤 Результат передан частями: {chunks}"
 
 @mcp.tool()
-def complete_task(task_id: int) -> str:
+@profiler.profiled
+def complete_task(task_id: int, ctx: Context = None) -> str:
     """Отметить задачу как выполненную.
     
     Args:
         task_id: ID задачи для завершения
     """
-    for task in tasks_storage:
-        if task["id"] == task_id:
-            if task["completed"]:
-                return f"⚠️ Задача #{task_id} уже выполнена"
-            
-            task["completed"] = True
-            task["completed_at"] = datetime.now().isoformat()
-            return f"🎉 Задача #{task_id} '{task['title']}' отмечена как выполненная!"
+    namespace = _namespace(ctx)
+    task = namespace.get_task(task_id)
+    if task is None:
+        return f"❌ Задача с ID {task_id} не найдена"
+    
+    if task["completed"]:
+        return f"⚠️ Задача #{task_id} уже выполнена"
     
-    return f"❌ Задача с ID {task_id} не найдена"
+    namespace.mark_completed(task)
+    _notify_tasks_updated(namespace)
+    return f"🎉 Задача #{task_id} '{task['title']}' отмечена как выполненная!"
 
-@mcp.tool()
-def calculate(expression: str) -> str:
+@offloader.tool(mcp)
+@profiler.profiled
+def calculate(expression: str, ctx: Context = None) -> str:
     """Выполнить математическое вычисление.
     
     Args:
@@ -109,7 +320,11 @@ def calculate(expression: str) -> str:
         if not all(c in allowed_chars for c in expression):
             return "❌ Разрешены только числа и базовые математические операции"
         
-        result = eval(expression)
+        # Со степенью (9**9**9) вычисление может не закончиться — оно изолировано
+        if "**" in expression:
+            result = evaluator.evaluate(expression, _cancel_token(ctx))
+        else:
+            result = eval(expression)
         
         # Сохраняем в историю
         history_entry = {
@@ -117,14 +332,41 @@ def calculate(expression: str) -> str:
             "result": result,
             "timestamp": datetime.now().isoformat()
         }
-        calculator_history.append(history_entry)
+        # calculate выполняется в пуле потоков (offloader) — история общая с другими вызовами
+        namespace = _namespace(ctx)
+        with namespace.lock:
+            namespace.add_history(history_entry)
         
         return f"🧮 {expression} = {result}"
     
+    except RequestCancelled:
+        return "⏱️ Вычисление прервано: превышено время ожидания"
     except Exception as e:
         return f"❌ Ошибка вычисления: {str(e)}"
 
 @mcp.tool()
+@profiler.profiled
+def calc_stats(last_minutes: float = 0, since: str = "", until: str = "", ctx: Context = None) -> str:
+    """Статистика вычислений за окно времени: число, сумма, минимум и максимум,
+    среднее, перцентили и вызовы в минуту.
+    
+    Args:
+        last_minutes: Окно - последние N минут (0 - вся история)
+        since: Начало окна (ISO дата и время, необязательно)
+        until: Конец окна (ISO дата и время, необязательно)
+    """
+    try:
+        window = parse_window(last_minutes, since, until)
+    except ValueError as e:
+        return f"❌ Неверное окно: {e}"
+    namespace = _namespace(ctx)
+    # calculate дописывает колонки из пула потоков: под lock только их копия
+    with namespace.lock:
+        columns = namespace.history_columns.snapshot()
+    return format_stats(columns.aggregate(window["start"], window["end"]))
+
+@mcp.tool()
+@profiler.profiled
 def generate_password(length: int = 12, include_symbols: bool = True) -> str:
     """Сгенерировать безопасный пароль.
     
@@ -135,6 +377,10 @@ def generate_password(length: int = 12, include_symbols: bool = True) -> str:
     if length < 4 or length > 64:
         return "❌ Длина пароля должна быть от 4 до 64 символов"
     
+    # Редкий инструмент: модули загружаются при первом вызове, а не при старте
+    import random
+    import string
+    
     # Составляем набор символов
     chars = string.ascii_letters + string.digits
     if include_symbols:
@@ -152,7 +398,8 @@ def generate_password(length: int = 12, include_symbols: bool = True) -> str:
     
     return f"🔐 Сгенерированный пароль: {password}\n💪 Сила пароля: {strength}"
 
-@mcp.tool()
+@offloader.tool(mcp, isolate=True)
+@profiler.profiled
 def text_stats(text: str) -> str:
     """Получить статистику по тексту.
     
@@ -191,6 +438,24 @@ def text_stats(text: str) -> str:
     
     return result
 
+@mcp.tool()
+def set_profiling(enabled: bool = True, threshold_ms: float = 500.0, mode: str = "cprofile") -> str:
+    """Включить или выключить профилирование медленных вызовов без перезапуска сервера.
+    
+    Args:
+        enabled: Включить профилирование
+        threshold_ms: Порог длительности вызова в миллисекундах
+        mode: Режим профайлера (cprofile, sampling)
+    """
+    if not profiler.remote_control:
+        return "❌ Управление профилированием выключено (MCP_PROFILE_CONTROL=1 при запуске сервера)"
+    try:
+        status = profiler.configure(enabled=enabled, threshold_ms=threshold_ms, mode=mode)
+    except ValueError as e:
+        return f"❌ {e}"
+    
+    return f"🔬 Профилирование: {json.dumps(status, ensure_ascii=False)}"
+
 # =============================================================================
 # RESOURCES (Ресурсы)
 # =============================================================================
@@ -198,7 +463,30 @@ def text_stats(text: str) -> str:
 @mcp.resource("tasks://list")
 def tasks_resource() -> str:
     """Ресурс для доступа к списку всех задач в JSON формате."""
-    return json.dumps(tasks_storage, ensure_ascii=False, indent=2)
+    return json.dumps(tenants.get(DEFAULT_TENANT).snapshot().tasks, ensure_ascii=False, indent=2)
+
+@mcp.resource("tasks://{tenant}/list")
+def tenant_tasks_resource(tenant: str) -> str:
+    """Ресурс со списком задач указанного арендатора в JSON формате."""
+    return json.dumps(tenants.get(tenant).snapshot().tasks, ensure_ascii=False, indent=2)
+
+class QueryResourceTemplate(ResourceTemplate):
+    """Шаблон с query-параметрами: '?' в URI — обычный символ, а не часть регулярного выражения"""
+    
+    def matches(self, uri: str) -> Optional[Dict[str, Any]]:
+        pattern = re.escape(self.uri_template).replace(r"\{", "(?P<").replace(r"\}", ">[^/&]+)")
+        match = re.fullmatch(pattern, uri)
+        return match.groupdict() if match else None
+
+def tasks_changes_resource(since: int, ctx: Context = None) -> str:
+    """Задачи, добавленные или завершенные после версии since, и текущая версия (JSON)."""
+    return json.dumps(_namespace(ctx).changes_since(since), ensure_ascii=False)
+
+mcp.resource("tasks://changes?since={since}", mime_type="application/json")(tasks_changes_resource)
+_changes_template = mcp._resource_manager._templates["tasks://changes?since={since}"]
+mcp._resource_manager._templates[_changes_template.uri_template] = QueryResourceTemplate(
+    **{field: getattr(_changes_template, field) for field in ResourceTemplate.model_fields}
+)
 
 @mcp.resource("calculator://history")
 def calculator_history_resource() -> str:
@@ -210,8 +498,14 @@ def calculator_history_resource() -> str:
 # =============================================================================
 
 @mcp.prompt()
-def task_summary() -> str:
+def task_summary(ctx: Context = None) -> str:
     """Создать сводку по задачам для ИИ помощника."""
+    namespace = _namespace(ctx)
+    view = namespace.snapshot()
+    return prompt_outputs.get(("task_summary", namespace.tenant_id), view.version,
+                              lambda: _task_summary_text(view.tasks))
+
+def _task_summary_text(tasks_storage: Sequence[Dict[str, Any]]) -> str:
     total = len(tasks_storage)
     completed = len([t for t in tasks_storage if t["completed"]])
     pending = total - completed
@@ -235,6 +529,10 @@ def productivity_tips(focus_area: str = "general") -> str:
     Args:
         focus_area: Область фокуса (general, time_management, task_organization)
     """
+    # Текст зависит только от аргумента: версия состояния постоянная
+    return prompt_outputs.get(("productivity_tips", focus_area), 0, lambda: _productivity_tips_text(focus_area))
+
+def _productivity_tips_text(focus_area: str) -> str:
     prompts = {
         "general": "Дай 3-5 универсальных советов по повышению продуктивности",
         "time_management": "Дай советы по эффективному управлению временем",
@@ -254,22 +552,30 @@ def productivity_tips(focus_area: str = "general") -> str:
 # =============================================================================
 
 if __name__ == "__main__":
-    print("🚀 Запуск Personal Assistant MCP Server...")
-    print("📋 Доступные инструменты:")
-    print("   • add_task - добавить задачу")
-    print("   • get_tasks - получить список задач")
-    print("   • complete_task - завершить задачу")
-    print("   • calculate - калькулятор")
-    print("   • generate_password - генератор паролей")
-    print("   • text_stats - анализ текста")
-    print()
-    print("📦 Доступные ресурсы:")
-    print("   • tasks://list - список задач")
-    print("   • calculator://history - история вычислений")
-    print()
-    print("💡 Доступные промпты:")
-    print("   • task_summary - сводка по задачам")
-    print("   • productivity_tips - советы по продуктивности")
-    print()
-    
-    mcp.run() 
\ No newline at end of file
+    # stdout занят протоколом stdio — баннер выводится в stderr
+    print("🚀 Запуск Personal Assistant MCP Server...", file=sys.stderr)
+    print("📋 Доступные инструменты:", file=sys.stderr)
+    print("   • add_task - добавить задачу", file=sys.stderr)
+    print("   • get_tasks - получить список задач", file=sys.stderr)
+    print("   • complete_task - завершить задачу", file=sys.stderr)
+    print("   • next_tasks - что делать дальше (приоритет и срок)", file=sys.stderr)
+    print("   • overdue_tasks - просроченные задачи", file=sys.stderr)
+    print("   • calculate - калькулятор", file=sys.stderr)
+    print("   • generate_password - генератор паролей", file=sys.stderr)
+    print("   • text_stats - анализ текста", file=sys.stderr)
+    print("   • calc_stats - статистика вычислений за окно времени", file=sys.stderr)
+    print("   • export_tasks - список задач частями", file=sys.stderr)
+    print(file=sys.stderr)
+    print("📦 Доступные ресурсы:", file=sys.stderr)
+    print("   • tasks://list - список задач (поддерживает подписку)", file=sys.stderr)
+    print("   • tasks://changes?since=N - изменения задач после версии N", file=sys.stderr)
+    print("   • calculator://history - история вычислений", file=sys.stderr)
+    print(file=sys.stderr)
+    print("💡 Доступные промпты:", file=sys.stderr)
+    print("   • task_summary - сводка по задачам", file=sys.stderr)
+    print("   • productivity_tips - советы по продуктивности", file=sys.stderr)
+    print(file=sys.stderr)
+    
+    mcp.run()
+    # MCP_TASKS_SNAPSHOT — сохранить задачи для следующего запуска
+    tenants.save_snapshot() 
\ No newline at end of file
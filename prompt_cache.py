@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Кэширование префикса промпта у провайдера и кэш вывода MCP промптов
+
+Провайдеры переиспользуют уже обработанный префикс запроса (инструменты,
+системный промпт, начало истории), если он совпадает байт в байт. Для
+этого запрос собирается в постоянном порядке: замороженный список
+инструментов, неизменный системный промпт, затем история диалога как есть.
+Anthropic и Gemini кэшируют только помеченные блоки — для них в сообщения
+добавляются метки cache_control; OpenAI, DeepSeek и другие кэшируют общий
+префикс автоматически, метки им не нужны.
+
+Попадания в кэш провайдер сообщает в usage ответа; они учитываются
+в счетчиках хода клиента (turn_metrics).
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Модели OpenRouter, которым нужны явные метки cache_control
+MARKER_MODEL_PREFIXES = ("anthropic/", "google/gemini")
+
+# Anthropic принимает не больше 4 меток: системный промпт и два последних сообщения
+MAX_HISTORY_MARKERS = 2
+
+DEFAULT_SYSTEM_PROMPT = (
+    "Ты персональный помощник. Управляй задачами пользователя, считай выражения, "
+    "генерируй пароли и анализируй текст с помощью доступных инструментов. "
+    "Отвечай кратко, на языке пользователя."
+)
+
+
+def needs_cache_markers(model: str) -> bool:
+    return model.startswith(MARKER_MODEL_PREFIXES)
+
+
+def canonical_json(value: Any) -> str:
+    """Сериализация без пробелов и с фиксированным порядком ключей"""
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def strip_cache_markers(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Сообщение без меток: метки двигаются от хода к ходу и не входят в префикс"""
+    content = message.get("content")
+    if isinstance(content, list) and len(content) == 1 and "cache_control" in content[0]:
+        return {**message, "content": content[0]["text"]}
+    return message
+
+
+def usage_cache_stats(usage: Optional[Dict[str, Any]]) -> Tuple[int, int, int]:
+    """(токены промпта, прочитано из кэша, записано в кэш) из usage ответа"""
+    if not usage:
+        return 0, 0, 0
+    details = usage.get("prompt_tokens_details") or {}
+    cached = details.get("cached_tokens") or usage.get("cache_read_input_tokens") or 0
+    written = details.get("cache_write_tokens") or usage.get("cache_creation_input_tokens") or 0
+    return int(usage.get("prompt_tokens") or 0), int(cached), int(written)
+
+
+class PromptCachePlanner:
+    """Собирает сообщения запроса так, чтобы префикс оставался стабильным.
+
+    mode: auto — метки только для моделей из MARKER_MODEL_PREFIXES,
+    on — метки всегда, off — запрос как раньше (без системного промпта и меток).
+    """
+
+    def __init__(self, mode: str = "auto", system_prompt: str = DEFAULT_SYSTEM_PROMPT):
+        if mode not in ("auto", "on", "off"):
+            raise ValueError(f"Неизвестный режим кэширования промптов: {mode}")
+        self.mode = mode
+        self.system_prompt = system_prompt
+        self._tools_source: Optional[List[Dict]] = None
+        self._tools: List[Dict] = []
+
+    @classmethod
+    def from_env(cls) -> "PromptCachePlanner":
+        return cls(
+            mode=os.getenv("OPENROUTER_PROMPT_CACHE", "auto"),
+            system_prompt=os.getenv("OPENROUTER_SYSTEM_PROMPT", DEFAULT_SYSTEM_PROMPT)
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def uses_markers(self, model: str) -> bool:
+        return self.mode == "on" or (self.mode == "auto" and needs_cache_markers(model))
+
+    def tools(self, source: List[Dict], build: Callable[[], List[Dict]]) -> List[Dict]:
+        """Список инструментов для запроса, один и тот же объект, пока не сменился source.
+
+        Инструменты сортируются по имени: перезапущенный сервер или другой процесс пула
+        может перечислить их в другом порядке, а префикс от этого меняться не должен.
+        """
+        if source is not self._tools_source:
+            tools = build()
+            if self.enabled:
+                tools = sorted(tools, key=lambda tool: tool["function"]["name"])
+            self._tools_source, self._tools = source, tools
+        return self._tools
+
+    def messages(self, model: str, history: List[Dict]) -> List[Dict]:
+        """Сообщения запроса: системный промпт, история, метки cache_control.
+
+        История не меняется: помеченные сообщения копируются.
+        """
+        if not self.enabled:
+            return history
+        messages = [{"role": "system", "content": self.system_prompt}] if self.system_prompt else []
+        messages += history
+        if not self.uses_markers(model):
+            return messages
+        # Метка на системном промпте кэширует инструменты и его самого, метки на последних
+        # сообщениях — историю; следующий ход читает кэш до своей предыдущей метки
+        first = 1 if self.system_prompt else 0
+        marked = [0] if self.system_prompt else []
+        history_marks = 0
+        for index in range(len(messages) - 1, first - 1, -1):
+            if history_marks == MAX_HISTORY_MARKERS:
+                break
+            message = messages[index]
+            if message.get("role") in ("user", "tool") and isinstance(message.get("content"), str):
+                marked.append(index)
+                history_marks += 1
+        for index in marked:
+            message = messages[index]
+            messages[index] = {
+                **message,
+                "content": [{"type": "text", "text": message["content"], "cache_control": CACHE_CONTROL}]
+            }
+        return messages
+
+
+class VersionedCache:
+    """Кэш вычисленных значений, действительный, пока не сменилась версия состояния.
+
+    Ключ — например, арендатор и аргументы промпта; версия — версия задач
+    (TaskNamespace.version). Значение пересчитывается, только если версия другая.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: Hashable, build: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        value = build()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
@@ -4,73 +4,337 @@ Standard MCP Server для Personal Assistant
 Совместимый с официальным MCP протоколом
 """
 
+import itertools
 import json
+import os
+import queue
+import signal
 import sys
-import random
-import string
+import time
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Callable, Dict, Iterable, Iterator, List, Any, Optional, Sequence
+
+from calc_analytics import format_stats, parse_window
+from mcp_admission import AdmissionController, AdmissionError
+from mcp_cancellation import DEADLINE_EXCEEDED, CancelToken, IsolatedEvaluator, RequestCancelled, cancel_key
+from mcp_metrics import MetricsRegistry
+from mcp_payload import CAPABILITY, PAYLOAD_MARKER, PAYLOAD_UNAVAILABLE, PayloadChannel, PayloadTooLarge, PayloadUnavailable
+from mcp_profiling import SlowRequestProfiler
+from task_tenants import DEFAULT_TENANT, TaskNamespace, TenantLimitError, TenantRegistry, parse_due_date
+
+# Инструменты, которые читают или меняют состояние арендатора.
+# При параллельном выполнении запросов они сериализуются через lock его пространства.
+# get_tasks читает снимок задач (TaskNamespace.snapshot), calc_stats — копию колонок
+# истории (HistoryColumns.snapshot), поэтому писателей они не задерживают
+STATEFUL_TOOLS = frozenset({"add_task", "complete_task", "next_tasks", "overdue_tasks", "calculate"})
+
+# Инструменты и ресурсы, результат которых можно получить по частям:
+# запрос с params._meta.progressToken получает фрагменты в notifications/progress
+STREAMING_TOOLS = frozenset({"get_tasks"})
+STREAMING_RESOURCES = frozenset({"tasks://list", "calculator://history"})
+
+# Ресурсы, на изменения которых можно подписаться (resources/subscribe)
+SUBSCRIBABLE_RESOURCES = frozenset({"tasks://list", "tasks://changes"})
+
+# Сколько прочитанных блоков stdin (до 64 КБ каждый) может ждать обработки
+INPUT_QUEUE_CHUNKS = 64
+
+# Как часто главный поток выходит из ожидания очереди, чтобы выполнить обработчик SIGTERM
+SIGNAL_POLL_INTERVAL = 0.2
+
+# Реестр инструментов; `--dump-tools PATH` сохраняет его для MCP_TOOLS_REGISTRY
+TOOLS: List[Dict[str, Any]] = [
+    {
+        "name": "add_task",
+        "description": "Добавить новую задачу в список дел",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "title": {"type": "string", "description": "Название задачи"},
+                "description": {"type": "string", "description": "Описание задачи", "default": ""},
+                "priority": {"type": "string", "enum": ["low", "medium", "high"], "description": "Приоритет задачи", "default": "medium"},
+                "due_date": {"type": "string", "description": "Срок: YYYY-MM-DD или YYYY-MM-DDTHH:MM", "default": ""}
+            },
+            "required": ["title"],
+            "additionalProperties": False
+        }
+    },
+    {
+        "name": "get_tasks",
+        "description": "Получить список задач",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "status": {"type": "string", "enum": ["all", "completed", "pending"], "description": "Фильтр по статусу", "default": "all"}
+            },
+            "additionalProperties": False
+        }
+    },
+    {
+        "name": "complete_task",
+        "description": "Отметить задачу как выполненную",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "task_id": {"type": "integer", "description": "ID задачи для завершения"}
+            },
+            "required": ["task_id"],
+            "additionalProperties": False
+        }
+    },
+    {
+        "name": "next_tasks",
+        "description": "Что делать дальше: незавершенные задачи по приоритету и сроку",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "k": {"type": "integer", "description": "Сколько задач вернуть", "default": 5}
+            },
+            "additionalProperties": False
+        }
+    },
+    {
+        "name": "overdue_tasks",
+        "description": "Незавершенные задачи с истекшим сроком, самые просроченные первыми",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "k": {"type": "integer", "description": "Сколько задач вернуть", "default": 5}
+            },
+            "additionalProperties": False
+        }
+    },
+    {
+        "name": "calculate",
+        "description": "Выполнить математическое вычисление",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "expression": {"type": "string", "description": "Математическое выражение"}
+            },
+            "required": ["expression"],
+            "additionalProperties": False
+        }
+    },
+    {
+        "name": "calc_stats",
+        "description": "Статистика вычислений за окно времени: число, сумма, минимум и максимум, среднее, перцентили, вызовы в минуту",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "last_minutes": {"type": "number", "description": "Окно: последние N минут (0 — вся история)", "default": 0},
+                "since": {"type": "string", "description": "Начало окна (ISO дата и время)", "default": ""},
+                "until": {"type": "string", "description": "Конец окна (ISO дата и время)", "default": ""}
+            },
+            "additionalProperties": False
+        }
+    },
+    {
+        "name": "generate_password",
+        "description": "Сгенерировать безопасный пароль",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "length": {"type": "integer", "description": "Длина пароля (4-64)", "default": 12},
+                "include_symbols": {"type": "boolean", "description": "Включать спецсимволы", "default": True}
+            },
+            "additionalProperties": False
+        }
+    },
+    {
+        "name": "text_stats",
+        "description": "Получить статистику по тексту",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "text": {"type": "string", "description": "Текст для анализа"}
+            },
+            "required": ["text"],
+            "additionalProperties": False
+        }
+    }
+]
+
+# Время импорта модуля — запасной отсчет старта, если /proc недоступен
+_IMPORTED_AT = time.perf_counter()
+
+
+def process_uptime() -> float:
+    """Секунды с момента запуска процесса, включая старт интерпретатора и импорты.
+
+    На Linux берется из /proc (точность — такт ядра, обычно 10 мс),
+    иначе считается от импорта модуля.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.perf_counter() - _IMPORTED_AT
+
+
+def dump_tools_registry(path: str):
+    """Сохранить результат tools/list в файл для MCP_TOOLS_REGISTRY"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"tools": TOOLS}, f, ensure_ascii=False)
+        f.write("\n")
+
 
 class StandardMCPServer:
-    def __init__(self):
-        self.tasks_storage: List[Dict[str, Any]] = []
-        self.calculator_history: List[Dict[str, Any]] = []
+    def __init__(self, batch_workers: int = 0, tenants: Optional[TenantRegistry] = None,
+                 tools_registry: Optional[str] = None, admission: Optional[AdmissionController] = None):
+        # Пространства задач арендаторов; арендатор выбирается в сессии или параметром _meta.tenant
+        self.tenants = tenants if tenants is not None else TenantRegistry.from_env()
+        # Сессия stdio режима; сетевые транспорты передают свою сессию в handle_raw
+        self.session: Dict[str, Any] = {"tenant": DEFAULT_TENANT}
+        self._context = threading.local()
+        # batch_workers > 1 включает параллельное выполнение элементов batch-запроса
+        self.batch_workers = batch_workers
+        # ThreadPoolExecutor создается (и импортируется) при первом параллельном batch
+        self._batch_executor = None
+        # Заранее сериализованный реестр инструментов (--dump-tools); без него — TOOLS
+        self.tools_registry = tools_registry if tools_registry is not None else os.getenv("MCP_TOOLS_REGISTRY")
+        self._tools_json: Optional[bytes] = None
+        self._tools: Optional[List[Dict[str, Any]]] = None
+        # Размер фрагмента потокового результата (символов)
+        self.stream_chunk_size = int(os.getenv("MCP_STREAM_CHUNK", 64 * 1024))
+        # Время от запуска процесса до первого ответа на initialize
+        self.startup_seconds: Optional[float] = None
+        # Подписки на ресурсы задач: арендатор -> {id сессии: сессия}.
+        # Сессия может доставлять уведомления, если в ней есть callable "notify"
+        self._subscribers: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        self._subscribers_lock = threading.Lock()
+        # Токены отмены выполняющихся запросов и отмены, пришедшие раньше самих запросов
+        self._requests: Dict[Any, CancelToken] = {}
+        self._cancelled_early: "OrderedDict[Any, None]" = OrderedDict()
+        self._requests_lock = threading.Lock()
+        # Выражения со степенью вычисляются в отдельном процессе, который можно убить
+        self.evaluator = IsolatedEvaluator()
+        # Лимиты размера, параллельности тяжелых инструментов, частоты и глубины очереди
+        self.admission = admission if admission is not None else AdmissionController.from_env()
+        # Счетчики, латентности и размеры сообщений по методам и инструментам
+        self.metrics = MetricsRegistry()
+        # Профилирование медленных запросов; включается через MCP_PROFILE или debug/profiling
+        self.profiler = SlowRequestProfiler.from_env()
+        # Большие строки запросов и ответов — файлами в общей памяти (capabilities.experimental.payloads)
+        self.payloads = PayloadChannel.from_env()
+
+    @property
+    def namespace(self) -> TaskNamespace:
+        """Пространство арендатора текущего запроса"""
+        namespace = getattr(self._context, "namespace", None)
+        return namespace if namespace is not None else self.tenants.get(DEFAULT_TENANT)
+
+    @property
+    def cancel_token(self) -> CancelToken:
+        """Токен отмены текущего запроса"""
+        token = getattr(self._context, "cancel", None)
+        return token if token is not None else CancelToken()
+
+    @property
+    def tasks_storage(self) -> List[Dict[str, Any]]:
+        return self.namespace.tasks
+
+    @property
+    def calculator_history(self) -> List[Dict[str, Any]]:
+        return self.namespace.calculator_history
         
-    def add_task(self, title: str, description: str = "", priority: str = "medium") -> str:
+    def add_task(self, title: str, description: str = "", priority: str = "medium", due_date: str = "") -> str:
         """Добавить новую задачу"""
         if priority not in ["low", "medium", "high"]:
             return "Ошибка: приоритет должен быть low, medium или high"
+        if due_date:
+            try:
+                parse_due_date(due_date)
+            except ValueError:
+                return "Ошибка: срок должен быть в формате YYYY-MM-DD или YYYY-MM-DDTHH:MM"
         
         task = {
-            "id": len(self.tasks_storage) + 1,
             "title": title,
             "description": description,
             "priority": priority,
             "completed": False,
             "created_at": datetime.now().isoformat()
         }
+        if due_date:
+            task["due_date"] = due_date
         
-        self.tasks_storage.append(task)
-        return f"✅ Задача '{title}' добавлена с приоритетом {priority}"
+        try:
+            task = self.namespace.add_task(task)
+        except TenantLimitError as e:
+            return f"❌ Задача не добавлена: {e}"
+        return f"✅ Задача #{task['id']} '{title}' добавлена с приоритетом {priority}"
 
     def get_tasks(self, status: str = "all") -> str:
         """Получить список задач"""
-        if not self.tasks_storage:
-            return "📝 Список задач пуст"
+        return "".join(self.iter_tasks(status))
+
+    def iter_tasks(self, status: str = "all") -> Iterator[str]:
+        """Список задач по частям: заголовок, затем по фрагменту на задачу"""
+        tasks = self.namespace.snapshot().tasks
+        if not tasks:
+            yield "📝 Список задач пуст"
+            return
         
-        filtered_tasks = self.tasks_storage
+        filtered_tasks = iter(tasks)
         if status == "completed":
-            filtered_tasks = [t for t in self.tasks_storage if t["completed"]]
+            filtered_tasks = (t for t in tasks if t["completed"])
         elif status == "pending":
-            filtered_tasks = [t for t in self.tasks_storage if not t["completed"]]
+            filtered_tasks = (t for t in tasks if not t["completed"])
         
-        if not filtered_tasks:
-            return f"📝 Нет задач со статусом '{status}'"
+        first = next(filtered_tasks, None)
+        if first is None:
+            yield f"📝 Нет задач со статусом '{status}'"
+            return
         
-        result = f"📋 Список задач ({status}):\n\n"
-        for task in filtered_tasks:
+        yield f"📋 Список задач ({status}):\n\n"
+        token = self.cancel_token
+        for task in itertools.chain([first], filtered_tasks):
+            token.check()
             status_icon = "✅" if task["completed"] else "⏳"
             priority_icon = {"high": "🔴", "medium": "🟡", "low": "🟢"}[task["priority"]]
             
-            result += f"{status_icon} {priority_icon} #{task['id']}: {task['title']}\n"
+            result = f"{status_icon} {priority_icon} #{task['id']}: {task['title']}\n"
             if task["description"]:
                 result += f"   📄 {task['description']}\n"
+            if task.get("due_date"):
+                result += f"   ⏰ Срок: {task['due_date']}\n"
             result += f"   📅 Создана: {task['created_at'][:10]}\n\n"
-        
-        return result
+            yield result
+
+    def next_tasks(self, k: int = 5) -> str:
+        """Ближайшие задачи по приоритету и сроку (O(k log k), без просмотра всего списка)"""
+        if k < 1:
+            return "❌ k должно быть положительным"
+        tasks = self.namespace.next_tasks(k)
+        if not tasks:
+            return "🎉 Незавершенных задач нет"
+        return f"🎯 Следующие задачи ({len(tasks)}):\n\n" + "".join(_format_scheduled(task) for task in tasks)
+
+    def overdue_tasks(self, k: int = 5) -> str:
+        """Просроченные задачи, самые просроченные первыми"""
+        if k < 1:
+            return "❌ k должно быть положительным"
+        tasks = self.namespace.overdue_tasks(k)
+        if not tasks:
+            return "✅ Просроченных задач нет"
+        return f"⏰ Просроченные задачи ({len(tasks)}):\n\n" + "".join(_format_scheduled(task) for task in tasks)
 
     def complete_task(self, task_id: int) -> str:
         """Завершить задачу"""
-        for task in self.tasks_storage:
-            if task["id"] == task_id:
-                if task["completed"]:
-                    return f"⚠️ Задача #{task_id} уже выполнена"
-                
-                task["completed"] = True
-                task["completed_at"] = datetime.now().isoformat()
-                return f"🎉 Задача #{task_id} '{task['title']}' отмечена как выполненная!"
+        task = self.namespace.get_task(task_id)
+        if task is None:
+            return f"❌ Задача с ID {task_id} не найдена"
+        
+        if task["completed"]:
+            return f"⚠️ Задача #{task_id} уже выполнена"
         
-        return f"❌ Задача с ID {task_id} не найдена"
+        self.namespace.mark_completed(task)
+        return f"🎉 Задача #{task_id} '{task['title']}' отмечена как выполненная!"
 
     def calculate(self, expression: str) -> str:
         """Калькулятор"""
@@ -79,25 +343,46 @@ class StandardMCPServer:
             if not all(c in allowed_chars for c in expression):
                 return "❌ Разрешены только числа и базовые математические операции"
             
-            result = eval(expression)
+            # Без степени выражение из разрешенных символов вычисляется мгновенно;
+            # со степенью (9**9**9) может зависнуть — такое считается в отдельном процессе
+            if "**" in expression:
+                result = self.evaluator.evaluate(expression, self.cancel_token)
+            else:
+                result = eval(expression)
             
             history_entry = {
                 "expression": expression,
                 "result": result,
                 "timestamp": datetime.now().isoformat()
             }
-            self.calculator_history.append(history_entry)
+            self.namespace.add_history(history_entry)
             
             return f"🧮 {expression} = {result}"
         
         except Exception as e:
             return f"❌ Ошибка вычисления: {str(e)}"
 
+    def calc_stats(self, last_minutes: float = 0, since: str = "", until: str = "") -> str:
+        """Векторная сводка по колонкам истории вычислений"""
+        try:
+            window = parse_window(last_minutes, since, until)
+        except ValueError as e:
+            return f"❌ Неверное окно: {e}"
+        namespace = self.namespace
+        # Под lock только копия колонок, сводка считается без него
+        with namespace.lock:
+            columns = namespace.history_columns.snapshot()
+        return format_stats(columns.aggregate(window["start"], window["end"]))
+
     def generate_password(self, length: int = 12, include_symbols: bool = True) -> str:
         """Генератор паролей"""
         if length < 4 or length > 64:
             return "❌ Длина пароля должна быть от 4 до 64 символов"
         
+        # Редкий инструмент: модули загружаются при первом вызове, а не при старте
+        import random
+        import string
+        
         chars = string.ascii_letters + string.digits
         if include_symbols:
             chars += "!@#$%^&*()-_=+[]{}|;:,.<>?"
@@ -124,7 +409,10 @@ class StandardMCPServer:
         paragraphs = len([p for p in text.split("\n\n") if p.strip()])
         
         word_freq = {}
-        for word in words:
+        token = self.cancel_token
+        for index, word in enumerate(words):
+            if index % 10000 == 0:
+                token.check()
             word_clean = word.lower().strip(".,!?;:")
             word_freq[word_clean] = word_freq.get(word_clean, 0) + 1
         
@@ -145,101 +433,70 @@ class StandardMCPServer:
         
         return result
 
+    @property
+    def tools_json(self) -> bytes:
+        """Результат tools/list, сериализованный один раз (или прочитанный из реестра)"""
+        if self._tools_json is None:
+            if self.tools_registry:
+                with open(self.tools_registry, "rb") as f:
+                    self._tools_json = f.read().strip()
+            else:
+                self._tools_json = json.dumps({"tools": TOOLS}, ensure_ascii=False).encode("utf-8")
+        return self._tools_json
+
     def get_tools_list(self):
         """Список доступных инструментов"""
-        return {
-            "tools": [
-                {
-                    "name": "add_task",
-                    "description": "Добавить новую задачу в список дел",
-                    "inputSchema": {
-                        "type": "object",
-                        "properties": {
-                            "title": {"type": "string", "description": "Название задачи"},
-                            "description": {"type": "string", "description": "Описание задачи", "default": ""},
-                            "priority": {"type": "string", "enum": ["low", "medium", "high"], "description": "Приоритет задачи", "default": "medium"}
-                        },
-                        "required": ["title"],
-                        "additionalProperties": False
-                    }
-                },
-                {
-                    "name": "get_tasks",
-                    "description": "Получить список задач",
-                    "inputSchema": {
-                        "type": "object",
-                        "properties": {
-                            "status": {"type": "string", "enum": ["all", "completed", "pending"], "description": "Фильтр по статусу", "default": "all"}
-                        },
-                        "additionalProperties": False
-                    }
-                },
-                {
-                    "name": "complete_task",
-                    "description": "Отметить задачу как выполненную",
-                    "inputSchema": {
-                        "type": "object",
-                        "properties": {
-                            "task_id": {"type": "integer", "description": "ID задачи для завершения"}
-                        },
-                        "required": ["task_id"],
-                        "additionalProperties": False
-                    }
-                },
-                {
-                    "name": "calculate",
-                    "description": "Выполнить математическое вычисление",
-                    "inputSchema": {
-                        "type": "object",
-                        "properties": {
-                            "expression": {"type": "string", "description": "Математическое выражение"}
-                        },
-                        "required": ["expression"],
-                        "additionalProperties": False
-                    }
-                },
-                {
-                    "name": "generate_password",
-                    "description": "Сгенерировать безопасный пароль",
-                    "inputSchema": {
-                        "type": "object",
-                        "properties": {
-                            "length": {"type": "integer", "description": "Длина пароля (4-64)", "default": 12},
-                            "include_symbols": {"type": "boolean", "description": "Включать спецсимволы", "default": True}
-                        },
-                        "additionalProperties": False
-                    }
-                },
-                {
-                    "name": "text_stats",
-                    "description": "Получить статистику по тексту",
-                    "inputSchema": {
-                        "type": "object",
-                        "properties": {
-                            "text": {"type": "string", "description": "Текст для анализа"}
-                        },
-                        "required": ["text"],
-                        "additionalProperties": False
-                    }
-                }
-            ]
-        }
+        if self._tools is None:
+            self._tools = json.loads(self.tools_json)["tools"] if self.tools_registry else TOOLS
+        return {"tools": self._tools}
 
-    def call_tool(self, name: str, arguments: Dict) -> Dict:
-        """Вызов инструмента"""
+    def call_tool(self, name: str, arguments: Dict, progress: Optional[Callable[[str], None]] = None) -> Dict:
+        """Вызов инструмента.
+
+        progress — куда отдавать фрагменты результата потоковых инструментов;
+        тогда в самом ответе остается только сводка о переданных частях.
+        """
+        started = time.perf_counter()
+        if progress is not None and name in STREAMING_TOOLS:
+            # Потоковые инструменты только читают снимок задач
+            result = self._stream_tool(name, arguments, progress)
+        elif name in STATEFUL_TOOLS:
+            namespace = self.namespace
+            with namespace.lock:
+                version = namespace.version
+                result = self._call_tool(name, arguments)
+                if namespace.version != version:
+                    self._publish_tasks_updated(namespace)
+        else:
+            result = self._call_tool(name, arguments)
+        self.metrics.record("tool", str(name), time.perf_counter() - started, result.get("isError", False))
+        return result
+
+    def _call_tool(self, name: str, arguments: Dict) -> Dict:
         try:
             if name == "add_task":
                 result = self.add_task(
                     arguments.get("title", ""),
                     arguments.get("description", ""),
-                    arguments.get("priority", "medium")
+                    arguments.get("priority", "medium"),
+                    arguments.get("due_date", "")
                 )
             elif name == "get_tasks":
                 result = self.get_tasks(arguments.get("status", "all"))
             elif name == "complete_task":
                 result = self.complete_task(arguments.get("task_id", 0))
+            elif name == "next_tasks":
+                result = self.next_tasks(arguments.get("k", 5))
+            elif name == "overdue_tasks":
+                result = self.overdue_tasks(arguments.get("k", 5))
             elif name == "calculate":
                 result = self.calculate(arguments.get("expression", ""))
+            elif name == "calc_stats":
+                result = self.calc_stats(
+                    arguments.get("last_minutes", 0),
+                    arguments.get("since", ""),
+                    arguments.get("until", "")
+                )
             elif name == "generate_password":
                 result = self.generate_password(
                     arguments.get("length", 12),
@@ -264,22 +521,368 @@ class StandardMCPServer:
                 "isError": True
             }
 
-    def handle_request(self, request: Dict) -> Dict:
-        """Обработка JSON-RPC запроса"""
+    def _stream_tool(self, name: str, arguments: Dict, progress: Callable[[str], None]) -> Dict:
+        try:
+            if name == "get_tasks":
+                chunks = self.iter_tasks(arguments.get("status", "all"))
+            else:
+                return self._call_tool(name, arguments)
+            streamed = self._emit_chunks(chunks, progress)
+        except Exception as e:
+            return {
+                "content": [{"type": "text", "text": f"❌ Ошибка выполнения: {str(e)}"}],
+                "isError": True
+            }
+        
+        return {
+            "content": [{"type": "text", "text": f"📤 Результат передан частями: {streamed['chunks']}"}],
+            "isError": False,
+            "_meta": {"streamed": streamed}
+        }
+
+    def _emit_chunks(self, pieces: Iterable[str], progress: Callable[[str], None]) -> Dict[str, int]:
+        """Склеить фрагменты генератора в части по stream_chunk_size и отправить каждую"""
+        buffer: List[str] = []
+        size = chunks = total = 0
+        token = self.cancel_token
+        for piece in pieces:
+            token.check()
+            buffer.append(piece)
+            size += len(piece)
+            if size >= self.stream_chunk_size:
+                progress("".join(buffer))
+                chunks += 1
+                total += size
+                buffer, size = [], 0
+        if buffer:
+            progress("".join(buffer))
+            chunks += 1
+            total += size
+        return {"chunks": chunks, "chars": total}
+
+    def _progress_sender(self, params: Dict) -> Optional[Callable[[str], None]]:
+        """Отправитель notifications/progress, если клиент прислал progressToken и сессия умеет уведомлять"""
+        meta = params.get("_meta")
+        token = meta.get("progressToken") if isinstance(meta, dict) else None
+        notify = self._context.session.get("notify")
+        if token is None or not callable(notify):
+            return None
+        
+        counter = itertools.count(1)
+        
+        def send(chunk: str):
+            notification = {
+                "jsonrpc": "2.0",
+                "method": "notifications/progress",
+                "params": {"progressToken": token, "progress": next(counter), "message": chunk}
+            }
+            notify((json.dumps(notification, ensure_ascii=False) + "\n").encode("utf-8"))
+        return send
+
+    def get_resources_list(self):
+        """Список доступных ресурсов"""
+        return {
+            "resources": [
+                {
+                    "uri": "tasks://list",
+                    "name": "Список задач",
+                    "description": "Все задачи арендатора в JSON; поддерживает resources/subscribe",
+                    "mimeType": "application/json"
+                },
+                {
+                    "uri": "calculator://history",
+                    "name": "История вычислений",
+                    "description": "История калькулятора арендатора в JSON",
+                    "mimeType": "application/json"
+                },
+                {
+                    "uri": "metrics://server",
+                    "name": "Метрики сервера",
+                    "description": "Вызовы, ошибки, латентность и размеры сообщений по методам и инструментам",
+                    "mimeType": "application/json"
+                },
+                {
+                    "uri": "metrics://server/prometheus",
+                    "name": "Метрики сервера (Prometheus)",
+                    "description": "Те же метрики в текстовом формате Prometheus",
+                    "mimeType": "text/plain"
+                }
+            ]
+        }
+
+    def get_resource_templates_list(self):
+        """Шаблоны ресурсов"""
+        return {
+            "resourceTemplates": [
+                {
+                    "uriTemplate": "tasks://changes?since={version}",
+                    "name": "Изменения задач",
+                    "description": "Задачи, добавленные или завершенные после версии since, и текущая версия",
+                    "mimeType": "application/json"
+                }
+            ]
+        }
+
+    def read_resource(self, uri: str, progress: Optional[Callable[[str], None]] = None) -> Optional[Dict]:
+        """Чтение ресурса по URI (JSON списки — по частям, если передан progress)"""
+        if progress is not None and uri in STREAMING_RESOURCES:
+            if uri == "tasks://list":
+                streamed = self._emit_chunks(_iter_json_array(self.namespace.snapshot().tasks), progress)
+            else:
+                with self.namespace.lock:
+                    streamed = self._emit_chunks(_iter_json_array(self.calculator_history), progress)
+            return {
+                "contents": [{"uri": uri, "mimeType": "application/json", "text": ""}],
+                "_meta": {"streamed": streamed}
+            }
+        
+        if uri == "tasks://list":
+            text, mime_type = json.dumps(self.namespace.snapshot().tasks, ensure_ascii=False), "application/json"
+        elif uri == "calculator://history":
+            text, mime_type = json.dumps(self.calculator_history, ensure_ascii=False), "application/json"
+        elif uri.startswith("tasks://changes"):
+            since = _parse_since(uri)
+            with self.namespace.lock:
+                changes = self.namespace.changes_since(since)
+                text = json.dumps(changes, ensure_ascii=False)
+            mime_type = "application/json"
+        elif uri == "metrics://server":
+            text, mime_type = self.metrics.to_json(), "application/json"
+        elif uri == "metrics://server/prometheus":
+            text, mime_type = self.metrics.render_prometheus(), "text/plain"
+        else:
+            return None
+        
+        return {
+            "contents": [{"uri": uri, "mimeType": mime_type, "text": text}]
+        }
+
+    def handle_raw(self, data: bytes, session: Optional[Dict[str, Any]] = None) -> Optional[bytes]:
+        """Обработка сырого сообщения: разбор, выполнение и сериализация ответа"""
+        try:
+            # Слишком большое сообщение отклоняется, не тратя память на разбор
+            self.admission.check_size(len(data))
+        except AdmissionError as e:
+            self.metrics.record("rejected", e.reason, 0.0, True)
+            return (json.dumps({"jsonrpc": "2.0", "id": None, "error": e.to_error()}) + "\n").encode("utf-8")
+        try:
+            message = json.loads(data)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            response = {
+                "jsonrpc": "2.0",
+                "id": None,
+                "error": {
+                    "code": -32700,
+                    "message": "Parse error"
+                }
+            }
+            message = None
+        else:
+            if isinstance(message, dict) and message.get("method") == "tools/list" and "id" in message:
+                # Ответ собирается из уже сериализованного реестра, без json.dumps
+                encoded = self._tools_list_response(message["id"])
+                self.metrics.record_bytes("method", "tools/list", len(data), len(encoded))
+                return encoded
+            if PAYLOAD_MARKER in data:
+                response = self._handle_with_payloads(message, session)
+            else:
+                response = self.handle_message(message, session)
+            if response is not None and (session if session is not None else self.session).get("payloads"):
+                response = self.payloads.externalize(response)
+
+        if response is None:
+            encoded = b""
+        else:
+            encoded = (json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8")
+
+        if isinstance(message, dict):
+            method = str(message.get("method"))
+        else:
+            method = "batch" if isinstance(message, list) else "invalid"
+        self.metrics.record_bytes("method", method, len(data), len(encoded))
+        return encoded or None
+
+    def _handle_with_payloads(self, message: Any, session: Optional[Dict[str, Any]]) -> Optional[Any]:
+        """Обработка сообщения со ссылками $payload.
+
+        Элемент, ссылку которого не удалось прочитать, не выполняется: на него
+        приходит ошибка PAYLOAD_UNAVAILABLE, и клиент повторяет его со значениями в строке.
+        """
+        items = message if isinstance(message, list) else [message]
+        loaded, errors = [], []
+        for item in items:
+            try:
+                loaded.append(self.payloads.internalize(item, self.admission.max_request_bytes))
+                continue
+            except PayloadTooLarge as e:
+                try:
+                    self.admission.check_size(e.size)
+                except AdmissionError as rejected:
+                    self.metrics.record("rejected", rejected.reason, 0.0, True)
+                    error = rejected.to_error()
+            except PayloadUnavailable as e:
+                self.metrics.record("payload", "unavailable", 0.0, True)
+                error = {"code": PAYLOAD_UNAVAILABLE, "message": f"Payload unavailable: {e}",
+                         "data": {"direction": "request"}}
+            if isinstance(item, dict) and "id" in item:
+                errors.append({"jsonrpc": "2.0", "id": item["id"], "error": error})
+
+        if not isinstance(message, list):
+            if errors:
+                return errors[0]
+            return self.handle_message(loaded[0], session) if loaded else None
+        responses = (self.handle_batch(loaded, session) or []) if loaded else []
+        return errors + responses or None
+
+    def _tools_list_response(self, request_id: Any) -> bytes:
+        started = time.perf_counter()
+        encoded = b"".join((
+            b'{"jsonrpc": "2.0", "id": ',
+            json.dumps(request_id, ensure_ascii=False).encode("utf-8"),
+            b', "result": ',
+            self.tools_json,
+            b"}\n"
+        ))
+        self.metrics.record("method", "tools/list", time.perf_counter() - started)
+        return encoded
+
+    def handle_request(self, request: Dict, session: Optional[Dict[str, Any]] = None) -> Optional[Dict]:
+        """Обработка JSON-RPC запроса.
+
+        Для запроса, отмененного клиентом (notifications/cancelled), ответ не
+        отправляется и возвращается None; истекший дедлайн (params._meta.timeoutMs)
+        дает ошибку DEADLINE_EXCEEDED.
+        """
+        started = time.perf_counter()
+        session = session if session is not None else self.session
+        token = self._start_request(request, session)
+        if token is None:
+            return None
+        method = str(request.get("method"))
+        params = request.get("params") if isinstance(request.get("params"), dict) else {}
+        tool = params.get("name") if method == "tools/call" else None
+        try:
+            # Слот тяжелого инструмента ждем не дольше дедлайна запроса
+            ticket = None if self._is_replay(params, session) else \
+                self.admission.admit(method, tool, session, token.remaining(self.admission.concurrency_wait))
+        except AdmissionError as e:
+            self._finish_request(request, session)
+            self.metrics.record("rejected", e.reason, time.perf_counter() - started, True)
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": e.to_error()}
+        namespace = self.tenants.acquire(self._resolve_tenant(request, session))
+        self._context.namespace = namespace
+        self._context.session = session
+        self._context.cancel = token
+        try:
+            if self.profiler.enabled:
+                with self.profiler.profile(method, tool, params.get("arguments")):
+                    response = self._handle_request(request)
+            else:
+                response = self._handle_request(request)
+        except RequestCancelled as e:
+            response = None if e.reason == "cancelled" else {
+                "jsonrpc": "2.0",
+                "id": request.get("id"),
+                "error": {
+                    "code": DEADLINE_EXCEEDED,
+                    "message": "Request timed out"
+                }
+            }
+        finally:
+            self._context.namespace = None
+            self._context.session = None
+            self._context.cancel = None
+            self.tenants.release(namespace)
+            self.admission.release(ticket)
+            self._finish_request(request, session)
+        self.metrics.record("method", method, time.perf_counter() - started,
+                            response is None or "error" in response)
+        if self.startup_seconds is None and request.get("method") == "initialize":
+            self.startup_seconds = process_uptime()
+            self.metrics.record("startup", "first_initialize", self.startup_seconds)
+        return response
+
+    def _start_request(self, request: Dict, session: Dict[str, Any]) -> Optional[CancelToken]:
+        """Создать токен отмены с дедлайном; None — запрос отменили еще до начала"""
+        params = request.get("params")
+        meta = params.get("_meta") if isinstance(params, dict) else None
+        timeout_ms = meta.get("timeoutMs") if isinstance(meta, dict) else None
+        token = CancelToken(timeout_ms / 1000 if isinstance(timeout_ms, (int, float)) else None)
+        if "id" not in request:
+            return token
+
+        key = cancel_key(session, request["id"])
+        with self._requests_lock:
+            if key in self._cancelled_early:
+                del self._cancelled_early[key]
+                return None
+            self._requests[key] = token
+        return token
+
+    def _finish_request(self, request: Dict, session: Dict[str, Any]):
+        if "id" in request:
+            with self._requests_lock:
+                self._requests.pop(cancel_key(session, request["id"]), None)
+
+    def cancel_request(self, session: Dict[str, Any], request_id: Any):
+        """Отменить запрос сессии (notifications/cancelled)"""
+        key = cancel_key(session, request_id)
+        with self._requests_lock:
+            token = self._requests.get(key)
+            if token is None:
+                # Отмена обогнала сам запрос (он еще в очереди)
+                self._cancelled_early[key] = None
+                while len(self._cancelled_early) > 1024:
+                    self._cancelled_early.popitem(last=False)
+                return
+        token.cancel("cancelled")
+
+    def _is_replay(self, params: Dict, session: Dict[str, Any]) -> bool:
+        """Воспроизведение журнала супервизором (_meta.replay) — мимо контроля допуска.
+
+        Флаг действует только в stdio-сессии: ее клиент сам запустил процесс,
+        а клиенты сетевых транспортов так обойти лимиты не могут.
+        """
+        meta = params.get("_meta")
+        return session is self.session and isinstance(meta, dict) and meta.get("replay") is True
+
+    def _resolve_tenant(self, request: Dict, session: Optional[Dict[str, Any]]) -> str:
+        """Арендатор запроса: _meta.tenant в параметрах, иначе арендатор сессии.
+
+        _meta.tenant в initialize закрепляет арендатора за сессией.
+        """
+        session = session if session is not None else self.session
+        params = request.get("params")
+        meta = params.get("_meta") if isinstance(params, dict) else None
+        tenant = meta.get("tenant") if isinstance(meta, dict) else None
+        if isinstance(tenant, str) and tenant:
+            if request.get("method") == "initialize":
+                session["tenant"] = tenant
+            return tenant
+        return session.get("tenant", DEFAULT_TENANT)
+
+    def _handle_request(self, request: Dict) -> Dict:
         method = request.get("method")
         params = request.get("params", {})
         request_id = request.get("id")
         
         try:
             if method == "initialize":
+                capabilities = {
+                    "tools": {},
+                    "resources": {"subscribe": True}
+                }
+                # Ссылки $payload в ответах — только если клиент умеет их читать
+                experimental = (params.get("capabilities") or {}).get("experimental") or {}
+                if self.payloads.enabled and CAPABILITY in experimental:
+                    self._context.session["payloads"] = True
+                    capabilities["experimental"] = self.payloads.capability()
                 return {
                     "jsonrpc": "2.0",
                     "id": request_id,
                     "result": {
                         "protocolVersion": "2024-11-05",
-                        "capabilities": {
-                            "tools": {}
-                        },
+                        "capabilities": capabilities,
                         "serverInfo": {
                             "name": "Personal Assistant MCP Server",
                             "version": "1.0.0"
@@ -287,6 +890,32 @@ class StandardMCPServer:
                     }
                 }
             
+            elif method == "notifications/cancelled":
+                self.cancel_request(self._context.session, params.get("requestId"))
+                return {
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "result": {}
+                }
+            
+            elif method == "notifications/payloads":
+                # Клиент не смог прочитать ссылку (например, файл на другой машине):
+                # дальше ответы передаются в строке
+                if not params.get("enabled", True):
+                    self._context.session.pop("payloads", None)
+                return {
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "result": {}
+                }
+            
+            elif method == "ping":
+                return {
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "result": {}
+                }
+            
             elif method == "tools/list":
                 return {
                     "jsonrpc": "2.0",
@@ -297,7 +926,94 @@ class StandardMCPServer:
             elif method == "tools/call":
                 tool_name = params.get("name")
                 tool_args = params.get("arguments", {})
-                result = self.call_tool(tool_name, tool_args)
+                result = self.call_tool(tool_name, tool_args, self._progress_sender(params))
+                
+                return {
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "result": result
+                }
+            
+            elif method == "debug/profiling" and self.profiler.remote_control:
+                # Включение/настройка профилирования без перезапуска сервера (MCP_PROFILE_CONTROL=1)
+                try:
+                    status = self.profiler.configure(
+                        enabled=params.get("enabled"),
+                        threshold_ms=params.get("thresholdMs"),
+                        mode=params.get("mode"),
+                        profile_dir=params.get("profileDir")
+                    )
+                except ValueError as e:
+                    return {
+                        "jsonrpc": "2.0",
+                        "id": request_id,
+                        "error": {
+                            "code": -32602,
+                            "message": f"Invalid params: {str(e)}"
+                        }
+                    }
+                
+                return {
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "result": status
+                }
+            
+            elif method == "resources/list":
+                return {
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "result": self.get_resources_list()
+                }
+            
+            elif method == "resources/templates/list":
+                return {
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "result": self.get_resource_templates_list()
+                }
+            
+            elif method in ("resources/subscribe", "resources/unsubscribe"):
+                uri = params.get("uri", "")
+                error = self._update_subscription(uri, subscribe=method == "resources/subscribe")
+                if error:
+                    return {
+                        "jsonrpc": "2.0",
+                        "id": request_id,
+                        "error": {
+                            "code": -32602,
+                            "message": error
+                        }
+                    }
+                
+                return {
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "result": {}
+                }
+            
+            elif method == "resources/read":
+                uri = params.get("uri", "")
+                try:
+                    result = self.read_resource(uri, self._progress_sender(params))
+                except ValueError as e:
+                    return {
+                        "jsonrpc": "2.0",
+                        "id": request_id,
+                        "error": {
+                            "code": -32602,
+                            "message": f"Invalid params: {str(e)}"
+                        }
+                    }
+                if result is None:
+                    return {
+                        "jsonrpc": "2.0",
+                        "id": request_id,
+                        "error": {
+                            "code": -32002,
+                            "message": f"Resource not found: {uri}"
+                        }
+                    }
                 
                 return {
                     "jsonrpc": "2.0",
@@ -325,41 +1041,388 @@ class StandardMCPServer:
                 }
             }
 
-def main():
-    """Основная функция для запуска сервера"""
-    server = StandardMCPServer()
-    
-    for line in sys.stdin:
-        try:
-            request = json.loads(line)
-            response = server.handle_request(request)
-            # Изменяем параметры json.dumps для корректного отображения русских символов
-            print(json.dumps(response, ensure_ascii=False))
-            sys.stdout.flush()
-            
-        except json.JSONDecodeError:
-            print(json.dumps({
-                "jsonrpc": "2.0",
-                "id": None,
-                "error": {
-                    "code": -32700,
-                    "message": "Parse error"
+    def _update_subscription(self, uri: str, subscribe: bool) -> Optional[str]:
+        """Подписать (отписать) сессию текущего запроса; возвращает текст ошибки"""
+        if uri.split("?", 1)[0] not in SUBSCRIBABLE_RESOURCES:
+            return f"Resource does not support subscriptions: {uri}"
+        session = self._context.session
+        if subscribe and not callable(session.get("notify")):
+            return "Subscriptions are not supported on this transport"
+
+        tenant = self.namespace.tenant_id
+        with self._subscribers_lock:
+            subscriptions = session.setdefault("subscriptions", set())
+            if subscribe:
+                subscriptions.add(uri)
+                self._subscribers.setdefault(tenant, {})[id(session)] = session
+            else:
+                subscriptions.discard(uri)
+                if not subscriptions:
+                    self._subscribers.get(tenant, {}).pop(id(session), None)
+        return None
+
+    def _publish_tasks_updated(self, namespace: TaskNamespace):
+        """Разослать notifications/resources/updated подписчикам арендатора"""
+        with self._subscribers_lock:
+            sessions = list(self._subscribers.get(namespace.tenant_id, {}).values())
+            targets = [(session, sorted(session.get("subscriptions", ()))) for session in sessions]
+        for session, uris in targets:
+            for uri in uris:
+                notification = {
+                    "jsonrpc": "2.0",
+                    "method": "notifications/resources/updated",
+                    "params": {"uri": uri, "_meta": {"version": namespace.version}}
                 }
-            }, ensure_ascii=False))
-            sys.stdout.flush()
+                try:
+                    session["notify"]((json.dumps(notification, ensure_ascii=False) + "\n").encode("utf-8"))
+                except Exception:
+                    # Сессия закрылась — уведомление просто теряется
+                    pass
+
+    def close(self):
+        """Освободить ресурсы экземпляра: процесс вычислений, файлы $payload и потоки batch"""
+        self.evaluator.close()
+        self.payloads.close()
+        if self._batch_executor is not None:
+            self._batch_executor.shutdown(wait=False)
+            self._batch_executor = None
+
+    def drop_session(self, session: Dict[str, Any]):
+        """Удалить подписки закрытой сессии"""
+        with self._subscribers_lock:
+            for subscribers in self._subscribers.values():
+                subscribers.pop(id(session), None)
+            session.pop("subscriptions", None)
+
+    def handle_message(self, message: Any, session: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+        """Обработка входящего JSON-RPC сообщения: одиночного или batch-массива.
+
+        Для уведомлений (сообщений без id) ответ не формируется и возвращается None.
+        """
+        if isinstance(message, list):
+            return self.handle_batch(message, session)
+
+        if not isinstance(message, dict):
+            return _invalid_request()
+
+        response = self.handle_request(message, session)
+        return response if "id" in message else None
+
+    def handle_batch(self, batch: List[Any], session: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+        """Обработка batch-массива по спецификации JSON-RPC 2.0"""
+        if not batch:
+            return _invalid_request()
+
+        def handle_item(item: Any) -> Optional[Dict]:
+            if not isinstance(item, dict):
+                return _invalid_request()
+            response = self.handle_request(item, session)
+            return response if "id" in item else None
+
+        if self.batch_workers > 1 and len(batch) > 1:
+            if self._batch_executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._batch_executor = ThreadPoolExecutor(
+                    max_workers=self.batch_workers,
+                    thread_name_prefix="mcp-batch"
+                )
+            responses = list(self._batch_executor.map(handle_item, batch))
+        else:
+            responses = [handle_item(item) for item in batch]
+
+        responses = [r for r in responses if r is not None]
+        # Batch из одних уведомлений не требует ответа
+        return responses or None
+
+def _iter_json_array(items: Sequence[Any]) -> Iterator[str]:
+    """JSON массив по элементу (результат совпадает с json.dumps(items, ensure_ascii=False))"""
+    yield "["
+    for index, item in enumerate(items):
+        yield (", " if index else "") + json.dumps(item, ensure_ascii=False)
+    yield "]"
+
+
+def _format_scheduled(task: Dict[str, Any]) -> str:
+    """Задача в ответе next_tasks/overdue_tasks"""
+    priority_icon = {"high": "🔴", "medium": "🟡", "low": "🟢"}[task["priority"]]
+    result = f"{priority_icon} #{task['id']}: {task['title']}\n"
+    if task.get("due_date"):
+        result += f"   ⏰ Срок: {task['due_date']}\n"
+    return result + "\n"
+
+
+def _parse_since(uri: str) -> int:
+    """Версия из tasks://changes?since=N (без параметра — 0, то есть все изменения)"""
+    _, _, query = uri.partition("?")
+    since = "0"
+    for pair in query.split("&"):
+        key, _, value = pair.partition("=")
+        if key == "since":
+            since = value
+    try:
+        return int(since)
+    except ValueError:
+        raise ValueError(f"since должен быть целым числом: {since}")
+
+
+def _invalid_request() -> Dict:
+    return {
+        "jsonrpc": "2.0",
+        "id": None,
+        "error": {
+            "code": -32600,
+            "message": "Invalid Request"
+        }
+    }
+
+
+class FramedWriter:
+    """Буферизованный вывод JSON-RPC сообщений (одна строка = одно сообщение).
+
+    Ответы копятся в памяти и уходят в поток одним вызовом write,
+    когда вызывающий код решает сбросить буфер (обычно — когда во входном
+    пайпе больше нет готовых запросов), когда буфер превысил max_buffer
+    или когда самый старый ответ ждет дольше max_delay секунд: готовый ответ
+    не должен стоять за медленным запросом, выполняющимся следом.
+    """
+
+    def __init__(self, stream=None, max_buffer: int = 64 * 1024, max_delay: float = 0.0):
+        self.stream = stream if stream is not None else sys.stdout.buffer
+        self.max_buffer = max_buffer
+        self.max_delay = max_delay
+        self.flushes = 0
+        self._chunks: List[bytes] = []
+        self._size = 0
+        self._first_at = 0.0
+        # Уведомления могут приходить из потоков параллельного batch
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        if max_delay > 0:
+            threading.Thread(target=self._flush_loop, name="mcp-flush", daemon=True).start()
+
+    def write_message(self, message: Any):
+        """Поставить сообщение в очередь на отправку"""
+        self.write_bytes((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    def write_bytes(self, data: bytes):
+        """Поставить в очередь уже сериализованное сообщение (со строкой-разделителем)"""
+        with self._lock:
+            if not self._chunks:
+                self._first_at = time.perf_counter()
+                self._wake.notify()
+            self._chunks.append(data)
+            self._size += len(data)
+            full = self._size >= self.max_buffer
+        if full:
+            self.flush()
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._chunks)
+
+    def flush(self):
+        """Отправить все накопленные сообщения одной записью"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._chunks:
+            return
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self._size = 0
+        self.stream.write(data)
+        self.stream.flush()
+        self.flushes += 1
+
+    def _flush_loop(self):
+        """Фоновый сброс ответов, ждущих дольше max_delay"""
+        with self._wake:
+            while True:
+                if not self._chunks:
+                    self._wake.wait()
+                    continue
+                remaining = self._first_at + self.max_delay - time.perf_counter()
+                if remaining > 0:
+                    self._wake.wait(remaining)
+                    continue
+                try:
+                    self._flush_locked()
+                except (OSError, ValueError):
+                    # Клиент закрыл пайп — ответы больше некуда отправлять
+                    return
+
+
+def iter_input_lines(fd: int, chunk_size: int = 64 * 1024, max_line: int = 0):
+    """Читать stdin крупными блоками и отдавать пачки готовых строк.
+
+    Каждая пачка — все строки, которые уже лежат в пайпе; пустой список
+    означает, что следующий read заблокируется (самое время сбросить вывод).
+    От строки длиннее max_line в памяти остается только начало — ее все равно
+    отклонит проверка размера в handle_raw.
+    """
+    pending = bytearray()
+    while True:
+        chunk = os.read(fd, chunk_size)
+        if not chunk:
+            if pending.strip():
+                yield [bytes(pending)]
+            return
+        pending += chunk
+        end = pending.rfind(b"\n")
+        if end < 0:
+            if max_line and len(pending) > max_line:
+                del pending[max_line + 1:]
             continue
-        
-        except Exception as e:
-            print(json.dumps({
-                "jsonrpc": "2.0",
-                "id": None,
-                "error": {
-                    "code": -32603,
-                    "message": f"Internal error: {str(e)}"
-                }
-            }, ensure_ascii=False))
-            sys.stdout.flush()
+        lines = bytes(pending[:end]).split(b"\n")
+        del pending[:end + 1]
+        yield lines
+
+
+# Уведомление об отмене — короткое сообщение; длинные строки не разбираются дважды
+CANCEL_LINE_MAX = 4096
+
+
+def _is_cancel_notification(line: bytes) -> bool:
+    """Строка — одиночное уведомление notifications/cancelled (без id).
+
+    Запросы и batch, где эта подстрока встречается в аргументах, идут через очередь.
+    """
+    if len(line) > CANCEL_LINE_MAX or b"notifications/cancelled" not in line:
+        return False
+    try:
+        message = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return False
+    return isinstance(message, dict) and message.get("method") == "notifications/cancelled" and "id" not in message
+
+
+def _read_input(server: StandardMCPServer, fd: int, lines_queue: "queue.Queue[Optional[List[bytes]]]"):
+    """Поток чтения stdin: пачки строк уходят в очередь по порядку.
+
+    notifications/cancelled выполняется сразу в этом потоке, не дожидаясь
+    очереди, — иначе отмена ждала бы завершения запроса, который отменяет.
+    """
+    try:
+        for lines in iter_input_lines(fd, max_line=server.admission.max_request_bytes):
+            pending = []
+            for line in lines:
+                if _is_cancel_notification(line):
+                    _process_line(server, line)
+                else:
+                    pending.append(line)
+            if pending:
+                # Глубина очереди — основа для сброса нагрузки; полная очередь
+                # останавливает чтение, и клиент упирается в заполненный пайп
+                server.admission.enqueued(len(pending))
+                lines_queue.put(pending)
+    finally:
+        lines_queue.put(None)
+
+
+def _process_line(server: StandardMCPServer, line: bytes) -> Optional[bytes]:
+    """Обработать одну строку (запрос, уведомление или batch) и получить сериализованный ответ"""
+    if not line.strip():
+        return None
+
+    try:
+        return server.handle_raw(line)
+
+    except Exception as e:
+        return (json.dumps({
+            "jsonrpc": "2.0",
+            "id": None,
+            "error": {
+                "code": -32603,
+                "message": f"Internal error: {str(e)}"
+            }
+        }, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _terminate(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+def _next_lines(lines_queue: "queue.Queue[Optional[List[bytes]]]") -> Optional[List[bytes]]:
+    """Дождаться следующей пачки строк.
+
+    Сигнал может достаться любому потоку процесса, а Python обработчик
+    выполняется только в главном — после выхода из блокирующего ожидания.
+    Поэтому очередь ждем с таймаутом, а не бесконечно.
+    """
+    while True:
+        try:
+            return lines_queue.get(timeout=SIGNAL_POLL_INTERVAL)
+        except queue.Empty:
             continue
 
+
+def main():
+    """Основная функция для запуска сервера"""
+    if len(sys.argv) == 3 and sys.argv[1] == "--dump-tools":
+        dump_tools_registry(sys.argv[2])
+        print(f"💾 Реестр инструментов сохранен в {sys.argv[2]}", file=sys.stderr)
+        return
+
+    # MCP_BATCH_WORKERS > 1 — параллельное выполнение элементов batch-запроса
+    server = StandardMCPServer(batch_workers=int(os.getenv("MCP_BATCH_WORKERS", "0")))
+
+    # Окно ожидания (мс) следующих запросов перед сбросом буфера; 0 — не ждать
+    flush_window = float(os.getenv("MCP_FLUSH_WINDOW_MS", "0")) / 1000
+    # MCP_WRITE_BUFFER=0 — сбрасывать каждый ответ сразу (старое поведение).
+    # Готовый ответ ждет в буфере не дольше окна и MCP_FLUSH_MAX_DELAY_MS,
+    # даже если следом выполняется долгий запрос
+    max_delay = float(os.getenv("MCP_FLUSH_MAX_DELAY_MS", "1")) / 1000
+    writer = FramedWriter(max_buffer=int(os.getenv("MCP_WRITE_BUFFER", 64 * 1024)),
+                          max_delay=max(flush_window, max_delay))
+    # Уведомления (notifications/resources/updated) идут в тот же буфер, что и ответы
+    server.session["notify"] = writer.write_bytes
+    first_pending_at = 0.0
+
+    # stdin читает отдельный поток, чтобы отмена дошла до сервера, пока запрос выполняется;
+    # сами запросы выполняются здесь по очереди, как пришли
+    lines_queue: "queue.Queue[Optional[List[bytes]]]" = queue.Queue(maxsize=INPUT_QUEUE_CHUNKS)
+    threading.Thread(target=_read_input, args=(server, sys.stdin.fileno(), lines_queue),
+                     name="mcp-stdin", daemon=True).start()
+    prefetched = False
+
+    # SIGTERM (MCPConnection.close, супервизор) завершает сервер так же, как конец stdin:
+    # буфер отправляется, снимок задач сохраняется
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        while True:
+            if not prefetched:
+                lines = _next_lines(lines_queue)
+            prefetched = False
+            if lines is None:
+                break
+            for line in lines:
+                server.admission.dequeued()
+                response = _process_line(server, line)
+                if response is not None:
+                    if not writer.pending:
+                        first_pending_at = time.perf_counter()
+                    writer.write_bytes(response)
+
+            if not writer.pending:
+                continue
+
+            # Сбрасываем буфер, только если следующий запрос еще не пришел
+            remaining = flush_window - (time.perf_counter() - first_pending_at)
+            try:
+                lines = lines_queue.get(timeout=remaining) if remaining > 0 else lines_queue.get_nowait()
+                prefetched = True
+            except queue.Empty:
+                writer.flush()
+    finally:
+        try:
+            writer.flush()
+        except (OSError, ValueError):
+            # Клиент уже закрыл пайп
+            pass
+        server.close()
+        # MCP_TASKS_SNAPSHOT — сохранить задачи для следующего запуска
+        server.tenants.save_snapshot()
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file
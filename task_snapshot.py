@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Колоночные бинарные снимки списка задач
+
+Снимок пишется одним проходом и открывается через mmap: числовые поля лежат
+колонками фиксированной ширины, строки — в общей куче UTF-8 со смещениями.
+Открытие снимка не зависит от числа задач, а аналитика (счетчики по
+приоритетам, просроченные задачи) просматривает колонки напрямую, не создавая
+словарь на каждую задачу.
+
+Формат (little-endian, секции выровнены по 8 байт):
+  заголовок   magic "MCPSNAP1", версия u32, число задач u64, размер кучи u64
+  id          i64[n]
+  created     i64[n]   время создания, микросекунды от 1970-01-01 (локальное время)
+  due         i64[n]   срок (parse_due_date), NO_TIME если срока нет
+  completed_at i64[n]  время завершения, NO_TIME если задача не завершена
+  priority    u8[n]    0 — high, 1 — medium, 2 — low
+  completed   u8[n]    0/1
+  offsets     u64[3n+1] границы строк в куче: title, description, due_date задачи i — 3i, 3i+1, 3i+2
+  heap        байты UTF-8
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+MAGIC = b"MCPSNAP1"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIQQ")
+HEADER_SIZE = 32
+
+PRIORITIES = ("high", "medium", "low")
+NO_TIME = -2 ** 63
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def to_micros(value: datetime) -> int:
+    """Локальное время без часового пояса -> микросекунды (без потерь точности)"""
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def from_micros(micros: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=micros)
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _column(typecode: str, values: Iterable[int]) -> bytes:
+    column = array(typecode, values)
+    if not _LITTLE_ENDIAN:
+        column.byteswap()
+    return column.tobytes()
+
+
+def write_snapshot(path: str, tasks: Sequence[Dict[str, Any]]) -> int:
+    """Записать снимок задач; возвращает размер файла в байтах.
+
+    Файл пишется во временный и подменяется атомарно, так что открытый
+    снимок (mmap) у читателей остается целым.
+    """
+    # Отложенный импорт: task_tenants сам импортирует этот модуль при загрузке снимка
+    from task_tenants import parse_due_date
+
+    count = len(tasks)
+    heap = bytearray()
+    offsets = [0]
+    due: List[int] = []
+    for task in tasks:
+        due_date = task.get("due_date") or ""
+        for text in (task.get("title", ""), task.get("description", ""), due_date):
+            heap += text.encode("utf-8")
+            offsets.append(len(heap))
+        due.append(to_micros(parse_due_date(due_date)) if due_date else NO_TIME)
+
+    sections = [
+        _column("q", (task["id"] for task in tasks)),
+        _column("q", (to_micros(datetime.fromisoformat(task["created_at"])) for task in tasks)),
+        _column("q", due),
+        _column("q", (to_micros(datetime.fromisoformat(task["completed_at"])) if task.get("completed_at")
+                      else NO_TIME for task in tasks)),
+        _column("B", (PRIORITIES.index(task["priority"]) for task in tasks)),
+        _column("B", (1 if task.get("completed") else 0 for task in tasks)),
+        _column("Q", offsets),
+        bytes(heap),
+    ]
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, count, len(heap)).ljust(HEADER_SIZE, b"\0"))
+        position = HEADER_SIZE
+        for section in sections:
+            f.write(section)
+            position += len(section)
+            padding = _align(position) - position
+            f.write(b"\0" * padding)
+            position += padding
+    os.replace(tmp_path, path)
+    return position
+
+
+class TaskSnapshot:
+    """Снимок, открытый через mmap: колонки — memoryview без копирования"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, count, heap_size = HEADER.unpack_from(self._mmap, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"{path}: не снимок задач версии {FORMAT_VERSION}")
+            self.count = count
+            view = memoryview(self._mmap)
+            position = HEADER_SIZE
+
+            def take(typecode: str, length: int) -> memoryview:
+                nonlocal position
+                size = struct.calcsize(typecode) * length
+                if position + size > len(self._mmap):
+                    raise ValueError(f"{path}: файл снимка обрезан")
+                section = view[position:position + size]
+                position = _align(position + size)
+                if not _LITTLE_ENDIAN and typecode != "B":
+                    # На big-endian колонки переворачиваются в память
+                    swapped = array(typecode, section.tobytes())
+                    swapped.byteswap()
+                    return memoryview(swapped)
+                return section.cast(typecode)
+
+            self.ids = take("q", count)
+            self.created = take("q", count)
+            self.due = take("q", count)
+            self.completed_at = take("q", count)
+            self.priority = take("B", count)
+            self.completed = take("B", count)
+            self.offsets = take("Q", 3 * count + 1)
+            self.heap = view[position:position + heap_size]
+            if len(self.heap) != heap_size:
+                raise ValueError(f"{path}: файл снимка обрезан")
+        except Exception:
+            self.close()
+            raise
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self) -> "TaskSnapshot":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        # memoryview на mmap нужно отпустить до закрытия файла
+        for name in ("ids", "created", "due", "completed_at", "priority", "completed", "offsets", "heap"):
+            view = self.__dict__.pop(name, None)
+            if isinstance(view, memoryview):
+                view.release()
+        if not self._mmap.closed:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Кто-то еще держит срез колонки; файл закроется вместе с ним
+                pass
+
+    def _string(self, index: int) -> str:
+        return bytes(self.heap[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8")
+
+    def title(self, i: int) -> str:
+        return self._string(3 * i)
+
+    def description(self, i: int) -> str:
+        return self._string(3 * i + 1)
+
+    def due_date(self, i: int) -> str:
+        return self._string(3 * i + 2)
+
+    def task(self, i: int) -> Dict[str, Any]:
+        """Задача i в виде словаря, как в TaskNamespace.tasks"""
+        task = {
+            "id": self.ids[i],
+            "title": self.title(i),
+            "description": self.description(i),
+            "priority": PRIORITIES[self.priority[i]],
+            "completed": bool(self.completed[i]),
+            "created_at": from_micros(self.created[i]).isoformat(),
+        }
+        due_date = self.due_date(i)
+        if due_date:
+            task["due_date"] = due_date
+        if self.completed_at[i] != NO_TIME:
+            task["completed_at"] = from_micros(self.completed_at[i]).isoformat()
+        return task
+
+    def iter_tasks(self) -> Iterator[Dict[str, Any]]:
+        for i in range(self.count):
+            yield self.task(i)
+
+    def tasks(self) -> List[Dict[str, Any]]:
+        """Все задачи разом: колонки читаются целиком, а не по элементу"""
+        heap = self.heap.tobytes()
+        offsets = self.offsets.tolist()
+        strings = [heap[offsets[j]:offsets[j + 1]].decode("utf-8") for j in range(3 * self.count)]
+        epoch = _EPOCH
+        tasks = []
+        for i, (task_id, priority, completed, created, completed_at) in enumerate(zip(
+                self.ids.tolist(), self.priority.tobytes(), self.completed.tobytes(),
+                self.created.tolist(), self.completed_at.tolist())):
+            task = {
+                "id": task_id,
+                "title": strings[3 * i],
+                "description": strings[3 * i + 1],
+                "priority": PRIORITIES[priority],
+                "completed": completed == 1,
+                "created_at": (epoch + timedelta(microseconds=created)).isoformat(),
+            }
+            if strings[3 * i + 2]:
+                task["due_date"] = strings[3 * i + 2]
+            if completed_at != NO_TIME:
+                task["completed_at"] = (epoch + timedelta(microseconds=completed_at)).isoformat()
+            tasks.append(task)
+        return tasks
+
+    def summary(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Счетчики по колонкам, без создания словарей задач"""
+        priority = self.priority.tobytes()
+        completed = self.completed.tobytes()
+        now_micros = to_micros(now or datetime.now())
+        overdue = sum(1 for due, done in zip(self.due, completed)
+                      if not done and due != NO_TIME and due <= now_micros)
+        return {
+            "total": self.count,
+            "completed": completed.count(1),
+            "pending": self.count - completed.count(1),
+            "by_priority": {name: priority.count(code) for code, name in enumerate(PRIORITIES)},
+            "overdue": overdue,
+        }
+
+
+def main():
+    """Экспорт JSON -> снимок, импорт снимок -> JSON и сводка по снимку"""
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Колоночные снимки списка задач")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="JSON список задач (tasks://list) -> снимок")
+    export.add_argument("source")
+    export.add_argument("snapshot")
+    restore = commands.add_parser("import", help="снимок -> JSON список задач")
+    restore.add_argument("snapshot")
+    restore.add_argument("target")
+    summary = commands.add_parser("summary", help="счетчики по колонкам снимка")
+    summary.add_argument("snapshot")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        with open(args.source, encoding="utf-8") as f:
+            tasks = json.load(f)
+        size = write_snapshot(args.snapshot, tasks)
+        print(f"💾 Снимок: {len(tasks)} задач, {size} байт -> {args.snapshot}")
+    elif args.command == "import":
+        with TaskSnapshot(args.snapshot) as snapshot, open(args.target, "w", encoding="utf-8") as f:
+            json.dump(snapshot.tasks(), f, ensure_ascii=False)
+        print(f"📥 Задачи из {args.snapshot} сохранены в {args.target}")
+    else:
+        with TaskSnapshot(args.snapshot) as snapshot:
+            print(json.dumps(snapshot.summary(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Изолированные пространства задач для нескольких пользователей (арендаторов)
+
+Каждый арендатор получает свои задачи, индекс по id, кучи незавершенных
+задач по приоритету и сроку, счетчики и историю вычислений с лимитами. Неактивные арендаторы вытесняются на диск (LRU)
+и загружаются обратно при следующем обращении.
+
+Списки задач читаются по снимкам (TaskNamespace.snapshot): задача после
+добавления не меняется — завершение заменяет ее новым словарем, — поэтому
+снимок версии можно обходить и сериализовать без блокировки, пока писатели
+добавляют и завершают задачи.
+"""
+
+import atexit
+import bisect
+import hashlib
+import heapq
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from calc_analytics import HistoryColumns
+
+DEFAULT_TENANT = "default"
+
+# Порядок приоритетов в планировщике (меньше — раньше)
+PRIORITY_RANK = {"high": 0, "medium": 1, "low": 2}
+
+
+def parse_due_date(value: str) -> datetime:
+    """Срок задачи: дата (YYYY-MM-DD, до конца дня) или дата и время в ISO формате.
+
+    Возвращает локальное время без часового пояса; ValueError — неверный формат.
+    """
+    due = datetime.fromisoformat(value)
+    if len(value) == 10:
+        return due + timedelta(days=1)
+    if due.tzinfo is not None:
+        due = due.astimezone().replace(tzinfo=None)
+    return due
+
+
+def _iter_heap(heap: List[Tuple]) -> Iterator[Tuple]:
+    """Элементы кучи по возрастанию без ее изменения.
+
+    Обход лучший-первым по дереву кучи: k элементов стоят O(k log k),
+    а не O(n log n) за полную сортировку.
+    """
+    if not heap:
+        return
+    frontier = [(heap[0], 0)]
+    while frontier:
+        entry, index = heapq.heappop(frontier)
+        yield entry
+        for child in (2 * index + 1, 2 * index + 2):
+            if child < len(heap):
+                heapq.heappush(frontier, (heap[child], child))
+
+
+class TenantLimitError(Exception):
+    """Превышен лимит арендатора"""
+
+
+class TaskView:
+    """Неизменяемый снимок задач одной версии.
+
+    tasks — кортеж словарей задач; словари общие с хранилищем и не должны
+    изменяться читателями.
+    """
+
+    __slots__ = ("version", "tasks", "completed_count")
+
+    def __init__(self, version: int, tasks: Tuple[Dict[str, Any], ...], completed_count: int):
+        self.version = version
+        self.tasks = tasks
+        self.completed_count = completed_count
+
+
+class TaskNamespace:
+    """Задачи и история вычислений одного арендатора"""
+
+    def __init__(self, tenant_id: str, max_tasks: int = 10000, max_history_bytes: int = 1024 * 1024,
+                 max_history_rows: int = 1_000_000):
+        self.tenant_id = tenant_id
+        self.max_tasks = max_tasks
+        self.max_history_bytes = max_history_bytes
+        self.tasks: List[Dict[str, Any]] = []
+        self.tasks_by_id: Dict[int, Dict[str, Any]] = {}
+        # id задач в том же порядке, что и tasks: позиция задачи ищется бинарным поиском
+        # без key= у bisect (он появился только в Python 3.10)
+        self._task_ids: List[int] = []
+        self.next_task_id = 1
+        self.completed_count = 0
+        self.calculator_history: List[Dict[str, Any]] = []
+        self._entry_bytes = 0
+        # Время и результат каждого вычисления в колонках для calc_stats. Лимит
+        # max_history_bytes общий для списка и колонок; колонки еще ограничены по числу строк
+        self.history_columns = HistoryColumns(max_history_rows)
+        # Версия задач растет на каждое изменение; журнал (версия, id задачи, операция)
+        # упорядочен по версии, поэтому изменения после since находятся бинарным поиском
+        self.version = 0
+        self.changes: List[Tuple[int, int, str]] = []
+        # Кучи незавершенных задач: (приоритет, срок, id) и (срок, id) для задач со сроком.
+        # Завершенные задачи удаляются лениво: пропускаются при обходе, а когда их
+        # становится больше половины, кучи перестраиваются
+        self.schedule: List[Tuple[int, float, int]] = []
+        self.deadlines: List[Tuple[float, int]] = []
+        self._stale = 0
+        self.lock = threading.RLock()
+        # Снимок последней прочитанной версии: читатели одной версии делят один кортеж
+        self._view = TaskView(-1, (), 0)
+        self.last_used = datetime.now().isoformat()
+        # Число запросов, которые сейчас работают с пространством (такое не вытесняется)
+        self.active = 0
+
+    def add_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """Добавить задачу, присвоив ей следующий id"""
+        with self.lock:
+            if len(self.tasks) >= self.max_tasks:
+                raise TenantLimitError(f"достигнут лимит задач ({self.max_tasks})")
+            task = {"id": self.next_task_id, **task}
+            self.next_task_id += 1
+            self.tasks.append(task)
+            self._task_ids.append(task["id"])
+            self.tasks_by_id[task["id"]] = task
+            self._schedule(task)
+            self._log_change(task["id"], "added")
+            return task
+
+    def get_task(self, task_id: int) -> Optional[Dict[str, Any]]:
+        return self.tasks_by_id.get(task_id)
+
+    def mark_completed(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """Завершить задачу; возвращает новый словарь задачи.
+
+        Старый словарь не меняется: он может быть в снимке, который сейчас читают.
+        """
+        with self.lock:
+            completed = {**task, "completed": True, "completed_at": datetime.now().isoformat()}
+            self.tasks[self._position(task["id"])] = completed
+            self.tasks_by_id[task["id"]] = completed
+            self.completed_count += 1
+            self._stale += 1
+            if self._stale * 2 > len(self.schedule):
+                self._rebuild_schedule()
+            self._log_change(task["id"], "completed")
+            return completed
+
+    def snapshot(self) -> TaskView:
+        """Согласованный снимок задач текущей версии.
+
+        Под блокировкой копируется только список ссылок, и то один раз на
+        версию; обход и сериализация снимка блокировку не держат.
+        """
+        view = self._view
+        # Версия растет после изменения, поэтому снимок с текущей версией полон
+        if view.version == self.version:
+            return view
+        with self.lock:
+            if self._view.version != self.version:
+                self._view = TaskView(self.version, tuple(self.tasks), self.completed_count)
+            return self._view
+
+    def _position(self, task_id: int) -> int:
+        """Индекс задачи в списке: id растут в порядке добавления"""
+        index = bisect.bisect_left(self._task_ids, task_id)
+        if index < len(self._task_ids) and self._task_ids[index] == task_id:
+            return index
+        return self._task_ids.index(task_id)
+
+    def next_tasks(self, k: int) -> List[Dict[str, Any]]:
+        """k незавершенных задач по приоритету, затем по сроку (без срока — последними)"""
+        result = []
+        for _, _, task_id in _iter_heap(self.schedule):
+            if len(result) >= k:
+                break
+            task = self.tasks_by_id[task_id]
+            if not task["completed"]:
+                result.append(task)
+        return result
+
+    def overdue_tasks(self, k: int, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """До k незавершенных задач с истекшим сроком, самые просроченные первыми"""
+        now_ts = (now or datetime.now()).timestamp()
+        result = []
+        for due_ts, task_id in _iter_heap(self.deadlines):
+            if len(result) >= k or due_ts > now_ts:
+                break
+            task = self.tasks_by_id[task_id]
+            if not task["completed"]:
+                result.append(task)
+        return result
+
+    def _schedule(self, task: Dict[str, Any]):
+        entry, deadline = _schedule_entries(task)
+        heapq.heappush(self.schedule, entry)
+        if deadline is not None:
+            heapq.heappush(self.deadlines, deadline)
+
+    def _rebuild_schedule(self):
+        """Кучи заново по незавершенным задачам, O(n)"""
+        self.schedule, self.deadlines, self._stale = [], [], 0
+        for task in self.tasks:
+            if not task.get("completed"):
+                entry, deadline = _schedule_entries(task)
+                self.schedule.append(entry)
+                if deadline is not None:
+                    self.deadlines.append(deadline)
+        heapq.heapify(self.schedule)
+        heapq.heapify(self.deadlines)
+
+    def changes_since(self, since: int) -> Dict[str, Any]:
+        """Задачи, добавленные или завершенные после версии since.
+
+        Стоимость пропорциональна числу изменений, а не размеру хранилища.
+        Задача, добавленная и завершенная после since, попадает только в added
+        (в текущем состоянии). Если since больше текущей версии (например,
+        клиент синхронизировался с другим процессом), возвращается полный
+        список с reset=true.
+        """
+        if since < 0 or since > self.version:
+            return {"version": self.version, "since": since, "reset": True,
+                    "added": list(self.tasks), "completed": []}
+
+        # (since, inf) больше любой записи версии since и меньше записей следующих версий
+        start = bisect.bisect_right(self.changes, (since, math.inf))
+        added: List[Dict[str, Any]] = []
+        completed: List[Dict[str, Any]] = []
+        added_ids = set()
+        for _, task_id, operation in self.changes[start:]:
+            task = self.tasks_by_id[task_id]
+            if operation == "added":
+                added.append(task)
+                added_ids.add(task_id)
+            elif task_id not in added_ids:
+                completed.append(task)
+        return {"version": self.version, "since": since, "reset": False,
+                "added": added, "completed": completed}
+
+    def _log_change(self, task_id: int, operation: str):
+        self.version += 1
+        self.changes.append((self.version, task_id, operation))
+
+    @property
+    def history_bytes(self) -> int:
+        """Память истории вычислений: записи списка и колонки calc_stats"""
+        return self._entry_bytes + self.history_columns.nbytes
+
+    def add_history(self, entry: Dict[str, Any]):
+        """Добавить запись в историю; самые старые записи вытесняются при превышении лимита"""
+        self.history_columns.append(datetime.fromisoformat(entry["timestamp"]).timestamp(), entry["result"])
+        self.calculator_history.append(entry)
+        self._entry_bytes += _entry_size(entry)
+        self._trim_history()
+
+    def _trim_history(self):
+        """Вытеснить самые старые вычисления из списка и колонок вместе, пока история не уложится в лимит"""
+        while self.history_bytes > self.max_history_bytes:
+            extra_rows = len(self.history_columns) - len(self.calculator_history)
+            if extra_rows > 0:
+                # Строки колонок старше самой старой записи списка (файл прежней версии) уходят первыми
+                excess = self.history_bytes - self.max_history_bytes
+                self.history_columns.drop_oldest(min(extra_rows, -(-excess // HistoryColumns.ROW_BYTES)))
+            elif len(self.calculator_history) > 1:
+                self._entry_bytes -= _entry_size(self.calculator_history.pop(0))
+                self.history_columns.drop_oldest(len(self.history_columns) - len(self.calculator_history))
+            else:
+                break
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tenant_id": self.tenant_id,
+            "next_task_id": self.next_task_id,
+            "version": self.version,
+            "changes": self.changes,
+            "tasks": self.tasks,
+            "calculator_history": self.calculator_history,
+            "calculator_columns": self.history_columns.to_dict() if len(self.history_columns) else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], **limits) -> "TaskNamespace":
+        namespace = cls(data["tenant_id"], **limits)
+        namespace.tasks = data.get("tasks", [])
+        namespace.tasks_by_id = {task["id"]: task for task in namespace.tasks}
+        namespace._task_ids = [task["id"] for task in namespace.tasks]
+        namespace.next_task_id = data.get("next_task_id", len(namespace.tasks) + 1)
+        namespace.completed_count = sum(1 for task in namespace.tasks if task.get("completed"))
+        namespace._rebuild_schedule()
+        if "changes" in data:
+            namespace.version = data.get("version", 0)
+            namespace.changes = [tuple(change) for change in data["changes"]]
+        else:
+            # Файл без журнала: восстанавливаем его в порядке задач
+            for task in namespace.tasks:
+                namespace._log_change(task["id"], "added")
+            for task in namespace.tasks:
+                if task.get("completed"):
+                    namespace._log_change(task["id"], "completed")
+        namespace.calculator_history = data.get("calculator_history", [])
+        namespace._entry_bytes = sum(_entry_size(entry) for entry in namespace.calculator_history)
+        if data.get("calculator_columns"):
+            namespace.history_columns = HistoryColumns.from_dict(data["calculator_columns"],
+                                                                 namespace.history_columns.max_rows)
+        else:
+            # Файл без колонок: восстанавливаем их по сохраненному списку
+            for entry in namespace.calculator_history:
+                namespace.history_columns.append(datetime.fromisoformat(entry["timestamp"]).timestamp(),
+                                                 entry["result"])
+        namespace._trim_history()
+        return namespace
+
+
+class TenantRegistry:
+    """LRU-реестр пространств арендаторов с вытеснением на диск.
+
+    В памяти держится не больше max_active пространств; давно не
+    использовавшиеся сохраняются в store_dir (один JSON файл на арендатора).
+    Пространство арендатора по умолчанию не вытесняется никогда.
+
+    Без явного store_dir (MCP_TENANT_DIR) у реестра свой временный каталог:
+    он создается при первом вытеснении и удаляется при завершении процесса,
+    поэтому разные процессы и экземпляры не видят арендаторов друг друга.
+    """
+
+    def __init__(self, max_active: int = 1000, store_dir: Optional[str] = None,
+                 max_tasks: int = 10000, max_history_bytes: int = 1024 * 1024,
+                 max_history_rows: int = 1_000_000, snapshot_path: Optional[str] = None):
+        self.max_active = max_active
+        self._store_dir = store_dir or None
+        # Колоночный снимок задач арендатора по умолчанию (task_snapshot.py):
+        # загружается при первом обращении, сохраняется save_snapshot()
+        self.snapshot_path = snapshot_path
+        self.limits = {"max_tasks": max_tasks, "max_history_bytes": max_history_bytes,
+                       "max_history_rows": max_history_rows}
+        self.evictions = 0
+        self._active: "OrderedDict[str, TaskNamespace]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_env(cls) -> "TenantRegistry":
+        """Настройки из переменных окружения MCP_TENANT_*"""
+        return cls(
+            max_active=int(os.getenv("MCP_TENANT_MAX_ACTIVE", "1000")),
+            store_dir=os.getenv("MCP_TENANT_DIR"),
+            max_tasks=int(os.getenv("MCP_TENANT_MAX_TASKS", "10000")),
+            max_history_bytes=int(os.getenv("MCP_TENANT_MAX_HISTORY_BYTES", str(1024 * 1024))),
+            max_history_rows=int(os.getenv("MCP_TENANT_MAX_HISTORY_ROWS", "1000000")),
+            snapshot_path=os.getenv("MCP_TASKS_SNAPSHOT")
+        )
+
+    def __len__(self) -> int:
+        return len(self._active)
+
+    @property
+    def store_dir(self) -> str:
+        """Каталог вытесненных арендаторов (временный создается при первом обращении)"""
+        with self._lock:
+            if self._store_dir is None:
+                self._store_dir = tempfile.mkdtemp(prefix="mcp_tenants_")
+                atexit.register(shutil.rmtree, self._store_dir, True)
+            return self._store_dir
+
+    @store_dir.setter
+    def store_dir(self, value: str):
+        self._store_dir = value
+
+    def get(self, tenant_id: str = DEFAULT_TENANT) -> TaskNamespace:
+        """Получить пространство арендатора (из памяти, с диска или новое)"""
+        with self._lock:
+            namespace = self._active.get(tenant_id)
+            if namespace is not None:
+                self._active.move_to_end(tenant_id)
+            else:
+                namespace = self._load(tenant_id) or TaskNamespace(tenant_id, **self.limits)
+                self._active[tenant_id] = namespace
+                # Только что загруженное пространство вытеснять нельзя: его сейчас вернут вызывающему
+                self._evict(keep=tenant_id)
+            namespace.last_used = datetime.now().isoformat()
+            return namespace
+
+    def acquire(self, tenant_id: str = DEFAULT_TENANT) -> TaskNamespace:
+        """Получить пространство и пометить его занятым на время запроса"""
+        with self._lock:
+            namespace = self.get(tenant_id)
+            namespace.active += 1
+            return namespace
+
+    def release(self, namespace: TaskNamespace):
+        with self._lock:
+            namespace.active -= 1
+
+    def save_snapshot(self, tenant_id: str = DEFAULT_TENANT) -> Optional[int]:
+        """Записать задачи арендатора в снимок snapshot_path; размер файла или None"""
+        if not self.snapshot_path:
+            return None
+        from task_snapshot import write_snapshot
+        return write_snapshot(self.snapshot_path, self.get(tenant_id).snapshot().tasks)
+
+    def flush(self):
+        """Сохранить все пространства на диск"""
+        with self._lock:
+            for namespace in self._active.values():
+                self._save(namespace)
+
+    def _evict(self, keep: Optional[str] = None):
+        if len(self._active) <= self.max_active:
+            return
+        for tenant_id in list(self._active):
+            if len(self._active) <= self.max_active:
+                break
+            namespace = self._active[tenant_id]
+            if tenant_id in (DEFAULT_TENANT, keep) or namespace.active:
+                continue
+            self._save(namespace)
+            del self._active[tenant_id]
+            self.evictions += 1
+
+    def _path(self, tenant_id: str) -> str:
+        digest = hashlib.sha256(tenant_id.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.store_dir, f"{digest}.json")
+
+    def _save(self, namespace: TaskNamespace):
+        os.makedirs(self.store_dir, exist_ok=True)
+        path = self._path(namespace.tenant_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(namespace.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _load(self, tenant_id: str) -> Optional[TaskNamespace]:
+        if tenant_id == DEFAULT_TENANT and self.snapshot_path and os.path.exists(self.snapshot_path):
+            return self._load_snapshot(tenant_id)
+        if self._store_dir is None:
+            # Временный каталог еще не создан — на диске этого арендатора нет
+            return None
+        try:
+            with open(self._path(tenant_id), encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if data.get("tenant_id") != tenant_id:
+            return None
+        return TaskNamespace.from_dict(data, **self.limits)
+
+    def _load_snapshot(self, tenant_id: str) -> Optional[TaskNamespace]:
+        from task_snapshot import TaskSnapshot
+        try:
+            with TaskSnapshot(self.snapshot_path) as snapshot:
+                tasks = snapshot.tasks()
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Снимок задач не загружен: {e}", file=sys.stderr)
+            return None
+        next_task_id = max((task["id"] for task in tasks), default=0) + 1
+        return TaskNamespace.from_dict({"tenant_id": tenant_id, "tasks": tasks, "next_task_id": next_task_id},
+                                       **self.limits)
+
+
+def _schedule_entries(task: Dict[str, Any]) -> Tuple[Tuple[int, float, int], Optional[Tuple[float, int]]]:
+    """Элементы куч планировщика для задачи"""
+    due = task.get("due_date")
+    due_ts = parse_due_date(due).timestamp() if due else float("inf")
+    deadline = (due_ts, task["id"]) if due else None
+    return (PRIORITY_RANK.get(task["priority"], 1), due_ts, task["id"]), deadline
+
+
+def _entry_size(entry: Dict[str, Any]) -> int:
+    return len(json.dumps(entry, ensure_ascii=False).encode("utf-8"))
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Тест колонок истории калькулятора и инструмента calc_stats
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+import calc_analytics
+from calc_analytics import HistoryColumns, format_stats, parse_window
+from mcp_connection import NO_SITE_COMMAND, SERVER_COMMAND
+from standard_mcp_server import StandardMCPServer
+from task_tenants import TaskNamespace
+
+def test_calc_analytics():
+    print("🧪 Тестирование аналитики вычислений...")
+
+    # Тест 1: агрегаты за окно совпадают с прямым расчетом
+    print("🔄 Тест 1: агрегаты за окно")
+    columns = HistoryColumns()
+    for i in range(600):
+        # 10 вызовов в секунду: 60 секунд истории
+        columns.append(1000.0 + i / 10, float(i))
+    stats = columns.aggregate()
+    assert stats["count"] == stats["numeric"] == 600
+    assert stats["sum"] == sum(range(600)) and stats["min"] == 0 and stats["max"] == 599
+    assert stats["mean"] == 299.5 and stats["percentiles"]["p50"] == 299.5
+    assert stats["peak_per_minute"] == 600
+    window = columns.aggregate(1010.0, 1019.95)
+    assert window["count"] == 100 and window["min"] == 100 and window["max"] == 199
+    assert columns.aggregate(0, 999)["count"] == 0
+
+    # Нечисловые результаты учитываются в count, но не в агрегатах
+    columns.append(1060.0, "ошибка")
+    columns.append(1061.0, float("inf"))
+    stats = columns.aggregate(1060.0)
+    assert stats["count"] == 2 and stats["numeric"] == 0 and "sum" not in stats
+
+    # Время пошло назад: окна считаются маской, результат тот же
+    shuffled = HistoryColumns()
+    order = np.random.default_rng(1).permutation(600)
+    shuffled.extend(1000.0 + order / 10, order.astype(float))
+    assert shuffled.aggregate(1010.0, 1019.95) == window
+
+    # Без NumPy (сервер под python -S) сводка та же
+    windows = ((None, None), (1010.0, 1019.95), (1030.0, None))
+    expected = [source.aggregate(*window) for source in (columns, shuffled) for window in windows]
+    numpy_module = calc_analytics._numpy
+    calc_analytics._numpy = lambda: None
+    try:
+        actual = [source.aggregate(*window) for source in (columns, shuffled) for window in windows]
+        python_columns = HistoryColumns()
+        python_columns.extend([1.0, 3.0, 2.0], [1.0, float("nan"), 2.0])
+        assert python_columns.non_numeric == 1 and python_columns.aggregate()["sum"] == 3.0
+    finally:
+        calc_analytics._numpy = numpy_module
+    for python_stats, numpy_stats in zip(actual, expected):
+        assert python_stats.keys() == numpy_stats.keys()
+        for key, value in python_stats.items():
+            if isinstance(value, dict):
+                assert all(abs(value[p] - numpy_stats[key][p]) < 1e-9 for p in value), key
+            else:
+                assert abs(value - numpy_stats[key]) < 1e-9, key
+
+    # Тест 2: ограничение числа строк и сериализация
+    print("🔄 Тест 2: вытеснение и to_dict")
+    limited = HistoryColumns(max_rows=100)
+    for i in range(250):
+        limited.append(float(i), i)
+    assert len(limited) <= 100 and limited.dropped == 250 - len(limited)
+    assert limited.values[-1] == 249 and limited.timestamps[0] == 250 - len(limited)
+    restored = HistoryColumns.from_dict(limited.to_dict())
+    assert np.array_equal(restored.values, limited.values)
+
+    # Большие окна: перцентили по выборке, остальные агрегаты точные
+    big = HistoryColumns(max_rows=2_000_000)
+    big.extend(np.arange(2_000_000, dtype=float), np.arange(2_000_000, dtype=float))
+    stats = big.aggregate()
+    assert stats["percentile_sample"] <= calc_analytics.PERCENTILE_SAMPLE_ROWS
+    assert abs(stats["percentiles"]["p50"] - 1_000_000) < 10
+    assert stats["sum"] == float(np.arange(2_000_000).sum()) and stats["max"] == 1_999_999
+
+    # Тест 3: окно last_minutes / since / until
+    print("🔄 Тест 3: разбор окна")
+    now = datetime(2025, 3, 1, 12, 0)
+    assert parse_window(30, now=now) == {"start": (now - timedelta(minutes=30)).timestamp(),
+                                         "end": now.timestamp()}
+    assert parse_window(since="2025-03-01T10:00")["end"] is None
+    assert parse_window() == {"start": None, "end": None}
+    try:
+        parse_window(-1)
+        assert False, "ожидалась ошибка"
+    except ValueError:
+        pass
+
+    # Тест 4: история арендатора и инструмент стандартного сервера
+    print("🔄 Тест 4: calc_stats")
+    namespace = TaskNamespace("test")
+    namespace.add_history({"expression": "old", "result": 1,
+                           "timestamp": (datetime.now() - timedelta(days=2)).isoformat()})
+    data = namespace.to_dict()
+    restored = TaskNamespace.from_dict(data)
+    assert np.array_equal(restored.history_columns.values, namespace.history_columns.values)
+    # Файл арендатора без колонок: они восстанавливаются по списку истории
+    del data["calculator_columns"]
+    assert len(TaskNamespace.from_dict(data).history_columns) == 1
+
+    # Лимит памяти арендатора общий для списка и колонок: старые вычисления уходят из обоих
+    limited = TaskNamespace("limited", max_history_bytes=4096)
+    started = datetime.now()
+    for i in range(500):
+        limited.add_history({"expression": f"{i} + 0", "result": i,
+                             "timestamp": (started + timedelta(seconds=i)).isoformat()})
+    assert limited.history_bytes <= 4096 and len(limited.history_columns) == len(limited.calculator_history)
+    assert limited.history_columns.values[-1] == 499 and limited.calculator_history[0]["result"] == \
+        limited.history_columns.values[0]
+    # Файл с колонками длиннее списка загружается в пределах лимита
+    data = limited.to_dict()
+    columns = HistoryColumns()
+    columns.extend([float(i) for i in range(10_000)], [1.0] * 10_000)
+    data["calculator_columns"] = columns.to_dict()
+    restored = TaskNamespace.from_dict(data, max_history_bytes=4096)
+    assert restored.history_bytes <= 4096 and restored.calculator_history == limited.calculator_history
+
+    server = StandardMCPServer()
+    for expression in ("2 + 2", "10 * 3", "1 / 4"):
+        server.calculate(expression)
+    text = server.calc_stats(last_minutes=5)
+    assert "Вызовов: 3" in text and "Сумма: 34.25" in text and "Максимум: 30" in text
+    assert "нет" in server.calc_stats(until="2000-01-01")
+    assert server.calc_stats(last_minutes=-5).startswith("❌")
+    assert format_stats(server.namespace.history_columns.aggregate()) == server.calc_stats()
+
+    # Сводка считается по копии колонок, lock пространства в это время свободен
+    free = []
+    aggregate = HistoryColumns.aggregate
+
+    def try_lock():
+        acquired = server.namespace.lock.acquire(timeout=0)
+        if acquired:
+            server.namespace.lock.release()
+        free.append(acquired)
+
+    def checked_aggregate(columns, *args, **kwargs):
+        probe = threading.Thread(target=try_lock)
+        probe.start()
+        probe.join()
+        return aggregate(columns, *args, **kwargs)
+
+    HistoryColumns.aggregate = checked_aggregate
+    try:
+        assert "Вызовов: 3" in server.calc_stats()
+        server.call_tool("calc_stats", {})
+    finally:
+        HistoryColumns.aggregate = aggregate
+    assert free == [True, True], free
+
+    # Под -S NumPy недоступен, и sys.path ради него не меняется — сводка считается на чистом Python
+    check = subprocess.run(
+        [sys.executable, "-S", "-c", "import sys, calc_analytics; path = list(sys.path); "
+                                     "assert calc_analytics._numpy() is None and sys.path == path"],
+        capture_output=True, text=True, timeout=60, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    assert check.returncode == 0, check.stderr
+
+    # Калькулятор через stdio одинаков с NumPy (команда клиента) и без него (MCP_SERVER_NO_SITE=1)
+    requests = [{"jsonrpc": "2.0", "id": i, "method": "tools/call", "params": {"name": name, "arguments": args}}
+                for i, (name, args) in enumerate([("calculate", {"expression": "6 * 7"}), ("calc_stats", {})], 1)]
+    for command in (SERVER_COMMAND, NO_SITE_COMMAND):
+        process = subprocess.run(
+            command,
+            input="".join(json.dumps(r) + "\n" for r in requests),
+            capture_output=True, text=True, encoding="utf-8", timeout=60,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        texts = [json.loads(line)["result"]["content"][0]["text"] for line in process.stdout.splitlines()]
+        assert texts[0] == "🧮 6 * 7 = 42" and "Сумма: 42" in texts[1], texts
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_calc_analytics()
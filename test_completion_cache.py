@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Тест кэша ответов OpenRouter: ключ, TTL, вытеснение, record/replay и single-flight
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+import aiohttp
+
+from completion_cache import CompletionCache, completion_key
+from openrouter_client import OpenRouterMCPClient
+from stub_llm import StubLLMServer
+
+PAYLOAD = {"model": "stub", "messages": [{"role": "user", "content": "Привет"}], "tools": []}
+
+async def check_client(cache_dir):
+    stub = StubLLMServer(latency=0.2)
+    await stub.start()
+    client = OpenRouterMCPClient(api_key="test")
+    client.base_url = stub.base_url
+    client.completion_cache = CompletionCache(cache_dir, mode="cache")
+    turn = client._new_turn()
+    try:
+        async with aiohttp.ClientSession() as session:
+            # Одинаковые одновременные запросы — один запрос к upstream
+            results = await asyncio.gather(*(
+                client._post_completion(session, {}, dict(PAYLOAD), turn) for _ in range(5)
+            ))
+            assert stub.requests == 1 and len(set(results)) == 1
+            assert turn["upstream_deduplicated"] == 4
+
+            # Повтор после завершения берется из кэша
+            await client._post_completion(session, {}, dict(PAYLOAD), turn)
+            assert stub.requests == 1 and turn["upstream_cached"] == 1
+
+            # Replay: без сети, промах — ошибка, а не запрос к upstream
+            client.completion_cache = CompletionCache(cache_dir, mode="replay")
+            status, _ = await client._post_completion(session, {}, dict(PAYLOAD), turn)
+            assert status == 200
+            status, _ = await client._post_completion(session, {}, {**PAYLOAD, "model": "other"}, turn)
+            assert status == 404 and stub.requests == 1
+    finally:
+        await stub.stop()
+
+def test_completion_cache():
+    print("🧪 Тестирование кэша ответов OpenRouter...")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Тест 1: канонический ключ не зависит от порядка полей
+        print("🔄 Тест 1: ключ запроса")
+        reordered = {"tools": [], "messages": [{"content": "Привет", "role": "user"}], "model": "stub"}
+        assert completion_key(PAYLOAD) == completion_key(reordered)
+        assert completion_key(PAYLOAD) != completion_key({**PAYLOAD, "model": "other"})
+
+        # Тест 2: TTL и ошибки не кэшируются
+        print("🔄 Тест 2: TTL")
+        cache = CompletionCache(os.path.join(cache_dir, "ttl"), ttl=-1)
+        cache.put("a", PAYLOAD, 200, "ответ")
+        assert cache.get("a") is None
+        cache.ttl = 60
+        cache.put("a", PAYLOAD, 200, "ответ")
+        cache.put("b", PAYLOAD, 500, "ошибка")
+        assert cache.get("a") == (200, "ответ") and cache.get("b") is None
+
+        # Тест 3: вытеснение по размеру, давно использованные уходят первыми
+        print("🔄 Тест 3: вытеснение по размеру")
+        cache = CompletionCache(os.path.join(cache_dir, "lru"))
+        cache.put("k1", PAYLOAD, 200, "x" * 100)
+        # Место ровно под три записи
+        cache.max_bytes = cache.stats()["bytes"] * 3
+        for key in ("k2", "k3"):
+            cache.put(key, PAYLOAD, 200, "x" * 100)
+        cache.get("k1")
+        cache.put("k4", PAYLOAD, 200, "x" * 100)
+        assert cache.get("k2") is None and cache.get("k1") is not None
+        assert cache.stats()["bytes"] <= cache.max_bytes and cache.evictions == 1
+
+        # Тест 4: single-flight, кэш и replay в клиенте
+        print("🔄 Тест 4: клиент")
+        asyncio.run(check_client(os.path.join(cache_dir, "client")))
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_completion_cache()
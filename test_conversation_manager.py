@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Тест параллельных диалогов и пакетного режима клиента OpenRouter
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+from conversation_manager import ConversationManager, read_batch, write_batch
+from openrouter_client import OpenRouterMCPClient
+from stub_llm import StubLLMServer
+
+async def check_manager(batch_path):
+    # Без инструментов: каждый ход — один запрос к upstream
+    stub = StubLLMServer(latency=0.1, tool_calls=[])
+    await stub.start()
+    client = OpenRouterMCPClient(api_key="test")
+    client.base_url = stub.base_url
+    try:
+        manager = ConversationManager(client, concurrency=8)
+        items = read_batch(batch_path)
+        started = time.perf_counter()
+        results = await manager.run_batch(items)
+        elapsed = time.perf_counter() - started
+
+        # 8 диалогов по 2 хода: параллельно это 2 волны, а не 16 последовательных ходов
+        assert [r["id"] for r in results] == [item["id"] for item in items]
+        assert all(r["response"] == "Готово." and r["error"] is None for r in results)
+        assert elapsed < 0.1 * 16 / 2, elapsed
+        assert stub.requests == 16
+
+        # Истории диалогов независимы, ходы одного диалога идут по порядку
+        assert len(manager.conversations) == 8
+        history = manager.conversations["c0"].history
+        assert [m["content"] for m in history if m["role"] == "user"] == ["c0 ход 0", "c0 ход 1"]
+        assert client.conversation_history == []
+        assert {r["turn"] for r in results if r["conversation"] == "c3"} == {1, 2}
+
+        # Один HTTP пул на все диалоги
+        assert client._http is not None and not client._http.closed
+
+        # Ограничение параллельности
+        manager = ConversationManager(client, concurrency=1)
+        started = time.perf_counter()
+        await manager.run_batch([{"prompt": f"Промпт {i}"} for i in range(3)])
+        assert time.perf_counter() - started >= 0.3
+        return results
+    finally:
+        await client.cleanup()
+        await stub.stop()
+
+def test_conversation_manager():
+    print("🧪 Тестирование параллельных диалогов...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Тест 1: чтение пакета
+        print("🔄 Тест 1: пакет промптов")
+        batch_path = os.path.join(tmp, "prompts.jsonl")
+        with open(batch_path, "w", encoding="utf-8") as f:
+            for turn in range(2):
+                for c in range(8):
+                    f.write(json.dumps({"id": f"{c}-{turn}", "conversation": f"c{c}",
+                                        "prompt": f"c{c} ход {turn}"}, ensure_ascii=False) + "\n")
+            f.write("\n")
+        assert len(read_batch(batch_path)) == 16
+
+        # Тест 2: параллельные диалоги
+        print("🔄 Тест 2: параллельные диалоги")
+        results = asyncio.run(check_manager(batch_path))
+
+        # Тест 3: запись результатов
+        print("🔄 Тест 3: результаты с временем ходов")
+        output_path = os.path.join(tmp, "results.jsonl")
+        write_batch(output_path, results)
+        written = read_batch(output_path)
+        assert len(written) == 16
+        assert all(r["seconds"] >= r["upstream_seconds"] > 0 for r in written)
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_conversation_manager()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Тест контроля допуска стандартного MCP сервера: размер, параллельность, частота, глубина очереди
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mcp_admission import RATE_LIMITED, SERVER_OVERLOADED, AdmissionController
+from standard_mcp_server import StandardMCPServer
+from task_tenants import TenantRegistry
+
+def call(server, request_id, name, arguments, session):
+    return server.handle_request(
+        {"jsonrpc": "2.0", "id": request_id, "method": "tools/call",
+         "params": {"name": name, "arguments": arguments}},
+        session
+    )
+
+def test_mcp_admission():
+    print("🧪 Тестирование контроля допуска...")
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        admission = AdmissionController(max_request_bytes=1000, tool_concurrency={"text_stats": 1},
+                                        concurrency_wait=0.05, rate=5, burst=3,
+                                        shed_depth=10, max_depth=20)
+        server = StandardMCPServer(tenants=TenantRegistry(store_dir=store_dir), admission=admission)
+        session = {"tenant": "default"}
+
+        # Тест 1: слишком большое сообщение отклоняется до разбора
+        print("🔄 Тест 1: размер сообщения")
+        raw = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+                          "params": {"name": "text_stats", "arguments": {"text": "слово " * 500}}})
+        response = json.loads(server.handle_raw(raw.encode("utf-8"), session))
+        assert response["error"]["code"] == -32600 and response["id"] is None
+        assert response["error"]["data"]["maxBytes"] == 1000
+
+        # Тест 2: token bucket на сессию, служебные методы не ограничиваются
+        print("🔄 Тест 2: частота запросов")
+        results = [call(server, 10 + i, "calculate", {"expression": "1 + 1"}, session) for i in range(4)]
+        assert all("result" in r for r in results[:3])
+        assert results[3]["error"]["code"] == RATE_LIMITED
+        assert results[3]["error"]["data"]["retryAfterMs"] > 0
+        assert "result" in server.handle_request({"jsonrpc": "2.0", "id": 20, "method": "ping"}, session)
+        assert "result" in call(server, 21, "calculate", {"expression": "2 + 2"}, {"tenant": "default"})
+        admission.rate = 0
+
+        # Тест 3: лимит одновременных вызовов тяжелого инструмента
+        print("🔄 Тест 3: параллельность инструментов")
+        ticket = admission.admit("tools/call", "text_stats", session)
+        response = call(server, 30, "text_stats", {"text": "раз два"}, session)
+        assert response["error"]["code"] == SERVER_OVERLOADED
+        assert response["error"]["data"]["reason"] == "concurrency"
+        assert "result" in call(server, 31, "calculate", {"expression": "3 * 3"}, session)
+        admission.release(ticket)
+        assert "result" in call(server, 32, "text_stats", {"text": "раз два"}, session)
+
+        # Тест 4: при глубокой очереди сначала отклоняются тяжелые инструменты
+        print("🔄 Тест 4: сброс нагрузки по глубине очереди")
+        admission.enqueued(10)
+        assert call(server, 40, "text_stats", {"text": "раз"}, session)["error"]["data"]["reason"] == "queue_depth"
+        assert "result" in call(server, 41, "calculate", {"expression": "4 + 4"}, session)
+        admission.enqueued(10)
+        assert call(server, 42, "calculate", {"expression": "5 + 5"}, session)["error"]["code"] == SERVER_OVERLOADED
+        assert "result" in server.handle_request({"jsonrpc": "2.0", "id": 43, "method": "ping"}, session)
+        admission.dequeued(20)
+        assert admission.rejected["queue_depth"] == 2
+        metrics = server.metrics.snapshot()["rejected"]
+        assert metrics["queue_depth"]["calls"] == 2 and metrics["rate_limit"]["calls"] == 1
+
+    # Тест 5: длинная строка в stdio не мешает следующим запросам
+    print("🔄 Тест 5: stdio")
+    payload = (
+        json.dumps({"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+                    "params": {"name": "text_stats", "arguments": {"text": "x" * 300000}}}) + "\n" +
+        json.dumps({"jsonrpc": "2.0", "id": 2, "method": "ping"}) + "\n"
+    ).encode("utf-8")
+    output = subprocess.run(
+        [sys.executable, "-S", "standard_mcp_server.py"], input=payload, capture_output=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)), timeout=30,
+        env={**os.environ, "MCP_MAX_REQUEST_BYTES": "100000"}
+    ).stdout
+    responses = [json.loads(line) for line in output.splitlines()]
+    assert responses[0]["error"]["code"] == -32600
+    assert responses[1] == {"jsonrpc": "2.0", "id": 2, "result": {}}
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_mcp_admission()
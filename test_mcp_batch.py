@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Тест batch-запросов JSON-RPC 2.0 для стандартного MCP сервера
+"""
+
+import json
+import subprocess
+import sys
+import os
+
+def send_line(process, message):
+    process.stdin.write(json.dumps(message, ensure_ascii=False) + "\n")
+    process.stdin.flush()
+    return json.loads(process.stdout.readline())
+
+def test_mcp_batch():
+    print("🧪 Тестирование batch-запросов...")
+    
+    env = os.environ.copy()
+    env['PYTHONIOENCODING'] = 'utf-8'
+    env['MCP_BATCH_WORKERS'] = '4'
+    
+    process = subprocess.Popen(
+        [sys.executable, "standard_mcp_server.py"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding='utf-8',
+        env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    
+    try:
+        # Тест 1: initialize + уведомление + tools/list одним batch
+        print("🔄 Тест 1: initialize + tools/list")
+        responses = send_line(process, [
+            {"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {}},
+            {"jsonrpc": "2.0", "method": "notifications/initialized"},
+            {"jsonrpc": "2.0", "id": 2, "method": "tools/list"}
+        ])
+        assert [r["id"] for r in responses] == [1, 2]
+        assert len(responses[1]["result"]["tools"]) > 0
+        print(f"📥 Получено ответов: {len(responses)}")
+        
+        # Тест 2: несколько инструментов и некорректный элемент
+        print("\n🔄 Тест 2: несколько tools/call")
+        responses = send_line(process, [
+            {"jsonrpc": "2.0", "id": 3, "method": "tools/call",
+             "params": {"name": "add_task", "arguments": {"title": "Batch"}}},
+            {"jsonrpc": "2.0", "id": 4, "method": "tools/call",
+             "params": {"name": "calculate", "arguments": {"expression": "6 * 7"}}},
+            42
+        ])
+        assert [r["id"] for r in responses] == [3, 4, None]
+        assert "42" in responses[1]["result"]["content"][0]["text"]
+        assert responses[2]["error"]["code"] == -32600
+        print(f"📥 Ответ: {json.dumps(responses, ensure_ascii=False)[:200]}")
+        
+        # Тест 3: пустой batch
+        print("\n🔄 Тест 3: пустой batch")
+        response = send_line(process, [])
+        assert response["error"]["code"] == -32600
+        
+        print("\n✅ Все тесты выполнены!")
+    
+    finally:
+        process.terminate()
+        process.wait()
+
+if __name__ == "__main__":
+    test_mcp_batch()
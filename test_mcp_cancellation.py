@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Тест дедлайнов и отмены запросов стандартного MCP сервера
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mcp_cancellation import DEADLINE_EXCEEDED
+from mcp_connection import MCPConnection, make_request
+from standard_mcp_server import StandardMCPServer, _is_cancel_notification
+from task_tenants import TenantRegistry
+
+def calculate_request(request_id, expression, timeout_ms=None):
+    params = {"name": "calculate", "arguments": {"expression": expression}}
+    if timeout_ms is not None:
+        params["_meta"] = {"timeoutMs": timeout_ms}
+    return {"jsonrpc": "2.0", "id": request_id, "method": "tools/call", "params": params}
+
+async def check_stdio_cancel():
+    connection = MCPConnection()
+    await connection.start()
+    try:
+        await connection.initialize()
+        # Отмена вызывающим (task.cancel) доходит до сервера как notifications/cancelled
+        slow = asyncio.create_task(connection.request(make_request(
+            "tools/call", {"name": "calculate", "arguments": {"expression": "9**9**9**9"}}
+        )))
+        await asyncio.sleep(0.3)
+        slow.cancel()
+        started = time.perf_counter()
+        response = await connection.request(make_request("ping"), timeout=3)
+        assert "result" in response and time.perf_counter() - started < 2
+        assert connection.in_flight == 0
+    finally:
+        await connection.close()
+
+    # Клиентский дедлайн: сервер молчит, запрос завершается TimeoutError
+    silent = MCPConnection(command=[sys.executable, "-c", "import time; time.sleep(30)"])
+    await silent.start()
+    try:
+        try:
+            await silent.request(make_request("ping"), timeout=0.3)
+            raise AssertionError("ожидался TimeoutError")
+        except TimeoutError:
+            pass
+        assert silent.in_flight == 0
+    finally:
+        await silent.close()
+
+def test_mcp_cancellation():
+    print("🧪 Тестирование отмены запросов...")
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        server = StandardMCPServer(tenants=TenantRegistry(store_dir=store_dir))
+        session = {"tenant": "default"}
+        try:
+            # Тест 1: дедлайн прерывает зависшее вычисление
+            print("🔄 Тест 1: params._meta.timeoutMs")
+            started = time.perf_counter()
+            response = server.handle_request(calculate_request(1, "9**9**9**9", timeout_ms=300), session)
+            assert response["error"]["code"] == DEADLINE_EXCEEDED
+            assert time.perf_counter() - started < 2
+            assert server.evaluator.kills == 1
+
+            # Процесс вычислений перезапускается для следующего запроса
+            response = server.handle_request(calculate_request(2, "2**10", timeout_ms=2000), session)
+            assert "1024" in response["result"]["content"][0]["text"]
+
+            # Тест 2: отмена, пришедшая раньше запроса
+            print("🔄 Тест 2: notifications/cancelled до запроса")
+            server.handle_request({"jsonrpc": "2.0", "method": "notifications/cancelled",
+                                   "params": {"requestId": 3}}, session)
+            assert server.handle_request(calculate_request(3, "1 + 1"), session) is None
+            assert "result" in server.handle_request(calculate_request(3, "1 + 1"), session)
+        finally:
+            server.evaluator.close()
+
+    # Тест 3: отмена выполняющегося запроса и клиентский таймаут через stdio
+    print("🔄 Тест 3: отмена через stdio")
+    asyncio.run(check_stdio_cancel())
+
+    # Тест 4: сразу выполняются только настоящие уведомления об отмене
+    print("🔄 Тест 4: notifications/cancelled в аргументах запроса")
+    text_request = {"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+                    "params": {"name": "text_stats", "arguments": {"text": "notifications/cancelled пришло"}}}
+    cancel = {"jsonrpc": "2.0", "method": "notifications/cancelled", "params": {"requestId": 7}}
+    assert _is_cancel_notification(json.dumps(cancel).encode())
+    assert not _is_cancel_notification(json.dumps(text_request).encode())
+    assert not _is_cancel_notification(json.dumps([cancel]).encode())
+    assert not _is_cancel_notification(json.dumps({**cancel, "id": 5}).encode())
+    process = subprocess.run(
+        [sys.executable, "-S", "standard_mcp_server.py"],
+        input=json.dumps(text_request) + "\n" + json.dumps({"jsonrpc": "2.0", "id": 2, "method": "ping"}) + "\n",
+        capture_output=True, text=True, encoding="utf-8", timeout=60,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    responses = [json.loads(line) for line in process.stdout.splitlines()]
+    assert [r["id"] for r in responses] == [1, 2], responses
+    assert "Слов: 2" in responses[0]["result"]["content"][0]["text"]
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_mcp_cancellation()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Тест буферизованного вывода стандартного сервера (FramedWriter) и политики сброса
+"""
+
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from standard_mcp_server import FramedWriter
+
+def test_mcp_framing():
+    print("🧪 Тестирование буферизации вывода...")
+
+    # Тест 1: ответы копятся до явного сброса или до max_buffer
+    print("🔄 Тест 1: сброс по размеру и явный")
+    stream = io.BytesIO()
+    writer = FramedWriter(stream, max_buffer=100)
+    writer.write_message({"id": 1})
+    writer.write_message({"id": 2})
+    assert writer.pending and stream.getvalue() == b""
+    writer.flush()
+    assert stream.getvalue() == b'{"id": 1}\n{"id": 2}\n' and writer.flushes == 1 and not writer.pending
+    writer.write_bytes(b"x" * 120 + b"\n")
+    assert writer.flushes == 2 and not writer.pending
+    writer.flush()
+    assert writer.flushes == 2, "пустой буфер не пишется"
+
+    # Тест 2: ответ не ждет в буфере дольше max_delay
+    print("🔄 Тест 2: сброс по времени")
+    stream = io.BytesIO()
+    writer = FramedWriter(stream, max_delay=0.02)
+    writer.write_message({"id": 3})
+    writer.write_message({"id": 4})
+    deadline = time.perf_counter() + 2
+    while writer.pending and time.perf_counter() < deadline:
+        time.sleep(0.005)
+    assert stream.getvalue() == b'{"id": 3}\n{"id": 4}\n' and writer.flushes == 1
+
+    # Тест 3: ответ на ping не ждет следующего за ним долгого вычисления
+    print("🔄 Тест 3: ping перед долгим запросом")
+    env = {**os.environ, "PYTHONIOENCODING": "utf-8", "MCP_CALC_TIMEOUT": "3"}
+    process = subprocess.Popen(
+        [sys.executable, "-S", "standard_mcp_server.py"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env
+    )
+    try:
+        started = time.perf_counter()
+        process.stdin.write(b"".join(json.dumps(message).encode() + b"\n" for message in (
+            {"jsonrpc": "2.0", "id": 1, "method": "ping"},
+            {"jsonrpc": "2.0", "id": 2, "method": "tools/call",
+             "params": {"name": "calculate", "arguments": {"expression": "9**9**9"}}},
+        )))
+        process.stdin.flush()
+        first = json.loads(process.stdout.readline())
+        elapsed = time.perf_counter() - started
+        assert first["id"] == 1 and elapsed < 1.5, (first, elapsed)
+        second = json.loads(process.stdout.readline())
+        assert second["id"] == 2
+    finally:
+        process.stdin.close()
+        process.wait(timeout=10)
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_mcp_framing()
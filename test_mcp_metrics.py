@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Тест метрик: гистограмма латентности и вывод в формате Prometheus
+"""
+
+import os
+import re
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mcp_metrics import PROMETHEUS_BUCKETS, LatencyHistogram, MetricsRegistry
+from standard_mcp_server import StandardMCPServer
+
+# metric{labels} value
+SAMPLE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+def unescape(value):
+    return re.sub(r'\\(.)', lambda m: "\n" if m.group(1) == "n" else m.group(1), value)
+
+def parse_prometheus(text):
+    """Строки с данными: [(метрика, {метка: значение}, число)]"""
+    samples = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = SAMPLE.match(line)
+        assert match, f"строка не в формате Prometheus: {line!r}"
+        labels = {name: unescape(value) for name, value in LABEL.findall(match.group(2))}
+        # Метки разбираются целиком: после них не остается лишних символов
+        assert ",".join(f'{n}="{v}"' for n, v in LABEL.findall(match.group(2))) == match.group(2), line
+        samples.append((match.group(1), labels, float(match.group(3))))
+    return samples
+
+def test_mcp_metrics():
+    print("🧪 Тестирование метрик...")
+
+    # Тест 1: перцентили и накопленные корзины гистограммы
+    print("🔄 Тест 1: LatencyHistogram")
+    histogram = LatencyHistogram()
+    for seconds in (0.0003, 0.0003, 0.003, 0.2, 45.0):
+        histogram.record(seconds)
+    assert histogram.count == 5 and abs(histogram.total - 45.2036) < 1e-9
+    assert abs(histogram.percentile(50) - 0.003) / 0.003 <= 1 / 16, "ошибка перцентиля не больше 1/16"
+    assert histogram.percentile(100) == 45.0
+    buckets = dict(histogram.cumulative())
+    assert list(buckets) == list(PROMETHEUS_BUCKETS)
+    assert buckets[0.00025] == 0 and buckets[0.0005] == 2 and buckets[0.005] == 3
+    assert buckets[0.25] == 4 and buckets[30.0] == 4 and buckets[60.0] == 5
+
+    # Тест 2: экранирование меток и согласованность гистограммы в выводе Prometheus
+    print("🔄 Тест 2: render_prometheus")
+    registry = MetricsRegistry()
+    tricky = 'say "hi"\\path\nnext'
+    for seconds in (0.0003, 0.003, 0.2):
+        registry.record("tool", tricky, seconds)
+    registry.record("tool", tricky, 0.003, error=True)
+    registry.record_bytes("tool", tricky, bytes_in=10, bytes_out=25)
+    registry.record("method", "ping", 0.00001)
+    text = registry.render_prometheus()
+    assert text.endswith("\n") and "\nnext" not in text, "перевод строки в имени экранируется"
+    samples = parse_prometheus(text)
+
+    series = [(metric, labels, value) for metric, labels, value in samples if labels.get("name") == tricky]
+    values = {metric: value for metric, labels, value in series if "le" not in labels}
+    assert all(labels["kind"] == "tool" for _, labels, _ in series)
+    assert values["mcp_calls_total"] == 4 and values["mcp_errors_total"] == 1
+    assert values["mcp_bytes_in_total"] == 10 and values["mcp_bytes_out_total"] == 25
+    assert values["mcp_latency_seconds_count"] == 4 and abs(values["mcp_latency_seconds_sum"] - 0.2063) < 1e-6
+
+    buckets = [(labels["le"], value) for metric, labels, value in series if metric == "mcp_latency_seconds_bucket"]
+    assert [le for le, _ in buckets] == [str(bound) for bound in PROMETHEUS_BUCKETS] + ["+Inf"]
+    counts = [value for _, value in buckets]
+    assert counts == sorted(counts), "корзины накопленные"
+    assert dict(buckets)["0.0005"] == 1 and dict(buckets)["0.005"] == 3 and dict(buckets)["0.25"] == 4
+    assert counts[-1] == values["mcp_latency_seconds_count"]
+
+    # У каждой метрики ровно одна строка TYPE, серии отсортированы по (вид, имя)
+    types = [line.split()[2] for line in text.splitlines() if line.startswith("# TYPE")]
+    assert len(types) == len(set(types)) == 5
+    kinds = [labels["kind"] for metric, labels, _ in samples if metric == "mcp_calls_total"]
+    assert kinds == ["method", "tool"]
+
+    # Тест 3: ресурс metrics://server/prometheus отдает метрики сервера
+    print("🔄 Тест 3: ресурс сервера")
+    server = StandardMCPServer()
+    server.handle_request({"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+                           "params": {"name": "calculate", "arguments": {"expression": "1 + 1"}}})
+    response = server.handle_request({"jsonrpc": "2.0", "id": 2, "method": "resources/read",
+                                      "params": {"uri": "metrics://server/prometheus"}})
+    content = response["result"]["contents"][0]
+    assert content["mimeType"] == "text/plain"
+    samples = parse_prometheus(content["text"])
+    assert ("mcp_calls_total", {"kind": "tool", "name": "calculate"}, 1.0) in samples
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_mcp_metrics()
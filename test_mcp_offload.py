@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Тест выноса тяжелых инструментов FastMCP из цикла событий
+"""
+
+import asyncio
+import math
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mcp.server.fastmcp import Context, FastMCP
+
+from mcp_offload import OVERLOADED_MESSAGE, ToolOffloader
+
+def slow_tool(seconds: float, ctx: Context = None) -> str:
+    """Тяжелый инструмент (блокирует поток)"""
+    time.sleep(seconds)
+    return threading.current_thread().name
+
+async def check_server(offloader: ToolOffloader):
+    server = FastMCP("offload-test")
+    registered = offloader.tool(server)(slow_tool)
+    # Модульная функция осталась синхронной, в сервере — асинхронная обертка
+    assert registered is slow_tool and slow_tool(0) == threading.current_thread().name
+    tools = await server.list_tools()
+    assert [t.name for t in tools] == ["slow_tool"]
+    assert list(tools[0].inputSchema["properties"]) == ["seconds"]
+
+    # Пока инструмент работает, цикл событий продолжает обслуживать другие задачи
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticking = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    result = await server.call_tool("slow_tool", {"seconds": 0.3})
+    ticking.cancel()
+    assert time.perf_counter() - started >= 0.3
+    assert ticks >= 10, ticks
+    assert "mcp-offload" in str(result)
+
+async def check_queue():
+    # Один исполнитель и одно место в очереди: третий одновременный вызов отклоняется
+    offloader = ToolOffloader(mode="thread", workers=1, max_queue=1)
+    results = await asyncio.gather(*(offloader.run(slow_tool, False, 0.2) for _ in range(3)))
+    assert results.count(OVERLOADED_MESSAGE) == 1 and offloader.rejected == 1
+    assert offloader.snapshot()["pending"] == 0 and offloader.completed == 2
+    offloader.shutdown()
+
+async def check_process():
+    offloader = ToolOffloader(mode="process", workers=1)
+    assert await offloader.run(math.factorial, True, 20) == math.factorial(20)
+    assert offloader._processes is not None and offloader._threads is None
+    # Функция с общим состоянием (isolate=False) остается в пуле потоков
+    assert "mcp-offload" in await offloader.run(slow_tool, False, 0)
+    offloader.shutdown()
+
+def test_mcp_offload():
+    print("🧪 Тестирование выноса тяжелых инструментов...")
+
+    # Тест 1: инструмент в пуле потоков не блокирует цикл событий
+    print("🔄 Тест 1: пул потоков")
+    offloader = ToolOffloader(mode="thread", workers=2)
+    asyncio.run(check_server(offloader))
+    offloader.shutdown()
+
+    # Тест 2: режим off — инструмент регистрируется как есть
+    print("🔄 Тест 2: режим off")
+    server = FastMCP("offload-off")
+    ToolOffloader(mode="off").tool(server)(slow_tool)
+    result = asyncio.run(server.call_tool("slow_tool", {"seconds": 0}))
+    assert "MainThread" in str(result)
+
+    # Тест 3: ограниченная очередь
+    print("🔄 Тест 3: переполнение очереди")
+    asyncio.run(check_queue())
+
+    # Тест 4: пул процессов для чистых функций
+    print("🔄 Тест 4: пул процессов")
+    asyncio.run(check_process())
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_mcp_offload()
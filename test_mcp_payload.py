@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Тест передачи больших значений файлами в общей памяти ($payload)
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mcp_admission import AdmissionController
+from mcp_connection import MCPConnection, make_request
+from mcp_payload import PAYLOAD_KEY, PAYLOAD_UNAVAILABLE, PayloadChannel, PayloadTooLarge, PayloadUnavailable
+from standard_mcp_server import StandardMCPServer
+
+def call(request_id, name, arguments):
+    return {"jsonrpc": "2.0", "id": request_id, "method": "tools/call",
+            "params": {"name": name, "arguments": arguments}}
+
+def leftovers(directory):
+    return [name for name in os.listdir(directory) if name.startswith("mcp-payload-")]
+
+async def run_client(client_dir, server_dir):
+    client = MCPConnection(env={"MCP_PAYLOAD_THRESHOLD": "1024", "MCP_PAYLOAD_DIR": server_dir})
+    client.payloads = PayloadChannel(threshold=1024, directory=client_dir)
+    await client.start()
+    try:
+        await client.initialize()
+        active = client.payloads_active
+        stats = await client.request(make_request("tools/call", {"name": "text_stats", "arguments": {"text": "слово " * 50_000}}))
+        for i in range(100):
+            await client.request(make_request("tools/call", {"name": "add_task", "arguments": {"title": f"Задача {i}", "description": "описание " * 10}}))
+        tasks = await client.request(make_request("tools/call", {"name": "get_tasks", "arguments": {}}))
+        again = await client.request(make_request("tools/call", {"name": "get_tasks", "arguments": {}}))
+        return active, client.payloads, stats, tasks, again
+    finally:
+        await client.close()
+
+def test_mcp_payload():
+    print("🧪 Тестирование передачи больших значений...")
+
+    with tempfile.TemporaryDirectory() as directory, tempfile.TemporaryDirectory() as other:
+        # Тест 1: запись и чтение по ссылке
+        print("🔄 Тест 1: канал $payload")
+        channel = PayloadChannel(threshold=16, directory=directory)
+        message = {"params": {"arguments": {"text": "текст " * 100, "short": "коротко"}}, "list": ["x" * 16]}
+        outgoing = channel.externalize(message)
+        assert message["params"]["arguments"]["text"] == "текст " * 100, "исходное сообщение не меняется"
+        assert PAYLOAD_KEY in outgoing["params"]["arguments"]["text"] and outgoing["list"][0] is not message["list"][0]
+        assert outgoing["params"]["arguments"]["short"] == "коротко"
+        assert channel.externalize({"a": "коротко"}) == {"a": "коротко"}
+        assert channel.internalize(json.loads(json.dumps(outgoing))) == message
+        assert channel.sent == channel.received == 2 and not leftovers(directory)
+
+        # Подмененный файл, удаленный файл, чужой каталог и превышение лимита
+        ref = channel.store("значение")[PAYLOAD_KEY]
+        with open(ref["path"], "r+b") as f:
+            f.write("ЗНАЧЕНИЕ".encode("utf-8"))
+        for bad in (ref, {**ref, "path": os.path.join(directory, "mcp-payload-missing")},
+                    {**ref, "path": "/etc/hostname"}):
+            try:
+                channel.load(bad)
+                assert False, "ожидалась ошибка"
+            except PayloadUnavailable:
+                pass
+        try:
+            channel.load(channel.store("x" * 100)[PAYLOAD_KEY], max_bytes=10)
+            assert False, "ожидалась ошибка"
+        except PayloadTooLarge as e:
+            assert e.size == 100
+        channel.close()
+        assert not leftovers(directory)
+
+        # Тест 2: сервер читает ссылки запроса и отдает ссылки в ответе
+        print("🔄 Тест 2: handle_raw")
+        server = StandardMCPServer(admission=AdmissionController(max_request_bytes=64 * 1024))
+        server.payloads = PayloadChannel(threshold=1024, directory=directory)
+        session = {"tenant": "payloads"}
+        init = {"jsonrpc": "2.0", "id": 1, "method": "initialize",
+                "params": {"capabilities": {"experimental": {"payloads": {}}}}}
+        result = json.loads(server.handle_raw(json.dumps(init).encode(), session))["result"]
+        assert result["capabilities"]["experimental"]["payloads"]["threshold"] == 1024 and session["payloads"]
+
+        text = "слово " * 1000
+        batch = [call(2, "text_stats", {"text": channel.store(text)}),
+                 call(3, "text_stats", {"text": {**channel.store(text)[PAYLOAD_KEY], "sha256": "0" * 64}}),
+                 call(4, "text_stats", {"text": channel.store("x" * 100_000)})]
+        batch[1]["params"]["arguments"]["text"] = {PAYLOAD_KEY: batch[1]["params"]["arguments"]["text"]}
+        responses = {r["id"]: r for r in json.loads(server.handle_raw(json.dumps(batch).encode(), session))}
+        assert "Слов: 1000" in responses[2]["result"]["content"][0]["text"]
+        assert responses[3]["error"]["code"] == PAYLOAD_UNAVAILABLE
+        assert responses[4]["error"]["data"]["reason"] == "too_large"
+
+        for i in range(50):
+            server.handle_raw(json.dumps(call(10 + i, "add_task", {"title": f"Задача {i}"})).encode(), session)
+        response = json.loads(server.handle_raw(json.dumps(call(99, "get_tasks", {})).encode(), session))
+        content = response["result"]["content"][0]["text"]
+        assert PAYLOAD_KEY in content and "Задача 49" in channel.internalize(content)
+        # Клиент попросил отвечать в строке
+        server.handle_raw(b'{"jsonrpc": "2.0", "method": "notifications/payloads", "params": {"enabled": false}}', session)
+        response = json.loads(server.handle_raw(json.dumps(call(100, "get_tasks", {})).encode(), session))
+        assert "Задача 49" in response["result"]["content"][0]["text"]
+        channel.close()
+        server.payloads.close()
+        assert not leftovers(directory)
+
+        # Тест 3: клиент и сервер в одном каталоге
+        print("🔄 Тест 3: клиент ↔ сервер через общую память")
+        active, payloads, stats, tasks, _ = asyncio.run(run_client(directory, directory))
+        assert active and payloads.sent == 1 and payloads.received == 2
+        assert "Слов: 50000" in stats["result"]["content"][0]["text"]
+        assert "Задача 99" in tasks["result"]["content"][0]["text"]
+        assert not leftovers(directory), "файлы после чтения удаляются"
+
+        # Тест 4: ссылки не читаются — значения передаются в строке
+        print("🔄 Тест 4: откат к передаче в строке")
+        active, payloads, stats, tasks, again = asyncio.run(run_client(directory, other))
+        assert active and "Слов: 50000" in stats["result"]["content"][0]["text"]
+        # Ответ сервер уже отправил ссылкой: запрос получает ошибку, следующий идет в строке
+        assert tasks["error"]["code"] == PAYLOAD_UNAVAILABLE and tasks["error"]["data"]["direction"] == "response"
+        assert "Задача 99" in again["result"]["content"][0]["text"]
+        assert payloads.received == 0 and not leftovers(directory)
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_mcp_payload()
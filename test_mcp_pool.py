@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Тест пула процессов MCP сервера: маршрутизация запросов с состоянием
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mcp_connection import make_request
+from mcp_pool import MCPServerPool
+from task_snapshot import TaskSnapshot
+
+def call(name, arguments):
+    return make_request("tools/call", {"name": name, "arguments": arguments})
+
+async def check_routing():
+    pool = MCPServerPool(3)
+    await pool.start()
+    try:
+        await pool.request(call("add_task", {"title": "Задача в пуле"}))
+        # Вычисления распределялись бы по воркерам — история была бы у каждого своя
+        for expression in ("1 + 1", "2 * 3", "10 - 4"):
+            await pool.request(call("calculate", {"expression": expression}))
+        stats = await pool.request(call("calc_stats", {}))
+        assert "Вызовов: 3" in stats["result"]["content"][0]["text"], stats
+
+        # Ресурсы задач и калькулятора читаются у владельца, сколько бы раз их ни запросили
+        for _ in range(pool.size):
+            listing = await pool.request(make_request("resources/read", {"uri": "tasks://list"}))
+            tasks = json.loads(listing["result"]["contents"][0]["text"])
+            assert [task["title"] for task in tasks] == ["Задача в пуле"]
+        history = await pool.request(make_request("resources/read", {"uri": "calculator://history"}))
+        assert len(json.loads(history["result"]["contents"][0]["text"])) == 3
+        changes = await pool.request(make_request("resources/read", {"uri": "tasks://changes?since=0"}))
+        assert len(json.loads(changes["result"]["contents"][0]["text"])["added"]) == 1
+
+        # Batch: элементы с состоянием уходят владельцу, остальные — куда свободнее
+        responses = await pool.request([call("get_tasks", {}), call("text_stats", {"text": "два слова"}),
+                                        make_request("resources/read", {"uri": "tasks://list"})])
+        assert "Задача в пуле" in responses[0]["result"]["content"][0]["text"]
+        assert "Задача в пуле" in responses[2]["result"]["contents"][0]["text"]
+        owner = pool.workers[pool.owner_index]
+        assert pool.route(make_request("resources/subscribe", {"uri": "tasks://list"})) is owner
+        assert pool.route(call("generate_password", {})) is not None
+    finally:
+        await pool.close()
+
+async def wait_restarted(worker, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while not (worker.is_alive and worker.restarts) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+
+async def check_respawn():
+    pool = MCPServerPool(3)
+    await pool.start()
+    try:
+        await pool.request(call("add_task", {"title": "Переживет падение"}))
+        owner, other = pool.workers[pool.owner_index], pool.workers[1]
+        old_pids = {owner.index: owner.connection.pid, other.index: other.connection.pid}
+        other.connection.connection.process.kill()
+        owner.connection.connection.process.kill()
+
+        # Запрос к упавшему владельцу дожидается перезапуска, задачи восстановлены из журнала
+        tasks = await pool.request(call("get_tasks", {}))
+        assert "Переживет падение" in tasks["result"]["content"][0]["text"], tasks
+        await wait_restarted(other)
+        health = {status["worker"]: status for status in await pool.health_check()}
+        for worker in (owner, other):
+            status = health[worker.index]
+            assert status["alive"] and status["restarts"] == 1, status
+            assert status["pid"] != old_pids[worker.index] and status["ping_ms"] is not None
+
+        # Пул продолжает распределять запросы по всем воркерам, включая перезапущенный
+        before = [worker.requests for worker in pool.workers]
+        responses = await asyncio.gather(*(pool.request(call("text_stats", {"text": f"слово {i}"}))
+                                           for i in range(12)))
+        assert all("result" in response for response in responses)
+        assert all(worker.requests > count for worker, count in zip(pool.workers, before))
+    finally:
+        await pool.close()
+
+async def add_tasks_and_close(titles):
+    pool = MCPServerPool(3)
+    await pool.start()
+    try:
+        for title in titles:
+            await pool.request(call("add_task", {"title": title}))
+        # Вызовы без состояния задействуют и остальные воркеры
+        await asyncio.gather(*(pool.request(call("text_stats", {"text": "слово"})) for _ in range(6)))
+    finally:
+        await pool.close()
+
+async def get_tasks():
+    pool = MCPServerPool(2)
+    await pool.start()
+    try:
+        return (await pool.request(call("get_tasks", {})))["result"]["content"][0]["text"]
+    finally:
+        await pool.close()
+
+def check_snapshot():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tasks.snapshot")
+        saved = os.environ.get("MCP_TASKS_SNAPSHOT")
+        os.environ["MCP_TASKS_SNAPSHOT"] = path
+        try:
+            titles = [f"Задача {i}" for i in range(5)]
+            asyncio.run(add_tasks_and_close(titles))
+            with TaskSnapshot(path) as snapshot:
+                assert [task["title"] for task in snapshot.tasks()] == titles, "снимок сохраняет владелец"
+            text = asyncio.run(get_tasks())
+            assert all(title in text for title in titles), text
+        finally:
+            if saved is None:
+                os.environ.pop("MCP_TASKS_SNAPSHOT", None)
+            else:
+                os.environ["MCP_TASKS_SNAPSHOT"] = saved
+
+def test_mcp_pool():
+    print("🧪 Тестирование пула MCP серверов...")
+
+    # Тест 1: инструменты и ресурсы с состоянием — у владельца
+    print("🔄 Тест 1: маршрутизация")
+    asyncio.run(check_routing())
+
+    # Тест 2: убитые воркеры перезапускаются, маршрутизация продолжается
+    print("🔄 Тест 2: перезапуск воркера")
+    asyncio.run(check_respawn())
+
+    # Тест 3: снимок задач пишет и читает только владелец
+    print("🔄 Тест 3: MCP_TASKS_SNAPSHOT в пуле")
+    check_snapshot()
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_mcp_pool()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Тест профилирования медленных запросов и метода debug/profiling
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mcp_profiling import SlowRequestProfiler
+from standard_mcp_server import StandardMCPServer
+
+def profiling_request(server, params, request_id=1):
+    return server.handle_request({"jsonrpc": "2.0", "id": request_id, "method": "debug/profiling", "params": params})
+
+def test_mcp_profiling():
+    print("🧪 Тестирование профилирования медленных запросов...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.realpath(tmp)
+        log_path = os.path.join(root, "slow.jsonl")
+
+        # Тест 1: профиль и запись в журнал только для запросов дольше порога
+        print("🔄 Тест 1: SlowRequestProfiler")
+        profiler = SlowRequestProfiler(profile_dir=root, log_path=log_path)
+        with profiler.profile("tools/call", "calculate", {"expression": "1 + 1"}):
+            pass
+        assert profiler.slow_requests == 0 and not os.path.exists(log_path), "выключенный профайлер ничего не пишет"
+
+        profiler.configure(enabled=True, threshold_ms=10)
+        with profiler.profile("tools/call", "calculate", {"expression": "1 + 1"}):
+            pass
+        assert profiler.slow_requests == 0, "быстрый запрос не профилируется"
+        for mode, suffix in (("cprofile", ".prof"), ("sampling", ".folded")):
+            profiler.configure(mode=mode)
+            with profiler.profile("tools/call", "text_stats", {"text": "x" * 100}):
+                time.sleep(0.05)
+            with open(log_path, encoding="utf-8") as log:
+                entry = json.loads(log.readlines()[-1])
+            assert entry["tool"] == "text_stats" and entry["mode"] == mode and entry["duration_ms"] >= 50
+            assert entry["argument_sizes"] == {"text": 100}, "в журнал попадают размеры, а не значения"
+            assert entry["profile"].endswith(suffix) and os.path.getsize(entry["profile"]) > 0
+        assert profiler.slow_requests == 2
+
+        try:
+            profiler.configure(mode="perf")
+            assert False, "ожидалась ошибка"
+        except ValueError:
+            pass
+
+        # Тест 2: каталог профилей — только внутри настроенного
+        print("🔄 Тест 2: profileDir")
+        assert profiler.resolve_profile_dir("slow") == os.path.join(root, "slow")
+        assert profiler.resolve_profile_dir(os.path.join(root, "a", "..", "b")) == os.path.join(root, "b")
+        for outside in ("..", "../elsewhere", "/etc", os.path.join(root, "..")):
+            try:
+                profiler.resolve_profile_dir(outside)
+                assert False, f"путь вне каталога принят: {outside}"
+            except ValueError:
+                pass
+        # Ссылка внутри каталога, ведущая наружу, тоже отклоняется
+        os.symlink("/", os.path.join(root, "escape"))
+        try:
+            profiler.resolve_profile_dir("escape/tmp")
+            assert False, "ожидалась ошибка"
+        except ValueError:
+            pass
+
+        # Тест 3: debug/profiling выключен по умолчанию
+        print("🔄 Тест 3: debug/profiling без MCP_PROFILE_CONTROL")
+        server = StandardMCPServer()
+        assert not server.profiler.remote_control
+        response = profiling_request(server, {"enabled": True, "profileDir": "/tmp"})
+        assert response["error"]["code"] == -32601 and not server.profiler.enabled
+
+        # Тест 4: разрешенный метод настраивает профилирование в пределах каталога
+        print("🔄 Тест 4: debug/profiling с MCP_PROFILE_CONTROL=1")
+        server.profiler = SlowRequestProfiler(profile_dir=root, log_path=log_path, remote_control=True)
+        response = profiling_request(server, {"enabled": True, "thresholdMs": 1, "profileDir": "/etc"})
+        assert response["error"]["code"] == -32602 and server.profiler.profile_dir == root
+        assert server.profiler.threshold_ms == 500
+        assert not server.profiler.enabled, "отклоненный запрос не меняет настройки частично"
+        response = profiling_request(server, {"enabled": True, "thresholdMs": 0, "profileDir": "server"}, 2)
+        assert response["result"]["enabled"] and response["result"]["profileDir"] == os.path.join(root, "server")
+        server.handle_request({"jsonrpc": "2.0", "id": 3, "method": "tools/call",
+                               "params": {"name": "calculate", "arguments": {"expression": "2 + 2"}}})
+        assert os.listdir(os.path.join(root, "server")), "профиль пишется в выбранный каталог"
+
+        # Тест 5: параллельные запросы в режиме cprofile — профиль у одного, ответ у всех
+        print("🔄 Тест 5: параллельный cProfile")
+        profiler = SlowRequestProfiler(enabled=True, threshold_ms=0, profile_dir=root, log_path=log_path)
+        barrier = threading.Barrier(2)
+
+        def slow_request():
+            with profiler.profile("tools/call", "text_stats"):
+                barrier.wait(timeout=5)
+        threads = [threading.Thread(target=slow_request) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with open(log_path, encoding="utf-8") as log:
+            entries = [json.loads(line) for line in log.readlines()[-2:]]
+        assert profiler.slow_requests == 2 and profiler.skipped_profiles == 1
+        assert sorted(entry["profile"] is None for entry in entries) == [False, True]
+
+        results = []
+        def call_server(request_id):
+            results.append(server.handle_request({"jsonrpc": "2.0", "id": request_id, "method": "tools/call",
+                                                  "params": {"name": "calculate", "arguments": {"expression": "2 ** 10"}}}))
+        threads = [threading.Thread(target=call_server, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(r["id"] for r in results) == list(range(8)) and all("result" in r for r in results)
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_mcp_profiling()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Тест потоковой передачи больших результатов стандартного MCP сервера
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from standard_mcp_server import StandardMCPServer
+from task_tenants import TenantRegistry
+
+def request(server, request_id, method, params, session):
+    return server.handle_request(
+        {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params},
+        session
+    )
+
+def test_mcp_streaming():
+    print("🧪 Тестирование потоковых результатов...")
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        server = StandardMCPServer(tenants=TenantRegistry(store_dir=store_dir))
+        server.stream_chunk_size = 1000
+        messages = []
+        session = {"tenant": "default", "notify": lambda data: messages.append(data)}
+        for i in range(200):
+            request(server, i, "tools/call", {"name": "add_task", "arguments": {"title": f"Задача {i}"}}, session)
+
+        # Тест 1: без progressToken результат приходит целиком, как раньше
+        print("🔄 Тест 1: обычный вызов")
+        full = request(server, 1000, "tools/call", {"name": "get_tasks", "arguments": {}}, session)
+        full_text = full["result"]["content"][0]["text"]
+        assert "#200" in full_text and not messages
+
+        # Тест 2: с progressToken части приходят в notifications/progress
+        print("🔄 Тест 2: get_tasks частями")
+        params = {"name": "get_tasks", "arguments": {}, "_meta": {"progressToken": "t1"}}
+        streamed = request(server, 1001, "tools/call", params, session)
+        notifications = [json.loads(data) for data in messages]
+        assert all(n["method"] == "notifications/progress" for n in notifications)
+        assert [n["params"]["progress"] for n in notifications] == list(range(1, len(notifications) + 1))
+        assert "".join(n["params"]["message"] for n in notifications) == full_text
+        assert len(notifications) > 1 and max(len(data) for data in messages) < 4000
+        assert streamed["result"]["_meta"]["streamed"]["chunks"] == len(notifications)
+
+        # Тест 3: JSON ресурс частями совпадает с обычным чтением
+        print("🔄 Тест 3: tasks://list частями")
+        messages.clear()
+        request(server, 1002, "resources/read", {"uri": "tasks://list", "_meta": {"progressToken": "t2"}}, session)
+        whole = request(server, 1003, "resources/read", {"uri": "tasks://list"}, session)
+        chunks = [json.loads(data)["params"]["message"] for data in messages]
+        assert "".join(chunks) == whole["result"]["contents"][0]["text"]
+
+        # Тест 4: сессия без канала уведомлений получает результат целиком
+        print("🔄 Тест 4: транспорт без уведомлений")
+        plain = request(server, 1004, "tools/call", params, {"tenant": "default"})
+        assert plain["result"]["content"][0]["text"] == full_text
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_mcp_streaming()
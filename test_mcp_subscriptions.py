@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Тест подписок на ресурсы и ленты изменений tasks://changes стандартного MCP сервера
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from standard_mcp_server import StandardMCPServer
+from task_tenants import TaskNamespace, TenantRegistry
+
+def request(server, request_id, method, params, session):
+    return server.handle_request(
+        {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params},
+        session
+    )
+
+def read_changes(server, request_id, since, session):
+    response = request(server, request_id, "resources/read", {"uri": f"tasks://changes?since={since}"}, session)
+    return json.loads(response["result"]["contents"][0]["text"])
+
+def test_mcp_subscriptions():
+    print("🧪 Тестирование подписок на ресурсы...")
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        server = StandardMCPServer(tenants=TenantRegistry(store_dir=store_dir))
+        notifications = []
+        session = {"tenant": "default", "notify": lambda data: notifications.append(json.loads(data))}
+        other = {"tenant": "bob", "notify": lambda data: notifications.append(json.loads(data))}
+
+        # Тест 1: подписка и уведомления об изменениях
+        print("🔄 Тест 1: resources/subscribe")
+        assert request(server, 1, "resources/subscribe", {"uri": "tasks://list"}, session)["result"] == {}
+        assert "error" in request(server, 2, "resources/subscribe", {"uri": "metrics://server"}, session)
+        assert "error" in request(server, 3, "resources/subscribe", {"uri": "tasks://list"}, {"tenant": "default"})
+        request(server, 4, "tools/call", {"name": "add_task", "arguments": {"title": "Первая"}}, session)
+        request(server, 5, "tools/call", {"name": "add_task", "arguments": {"title": "Вторая"}}, session)
+        request(server, 6, "tools/call", {"name": "get_tasks", "arguments": {}}, session)
+        request(server, 7, "tools/call", {"name": "add_task", "arguments": {"title": "Чужая"}}, other)
+        assert [n["params"]["_meta"]["version"] for n in notifications] == [1, 2]
+        assert notifications[0]["method"] == "notifications/resources/updated"
+
+        # Тест 2: лента изменений возвращает только новое
+        print("🔄 Тест 2: tasks://changes?since=N")
+        request(server, 8, "tools/call", {"name": "complete_task", "arguments": {"task_id": 1}}, session)
+        changes = read_changes(server, 9, 2, session)
+        assert changes["version"] == 3 and not changes["added"]
+        assert [t["id"] for t in changes["completed"]] == [1]
+        changes = read_changes(server, 10, 1, session)
+        assert [t["id"] for t in changes["added"]] == [2] and [t["id"] for t in changes["completed"]] == [1]
+        assert read_changes(server, 11, 3, session)["added"] == []
+        assert read_changes(server, 12, 100, session)["reset"] is True
+        assert "error" in request(server, 13, "resources/read", {"uri": "tasks://changes?since=abc"}, session)
+
+        # Тест 3: отписка и закрытие сессии
+        print("🔄 Тест 3: resources/unsubscribe")
+        request(server, 14, "resources/unsubscribe", {"uri": "tasks://list"}, session)
+        request(server, 15, "tools/call", {"name": "add_task", "arguments": {"title": "Третья"}}, session)
+        assert len(notifications) == 3
+
+        # Тест 4: журнал изменений переживает вытеснение на диск
+        print("🔄 Тест 4: сохранение журнала")
+        namespace = server.tenants.get("default")
+        restored = TaskNamespace.from_dict(json.loads(json.dumps(namespace.to_dict())))
+        assert restored.version == namespace.version
+        assert restored.changes_since(2) == namespace.changes_since(2)
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_mcp_subscriptions()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Тест восстановления MCP сервера после падения процесса
+"""
+
+import asyncio
+import functools
+import os
+import signal
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mcp_connection import MCPConnection, make_request
+from mcp_supervisor import MCPSupervisor
+
+RECOVERY_TARGET = 2.0
+
+async def crash_and_recover():
+    supervisor = MCPSupervisor(recovery_target=RECOVERY_TARGET)
+    await supervisor.start()
+    
+    try:
+        await supervisor.request(make_request("tools/call", {
+            "name": "add_task", "arguments": {"title": "Пережить падение", "priority": "high"}
+        }))
+        
+        # Убиваем процесс и сразу отправляем идемпотентный запрос
+        print("💥 Убиваем процесс MCP сервера")
+        supervisor.connection.process.kill()
+        response = await supervisor.request(make_request("tools/call", {
+            "name": "get_tasks", "arguments": {}
+        }))
+        
+        text = response["result"]["content"][0]["text"]
+        print(f"📥 Ответ после восстановления:\n{text}")
+        assert "Пережить падение" in text, "задачи не восстановлены"
+        assert supervisor.restarts == 1
+        assert supervisor.recovery_times[0] < RECOVERY_TARGET
+        print(f"⏱️ Время восстановления: {supervisor.recovery_times[0] * 1000:.0f} мс")
+    
+    finally:
+        await supervisor.close()
+
+def call(name, arguments):
+    return make_request("tools/call", {"name": name, "arguments": arguments})
+
+async def wait_restarts(supervisor, count, timeout=10.0):
+    for _ in range(int(timeout / 0.05)):
+        if supervisor.restarts >= count and supervisor.is_alive:
+            return
+        await asyncio.sleep(0.05)
+    raise AssertionError("сервер не перезапущен")
+
+async def titles(supervisor):
+    text = (await supervisor.request(call("get_tasks", {})))["result"]["content"][0]["text"]
+    return [line.split(": ", 1)[1] for line in text.splitlines() if line.startswith(("⏳", "✅"))]
+
+async def snapshot_and_journal(path):
+    """Снимок, сохраненный при SIGTERM, и журнал супервизора не дублируют задачи"""
+    factory = functools.partial(MCPConnection, env={"MCP_TASKS_SNAPSHOT": path})
+    supervisor = MCPSupervisor(factory, recovery_target=RECOVERY_TARGET)
+    await supervisor.start()
+    try:
+        for title in ("Первая", "Вторая", "Третья"):
+            await supervisor.request(call("add_task", {"title": title}))
+        await supervisor.request(call("complete_task", {"task_id": 2}))
+
+        # SIGTERM: процесс сохраняет снимок, новый загружает его — журнал не повторяется
+        supervisor.connection.process.send_signal(signal.SIGTERM)
+        await wait_restarts(supervisor, 1)
+        assert await titles(supervisor) == ["Первая", "Вторая", "Третья"]
+        assert supervisor.journal_size == 0, "записи из снимка уходят из журнала"
+
+        # Падение без сохранения: из журнала добавляется только то, чего нет в снимке
+        await supervisor.request(call("add_task", {"title": "Четвертая"}))
+        await supervisor.request(call("complete_task", {"task_id": 4}))
+        supervisor.connection.process.kill()
+        await wait_restarts(supervisor, 2)
+        assert await titles(supervisor) == ["Первая", "Вторая", "Третья", "Четвертая"]
+        text = (await supervisor.request(call("get_tasks", {"status": "completed"})))["result"]["content"][0]["text"]
+        assert "#2: Вторая" in text and "#4: Четвертая" in text
+        assert supervisor.journal_size == 2
+    finally:
+        await supervisor.close()
+
+async def limited_replay(count=600):
+    """Журнал больше MCP_MAX_REQUEST_BYTES и глубины очереди восстанавливается целиком"""
+    factory = functools.partial(MCPConnection, env={
+        "MCP_MAX_REQUEST_BYTES": "200000", "MCP_MAX_QUEUE_DEPTH": "128",
+        "MCP_RATE_LIMIT": "2000", "MCP_RATE_BURST": "200"
+    })
+    supervisor = MCPSupervisor(factory, recovery_target=RECOVERY_TARGET)
+    await supervisor.start()
+    try:
+        # Ошибки инструмента ("Ошибка: приоритет ...") в журнал не попадают
+        response = await supervisor.request(call("add_task", {"title": "Нет", "priority": "urgent"}))
+        assert response["result"]["content"][0]["text"].startswith("Ошибка")
+        response = await supervisor.request(call("complete_task", {"task_id": 99}))
+        assert response["result"]["content"][0]["text"].startswith("❌")
+        assert supervisor.journal_size == 0
+
+        for start in range(1, count + 1, 100):
+            batch = [call("add_task", {"title": f"{i:04d} " + "ж" * 300}) for i in range(start, start + 100)]
+            responses = await supervisor.send_batch(batch)
+            assert all(r["result"]["content"][0]["text"].startswith("✅") for r in responses)
+            await asyncio.sleep(0.1)
+        await supervisor.request(call("complete_task", {"task_id": count}))
+        assert supervisor.journal_size == count + 1
+
+        supervisor.connection.process.kill()
+        await wait_restarts(supervisor, 1)
+        restored = await titles(supervisor)
+        assert [title[:4] for title in restored] == [f"{i:04d}" for i in range(1, count + 1)]
+        text = (await supervisor.request(call("get_tasks", {"status": "completed"})))["result"]["content"][0]["text"]
+        assert f"#{count}: {count:04d}" in text
+    finally:
+        await supervisor.close()
+
+def capped_journal():
+    """Сверх max_journal изменения не журналируются, журнал остается без пропусков"""
+    supervisor = MCPSupervisor(max_journal=2)
+    for task_id in (1, 2, 3):
+        reply = {"result": {"content": [{"type": "text", "text": f"✅ Задача #{task_id} 'x' добавлена"}]}}
+        supervisor._record(call("add_task", {"title": "x"}), reply)
+    assert supervisor.journal_size == 2 and supervisor.journal_dropped == 1
+
+def test_mcp_supervisor():
+    print("🧪 Тестирование супервизора MCP сервера...")
+
+    # Тест 1: падение процесса и воспроизведение журнала
+    print("🔄 Тест 1: восстановление после падения")
+    asyncio.run(crash_and_recover())
+
+    # Тест 2: снимок задач и журнал вместе
+    print("🔄 Тест 2: MCP_TASKS_SNAPSHOT и журнал")
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(snapshot_and_journal(os.path.join(tmp, "tasks.snapshot")))
+
+    # Тест 3: воспроизведение частями мимо контроля допуска и предел журнала
+    print("🔄 Тест 3: длинный журнал и лимиты сервера")
+    asyncio.run(limited_replay())
+    capped_journal()
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_mcp_supervisor()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Тест изолированных пространств задач (арендаторов) стандартного MCP сервера
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from standard_mcp_server import StandardMCPServer
+from task_tenants import TenantRegistry
+
+def call(server, request_id, name, arguments, tenant=None, session=None):
+    params = {"name": name, "arguments": arguments}
+    if tenant:
+        params["_meta"] = {"tenant": tenant}
+    response = server.handle_request(
+        {"jsonrpc": "2.0", "id": request_id, "method": "tools/call", "params": params},
+        session
+    )
+    return response["result"]["content"][0]["text"]
+
+def test_mcp_tenants():
+    print("🧪 Тестирование арендаторов...")
+    
+    with tempfile.TemporaryDirectory() as store_dir:
+        tenants = TenantRegistry(max_active=2, store_dir=store_dir, max_tasks=3)
+        server = StandardMCPServer(tenants=tenants)
+        
+        # Тест 1: задачи разных арендаторов не пересекаются
+        print("🔄 Тест 1: изоляция")
+        call(server, 1, "add_task", {"title": "Задача Алисы"}, tenant="alice")
+        call(server, 2, "add_task", {"title": "Задача Боба"}, tenant="bob")
+        alice_tasks = call(server, 3, "get_tasks", {}, tenant="alice")
+        assert "Задача Алисы" in alice_tasks and "Боба" not in alice_tasks
+        assert "#1" in call(server, 4, "get_tasks", {}, tenant="bob")
+        
+        # Тест 2: арендатор, закрепленный за сессией в initialize
+        print("🔄 Тест 2: арендатор сессии")
+        session = {"tenant": "default"}
+        server.handle_request({"jsonrpc": "2.0", "id": 5, "method": "initialize",
+                               "params": {"_meta": {"tenant": "carol"}}}, session)
+        call(server, 6, "add_task", {"title": "Задача Кэрол"}, session=session)
+        assert "Задача Кэрол" in call(server, 7, "get_tasks", {}, tenant="carol")
+        
+        # Тест 3: лимит числа задач
+        print("🔄 Тест 3: лимит задач")
+        for i in range(3):
+            call(server, 10 + i, "add_task", {"title": f"Лимит {i}"}, tenant="dave")
+        assert "лимит" in call(server, 20, "add_task", {"title": "Лишняя"}, tenant="dave")
+        
+        # Тест 4: вытесненный на диск арендатор загружается обратно
+        print("🔄 Тест 4: вытеснение и загрузка")
+        assert tenants.evictions > 0
+        assert "Задача Алисы" in call(server, 21, "get_tasks", {}, tenant="alice")
+        assert "Задача Алисы" in call(server, 22, "complete_task", {"task_id": 1}, tenant="alice")
+
+    # Тест 5: max_active=1 — в памяти только арендатор по умолчанию и текущий
+    print("🔄 Тест 5: max_active=1")
+    with tempfile.TemporaryDirectory() as store_dir:
+        tenants = TenantRegistry(max_active=1, store_dir=store_dir)
+        server = StandardMCPServer(tenants=tenants)
+        call(server, 0, "add_task", {"title": "Задача по умолчанию"})
+        for request_id, tenant in enumerate(("alice", "bob", "alice", "bob"), 1):
+            call(server, request_id, "add_task", {"title": f"Задача {tenant} {request_id}"}, tenant=tenant)
+            assert f"Задача {tenant} {request_id}" in call(server, 100 + request_id, "get_tasks", {}, tenant=tenant)
+        assert tenants.evictions == 3, "вытесняется предыдущий арендатор, а не только что загруженный"
+        assert "#2" in call(server, 10, "get_tasks", {}, tenant="alice")
+        assert "Задача по умолчанию" in call(server, 11, "get_tasks", {})
+
+    # Тест 6: без MCP_TENANT_DIR у каждого реестра свой каталог
+    print("🔄 Тест 6: каталог по умолчанию")
+    first, second = TenantRegistry(max_active=1), TenantRegistry(max_active=1)
+    first.get("alice").add_task({"title": "Секрет", "priority": "low", "completed": False})
+    first.get("bob")
+    assert first.evictions == 1 and os.listdir(first.store_dir)
+    assert second.get("alice").tasks == [], "вытесненный арендатор другого реестра не читается"
+    assert first.store_dir != second.store_dir
+    assert [task["title"] for task in first.get("alice").tasks] == ["Секрет"]
+    
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_mcp_tenants()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Тест реестра инструментов: --dump-tools и MCP_TOOLS_REGISTRY
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mcp_connection import SERVER_COMMAND
+from standard_mcp_server import StandardMCPServer
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def run_server(args=(), env=None, requests=()):
+    """Запуск сервера командой клиента (SERVER_COMMAND); ответы построчно"""
+    process = subprocess.run(
+        [*SERVER_COMMAND, *args],
+        input="".join(json.dumps(r, ensure_ascii=False) + "\n" for r in requests),
+        capture_output=True, text=True, encoding="utf-8", timeout=60,
+        cwd=SERVER_DIR, env={**os.environ, **(env or {})}
+    )
+    assert process.returncode == 0, process.stderr
+    return [json.loads(line) for line in process.stdout.splitlines() if line.strip()]
+
+def tools_list(request_id=1):
+    return {"jsonrpc": "2.0", "id": request_id, "method": "tools/list", "params": {}}
+
+def test_mcp_tools_registry():
+    print("🧪 Тестирование реестра инструментов...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tools.json")
+
+        # Тест 1: --dump-tools пишет ровно то, что сервер отвечает на tools/list
+        print("🔄 Тест 1: --dump-tools")
+        assert run_server(["--dump-tools", path]) == [], "в режиме выгрузки протокол не запускается"
+        with open(path, encoding="utf-8") as f:
+            dumped = json.load(f)
+        live = run_server(requests=[tools_list()])
+        assert live[0]["id"] == 1 and live[0]["result"] == dumped
+        names = [tool["name"] for tool in dumped["tools"]]
+        assert len(names) == len(set(names)) and "add_task" in names and "calculate" in names
+        assert all(tool["inputSchema"]["type"] == "object" for tool in dumped["tools"])
+
+        # Тест 2: сервер с MCP_TOOLS_REGISTRY отвечает тем же списком
+        print("🔄 Тест 2: MCP_TOOLS_REGISTRY")
+        # Одиночный tools/list собирается из байтов файла, в batch — через get_tools_list
+        responses = run_server(env={"MCP_TOOLS_REGISTRY": path},
+                               requests=[tools_list("a"), [tools_list(2), tools_list(3)]])
+        assert responses[0]["id"] == "a" and responses[0]["result"] == dumped
+        assert [r["result"] for r in responses[1]] == [dumped, dumped]
+        server = StandardMCPServer(tools_registry=path)
+        assert server.get_tools_list() == dumped == StandardMCPServer(tools_registry="").get_tools_list()
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_mcp_tools_registry()
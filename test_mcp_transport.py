@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Тест сетевых транспортов: TCP, Unix-сокет и streamable HTTP
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mcp_transport import MAX_MESSAGE_BYTES, MCPHttpServer, MCPSocketServer, SessionRegistry
+
+def message(request_id, method, params=None):
+    return {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}}
+
+def call(request_id, name, arguments, tenant=None):
+    params = {"name": name, "arguments": arguments}
+    if tenant:
+        params["_meta"] = {"tenant": tenant}
+    return message(request_id, "tools/call", params)
+
+def text(response):
+    return response["result"]["content"][0]["text"]
+
+class LineClient:
+    """JSON-RPC построчно поверх TCP или Unix-сокета"""
+
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+
+    async def send(self, *messages):
+        self.writer.write(b"".join(json.dumps(m, ensure_ascii=False).encode("utf-8") + b"\n" for m in messages))
+        await self.writer.drain()
+        responses = [json.loads(await self.reader.readline()) for _ in messages]
+        return {response["id"]: response for response in responses}
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+async def http_post(port, body, session_id=None, method="POST", path="/mcp"):
+    """Один HTTP запрос в отдельном соединении; (статус, заголовки, тело)"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else b""
+    head = f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Length: {len(data)}\r\nConnection: close\r\n"
+    if session_id:
+        head += f"Mcp-Session-Id: {session_id}\r\n"
+    writer.write((head + "\r\n").encode("latin-1") + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    payload = await reader.readexactly(int(headers.get("content-length", "0")))
+    writer.close()
+    await writer.wait_closed()
+    return status, headers, json.loads(payload) if payload else None
+
+async def check_sockets(tmp):
+    # Общее состояние по TCP: задача одного клиента видна другому
+    registry = SessionRegistry(state="shared")
+    server = await MCPSocketServer(registry).serve_tcp("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        first = LineClient(*await asyncio.open_connection("127.0.0.1", port))
+        second = LineClient(*await asyncio.open_connection("127.0.0.1", port))
+        # Запросы одного соединения можно отправлять, не дожидаясь ответов
+        responses = await first.send(message(1, "initialize"), call(2, "add_task", {"title": "Общая"}),
+                                     call(3, "calculate", {"expression": "6 * 7"}))
+        assert sorted(responses) == [1, 2, 3] and "42" in text(responses[3])
+        responses = await second.send(call(1, "get_tasks", {}))
+        assert "Общая" in text(responses[1])
+        assert len(registry) == 2
+        await first.close()
+        await second.close()
+    finally:
+        server.close()
+        await server.wait_closed()
+
+    # Отдельное состояние по Unix-сокету: у каждой сессии свои задачи и свой каталог на диске
+    registry = SessionRegistry(state="session")
+    path = os.path.join(tmp, "mcp.sock")
+    server = await MCPSocketServer(registry).serve_unix(path)
+    try:
+        first = LineClient(*await asyncio.open_unix_connection(path))
+        second = LineClient(*await asyncio.open_unix_connection(path))
+        await first.send(call(1, "add_task", {"title": "Секрет A"}, tenant="team"))
+        # MCP_TENANT_MAX_ACTIVE=1: переход к другому арендатору вытесняет team на диск
+        await first.send(call(2, "get_tasks", {}, tenant="other"))
+        store_dirs = {session.server.tenants.store_dir for session in registry._sessions.values()}
+        assert len(store_dirs) == 2 and all(d.startswith(os.path.join(tmp, "sessions")) for d in store_dirs)
+        assert sum(len(os.listdir(d)) for d in store_dirs if os.path.isdir(d)) == 1
+        responses = await second.send(call(1, "get_tasks", {}, tenant="team"))
+        assert "Секрет A" not in text(responses[1]), "вытесненный арендатор чужой сессии не должен читаться"
+        responses = await first.send(call(3, "get_tasks", {}, tenant="team"))
+        assert "Секрет A" in text(responses[3]), "своя сессия загружает арендатора с диска"
+        await first.close()
+        await second.close()
+        for _ in range(100):
+            if not len(registry):
+                break
+            await asyncio.sleep(0.01)
+        assert len(registry) == 0 and not any(os.path.exists(d) for d in store_dirs), "каталоги сессий удалены"
+    finally:
+        server.close()
+        await server.wait_closed()
+
+async def check_http():
+    registry = SessionRegistry(state="session")
+    server = await MCPHttpServer(registry).serve("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        status, headers, body = await http_post(port, message(1, "initialize"))
+        assert status == 200 and body["result"]["serverInfo"]
+        session_id = headers["mcp-session-id"]
+        status, _, body = await http_post(port, call(2, "add_task", {"title": "По HTTP"}), session_id)
+        assert status == 200 and "По HTTP" in text(body)
+        status, _, body = await http_post(port, [call(3, "get_tasks", {}), message(4, "ping")], session_id)
+        assert status == 200 and [r["id"] for r in body] == [3, 4] and "По HTTP" in text(body[0])
+        # Только уведомление — 202 без тела
+        status, _, body = await http_post(port, {"jsonrpc": "2.0", "method": "notifications/initialized"},
+                                          session_id)
+        assert status == 202 and body is None
+        # Новая сессия не видит задач первой
+        status, headers, body = await http_post(port, call(1, "get_tasks", {}))
+        assert headers["mcp-session-id"] != session_id and "По HTTP" not in text(body)
+
+        assert (await http_post(port, message(5, "ping"), "unknown"))[0] == 404
+        assert (await http_post(port, None, method="GET"))[0] == 405
+        assert (await http_post(port, message(6, "ping"), path="/other"))[0] == 404
+        assert (await http_post(port, None, session_id, method="DELETE"))[0] == 204
+        assert (await http_post(port, message(7, "ping"), session_id))[0] == 404
+
+        # Слишком большое тело отклоняется ответом 413, а не обрывом соединения
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"POST /mcp HTTP/1.1\r\nContent-Length: {MAX_MESSAGE_BYTES + 1}\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+        assert int((await reader.readline()).split()[1]) == 413
+        head, _, body = (await reader.read()).partition(b"\r\n\r\n")
+        assert b"Connection: close" in head and json.loads(body)["error"]["code"] == -32600
+        writer.close()
+        await writer.wait_closed()
+    finally:
+        server.close()
+        await server.wait_closed()
+
+async def check_session_cleanup():
+    # Сессии с отдельным состоянием: DELETE и простой закрывают процесс вычислений сессии
+    registry = SessionRegistry(state="session", idle_timeout=0.5)
+    server = await MCPHttpServer(registry).serve("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        processes = []
+        for _ in range(2):
+            status, headers, body = await http_post(port, call(1, "calculate", {"expression": "2 ** 10"}))
+            assert status == 200 and "1024" in text(body)
+            evaluator = registry.get(headers["mcp-session-id"]).server.evaluator
+            processes.append(evaluator._process)
+            assert processes[-1].poll() is None
+        deleted, idle = (session.session_id for session in list(registry._sessions.values()))
+
+        assert (await http_post(port, None, deleted, method="DELETE"))[0] == 204
+        assert processes[0].poll() is not None, "процесс вычислений закрывается вместе с сессией"
+
+        await asyncio.sleep(0.6)
+        assert (await http_post(port, message(2, "ping"), idle))[0] == 404
+        assert registry.expired == 1 and len(registry) == 0
+        assert processes[1].poll() is not None, "сессия без DELETE истекает по простою"
+    finally:
+        server.close()
+        await server.wait_closed()
+
+    # Лимит сессий вытесняет HTTP сессии, но не сессии открытых соединений
+    registry = SessionRegistry(state="shared", max_sessions=1)
+    connection = registry.open(pinned=True)
+    first = registry.open()
+    second = registry.open()
+    assert registry.get(connection.session_id) and registry.get(second.session_id)
+    assert registry.get(first.session_id) is None
+
+def test_mcp_transport():
+    print("🧪 Тестирование сетевых транспортов...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        saved = {name: os.environ.get(name) for name in ("MCP_TENANT_DIR", "MCP_TENANT_MAX_ACTIVE")}
+        os.environ.update({"MCP_TENANT_DIR": tmp, "MCP_TENANT_MAX_ACTIVE": "1"})
+        try:
+            # Тест 1: TCP и Unix-сокет, общее и отдельное состояние
+            print("🔄 Тест 1: TCP и Unix-сокет")
+            asyncio.run(check_sockets(tmp))
+
+            # Тест 2: streamable HTTP и сессии Mcp-Session-Id
+            print("🔄 Тест 2: HTTP")
+            asyncio.run(check_http())
+
+            # Тест 3: ресурсы закрытых и простаивающих сессий освобождаются
+            print("🔄 Тест 3: закрытие и истечение сессий")
+            asyncio.run(check_session_cleanup())
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_mcp_transport()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Тест кэширования промптов: стабильный префикс, метки cache_control,
+учет попаданий по usage и кэш вывода MCP промптов
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+from openrouter_client import OpenRouterMCPClient
+from prompt_cache import (CACHE_CONTROL, PromptCachePlanner, VersionedCache, canonical_json,
+                          strip_cache_markers, usage_cache_stats)
+from stub_llm import StubLLMServer
+
+TOOLS = [
+    {"name": name, "description": f"Инструмент {name}. " * 100,
+     "inputSchema": {"type": "object", "properties": {"text": {"type": "string"}}}}
+    for name in ("text_stats", "add_task", "calculate")
+]
+
+def request_bytes(messages):
+    """Запрос без меток, как его видит кэш провайдера (без закрывающей скобки)"""
+    return canonical_json([strip_cache_markers(message) for message in messages])[:-1]
+
+async def run_turns(mode: str, model: str, turns: int):
+    stub = StubLLMServer(tool_calls=[], prompt_cache=True)
+    await stub.start()
+    client = OpenRouterMCPClient(api_key="test", model=model)
+    client.base_url = stub.base_url
+    client.prompt_cache = PromptCachePlanner(mode=mode)
+    client.available_tools = TOOLS
+    try:
+        for i in range(turns):
+            await client.chat_turn(f"Вопрос {i}: " + "подробности " * 50)
+        return list(client.turn_metrics), client.conversation_history
+    finally:
+        await client.cleanup()
+        await stub.stop()
+
+async def reply_after_tools():
+    stub = StubLLMServer(tool_calls=[("text_stats", {"text": "x"})], chain_tool_calls=True)
+    await stub.start()
+    client = OpenRouterMCPClient(api_key="test", model="openai/gpt-4o")
+    client.base_url = stub.base_url
+    client.prompt_cache = PromptCachePlanner(mode="on")
+    client.available_tools = TOOLS
+    try:
+        reply, _ = await client.chat_turn("Посчитай слова")
+        return reply
+    finally:
+        await client.cleanup()
+        await stub.stop()
+
+def test_prompt_cache():
+    print("🧪 Тестирование кэширования промптов...")
+
+    # Тест 1: метки и стабильный префикс
+    print("🔄 Тест 1: сборка сообщений")
+    planner = PromptCachePlanner(mode="auto", system_prompt="Системный промпт")
+    history = [{"role": "user", "content": "Привет"}]
+    first = planner.messages("anthropic/claude-3.5-sonnet", history)
+    assert first[0]["role"] == "system" and first[0]["content"][0]["cache_control"] == CACHE_CONTROL
+    assert first[1]["content"][0]["cache_control"] == CACHE_CONTROL
+    assert history == [{"role": "user", "content": "Привет"}], "история не должна меняться"
+    history += [{"role": "assistant", "content": "Здравствуйте"}, {"role": "user", "content": "Еще"},
+                {"role": "assistant", "content": None, "tool_calls": []},
+                {"role": "tool", "tool_call_id": "1", "content": "42"}]
+    second = planner.messages("anthropic/claude-3.5-sonnet", history)
+    # Системный промпт и два последних сообщения пользователя/инструмента
+    assert [i for i, m in enumerate(second) if isinstance(m["content"], list)] == [0, 3, 5]
+    # Без меток предыдущий запрос — префикс следующего, байт в байт
+    assert request_bytes(second).startswith(request_bytes(first))
+    # Модели с автоматическим кэшем получают тот же префикс без меток
+    plain = planner.messages("openai/gpt-4o", history)
+    assert all(isinstance(m["content"], (str, type(None))) for m in plain) and plain[0]["role"] == "system"
+    assert PromptCachePlanner(mode="off").messages("anthropic/claude-3.5-sonnet", history) is history
+
+    # Инструменты: один объект, пока список сервера тот же; порядок не зависит от сервера
+    built = []
+    def build():
+        built.append(1)
+        return [{"type": "function", "function": {"name": t["name"]}} for t in TOOLS]
+    tools = planner.tools(TOOLS, build)
+    assert planner.tools(TOOLS, build) is tools and len(built) == 1
+    assert [t["function"]["name"] for t in tools] == ["add_task", "calculate", "text_stats"]
+    planner.tools(list(reversed(TOOLS)), build)
+    assert len(built) == 2 and canonical_json(planner.tools(list(reversed(TOOLS)), build)) == canonical_json(tools)
+
+    # Тест 2: usage разных провайдеров
+    print("🔄 Тест 2: разбор usage")
+    assert usage_cache_stats({"prompt_tokens": 100, "prompt_tokens_details": {"cached_tokens": 80}}) == (100, 80, 0)
+    assert usage_cache_stats({"prompt_tokens": 100, "cache_read_input_tokens": 60,
+                              "cache_creation_input_tokens": 40}) == (100, 60, 40)
+    assert usage_cache_stats(None) == (0, 0, 0)
+
+    # Тест 3: ходы диалога против заглушки с кэшем префиксов
+    print("🔄 Тест 3: попадания по ходам")
+    turns, history = asyncio.run(run_turns("auto", "anthropic/claude-3.5-sonnet", 4))
+    assert turns[0]["prompt_cache_misses"] == 1 and turns[0]["prompt_cache_write_tokens"] > 0
+    for turn in turns[1:]:
+        assert turn["prompt_cache_hits"] == 1 and turn["prompt_cache_savings"] > 0.5, turn
+    assert all(isinstance(m["content"], str) for m in history), "метки не попадают в историю"
+    # Без меток заглушка (как Anthropic) ничего не кэширует
+    turns, _ = asyncio.run(run_turns("off", "anthropic/claude-3.5-sonnet", 2))
+    assert sum(t["prompt_cache_hits"] for t in turns) == 0 and turns[1]["prompt_cache_misses"] == 1
+
+    # Финальный запрос после инструментов просит текст: модель, готовая вызывать инструменты
+    # дальше, все равно отвечает, а не возвращает tool_calls без содержимого
+    reply = asyncio.run(reply_after_tools())
+    assert reply == "Готово.", reply
+
+    # Тест 4: вывод MCP промптов кэшируется по версии задач
+    print("🔄 Тест 4: кэш вывода промптов")
+    cache = VersionedCache(max_entries=2)
+    assert cache.get("a", 1, lambda: "v1") == "v1" and cache.get("a", 1, lambda: "другое") == "v1"
+    assert cache.get("a", 2, lambda: "v2") == "v2" and (cache.hits, cache.misses) == (1, 2)
+
+    import personal_assistant
+    personal_assistant.add_task("Отчет", priority="high")
+    summary = personal_assistant.task_summary()
+    hits = personal_assistant.prompt_outputs.hits
+    assert personal_assistant.task_summary() == summary and personal_assistant.prompt_outputs.hits == hits + 1
+    total = len(personal_assistant.tasks_storage)
+    personal_assistant.add_task("Письмо")
+    assert f"Всего задач: {total + 1}" in personal_assistant.task_summary()
+    tips = personal_assistant.productivity_tips("time_management")
+    assert personal_assistant.productivity_tips("time_management") is tips
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_prompt_cache()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Тест снимков задач: читатели видят согласованную версию и не задерживают писателей
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from standard_mcp_server import StandardMCPServer
+from task_tenants import TaskNamespace, TenantRegistry
+
+def request(server, request_id, method, params, session):
+    return server.handle_request({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}, session)
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def stress(server, locked: bool, seconds: float, readers: int = 4):
+    """Писатель добавляет и завершает задачи, читатели непрерывно выгружают список.
+
+    locked=True — читатели держат lock пространства на время выгрузки (как без снимков).
+    Возвращает латентности записи, число чтений и найденные несоответствия.
+    """
+    namespace = server.namespace
+    session = {"tenant": namespace.tenant_id}
+    # Версия -> (задач, завершено) сразу после записи
+    ledger = {namespace.version: (len(namespace.tasks), namespace.completed_count)}
+    errors = []
+    reads = [0] * readers
+    stop = threading.Event()
+
+    def check_tasks(tasks):
+        ids = [task["id"] for task in tasks]
+        if ids != list(range(1, len(ids) + 1)):
+            errors.append("пропущены задачи")
+        if any(task["completed"] != ("completed_at" in task) for task in tasks):
+            errors.append("задача прочитана наполовину")
+
+    def reader(index):
+        while not stop.is_set():
+            if locked:
+                with namespace.lock:
+                    text = server.get_tasks()
+                    tasks = json.loads(json.dumps(namespace.tasks))
+            else:
+                text = server.get_tasks()
+                view = namespace.snapshot()
+                tasks = json.loads(request(server, 1, "resources/read", {"uri": "tasks://list"},
+                                           session)["result"]["contents"][0]["text"])
+                # Снимок совпадает с состоянием сразу после записи той же версии
+                if ledger.get(view.version) != (len(view.tasks), view.completed_count):
+                    errors.append(f"версия {view.version}: снимок не совпадает с журналом")
+                if sum(task["completed"] for task in view.tasks) != view.completed_count:
+                    errors.append("счетчик завершенных не совпадает со снимком")
+            check_tasks(tasks)
+            if not text.startswith("📋"):
+                errors.append("пустой список")
+            reads[index] += 1
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    request_id = 0
+    while time.perf_counter() < deadline:
+        request_id += 1
+        if request_id % 3:
+            params = {"name": "add_task", "arguments": {"title": f"Новая {request_id}"}}
+        else:
+            params = {"name": "complete_task", "arguments": {"task_id": namespace.completed_count + 1}}
+        started = time.perf_counter()
+        with namespace.lock:
+            request(server, request_id, "tools/call", params, session)
+            ledger[namespace.version] = (len(namespace.tasks), namespace.completed_count)
+        latencies.append(time.perf_counter() - started)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, sum(reads), errors
+
+def test_task_isolation():
+    print("🧪 Тестирование снимков задач...")
+
+    # Тест 1: снимок версии не меняется после записи
+    print("🔄 Тест 1: неизменяемый снимок")
+    namespace = TaskNamespace("test")
+    for i in range(3):
+        namespace.add_task({"title": f"Задача {i}", "description": "", "priority": "medium", "completed": False})
+    view = namespace.snapshot()
+    assert namespace.snapshot() is view, "читатели одной версии делят снимок"
+    original = namespace.get_task(2)
+    completed = namespace.mark_completed(original)
+    namespace.add_task({"title": "Еще", "description": "", "priority": "low", "completed": False})
+    assert len(view.tasks) == 3 and not view.tasks[1]["completed"] and not original["completed"]
+    assert completed["completed"] and namespace.tasks[1] is completed and namespace.get_task(2) is completed
+    latest = namespace.snapshot()
+    assert latest.version == namespace.version and len(latest.tasks) == 4 and latest.completed_count == 1
+    restored = TaskNamespace.from_dict(namespace.to_dict())
+    assert [task["id"] for task in restored.snapshot().tasks] == [1, 2, 3, 4]
+    # Позиция задачи в восстановленном пространстве находится так же, как в исходном
+    restored.mark_completed(restored.get_task(3))
+    assert restored.tasks[2]["completed"] and restored.changes_since(namespace.version)["completed"][0]["id"] == 3
+
+    # Тест 2: выгрузка списков под потоком записей
+    print("🔄 Тест 2: нагрузка чтение + запись")
+    results = {}
+    for locked in (True, False):
+        with tempfile.TemporaryDirectory() as store_dir:
+            server = StandardMCPServer(tenants=TenantRegistry(store_dir=store_dir, max_tasks=100_000))
+            for i in range(3000):
+                server.add_task(f"Задача {i}", "описание " * 5)
+            results[locked] = stress(server, locked, seconds=1.5)
+    for locked, (latencies, reads, errors) in results.items():
+        mode = "под lock" if locked else "снимки"
+        print(f"   {mode}: записей {len(latencies)}, p50 {percentile(latencies, 50) * 1000:.2f} мс, "
+              f"p99 {percentile(latencies, 99) * 1000:.2f} мс; чтений {reads}")
+    latencies, reads, errors = results[False]
+    assert not errors, errors[:5]
+    assert reads > 0 and len(latencies) > 100
+    # Писатель не ждет выгрузок целиком: записей больше, чем с читателями под lock, и хвост латентности короче
+    assert len(latencies) > len(results[True][0])
+    assert percentile(latencies, 99) < percentile(results[True][0], 99)
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_task_isolation()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Тест сроков задач и планировщика next_tasks / overdue_tasks
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from standard_mcp_server import StandardMCPServer
+from task_tenants import TaskNamespace, parse_due_date
+
+def titles(tasks):
+    return [task["title"] for task in tasks]
+
+def test_task_scheduler():
+    print("🧪 Тестирование планировщика задач...")
+
+    # Тест 1: формат срока
+    print("🔄 Тест 1: срок задачи")
+    assert parse_due_date("2026-03-01") == datetime(2026, 3, 2)
+    assert parse_due_date("2026-03-01T09:30") == datetime(2026, 3, 1, 9, 30)
+    try:
+        parse_due_date("завтра")
+        assert False, "ожидалась ошибка формата"
+    except ValueError:
+        pass
+
+    # Тест 2: порядок по приоритету, затем по сроку; задачи без срока последние
+    print("🔄 Тест 2: next_tasks")
+    namespace = TaskNamespace("test")
+    for title, priority, due in [
+        ("low-early", "low", "2020-01-01"),
+        ("high-none", "high", None),
+        ("high-late", "high", "2030-01-01"),
+        ("medium", "medium", "2025-06-01"),
+        ("high-early", "high", "2024-01-01"),
+    ]:
+        task = {"title": title, "priority": priority, "completed": False}
+        if due:
+            task["due_date"] = due
+        namespace.add_task(task)
+    assert titles(namespace.next_tasks(10)) == ["high-early", "high-late", "high-none", "medium", "low-early"]
+    assert titles(namespace.next_tasks(2)) == ["high-early", "high-late"]
+
+    # Тест 3: просроченные — самые ранние сроки первыми, будущие не попадают
+    print("🔄 Тест 3: overdue_tasks")
+    now = datetime(2026, 1, 1)
+    assert titles(namespace.overdue_tasks(10, now)) == ["low-early", "high-early", "medium"]
+    assert titles(namespace.overdue_tasks(1, now)) == ["low-early"]
+
+    # Тест 4: завершенные задачи исчезают из выдачи, кучи перестраиваются
+    print("🔄 Тест 4: завершение задач")
+    namespace.mark_completed(namespace.get_task(5))
+    assert titles(namespace.next_tasks(1)) == ["high-late"]
+    assert titles(namespace.overdue_tasks(10, now)) == ["low-early", "medium"]
+    for task_id in (1, 2, 3):
+        namespace.mark_completed(namespace.get_task(task_id))
+    assert len(namespace.schedule) < 5 and titles(namespace.next_tasks(10)) == ["medium"]
+
+    # После вытеснения на диск индекс восстанавливается
+    restored = TaskNamespace.from_dict(namespace.to_dict())
+    assert titles(restored.next_tasks(10)) == ["medium"]
+    assert titles(restored.overdue_tasks(10, now)) == ["medium"]
+
+    # Тест 5: инструменты стандартного сервера
+    print("🔄 Тест 5: инструменты сервера")
+    server = StandardMCPServer()
+    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    server.call_tool("add_task", {"title": "Отчет", "priority": "high", "due_date": yesterday})
+    server.call_tool("add_task", {"title": "Письмо", "priority": "low"})
+    result = server.call_tool("add_task", {"title": "Плохой срок", "due_date": "скоро"})
+    assert "Ошибка" in result["content"][0]["text"]
+    text = server.call_tool("next_tasks", {"k": 1})["content"][0]["text"]
+    assert "Отчет" in text and "Письмо" not in text
+    text = server.call_tool("overdue_tasks", {})["content"][0]["text"]
+    assert "Отчет" in text and f"Срок: {yesterday}" in text
+    assert "⏰ Срок" in server.call_tool("get_tasks", {})["content"][0]["text"]
+    server.call_tool("complete_task", {"task_id": 1})
+    assert "нет" in server.call_tool("overdue_tasks", {})["content"][0]["text"]
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_task_scheduler()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Тест колоночных снимков задач: формат, mmap, сводка и загрузка при старте сервера
+"""
+
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mcp_connection import MCPConnection, make_request
+from task_snapshot import TaskSnapshot, write_snapshot
+from task_tenants import DEFAULT_TENANT, TaskNamespace, TenantRegistry
+
+# Снимок без задач: заголовок и одно смещение строк (выравнивание до 8 байт)
+HEADER_ONLY = 40
+
+def make_namespace():
+    namespace = TaskNamespace("test")
+    namespace.add_task({"title": "Отчет 📊", "description": "Квартальный", "priority": "high",
+                        "completed": False, "created_at": "2025-01-02T03:04:05.123456",
+                        "due_date": "2025-01-10"})
+    namespace.add_task({"title": "Письмо", "description": "", "priority": "low",
+                        "completed": False, "created_at": "2025-01-03T10:00:00"})
+    namespace.add_task({"title": "Звонок", "description": "", "priority": "medium",
+                        "completed": False, "created_at": "2025-01-04T11:00:00",
+                        "due_date": "2030-01-01T09:30"})
+    namespace.mark_completed(namespace.get_task(2))
+    return namespace
+
+def run_server(env, requests):
+    lines = [{"jsonrpc": "2.0", "id": 0, "method": "initialize", "params": {}}] + requests
+    process = subprocess.run(
+        [sys.executable, "standard_mcp_server.py"],
+        input="".join(json.dumps(r, ensure_ascii=False) + "\n" for r in lines),
+        capture_output=True, text=True, encoding="utf-8", timeout=60,
+        cwd=os.path.dirname(os.path.abspath(__file__)), env={**os.environ, **env}
+    )
+    return [json.loads(line) for line in process.stdout.splitlines() if line.strip()]
+
+async def add_and_close(env, title):
+    """Клиент добавляет задачу и закрывает соединение (как openrouter_client.cleanup)"""
+    connection = MCPConnection(env=env)
+    await connection.start()
+    await connection.initialize()
+    await connection.request(make_request("tools/call", {"name": "add_task", "arguments": {"title": title}}))
+    await connection.close()
+    return connection.process.returncode
+
+def test_task_snapshot():
+    print("🧪 Тестирование снимков задач...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tasks.snapshot")
+        namespace = make_namespace()
+
+        # Тест 1: запись и чтение без потерь
+        print("🔄 Тест 1: формат снимка")
+        size = write_snapshot(path, namespace.tasks)
+        assert size == os.path.getsize(path) and size % 8 == 0
+        with TaskSnapshot(path) as snapshot:
+            assert len(snapshot) == 3
+            assert snapshot.tasks() == namespace.tasks
+            assert [snapshot.task(i) for i in range(3)] == namespace.tasks
+            # Колонки читаются без создания словарей
+            assert list(snapshot.ids) == [1, 2, 3] and list(snapshot.completed) == [0, 1, 0]
+            assert snapshot.title(0) == "Отчет 📊" and snapshot.due_date(1) == ""
+
+            # Тест 2: сводка по колонкам
+            print("🔄 Тест 2: сводка")
+            summary = snapshot.summary(now=datetime(2026, 1, 1))
+            assert summary == {"total": 3, "completed": 1, "pending": 2, "overdue": 1,
+                               "by_priority": {"high": 1, "medium": 1, "low": 1}}
+
+        # Пустой список и поврежденный файл
+        write_snapshot(path, [])
+        with TaskSnapshot(path) as snapshot:
+            assert snapshot.tasks() == [] and snapshot.summary()["total"] == 0
+        write_snapshot(path, namespace.tasks)
+        with open(path, "r+b") as f:
+            f.truncate(size - 16)
+        try:
+            TaskSnapshot(path)
+            assert False, "ожидалась ошибка"
+        except ValueError:
+            pass
+        # Поврежденный снимок не мешает старту: пространство начинается пустым
+        assert TenantRegistry(store_dir=tmp, snapshot_path=path).get().tasks == []
+        os.remove(path)
+
+        # Тест 3: арендатор по умолчанию загружается из снимка
+        print("🔄 Тест 3: реестр арендаторов")
+        registry = TenantRegistry(store_dir=tmp, snapshot_path=path)
+        assert registry.get().tasks == [] and registry.save_snapshot() == HEADER_ONLY
+        registry.get().add_task({"title": "Новая", "description": "", "priority": "low",
+                                 "completed": False, "created_at": "2025-02-01T00:00:00"})
+        registry.save_snapshot()
+        restored = TenantRegistry(store_dir=tmp, snapshot_path=path).get(DEFAULT_TENANT)
+        assert [t["title"] for t in restored.tasks] == ["Новая"]
+        assert restored.add_task({"title": "Еще", "priority": "low", "completed": False})["id"] == 2
+
+        # Тест 4: стандартный сервер сохраняет задачи при завершении и загружает при старте
+        print("🔄 Тест 4: перезапуск сервера")
+        server_path = os.path.join(tmp, "server.snapshot")
+        env = {"MCP_TASKS_SNAPSHOT": server_path}
+        run_server(env, [{"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+                          "params": {"name": "add_task", "arguments": {"title": "Переживет рестарт"}}}])
+        assert os.path.exists(server_path)
+        responses = run_server(env, [{"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+                                      "params": {"name": "get_tasks", "arguments": {}}}])
+        assert "Переживет рестарт" in responses[-1]["result"]["content"][0]["text"]
+
+        # Сессия клиента: close() закрывает stdin, сервер завершается сам и сохраняет снимок
+        os.remove(server_path)
+        assert asyncio.run(add_and_close(env, "Через клиента")) == 0
+        with TaskSnapshot(server_path) as snapshot:
+            assert [t["title"] for t in snapshot.tasks()] == ["Через клиента"]
+
+        # SIGTERM (зависший клиент, супервизор) тоже сохраняет снимок
+        os.remove(server_path)
+        process = subprocess.Popen(
+            [sys.executable, "-S", "standard_mcp_server.py"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            cwd=os.path.dirname(os.path.abspath(__file__)), env={**os.environ, **env}
+        )
+        process.stdin.write(json.dumps({"jsonrpc": "2.0", "id": 1, "method": "tools/call", "params": {
+            "name": "add_task", "arguments": {"title": "Перед SIGTERM"}}}).encode() + b"\n")
+        process.stdin.flush()
+        assert json.loads(process.stdout.readline())["id"] == 1
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=10)
+        process.stdin.close()
+        with TaskSnapshot(server_path) as snapshot:
+            assert [t["title"] for t in snapshot.tasks()] == ["Перед SIGTERM"]
+
+        # Сигнал может прийти в поток batch или чтения stdin — сервер все равно завершается
+        for _ in range(10):
+            process = subprocess.Popen(
+                [sys.executable, "standard_mcp_server.py"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                cwd=os.path.dirname(os.path.abspath(__file__)), env={**os.environ, "MCP_BATCH_WORKERS": "4"}
+            )
+            process.stdin.write(json.dumps([{"jsonrpc": "2.0", "id": i, "method": "tools/call", "params": {
+                "name": "text_stats", "arguments": {"text": "слово"}}} for i in range(4)]).encode() + b"\n")
+            process.stdin.flush()
+            assert len(json.loads(process.stdout.readline())) == 4
+            process.send_signal(signal.SIGTERM)
+            assert process.wait(timeout=5) == 128 + signal.SIGTERM
+            process.stdin.close()
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_task_snapshot()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Тест устойчивости запросов к OpenRouter: повторы, Retry-After, запасные модели
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+import aiohttp
+
+from openrouter_client import OpenRouterMCPClient
+from stub_llm import StubLLMServer
+from upstream_resilience import ModelSelector, RetryPolicy, parse_retry_after
+
+async def check_client():
+    stub = StubLLMServer(failing_models={"primary"}, retry_after=0.05)
+    await stub.start()
+    client = OpenRouterMCPClient(api_key="test", model="primary")
+    client.base_url = stub.base_url
+    client.retry_policy = RetryPolicy(max_attempts=2, base_delay=0.01, seed=1)
+    client.model_selector = ModelSelector(["primary", "backup"], min_samples=2)
+    try:
+        async with aiohttp.ClientSession() as session:
+            # Основная модель отвечает 503: повтор после Retry-After, затем запасная модель
+            turn = client._new_turn()
+            payload = {"model": "primary", "messages": [{"role": "user", "content": "Привет"}]}
+            started = time.perf_counter()
+            status, _ = await client._post_completion(session, {}, payload, turn)
+            assert status == 200 and time.perf_counter() - started >= 0.05
+            assert turn["upstream_retries"] == 1 and turn["upstream_fallbacks"] == 1
+            assert stub.requests == 3
+
+            # Статистика накоплена: падающая модель больше не пробуется первой
+            for i in range(3):
+                payload = {"model": "primary", "messages": [{"role": "user", "content": f"Еще {i}"}]}
+                await client._post_completion(session, {}, payload, client._new_turn())
+            assert client.model_selector.order("primary") == ["backup", "primary"]
+            requests = stub.requests
+            turn = client._new_turn()
+            payload = {"model": "primary", "messages": [{"role": "user", "content": "Последний"}]}
+            status, _ = await client._post_completion(session, {}, payload, turn)
+            assert status == 200 and stub.requests == requests + 1 and turn["upstream_retries"] == 0
+
+            # Retry-After дольше max_delay: без повтора и ожидания сразу к запасной модели
+            client.retry_policy = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.02, seed=1)
+            client.model_selector = ModelSelector(["primary", "backup"])
+            requests = stub.requests
+            turn = client._new_turn()
+            payload = {"model": "primary", "messages": [{"role": "user", "content": "Долгий Retry-After"}]}
+            started = time.perf_counter()
+            status, _ = await client._post_completion(session, {}, payload, turn)
+            assert status == 200 and time.perf_counter() - started < 0.05
+            assert turn["upstream_retries"] == 0 and turn["upstream_fallbacks"] == 1
+            assert stub.requests == requests + 2
+            # Без запасной модели клиент сразу получает 503
+            client.model_selector = ModelSelector(["primary"])
+            turn = client._new_turn()
+            payload = {"model": "primary", "messages": [{"role": "user", "content": "Без запасной"}]}
+            status, _ = await client._post_completion(session, {}, payload, turn)
+            assert status == 503 and turn["upstream_retries"] == 0 and stub.requests == requests + 3
+
+            # Ошибка клиента (не временная) не повторяется
+            stub.failing_models = set()
+            stub.error_rate = 0.0
+            client.model_selector = ModelSelector(["primary"])
+            client.base_url = stub.base_url + "/missing"
+            turn = client._new_turn()
+            status, _ = await client._post_completion(session, {}, payload, turn)
+            assert status == 404 and turn["upstream_retries"] == 0
+    finally:
+        await stub.stop()
+
+def test_upstream_resilience():
+    print("🧪 Тестирование устойчивости запросов к upstream...")
+
+    # Тест 1: Retry-After и задержки повторов
+    print("🔄 Тест 1: задержки повторов")
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("abc") is None and parse_retry_after(None) is None
+    policy = RetryPolicy(base_delay=0.1, max_delay=1.0, seed=7)
+    for attempt in range(6):
+        assert 0 <= policy.delay(attempt) <= min(1.0, 0.1 * 2 ** attempt)
+    assert policy.delay(0, retry_after=0.5) == 0.5
+    # Retry-After дольше max_delay: не ждать его обрезанным, а пропустить модель
+    assert policy.delay(0, retry_after=1.0) == 1.0 and policy.delay(0, retry_after=30) is None
+    assert policy.should_retry(503) and policy.should_retry(429) and not policy.should_retry(400)
+
+    # Тест 2: порядок моделей и задержка hedged-запроса
+    print("🔄 Тест 2: выбор модели")
+    selector = ModelSelector(["fast", "slow", "spare"], min_samples=3)
+    assert selector.order() == ["fast", "slow", "spare"] and selector.hedge_delay("fast") is None
+    for _ in range(5):
+        selector.record("fast", 0.1, True)
+        selector.record("slow", 1.0, True)
+    assert selector.order() == ["fast", "spare", "slow"]
+    assert selector.order("slow") == ["slow", "spare"]
+    assert abs(selector.hedge_delay("fast") - 0.1) < 1e-9
+
+    # Тест 3: повторы и запасная модель в клиенте
+    print("🔄 Тест 3: клиент")
+    asyncio.run(check_client())
+
+    print("\n✅ Все тесты выполнены!")
+
+if __name__ == "__main__":
+    test_upstream_resilience()
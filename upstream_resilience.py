@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Устойчивость запросов клиента к OpenRouter
+
+RetryPolicy — повторы с экспоненциальной задержкой и полным джиттером,
+с учетом заголовка Retry-After. ModelSelector — упорядоченный список моделей
+(основная и запасные) со скользящей статистикой латентности и ошибок: модель,
+которая заметно хуже лучшей, уходит в конец очереди, а p95 ее латентности
+служит задержкой для hedged-запроса (дубликата медленного запроса).
+"""
+
+import os
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Deque, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# Статусы, которые имеет смысл повторить: таймауты, лимиты и ошибки upstream.
+# 0 — запрос не дошел до ответа (ошибка соединения)
+RETRY_STATUSES = frozenset({0, 408, 409, 425, 429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Значение Retry-After в секундах (число секунд или HTTP-дата)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Сколько раз и с какой задержкой повторять запрос к одной модели"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.25, max_delay: float = 8.0,
+                 retry_statuses: FrozenSet[int] = RETRY_STATUSES, seed: Optional[int] = None):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = retry_statuses
+        self._random = random.Random(seed)
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """Настройки из переменных окружения OPENROUTER_MAX_ATTEMPTS и OPENROUTER_RETRY_*"""
+        return cls(
+            max_attempts=int(os.getenv("OPENROUTER_MAX_ATTEMPTS", "3")),
+            base_delay=float(os.getenv("OPENROUTER_RETRY_BASE_MS", "250")) / 1000,
+            max_delay=float(os.getenv("OPENROUTER_RETRY_MAX_MS", "8000")) / 1000
+        )
+
+    def should_retry(self, status: int) -> bool:
+        return status in self.retry_statuses
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """Задержка перед повтором номер attempt (с 0): полный джиттер, но не раньше Retry-After.
+
+        None — upstream просит ждать дольше max_delay: повтор раньше срока снова
+        получит отказ, поэтому эту модель лучше пропустить.
+        """
+        jittered = self._random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            if retry_after > self.max_delay:
+                return None
+            return max(jittered, retry_after)
+        return jittered
+
+
+class ModelStats:
+    """Скользящее окно (время, латентность, успех) запросов к одной модели"""
+
+    __slots__ = ("samples", "window", "max_samples")
+
+    def __init__(self, window: float = 300.0, max_samples: int = 100):
+        self.samples: Deque[Tuple[float, float, bool]] = deque(maxlen=max_samples)
+        self.window = window
+        self.max_samples = max_samples
+
+    def record(self, seconds: float, ok: bool):
+        self.samples.append((time.monotonic(), seconds, ok))
+
+    def recent(self) -> List[Tuple[float, bool]]:
+        horizon = time.monotonic() - self.window
+        while self.samples and self.samples[0][0] < horizon:
+            self.samples.popleft()
+        return [(seconds, ok) for _, seconds, ok in self.samples]
+
+    def summary(self) -> Dict[str, float]:
+        recent = self.recent()
+        if not recent:
+            return {"count": 0}
+        latencies = sorted(seconds for seconds, ok in recent if ok)
+        errors = sum(1 for _, ok in recent if not ok)
+        result = {"count": len(recent), "error_rate": errors / len(recent)}
+        if latencies:
+            result["p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return result
+
+
+class ModelSelector:
+    """Порядок моделей для запроса: заданный список, откуда худшие по счету уходят в конец.
+
+    Счет модели = p95 латентности * (1 + error_penalty * доля ошибок). Модель со
+    счетом больше demote_factor * лучший счет пробуется после остальных. Пока
+    статистики мало (меньше min_samples), модель остается на своем месте.
+    Окно статистики ограничено по времени, поэтому вытесненная модель со
+    временем снова получает шанс.
+    """
+
+    def __init__(self, models: Iterable[str], min_samples: int = 5, demote_factor: float = 2.0,
+                 error_penalty: float = 4.0, window: float = 300.0):
+        self.models: List[str] = list(dict.fromkeys(models))
+        self.min_samples = min_samples
+        self.demote_factor = demote_factor
+        self.error_penalty = error_penalty
+        self.window = window
+        self._stats: Dict[str, ModelStats] = {}
+
+    @classmethod
+    def from_env(cls, primary: str) -> "ModelSelector":
+        """Основная модель и запасные из OPENROUTER_FALLBACK_MODELS (через запятую)"""
+        fallbacks = [m.strip() for m in os.getenv("OPENROUTER_FALLBACK_MODELS", "").split(",") if m.strip()]
+        return cls([primary] + fallbacks)
+
+    def stats(self, model: str) -> ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats.setdefault(model, ModelStats(self.window))
+        return stats
+
+    def record(self, model: str, seconds: float, ok: bool):
+        self.stats(model).record(seconds, ok)
+
+    def score(self, model: str) -> Optional[float]:
+        summary = self.stats(model).summary()
+        if summary["count"] < self.min_samples:
+            return None
+        if "p95" not in summary:
+            return float("inf")
+        return summary["p95"] * (1 + self.error_penalty * summary["error_rate"])
+
+    def order(self, primary: Optional[str] = None) -> List[str]:
+        """Модели в порядке попыток: primary (модель из запроса, по умолчанию первая
+        в списке), затем запасные"""
+        primary = primary or self.models[0]
+        models = [primary] + [m for m in self.models[1:] if m != primary]
+        scores = {m: self.score(m) for m in models}
+        known = [s for s in scores.values() if s is not None]
+        if not known:
+            return models
+        best = min(known)
+        demoted = {m for m, s in scores.items() if s is not None and s > best * self.demote_factor}
+        return [m for m in models if m not in demoted] + [m for m in models if m in demoted]
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """Через сколько секунд отправлять дубликат: p95 успешных ответов модели"""
+        summary = self.stats(model).summary()
+        if summary["count"] < self.min_samples or "p95" not in summary:
+            return None
+        return summary["p95"]
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {model: self.stats(model).summary() for model in self.models}